@@ -5,6 +5,7 @@
 import os
 import sys
 import time
+from datetime import datetime, timedelta
 import gradio as gr
 
 # 필요한 모듈들 임포트
@@ -14,8 +15,9 @@ from ui.auth_ui import create_auth_ui
 from ui.portfolio_ui import create_portfolio_ui
 from ui.savings_ui import create_savings_ui
 from ui.visualization import create_visualization_ui
+from ui.admin_ui import create_admin_ui, setup_admin_events, load_cache_monitor
 from services.market_service import schedule_price_updates
-from services.portfolio_service import update_all_prices, buy_stock, sell_stock, load_portfolio, load_transactions, get_owned_stocks, get_stock_details
+from services.portfolio_service import update_all_prices, buy_stock, sell_stock, load_portfolio, apply_portfolio_delta, execute_trade_batch, trade_legs_from_table, load_transactions, load_transactions_page, load_dividends_page, get_owned_stocks, get_stock_details
 from services.savings_service import update_savings_calculation, load_savings
 
 # 로거 초기화
@@ -78,6 +80,9 @@ def create_ui():
                 with gr.Accordion("분석", open=True, elem_classes="menu-container"):
                     menu_buttons["portfolio_analysis"] = gr.Button("포트폴리오 분석", elem_classes="action-button")
                     menu_buttons["asset_allocation"] = gr.Button("자산 배분", elem_classes="action-button")
+                
+                with gr.Accordion("관리자", open=False, elem_classes="menu-container"):
+                    menu_buttons["cache_monitor"] = gr.Button("캐시 모니터", elem_classes="action-button")
             
             # 메인 컨텐츠 영역
             with gr.Column(scale=4, elem_classes="tab-content"):
@@ -85,18 +90,21 @@ def create_ui():
                 portfolio_containers, portfolio_components = create_portfolio_ui()
                 savings_containers, savings_components = create_savings_ui()
                 visualization_containers, visualization_components = create_visualization_ui()
+                admin_containers, admin_components = create_admin_ui()
                 
                 # UI 컴포넌트 합치기
                 all_containers = {
                     **portfolio_containers,
                     **savings_containers,
-                    **visualization_containers
+                    **visualization_containers,
+                    **admin_containers
                 }
                 
                 all_components = {
                     **portfolio_components,
                     **savings_components,
-                    **visualization_components
+                    **visualization_components,
+                    **admin_components
                 }
         
         # 로그인 함수
@@ -282,14 +290,23 @@ def create_ui():
             outputs=[portfolio_components["portfolio_table"]]
         )
         
+        # 거래 변경분을 화면의 표에 반영 (변경분이 없으면 전체 다시 조회)
+        def trade_table(state, table, delta):
+            if delta is None:
+                return load_portfolio(state["user_id"])
+            return apply_portfolio_delta(table, delta)
+        
         # 매수 이벤트 핸들러
         portfolio_components["buy_btn"].click(
-            fn=lambda state, 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가: (
-                buy_stock(state["user_id"], 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가),
+            fn=lambda state, table, 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가: (
+                trade_table(state, table, buy_stock(
+                    state["user_id"], 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가, return_delta=True
+                )),
                 "매수가 완료되었습니다."
             ),
             inputs=[
                 session_state,
+                portfolio_components["portfolio_table"],
                 portfolio_components["buy_증권사"],
                 portfolio_components["buy_계좌"],
                 portfolio_components["buy_국가"],
@@ -305,12 +322,15 @@ def create_ui():
         )
         
         # 매도 이벤트 핸들러
+        def sell_handler(state, table, 종목코드, 계좌, 수량, 매도가):
+            message, delta = sell_stock(state["user_id"], 종목코드, 계좌, 수량, 매도가, return_delta=True)
+            return message, trade_table(state, table, delta)
+        
         portfolio_components["sell_btn"].click(
-            fn=lambda state, 종목코드, 계좌, 수량, 매도가: sell_stock(
-                state["user_id"], 종목코드, 계좌, 수량, 매도가
-            ),
+            fn=sell_handler,
             inputs=[
                 session_state,
+                portfolio_components["portfolio_table"],
                 portfolio_components["sell_종목코드"],
                 portfolio_components["sell_계좌"],
                 portfolio_components["sell_수량"],
@@ -322,13 +342,139 @@ def create_ui():
             ]
         )
         
-        # 거래내역 로드 이벤트 핸들러
-        portfolio_components["load_transaction_btn"].click(
-            fn=lambda state: load_transactions(state["user_id"]),
-            inputs=[session_state],
-            outputs=[portfolio_components["transaction_table"]]
+        # 일괄 주문 이벤트 핸들러 (모든 행을 한 트랜잭션으로 실행, 성공하면 입력 표 비움)
+        def batch_order_handler(state, grid):
+            result = execute_trade_batch(state["user_id"], trade_legs_from_table(grid))
+            message = result["message"]
+            if result["errors"]:
+                message += "\n" + "\n".join(f"{error['leg']}행: {error['message']}" for error in result["errors"])
+            return message, load_portfolio(state["user_id"]), None if result["success"] else grid
+        
+        portfolio_components["batch_execute_btn"].click(
+            fn=batch_order_handler,
+            inputs=[session_state, portfolio_components["batch_table"]],
+            outputs=[
+                portfolio_components["batch_result"],
+                portfolio_components["portfolio_table"],
+                portfolio_components["batch_table"]
+            ]
+        )
+        
+        portfolio_components["batch_clear_btn"].click(
+            fn=lambda: (None, ""),
+            inputs=[],
+            outputs=[portfolio_components["batch_table"], portfolio_components["batch_result"]]
         )
         
+        # 거래내역/배당금 페이지 조회 (키셋 커서로 이전/다음 페이지 이동, 조건을 바꾸면 첫 페이지부터)
+        def move_page(page_state, direction):
+            """페이지 이동 방향에 맞는 (after, before, 페이지 번호)"""
+            page_state = page_state or {}
+            page_number = page_state.get("page", 1)
+            if direction == "next" and page_state.get("next_cursor"):
+                return page_state["next_cursor"], None, page_number + 1
+            if direction == "prev" and page_state.get("prev_cursor"):
+                return None, page_state["prev_cursor"], max(page_number - 1, 1)
+            if direction in ("next", "prev"):
+                return page_state.get("after"), page_state.get("before"), page_number
+            return None, None, 1
+        
+        def page_result(df, page, after, before, page_number):
+            # 이전 페이지가 첫 페이지에 도달하면 1페이지로 표시
+            page_number = page_number if page["has_prev"] else 1
+            state = dict(page, after=after, before=before, page=page_number)
+            info = f"{page_number} 페이지" + ("" if page["has_next"] else " (마지막)")
+            return df, info, state
+        
+        transaction_period_days = {"최근 1개월": 30, "최근 3개월": 90, "최근 6개월": 180, "최근 1년": 365}
+        
+        def load_transactions_handler(state, page_state, type_filter, search, period, direction="first"):
+            if not state or not state.get("user_id"):
+                return None, "", {}
+            
+            after, before, page_number = move_page(page_state, direction)
+            start_date = None
+            if period in transaction_period_days:
+                start_date = (datetime.now() - timedelta(days=transaction_period_days[period])).strftime("%Y-%m-%d")
+            
+            df, page = load_transactions_page(
+                state["user_id"], after=after, before=before,
+                transaction_type=type_filter if type_filter in ("매수", "매도") else None,
+                search=search.strip() if search else None, start_date=start_date
+            )
+            return page_result(df, page, after, before, page_number)
+        
+        transaction_inputs = [
+            session_state,
+            portfolio_components["transactions_page_state"],
+            portfolio_components["transactions_filter"],
+            portfolio_components["transactions_search"],
+            portfolio_components["transactions_period"]
+        ]
+        transaction_outputs = [
+            portfolio_components["transaction_table"],
+            portfolio_components["transactions_page_info"],
+            portfolio_components["transactions_page_state"]
+        ]
+        
+        for trigger, direction in (
+            (portfolio_components["load_transaction_btn"].click, "first"),
+            (portfolio_components["transactions_filter"].change, "first"),
+            (portfolio_components["transactions_period"].change, "first"),
+            (portfolio_components["transactions_search"].submit, "first"),
+            (portfolio_components["transactions_next_btn"].click, "next"),
+            (portfolio_components["transactions_prev_btn"].click, "prev")
+        ):
+            trigger(
+                fn=lambda *args, direction=direction: load_transactions_handler(*args, direction=direction),
+                inputs=transaction_inputs,
+                outputs=transaction_outputs
+            )
+        
+        def dividend_period_range(period):
+            """배당금 기간 선택값의 (시작일, 종료일)"""
+            today = datetime.now().date()
+            if period == "최근 1년":
+                return (today - timedelta(days=365)).isoformat(), None
+            if period == "올해":
+                return f"{today.year}-01-01", None
+            if period == "작년":
+                return f"{today.year - 1}-01-01", f"{today.year - 1}-12-31"
+            return None, None
+        
+        def load_dividends_handler(state, page_state, period, direction="first"):
+            if not state or not state.get("user_id"):
+                return None, "", {}
+            
+            after, before, page_number = move_page(page_state, direction)
+            start_date, end_date = dividend_period_range(period)
+            df, page = load_dividends_page(state["user_id"], after=after, before=before,
+                                           start_date=start_date, end_date=end_date)
+            return page_result(df, page, after, before, page_number)
+        
+        dividend_inputs = [
+            session_state,
+            portfolio_components["dividends_page_state"],
+            portfolio_components["dividends_period"]
+        ]
+        dividend_outputs = [
+            portfolio_components["dividends_table"],
+            portfolio_components["dividends_page_info"],
+            portfolio_components["dividends_page_state"]
+        ]
+        
+        for trigger, direction in (
+            (portfolio_components["load_dividends_btn"].click, "first"),
+            (portfolio_components["dividends_period"].change, "first"),
+            (portfolio_components["dividends_next_btn"].click, "next"),
+            (portfolio_components["dividends_prev_btn"].click, "prev")
+        ):
+            trigger(
+                fn=lambda *args, direction=direction: load_dividends_handler(*args, direction=direction),
+                inputs=dividend_inputs,
+                outputs=dividend_outputs
+            )
+        
         # 보유 종목 목록 업데이트 함수 (sell_stock_dropdown이 있는 경우)
         if "sell_stock_dropdown" in portfolio_components:
             # 매도 화면이 표시될 때 보유 종목 목록 업데이트
@@ -485,6 +631,23 @@ def create_ui():
             logger.warning(f"시각화 모듈 로드 실패: {e}")
             # 시각화 기능이 없어도 앱이 실행될 수 있도록 패스
         
+        # 관리자 화면 이벤트 (캐시 모니터)
+        setup_admin_events(app, session_state, admin_components, admin_containers)
+        
+        # 캐시 모니터 화면 표시 시 통계 자동 조회
+        menu_buttons["cache_monitor"].click(
+            fn=load_cache_monitor,
+            inputs=[session_state],
+            outputs=[
+                admin_components["cache_status"],
+                admin_components["cache_stats_table"],
+                admin_components["provider_stats_table"],
+                admin_components["hot_keys_table"],
+                admin_components["table_sizes_table"],
+                admin_components["oldest_entries_table"]
+            ]
+        )
+        
         # 적금 관련 이벤트
         try:
             from services.savings_service import create_savings, add_savings_deposit, get_savings_by_id
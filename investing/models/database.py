@@ -10,6 +10,38 @@ from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# 포트폴리오 집계 차원 (차원명: 그룹 값 식, {row}는 트리거의 NEW./OLD. 또는 빈 문자열)
+PORTFOLIO_AGGREGATE_DIMENSIONS = {
+    "total": "''",
+    "country": "COALESCE({row}국가, '미분류')",
+    "account": "COALESCE({row}계좌, '미분류')",
+    "broker": "COALESCE({row}증권사, '미분류')",
+    "sector": "COALESCE({row}섹터, '미분류')"
+}
+
+def portfolio_aggregate_select(where="1 = 1"):
+    """
+    포트폴리오 테이블에서 집계 테이블 행을 계산하는 SELECT 문 생성 (초기 구성, 재구성, 정합성 검사용)
+    
+    Args:
+        where (str, optional): portfolio 테이블 조건식
+        
+    Returns:
+        str: (user_id, dimension, dim_value, position_count, total_value, total_invested,
+              total_gain_loss, total_dividend) 를 반환하는 SELECT 문
+    """
+    selects = []
+    for dimension, expression in PORTFOLIO_AGGREGATE_DIMENSIONS.items():
+        value = expression.format(row='')
+        selects.append(f"""
+            SELECT user_id, '{dimension}', {value}, COUNT(*), SUM(COALESCE(평가액, 0)),
+                   SUM(COALESCE(수량, 0) * COALESCE(평단가_원화, 0)), SUM(COALESCE(손익금액, 0)), SUM(COALESCE(배당금, 0))
+            FROM portfolio
+            WHERE user_id IS NOT NULL AND ({where})
+            GROUP BY user_id, {value}
+        """)
+    return " UNION ALL ".join(selects)
+
 def init_databases():
     """
     모든 필요한 데이터베이스 초기화
@@ -150,6 +182,29 @@ def init_user_database():
     conn.commit()
     conn.close()
 
+def _add_missing_columns(cursor, table, columns):
+    """
+    이전 버전 데이터베이스의 테이블에 없는 컬럼 추가 (CREATE TABLE IF NOT EXISTS는 기존 테이블을 바꾸지 않음)
+
+    Args:
+        cursor (sqlite3.Cursor): 데이터베이스 커서
+        table (str): 테이블 이름
+        columns (dict): {컬럼 이름: 컬럼 타입}
+
+    Returns:
+        list: 추가한 컬럼 이름 목록
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+
+    added = [column for column in columns if column not in existing]
+    for column in added:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {columns[column]}")
+
+    if added:
+        logger.info(f"{table} 테이블에 컬럼 추가: {', '.join(added)}")
+    return added
+
 def init_portfolio_database():
     """
     포트폴리오, 적금 관련 데이터베이스 초기화
@@ -191,6 +246,12 @@ def init_portfolio_database():
     )
     ''')
     
+    # 이전 버전 포트폴리오 테이블 업그레이드 (집계 트리거와 초기 집계가 섹터/배당금 컬럼을 사용)
+    _add_missing_columns(cursor, 'portfolio', {
+        '배당금': 'REAL', '최근배당일': 'DATE', '섹터': 'TEXT', '산업군': 'TEXT', '현금흐름등급': 'TEXT',
+        '베타': 'REAL', '매수날짜': 'DATE', '메모': 'TEXT', '자동매수설정': 'TEXT'
+    })
+    
     # 거래 내역 테이블 생성
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS transactions (
@@ -209,6 +270,7 @@ def init_portfolio_database():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
+    _add_missing_columns(cursor, 'transactions', {'수수료': 'REAL', '세금': 'REAL', '실현손익': 'REAL', '거래메모': 'TEXT'})
 
     # 포트폴리오 이력 테이블 생성 (수익률 시각화용)
     cursor.execute('''
@@ -226,6 +288,7 @@ def init_portfolio_database():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
+    _add_missing_columns(cursor, 'portfolio_history', {'cash_balance': 'REAL', 'realized_profit': 'REAL', 'unrealized_profit': 'REAL'})
     
     # 배당금 기록 테이블
     cursor.execute('''
@@ -323,6 +386,294 @@ def init_portfolio_database():
     )
     ''')
     
+    # 보유 종목 유니버스 테이블 (전체 사용자 기준 종목별 1행, 가격 갱신 대상)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS held_symbols (
+        종목코드 TEXT NOT NULL,
+        국가 TEXT NOT NULL,
+        시장 TEXT,                /* KRX: 국내, INTL: 해외 (달러 시세) */
+        holder_count INTEGER,     /* 보유 사용자 수 */
+        position_count INTEGER,   /* 보유 포지션(계좌) 수 */
+        total_quantity REAL,
+        현재가_원화 REAL,
+        현재가_달러 REAL,
+        last_price_update TIMESTAMP,
+        last_update TIMESTAMP,
+        PRIMARY KEY (종목코드, 국가)
+    )
+    ''')
+
+    # 신규 포지션 부가정보 작업 큐 (섹터/산업군/베타, 평단가 달러 환산, 첫 시세를 매수 후 비동기로 채움)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS enrichment_queue (
+        portfolio_id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        종목코드 TEXT NOT NULL,
+        국가 TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',  /* pending, failed (완료된 작업은 삭제) */
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at TIMESTAMP,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_queue_due ON enrichment_queue (status, next_attempt_at)")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_portfolio_symbol ON portfolio (종목코드, 국가)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_portfolio_user ON portfolio (user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_portfolio ON transactions (portfolio_id, transaction_date)")
+    cursor.execute("DROP INDEX IF EXISTS idx_dividends_portfolio")
+    
+    # 내역 페이지 조회용 인덱스 (정렬 키: 날짜, id, id는 rowid라 인덱스에 포함됨)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, transaction_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date ON transactions (user_id, type, transaction_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dividends_user_date ON dividends (user_id, 지급일)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dividends_portfolio_date ON dividends (portfolio_id, 지급일)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_savings_transactions_user_date ON savings_transactions (user_id, 날짜)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_savings_transactions_savings_date ON savings_transactions (savings_id, 날짜)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_savings_transactions_user_type_date ON savings_transactions (user_id, 거래유형, 날짜)")
+    
+    # 사용자별 데이터 버전 테이블 (캐시 무효화용)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS data_version (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        last_update TIMESTAMP
+    )
+    ''')
+    
+    # 사용자 데이터 변경 시 버전 증가 트리거
+    bump_version = '''
+        INSERT INTO data_version (user_id, version, last_update) VALUES ({row}.user_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1, last_update = excluded.last_update;
+    '''
+    for table in ['portfolio', 'transactions', 'dividends', 'portfolio_history', 'savings', 'savings_transactions']:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_version AFTER INSERT ON {table}
+        BEGIN {bump_version.format(row='NEW')} END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_version AFTER DELETE ON {table}
+        BEGIN {bump_version.format(row='OLD')} END
+        ''')
+        # 사용자가 바뀌는 경우 이전/새 사용자 모두 증가
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_update_version AFTER UPDATE ON {table}
+        BEGIN
+            {bump_version.format(row='NEW')}
+            INSERT INTO data_version (user_id, version, last_update)
+            SELECT OLD.user_id, 1, CURRENT_TIMESTAMP WHERE OLD.user_id IS NOT NEW.user_id
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1, last_update = excluded.last_update;
+        END
+        ''')
+    
+    # 매수 로트 테이블 (원가 장부)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tax_lots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        portfolio_id INTEGER,
+        종목코드 TEXT,
+        buy_transaction_id INTEGER,   /* 매수 거래 ID (기초/조정 로트는 NULL) */
+        acquired_at TIMESTAMP,
+        quantity REAL,                /* 최초 수량 */
+        remaining_quantity REAL,      /* 남은 수량 */
+        cost_per_share REAL,          /* 주당 원가 (매수 수수료/세금 포함, 원화) */
+        closed_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    
+    # 매도-로트 매칭 테이블 (로트별 실현손익)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lot_matches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        portfolio_id INTEGER,
+        lot_id INTEGER,
+        sell_transaction_id INTEGER,
+        quantity REAL,
+        cost_basis REAL,
+        proceeds REAL,                /* 매도 금액 (매도 수수료/세금 차감) */
+        realized_gain REAL,
+        acquired_at TIMESTAMP,
+        disposed_at TIMESTAMP,
+        holding_days INTEGER,
+        method TEXT,                  /* FIFO, LIFO, AVG */
+        FOREIGN KEY (lot_id) REFERENCES tax_lots (id)
+    )
+    ''')
+    
+    # 종목별 누적 실현손익 (장부 처리 결과)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ledger_positions (
+        portfolio_id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        종목코드 TEXT,
+        realized_quantity REAL,
+        realized_cost REAL,
+        realized_proceeds REAL,
+        realized_gain REAL,
+        last_transaction_date TIMESTAMP,  /* 마지막으로 처리한 거래일 */
+        last_update TIMESTAMP
+    )
+    ''')
+    
+    # 사용자별 장부 처리 위치 및 원가 계산 방식
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ledger_state (
+        user_id INTEGER PRIMARY KEY,
+        method TEXT NOT NULL DEFAULT 'AVG',
+        last_transaction_id INTEGER NOT NULL DEFAULT 0,
+        transaction_count INTEGER NOT NULL DEFAULT 0,  /* 처리 위치까지의 거래 수 (삭제 감지용) */
+        last_update TIMESTAMP
+    )
+    ''')
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tax_lots_open ON tax_lots (portfolio_id, acquired_at) WHERE remaining_quantity > 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tax_lots_user ON tax_lots (user_id, remaining_quantity)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lot_matches_user ON lot_matches (user_id, disposed_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lot_matches_portfolio ON lot_matches (portfolio_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, id)")
+    
+    # 일별 시간가중수익률 (현금흐름 제거)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS portfolio_returns (
+        user_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        total_value REAL,
+        net_flow REAL,            /* 구간 순유입 (매수 - 매도 - 배당) */
+        daily_return REAL,        /* 구간 수익률 (소수) */
+        twr_index REAL,           /* 누적 지수 (시작 = 1) */
+        PRIMARY KEY (user_id, date)
+    )
+    ''')
+    
+    # 사용자별 수익률 요약 (시간가중수익률, XIRR)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS return_summary (
+        user_id INTEGER PRIMARY KEY,
+        start_date DATE,
+        end_date DATE,
+        twr_total REAL,           /* % */
+        twr_annualized REAL,      /* % */
+        xirr REAL,                /* 연 %, 해가 없으면 NULL */
+        last_update TIMESTAMP
+    )
+    ''')
+    
+    # 종목별 XIRR
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS position_returns (
+        portfolio_id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        xirr REAL,
+        last_update TIMESTAMP
+    )
+    ''')
+    
+    # 사용자별 포트폴리오 집계 테이블 (합계 및 국가/계좌/증권사/섹터별 분포, 트리거로 증분 유지)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS portfolio_aggregates (
+        user_id INTEGER NOT NULL,
+        dimension TEXT NOT NULL,  /* total, country, account, broker, sector */
+        dim_value TEXT NOT NULL,  /* total 차원은 빈 문자열 */
+        position_count INTEGER NOT NULL DEFAULT 0,
+        total_value REAL NOT NULL DEFAULT 0,
+        total_invested REAL NOT NULL DEFAULT 0,
+        total_gain_loss REAL NOT NULL DEFAULT 0,
+        total_dividend REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, dimension, dim_value)
+    )
+    ''')
+    
+    # 포지션 행을 집계에 더하거나(+) 빼는(-) 트리거 본문
+    def apply_aggregate(row, sign):
+        dimensions = " UNION ALL ".join(
+            f"SELECT '{dimension}' AS dimension, {expression.format(row=row + '.')} AS dim_value"
+            for dimension, expression in PORTFOLIO_AGGREGATE_DIMENSIONS.items()
+        )
+        return f'''
+            INSERT INTO portfolio_aggregates (user_id, dimension, dim_value, position_count, total_value,
+                                              total_invested, total_gain_loss, total_dividend)
+            SELECT {row}.user_id, d.dimension, d.dim_value, {sign}1, {sign}COALESCE({row}.평가액, 0),
+                   {sign}(COALESCE({row}.수량, 0) * COALESCE({row}.평단가_원화, 0)),
+                   {sign}COALESCE({row}.손익금액, 0), {sign}COALESCE({row}.배당금, 0)
+            FROM ({dimensions}) d
+            WHERE {row}.user_id IS NOT NULL
+            ON CONFLICT (user_id, dimension, dim_value) DO UPDATE SET
+                position_count = position_count + excluded.position_count,
+                total_value = total_value + excluded.total_value,
+                total_invested = total_invested + excluded.total_invested,
+                total_gain_loss = total_gain_loss + excluded.total_gain_loss,
+                total_dividend = total_dividend + excluded.total_dividend;
+        '''
+    
+    # 포지션이 없어진 그룹 제거 (부동소수점 누적 오차도 함께 사라짐)
+    remove_empty = "DELETE FROM portfolio_aggregates WHERE user_id = OLD.user_id AND position_count <= 0;"
+    
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_portfolio_insert_aggregates AFTER INSERT ON portfolio
+    BEGIN {apply_aggregate('NEW', '+')} END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_portfolio_delete_aggregates AFTER DELETE ON portfolio
+    BEGIN {apply_aggregate('OLD', '-')} {remove_empty} END
+    ''')
+    # 그룹(사용자, 국가, 계좌, 증권사, 섹터)이 바뀌면 이전 그룹에서 빼고 새 그룹에 더함
+    group_columns = ['user_id', '국가', '계좌', '증권사', '섹터']
+    group_changed = ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in group_columns)
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_portfolio_regroup_aggregates
+    AFTER UPDATE OF {', '.join(group_columns)} ON portfolio
+    WHEN {group_changed}
+    BEGIN {apply_aggregate('OLD', '-')} {apply_aggregate('NEW', '+')} {remove_empty} END
+    ''')
+    
+    # 그룹은 그대로이고 금액만 바뀐 경우 (재평가, 수량 변경) 해당 그룹 행에 차이만 반영
+    value_columns = ['수량', '평단가_원화', '평가액', '손익금액', '배당금']
+    group_match = ' OR '.join(
+        f"(dimension = '{dimension}' AND dim_value = {expression.format(row='NEW.')})"
+        for dimension, expression in PORTFOLIO_AGGREGATE_DIMENSIONS.items()
+    )
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_portfolio_update_aggregates
+    AFTER UPDATE OF {', '.join(value_columns)} ON portfolio
+    WHEN NOT ({group_changed}) AND ({' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in value_columns)})
+    BEGIN
+        UPDATE portfolio_aggregates SET
+            total_value = total_value + COALESCE(NEW.평가액, 0) - COALESCE(OLD.평가액, 0),
+            total_invested = total_invested + COALESCE(NEW.수량, 0) * COALESCE(NEW.평단가_원화, 0)
+                                            - COALESCE(OLD.수량, 0) * COALESCE(OLD.평단가_원화, 0),
+            total_gain_loss = total_gain_loss + COALESCE(NEW.손익금액, 0) - COALESCE(OLD.손익금액, 0),
+            total_dividend = total_dividend + COALESCE(NEW.배당금, 0) - COALESCE(OLD.배당금, 0)
+        WHERE user_id = NEW.user_id AND ({group_match});
+    END
+    ''')
+    
+    # 기존 데이터베이스는 포트폴리오에서 집계 초기 구성
+    cursor.execute("SELECT COUNT(*) FROM portfolio_aggregates")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"""
+        INSERT INTO portfolio_aggregates (user_id, dimension, dim_value, position_count, total_value,
+                                          total_invested, total_gain_loss, total_dividend)
+        {portfolio_aggregate_select()}
+        """)
+    
+    # 기존 데이터베이스는 포트폴리오에서 유니버스 초기 구성
+    cursor.execute("SELECT COUNT(*) FROM held_symbols")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute('''
+        INSERT INTO held_symbols (종목코드, 국가, 시장, holder_count, position_count, total_quantity, last_update)
+        SELECT 종목코드, 국가, CASE WHEN 국가 = '한국' THEN 'KRX' ELSE 'INTL' END,
+               COUNT(DISTINCT user_id), COUNT(*), SUM(수량), ?
+        FROM portfolio
+        WHERE 종목코드 IS NOT NULL AND 국가 IS NOT NULL
+        GROUP BY 종목코드, 국가
+        ''', (datetime.now(),))
+    
     conn.commit()
     conn.close()
 
@@ -412,6 +763,59 @@ def init_market_database():
     )
     ''')
     
+    # 일별 종가 이력 (포트폴리오 과거 평가액 재구성용)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_prices (
+        symbol TEXT NOT NULL,     /* 포트폴리오 종목코드 또는 지수 코드 */
+        market TEXT NOT NULL,     /* KRX, YF_국가, INDEX (벤치마크 지수) */
+        date DATE NOT NULL,
+        close REAL,
+        currency TEXT,            /* KRW, USD */
+        source TEXT,              /* pykrx, yfinance, snapshot */
+        PRIMARY KEY (symbol, market, date)
+    )
+    ''')
+    
+    # 일별 환율 이력
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fx_history (
+        from_currency TEXT NOT NULL,
+        to_currency TEXT NOT NULL,
+        date DATE NOT NULL,
+        rate REAL,
+        source TEXT,
+        PRIMARY KEY (from_currency, to_currency, date)
+    )
+    ''')
+    
+    # 프로바이더에서 이력을 받아 온 기간 (휴장일 때문에 다시 조회하지 않도록 기록)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS price_history_coverage (
+        symbol TEXT NOT NULL,     /* 종목코드 또는 통화쌍 (USDKRW) */
+        market TEXT NOT NULL,     /* KRX, YF_국가, FX, INDEX */
+        start_date DATE,
+        end_date DATE,
+        last_update TIMESTAMP,
+        PRIMARY KEY (symbol, market)
+    )
+    ''')
+    
+    # 종목별 벤치마크 대비 회귀 베타 (야간 작업에서 일괄 갱신)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stock_betas (
+        symbol TEXT NOT NULL,
+        country TEXT NOT NULL,
+        benchmark TEXT,           /* KS11, KQ11, SPX */
+        beta REAL,
+        correlation REAL,
+        observations INTEGER,     /* 회귀에 사용한 수익률 수 */
+        start_date DATE,
+        end_date DATE,
+        last_update TIMESTAMP,
+        PRIMARY KEY (symbol, country)
+    )
+    ''')
+    
     conn.commit()
     conn.close()
 
@@ -446,6 +850,34 @@ def init_settings_database():
     )
     ''')
     
+    # 스케줄 작업 실행 기록 테이블
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS job_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_name TEXT NOT NULL,
+        scheduled_at TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        duration_ms REAL,
+        outcome TEXT,             /* success, error, skipped */
+        error_message TEXT,
+        owner TEXT                /* 작업을 실행한 인스턴스 */
+    )
+    ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs (job_name, scheduled_at)")
+
+    # 스케줄러 리더 임대 테이블 (여러 앱 인스턴스 중 하나만 스케줄 작업 실행)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS job_leases (
+        lease_name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        acquired_at REAL,         /* 유닉스 시간 (초) */
+        heartbeat_at REAL,
+        expires_at REAL
+    )
+    ''')
+
     # 기본 시스템 설정 추가
     default_settings = [
         ('version', '2.0.0', '앱 버전'),
@@ -4,7 +4,7 @@
 import sqlite3
 from datetime import datetime
 import pandas as pd
-from models.database import get_db_connection
+from models.database import get_db_connection, portfolio_aggregate_select, PORTFOLIO_AGGREGATE_DIMENSIONS
 from utils.logging import get_logger, log_exception
 
 logger = get_logger(__name__)
@@ -73,6 +73,93 @@ def get_stock_by_ticker(user_id, ticker, account=None):
         log_exception(logger, e, {"context": "종목 상세 조회", "ticker": ticker})
         return None
 
+def get_user_symbols(cursor, user_id):
+    """
+    사용자가 보유한 종목 목록 조회 (보유 종목 유니버스 동기화용)
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+        
+    Returns:
+        set: (종목코드, 국가) 집합
+    """
+    cursor.execute("SELECT DISTINCT 종목코드, 국가 FROM portfolio WHERE user_id = ?", (user_id,))
+    return {(row[0], row[1]) for row in cursor.fetchall()}
+
+def sync_held_symbols(cursor, symbols):
+    """
+    보유 종목 유니버스(held_symbols) 갱신
+    
+    포트폴리오 변경과 같은 트랜잭션 안에서 호출하며, 지정한 종목의 보유자 수/포지션 수/총 수량을
+    다시 집계합니다. 더 이상 보유자가 없는 종목은 유니버스에서 제거합니다.
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        symbols (iterable): (종목코드, 국가) 목록
+    """
+    current_time = datetime.now()
+    
+    for ticker, country in set(symbols):
+        if not ticker or not country:
+            continue
+        
+        cursor.execute(
+            """
+            SELECT COUNT(DISTINCT user_id), COUNT(*), SUM(수량)
+            FROM portfolio WHERE 종목코드 = ? AND 국가 = ?
+            """,
+            (ticker, country)
+        )
+        holder_count, position_count, total_quantity = cursor.fetchone()
+        
+        if position_count == 0:
+            cursor.execute("DELETE FROM held_symbols WHERE 종목코드 = ? AND 국가 = ?", (ticker, country))
+            continue
+        
+        cursor.execute(
+            """
+            INSERT INTO held_symbols (종목코드, 국가, 시장, holder_count, position_count, total_quantity, last_update)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (종목코드, 국가) DO UPDATE SET
+                holder_count = excluded.holder_count,
+                position_count = excluded.position_count,
+                total_quantity = excluded.total_quantity,
+                last_update = excluded.last_update
+            """,
+            (ticker, country, 'KRX' if country == '한국' else 'INTL',
+             holder_count, position_count, total_quantity, current_time)
+        )
+
+def rebuild_portfolio_aggregates(cursor, user_id=None):
+    """
+    포트폴리오 집계 테이블(portfolio_aggregates)을 포트폴리오 테이블에서 다시 계산
+    
+    평소에는 트리거가 증분으로 유지하므로 정합성 검사에서 불일치가 발견된 경우에만 사용합니다.
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int, optional): 사용자 ID (없으면 전체 사용자)
+        
+    Returns:
+        int: 다시 계산된 집계 행 수
+    """
+    if user_id is None:
+        cursor.execute("DELETE FROM portfolio_aggregates")
+        where, params = "1 = 1", ()
+    else:
+        cursor.execute("DELETE FROM portfolio_aggregates WHERE user_id = ?", (user_id,))
+        # 차원마다 SELECT가 하나씩이므로 조건 파라미터도 차원 수만큼 전달
+        where, params = "user_id = ?", (user_id,) * len(PORTFOLIO_AGGREGATE_DIMENSIONS)
+    
+    cursor.execute(f"""
+        INSERT INTO portfolio_aggregates (user_id, dimension, dim_value, position_count, total_value,
+                                          total_invested, total_gain_loss, total_dividend)
+        {portfolio_aggregate_select(where)}
+    """, params)
+    
+    return cursor.rowcount
+
 def add_portfolio_stock(user_id, broker, account, country, ticker, stock_name, quantity, avg_price, 
                        avg_price_usd=None, sector=None, industry=None, memo=None, purchase_date=None):
     """
@@ -130,6 +217,9 @@ def add_portfolio_stock(user_id, broker, account, country, ticker, stock_name, q
             (stock_id, user_id, '매수', quantity, avg_price, memo, current_time)
         )
         
+        # 보유 종목 유니버스 갱신
+        sync_held_symbols(cursor, [(ticker, country)])
+        
         conn.commit()
         conn.close()
         
@@ -213,6 +303,11 @@ def update_portfolio_stock(stock_id, user_id, quantity=None, current_price=None,
             
             cursor.execute(query, update_values)
             
+            # 수량이 바뀌면 보유 종목 유니버스 갱신
+            if quantity is not None:
+                cursor.execute("SELECT 종목코드, 국가 FROM portfolio WHERE id = ?", (stock_id,))
+                sync_held_symbols(cursor, cursor.fetchall())
+            
             # 만약 현재가가 업데이트 되었다면 평가액 등도 업데이트
             if current_price is not None:
                 cursor.execute("""
@@ -278,12 +373,18 @@ def delete_portfolio_stock(stock_id, user_id):
             (stock_id, user_id)
         )
         
+        # 삭제 전 종목 확인 (보유 종목 유니버스 갱신용)
+        cursor.execute("SELECT 종목코드, 국가 FROM portfolio WHERE id = ? AND user_id = ?", (stock_id, user_id))
+        deleted_symbols = cursor.fetchall()
+        
         # 종목 삭제
         cursor.execute(
             "DELETE FROM portfolio WHERE id = ? AND user_id = ?",
             (stock_id, user_id)
         )
         
+        sync_held_symbols(cursor, deleted_symbols)
+        
         conn.commit()
         conn.close()
         
@@ -345,13 +446,14 @@ def add_transaction(portfolio_id, user_id, transaction_type, quantity, price,
         log_exception(logger, e, {"context": "거래내역 추가", "portfolio_id": portfolio_id})
         return None
 
-def get_transactions_by_user(user_id, limit=100):
+def get_transactions_by_user(user_id, limit=100, after=None):
     """
-    사용자의 거래내역 조회
+    사용자의 거래내역 조회 (거래일시 최근 순)
     
     Args:
         user_id (int): 사용자 ID
         limit (int, optional): 최대 조회 개수
+        after (tuple, optional): 이전 조회의 마지막 (transaction_date, id), 그보다 오래된 거래부터 조회
         
     Returns:
         list: 거래내역 목록
@@ -360,17 +462,18 @@ def get_transactions_by_user(user_id, limit=100):
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
+        keyset = "AND (t.transaction_date, t.id) < (?, ?)" if after else ""
         cursor.execute(
-            """
+            f"""
             SELECT t.id, p.종목명, t.type, t.quantity, t.price, t.transaction_date,
                   t.수수료, t.세금, t.실현손익, t.거래메모
             FROM transactions t
             LEFT JOIN portfolio p ON t.portfolio_id = p.id
-            WHERE t.user_id = ?
-            ORDER BY t.transaction_date DESC
+            WHERE t.user_id = ? {keyset}
+            ORDER BY t.transaction_date DESC, t.id DESC
             LIMIT ?
             """,
-            (user_id, limit)
+            (user_id, *(after or ()), limit)
         )
         
         transactions = [dict(row) for row in cursor.fetchall()]
@@ -442,13 +545,14 @@ def add_dividend(portfolio_id, user_id, payment_date, amount, dividend_type='현
         log_exception(logger, e, {"context": "배당금 추가", "portfolio_id": portfolio_id})
         return None
 
-def get_dividends_by_user(user_id, limit=100):
+def get_dividends_by_user(user_id, limit=100, after=None):
     """
-    사용자의 배당금 내역 조회
+    사용자의 배당금 내역 조회 (지급일 최근 순)
     
     Args:
         user_id (int): 사용자 ID
         limit (int, optional): 최대 조회 개수
+        after (tuple, optional): 이전 조회의 마지막 (지급일, id), 그보다 오래된 내역부터 조회
         
     Returns:
         list: 배당금 내역 목록
@@ -457,16 +561,17 @@ def get_dividends_by_user(user_id, limit=100):
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
+        keyset = "AND (d.지급일, d.id) < (?, ?)" if after else ""
         cursor.execute(
-            """
+            f"""
             SELECT d.id, p.종목명, d.지급일, d.배당액, d.배당유형, d.통화, d.세전금액, d.세후금액
             FROM dividends d
             LEFT JOIN portfolio p ON d.portfolio_id = p.id
-            WHERE d.user_id = ?
-            ORDER BY d.지급일 DESC
+            WHERE d.user_id = ? {keyset}
+            ORDER BY d.지급일 DESC, d.id DESC
             LIMIT ?
             """,
-            (user_id, limit)
+            (user_id, *(after or ()), limit)
         )
         
         dividends = [dict(row) for row in cursor.fetchall()]
@@ -645,6 +750,9 @@ def import_portfolio_data(user_id, import_data, overwrite=False):
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
+        # 가져오기 전 보유 종목 (보유 종목 유니버스 갱신용)
+        previous_symbols = get_user_symbols(cursor, user_id)
+        
         # 기존 데이터 삭제 (덮어쓰기 모드인 경우)
         if overwrite:
             cursor.execute("DELETE FROM transactions WHERE user_id = ?", (user_id,))
@@ -710,6 +818,9 @@ def import_portfolio_data(user_id, import_data, overwrite=False):
                 
                 results["portfolio_added"] += 1
         
+        # 보유 종목 유니버스 갱신 (제거된 종목과 추가된 종목 모두)
+        sync_held_symbols(cursor, previous_symbols | get_user_symbols(cursor, user_id))
+        
         # 거래내역 데이터 가져오기
         transactions = import_data.get("transactions", [])
         
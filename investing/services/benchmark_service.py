@@ -0,0 +1,108 @@
+"""
+벤치마크 지수 시계열 서비스
+
+코스피, 코스닥, S&P 500, 나스닥 일별 종가를 daily_prices(market='INDEX')에 저장해 두고,
+포트폴리오 이력 날짜에 맞춰(휴장일은 직전 종가) 첫 날짜 대비 누적 수익률로 돌려줍니다.
+같은 날짜 구간에는 항상 같은 결과가 나오므로 차트를 캐시할 수 있습니다.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 벤치마크 설정
+BENCHMARK_SETTINGS = {
+    "indices": ("KS11", "KQ11", "SPX", "IXIC"),  # 저장하는 지수 (market_service.INDEX_SYMBOLS 코드)
+    "default_index": "KS11",
+    "foreign_index": "SPX",                      # 해외 종목 보유 시 함께 표시하는 지수
+    "history_days": 400                         # 야간 갱신 시 확인하는 기간 (달력일)
+}
+
+def _stored_closes(index_code, start_date, end_date):
+    """저장된 지수 종가 조회 (날짜 배열, 종가 배열)"""
+    conn = get_db_connection('market')
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT date, close FROM daily_prices
+        WHERE symbol = ? AND market = 'INDEX' AND date BETWEEN ? AND ? AND close > 0
+        ORDER BY date
+    """, (index_code, str(start_date), str(end_date)))
+    rows = cursor.fetchall()
+    conn.close()
+
+    if not rows:
+        return np.array([], dtype='datetime64[D]'), np.array([])
+    dates, closes = zip(*rows)
+    return np.array([day[:10] for day in dates], dtype='datetime64[D]'), np.array(closes, dtype=float)
+
+def get_benchmark_returns(dates, index_code=None, fetch_missing=True):
+    """
+    포트폴리오 이력 날짜에 맞춘 벤치마크 누적 수익률
+
+    각 날짜에는 그날 또는 직전 거래일 종가를 사용하고, 첫 날짜 종가 대비 수익률(%)로 변환합니다.
+    첫 날짜 이전 종가가 없으면 종가가 처음 있는 날짜를 기준으로 삼고 그 전 날짜는 None입니다.
+
+    Args:
+        dates (list): 날짜 문자열 목록 ('YYYY-MM-DD', 오름차순)
+        index_code (str, optional): 지수 코드 (없으면 코스피)
+        fetch_missing (bool, optional): 저장되지 않은 기간을 프로바이더에서 받아 올지 여부
+
+    Returns:
+        list: 날짜별 누적 수익률 (%) 또는 None
+    """
+    index_code = index_code or BENCHMARK_SETTINGS["default_index"]
+    if not dates:
+        return []
+
+    try:
+        targets = np.array([str(day)[:10] for day in dates], dtype='datetime64[D]')
+        # 첫 날짜가 휴장일이어도 직전 종가를 쓸 수 있도록 일주일 앞부터 조회
+        start_date = (targets.min() - np.timedelta64(7, 'D')).astype(object)
+        end_date = targets.max().astype(object)
+
+        if fetch_missing:
+            from services.market_service import get_index_history
+            get_index_history(index_code, start_date, end_date)
+
+        close_dates, closes = _stored_closes(index_code, start_date, end_date)
+        if len(closes) == 0:
+            return [None] * len(dates)
+
+        # 날짜별 직전(당일 포함) 종가 위치
+        positions = np.searchsorted(close_dates, targets, side='right') - 1
+        available = positions >= 0
+        aligned = np.where(available, closes[np.maximum(positions, 0)], np.nan)
+
+        base = aligned[np.argmax(available)]
+        returns = (aligned / base - 1) * 100
+        return [float(value) if np.isfinite(value) else None for value in returns]
+    except Exception as e:
+        log_exception(logger, e, {"context": "벤치마크 수익률 조회", "index": index_code})
+        return [None] * len(dates)
+
+def update_benchmark_history(end_date=None):
+    """
+    벤치마크 지수 종가 이력 갱신 (야간 작업, 저장되지 않은 기간만 조회)
+
+    Args:
+        end_date (date, optional): 기준일 (없으면 오늘)
+
+    Returns:
+        int: 갱신한 지수 수
+    """
+    from services.market_service import get_index_history
+
+    end_date = end_date or datetime.now().date()
+    start_date = end_date - timedelta(days=BENCHMARK_SETTINGS["history_days"])
+
+    updated = 0
+    for index_code in BENCHMARK_SETTINGS["indices"]:
+        if get_index_history(index_code, start_date, end_date):
+            updated += 1
+
+    logger.info(f"벤치마크 지수 이력 갱신 완료: {updated}/{len(BENCHMARK_SETTINGS['indices'])}개 지수")
+    return updated
@@ -0,0 +1,327 @@
+"""
+신규 포지션 부가정보 작업 큐 서비스
+
+매수 시 포지션은 바로 저장하고 enrichment_queue에 작업만 넣어 두면, 워커가 섹터/산업군/베타,
+해외 종목 평단가의 달러 환산, 첫 시세를 비동기로 채웁니다. 조회는 프로바이더(pykrx, yfinance, 환율)별로
+묶어 종목당 한 번씩만 하고, 실패한 작업은 지수 백오프로 다시 시도합니다.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 부가정보 작업 설정
+ENRICHMENT_SETTINGS = {
+    "batch_size": 100,              # 한 번에 처리하는 작업 수
+    "max_attempts": 5,              # 이 횟수만큼 실패하면 failed로 남김
+    "retry_base_seconds": 60,       # 첫 재시도 대기 (실패할 때마다 2배)
+    "retry_max_seconds": 6 * 3600,  # 재시도 대기 상한
+    "provider_failure_limit": 3,    # 한 배치에서 프로바이더가 연속 실패하면 남은 종목은 다음 배치로 미룸
+    "job_interval": 60              # 스케줄 작업 실행 간격 (초)
+}
+
+# 작업 이름 (스케줄러 등록용)
+ENRICHMENT_JOB_NAME = "process_enrichment_queue"
+
+# 스케줄러 밖(리더가 아닌 인스턴스 등)에서 실행하는 워커 상호 배제
+_local_worker_lock = threading.Lock()
+
+def enqueue_enrichment(cursor, positions):
+    """
+    포지션 부가정보 작업 추가 (매수/가져오기와 같은 트랜잭션 안에서 호출, 커밋은 호출하는 쪽에서 처리)
+
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        positions (list): (포트폴리오 종목 ID, 사용자 ID, 종목코드, 국가) 목록
+    """
+    now = datetime.now()
+    cursor.executemany(
+        """
+        INSERT INTO enrichment_queue (portfolio_id, user_id, 종목코드, 국가, status, attempts, next_attempt_at, updated_at)
+        VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)
+        ON CONFLICT (portfolio_id) DO UPDATE SET
+            status = 'pending', attempts = 0, next_attempt_at = excluded.next_attempt_at,
+            last_error = NULL, updated_at = excluded.updated_at
+        """,
+        [(portfolio_id, user_id, ticker, country, now, now) for portfolio_id, user_id, ticker, country in positions]
+    )
+
+def request_enrichment():
+    """
+    대기 중인 부가정보 작업을 백그라운드에서 바로 처리하도록 요청 (기다리지 않음)
+
+    리더 인스턴스에 작업이 등록되어 있으면 스케줄러 스레드 풀에서 실행하고(이미 실행 중이면 건너뜀),
+    작업이 등록 전이거나 리더가 아닌 인스턴스(스케줄 작업이 실행되지 않음)이면 별도 스레드에서 실행합니다.
+    """
+    try:
+        from services.scheduler_service import get_scheduler
+
+        scheduler = get_scheduler()
+        if scheduler.is_leader:
+            scheduler.run_now(ENRICHMENT_JOB_NAME)
+            return
+    except KeyError:
+        pass
+    except Exception as e:
+        log_exception(logger, e, {"context": "부가정보 작업 요청"})
+        return
+
+    threading.Thread(target=_process_enrichment_locally, name="enrichment", daemon=True).start()
+
+def _process_enrichment_locally():
+    """스케줄러 밖에서 작업 큐 처리 (이 인스턴스에서 한 번에 하나만 실행, 실행 중이면 건너뜀)"""
+    if not _local_worker_lock.acquire(blocking=False):
+        return
+    try:
+        process_enrichment_queue()
+    finally:
+        _local_worker_lock.release()
+
+def _retry_delay(attempts):
+    """재시도 대기 시간 (지수 백오프)"""
+    seconds = ENRICHMENT_SETTINGS["retry_base_seconds"] * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, ENRICHMENT_SETTINGS["retry_max_seconds"]))
+
+def _lookup_by_provider(keys, fetch):
+    """
+    프로바이더 하나로 종목별 조회 (연속 실패가 한도에 이르면 남은 종목은 조회하지 않고 미룸)
+
+    Args:
+        keys (list): 조회할 키 목록
+        fetch (callable): 키를 받아 결과(dict 또는 값)를 돌려주는 함수 (실패 시 None)
+
+    Returns:
+        tuple: (성공 결과 dict, 실패한 키 set, 미룬 키 set)
+    """
+    results, failed, deferred = {}, set(), set()
+    consecutive_failures = 0
+
+    for key in keys:
+        if consecutive_failures >= ENRICHMENT_SETTINGS["provider_failure_limit"]:
+            deferred.add(key)
+            continue
+
+        try:
+            value = fetch(key)
+        except Exception as e:
+            log_exception(logger, e, {"context": "부가정보 조회", "key": key})
+            value = None
+
+        if value:
+            results[key] = value
+            consecutive_failures = 0
+        else:
+            failed.add(key)
+            consecutive_failures += 1
+
+    return results, failed, deferred
+
+def _stored_betas(symbols):
+    """야간 회귀로 저장된 종목 베타 조회 ({(종목코드, 국가): 베타})"""
+    if not symbols:
+        return {}
+
+    conn = get_db_connection('market')
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT symbol, country, beta FROM stock_betas
+        WHERE (symbol, country) IN (VALUES {', '.join(['(?, ?)'] * len(symbols))}) AND beta IS NOT NULL
+        """,
+        [value for symbol in symbols for value in symbol]
+    )
+    betas = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+    conn.close()
+
+    return betas
+
+def process_enrichment_queue(batch_size=None):
+    """
+    대기 중인 부가정보 작업 처리
+
+    처리 시각이 된 작업을 한 번에 읽어 종목별로 묶은 뒤, 국내 종목은 pykrx, 해외 종목은 yfinance로
+    종목당 한 번씩 정보를 조회하고 환율은 배치당 한 번만 조회합니다. 비어 있는 섹터/산업군/베타와
+    평단가(달러)만 채우고, 시세가 아직 없는 종목은 그 종목만 시세를 조회해 재평가합니다.
+    실패한 작업은 재시도 시각을 늦추고, 최대 시도 횟수를 넘기면 failed로 남깁니다.
+
+    외부 조회(종목 정보, 환율, 시세)는 모두 쓰기 전에 끝내고, 결과 반영은 짧은 트랜잭션 하나로 처리해
+    조회가 느려도 같은 시간에 들어온 매수/매도가 포트폴리오 DB 잠금을 기다리지 않게 합니다.
+
+    Args:
+        batch_size (int, optional): 처리할 최대 작업 수
+
+    Returns:
+        dict: processed(완료), retried(재시도 예약), failed(포기) 작업 수
+    """
+    result = {"processed": 0, "retried": 0, "failed": 0}
+
+    try:
+        from services.market_service import get_krx_stock_info, get_international_stock_info, get_exchange_rate
+        from services.portfolio_service import (
+            _quote_symbol, store_held_symbol_price, revalue_position, update_position_weights
+        )
+
+        now = datetime.now()
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        # 처리할 작업 (포지션이 삭제된 작업은 p.id가 NULL)
+        cursor.execute(
+            """
+            SELECT q.portfolio_id, q.user_id, q.종목코드, q.국가, q.attempts, p.id,
+                   p.섹터 IS NULL OR p.산업군 IS NULL OR p.베타 IS NULL,
+                   p.국가 != '한국' AND p.평단가_달러 IS NULL AND p.평단가_원화 > 0,
+                   COALESCE(h.현재가_원화, 0) <= 0
+            FROM enrichment_queue AS q
+            LEFT JOIN portfolio AS p ON p.id = q.portfolio_id
+            LEFT JOIN held_symbols AS h ON h.종목코드 = q.종목코드 AND h.국가 = q.국가
+            WHERE q.status = 'pending' AND (q.next_attempt_at IS NULL OR q.next_attempt_at <= ?)
+            ORDER BY q.next_attempt_at
+            LIMIT ?
+            """,
+            (now, int(batch_size or ENRICHMENT_SETTINGS["batch_size"]))
+        )
+        tasks = cursor.fetchall()
+
+        if not tasks:
+            conn.close()
+            return result
+
+        # 포지션이 이미 삭제된 작업은 반영 단계에서 정리
+        gone = [(task[0],) for task in tasks if task[5] is None]
+        tasks = [task for task in tasks if task[5] is not None]
+
+        # 1) 외부 조회 (DB 쓰기 없음)
+        # 프로바이더별 조회 대상 (종목당 한 번)
+        info_symbols = list(dict.fromkeys((task[2], task[3]) for task in tasks if task[6]))
+        krx_tickers = [ticker for ticker, country in info_symbols if country == '한국']
+        foreign_symbols = [(ticker, country) for ticker, country in info_symbols if country != '한국']
+
+        krx_info, krx_failed, krx_deferred = _lookup_by_provider(krx_tickers, get_krx_stock_info)
+        foreign_info, foreign_failed, foreign_deferred = _lookup_by_provider(
+            foreign_symbols, lambda symbol: get_international_stock_info(*symbol)
+        )
+        stock_info = {(ticker, '한국'): info for ticker, info in krx_info.items()}
+        stock_info.update(foreign_info)
+        info_failed = {(ticker, '한국') for ticker in krx_failed} | foreign_failed
+        info_deferred = {(ticker, '한국') for ticker in krx_deferred} | foreign_deferred
+        betas = _stored_betas(info_symbols)
+
+        # 환율은 배치당 한 번 (평단가 환산과 해외 종목 시세 환산에 함께 사용)
+        price_symbols = list(dict.fromkeys((task[2], task[3]) for task in tasks if task[8]))
+        exchange_rate = None
+        if any(task[7] for task in tasks) or any(country != '한국' for _, country in price_symbols):
+            rates, _, _ = _lookup_by_provider([('USD', 'KRW')], lambda pair: get_exchange_rate(*pair))
+            exchange_rate = rates.get(('USD', 'KRW'))
+
+        # 시세가 아직 없는 종목은 그 종목만 조회 (실패하면 매수가로 평가된 값 유지)
+        quotes = {}
+        for ticker, country in price_symbols:
+            price, usd_price = _quote_symbol(ticker, country, exchange_rate)
+            if price:
+                quotes[(ticker, country)] = (price, usd_price)
+
+        # 2) 결과 반영 (짧은 트랜잭션 하나)
+        done, retry, failed, revalued_users = [], [], [], set()
+
+        cursor.executemany("DELETE FROM enrichment_queue WHERE portfolio_id = ?", gone)
+        for (ticker, country), (price, usd_price) in quotes.items():
+            store_held_symbol_price(cursor, ticker, country, price, usd_price)
+
+        for portfolio_id, user_id, ticker, country, attempts, _, needs_info, needs_fx, needs_price in tasks:
+            symbol = (ticker, country)
+            errors = []
+            deferred = False
+
+            if needs_info:
+                info = stock_info.get(symbol)
+                if info:
+                    cursor.execute(
+                        """
+                        UPDATE portfolio
+                        SET 섹터 = COALESCE(섹터, ?), 산업군 = COALESCE(산업군, ?), 베타 = COALESCE(베타, ?)
+                        WHERE id = ?
+                        """,
+                        (info.get('sector'), info.get('industry'), betas.get(symbol, info.get('beta')), portfolio_id)
+                    )
+                elif symbol in info_deferred:
+                    deferred = True
+                elif symbol in info_failed:
+                    errors.append("종목 정보 조회 실패")
+
+            if needs_fx:
+                if exchange_rate:
+                    cursor.execute(
+                        "UPDATE portfolio SET 평단가_달러 = 평단가_원화 / ? WHERE id = ? AND 평단가_달러 IS NULL",
+                        (exchange_rate, portfolio_id)
+                    )
+                else:
+                    errors.append("환율 조회 실패")
+
+            if symbol in quotes and revalue_position(cursor, user_id, portfolio_id, fetch_missing=False):
+                revalued_users.add(user_id)
+
+            if errors:
+                attempts += 1
+                if attempts >= ENRICHMENT_SETTINGS["max_attempts"]:
+                    failed.append(("failed", attempts, None, ", ".join(errors), now, portfolio_id))
+                else:
+                    retry.append(("pending", attempts, now + _retry_delay(attempts), ", ".join(errors), now, portfolio_id))
+            elif deferred:
+                # 프로바이더 장애로 조회하지 않은 작업은 시도 횟수를 늘리지 않고 미룸
+                retry.append(("pending", attempts, now + _retry_delay(1), "프로바이더 연속 실패로 보류", now, portfolio_id))
+            else:
+                done.append((portfolio_id,))
+
+        for user_id in revalued_users:
+            update_position_weights(cursor, user_id)
+
+        cursor.executemany("DELETE FROM enrichment_queue WHERE portfolio_id = ?", done)
+        cursor.executemany(
+            """
+            UPDATE enrichment_queue
+            SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+            WHERE portfolio_id = ?
+            """,
+            retry + failed
+        )
+
+        conn.commit()
+        conn.close()
+
+        result = {"processed": len(done), "retried": len(retry), "failed": len(failed)}
+        logger.info(f"부가정보 작업 처리: 완료 {len(done)}건, 재시도 {len(retry)}건, 실패 {len(failed)}건")
+        return result
+    except Exception as e:
+        log_exception(logger, e, {"context": "부가정보 작업 처리"})
+        return result
+
+def get_enrichment_status():
+    """
+    부가정보 작업 큐 현황
+
+    Returns:
+        dict: pending, failed 작업 수와 실패 작업 목록(최근 순)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM enrichment_queue GROUP BY status")
+        counts = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.execute(
+            """
+            SELECT portfolio_id, user_id, 종목코드, 국가, attempts, last_error, updated_at
+            FROM enrichment_queue WHERE status = 'failed'
+            ORDER BY updated_at DESC LIMIT 50
+            """
+        )
+        failed = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return {"pending": counts.get("pending", 0), "failed": counts.get("failed", 0), "failed_tasks": failed}
+    except Exception as e:
+        log_exception(logger, e, {"context": "부가정보 작업 현황 조회"})
+        return {"pending": 0, "failed": 0, "failed_tasks": []}
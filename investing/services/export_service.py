@@ -0,0 +1,359 @@
+"""
+포트폴리오/거래내역 스트리밍 내보내기 서비스
+
+커서에서 fetchmany로 일정 크기씩 읽어 CSV, JSON Lines, Parquet 파일에 바로 기록하므로
+거래내역이 수십만 건이어도 메모리 사용량이 청크 크기만큼으로 유지됩니다.
+날짜 구간과 컬럼을 골라 내보낼 수 있고, 진행률 콜백(gr.Progress 호환)으로 진행 상황을 알립니다.
+"""
+import os
+import csv
+import json
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    PYARROW_AVAILABLE = False
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 내보내기 설정
+EXPORT_SETTINGS = {
+    "chunk_size": 5000,                         # fetchmany 한 번에 읽는 행 수 (Parquet 행 그룹 크기)
+    "export_dir": os.path.join('data', 'exports'),
+    "formats": ("csv", "jsonl", "parquet")
+}
+
+# 데이터셋별 조회 쿼리와 날짜 필터 컬럼 (날짜 컬럼이 없으면 날짜 필터를 적용하지 않음)
+EXPORT_DATASETS = {
+    "portfolio": {
+        "query": "SELECT * FROM portfolio WHERE user_id = ?",
+        "tables": ("portfolio",),
+        "date_column": None,
+        "order_by": "투자비중 DESC, id"
+    },
+    "transactions": {
+        "query": """
+            SELECT t.*, p.종목코드, p.종목명
+            FROM transactions t
+            LEFT JOIN portfolio p ON t.portfolio_id = p.id
+            WHERE t.user_id = ?
+        """,
+        "tables": ("transactions", "portfolio"),
+        "date_column": "t.transaction_date",
+        "order_by": "t.id"
+    },
+    "dividends": {
+        "query": """
+            SELECT d.*, p.종목코드, p.종목명
+            FROM dividends d
+            LEFT JOIN portfolio p ON d.portfolio_id = p.id
+            WHERE d.user_id = ?
+        """,
+        "tables": ("dividends", "portfolio"),
+        "date_column": "d.지급일",
+        "order_by": "d.id"
+    },
+    "history": {
+        "query": "SELECT * FROM portfolio_history WHERE user_id = ?",
+        "tables": ("portfolio_history",),
+        "date_column": "date",
+        "order_by": "date, id"
+    }
+}
+
+def _build_query(dataset, user_id, start_date=None, end_date=None):
+    """데이터셋 조회 쿼리와 파라미터 생성 (날짜 구간 필터 포함)"""
+    spec = EXPORT_DATASETS[dataset]
+    query = spec["query"].strip()
+    params = [user_id]
+
+    date_column = spec["date_column"]
+    if date_column and start_date:
+        query += f" AND date({date_column}) >= date(?)"
+        params.append(str(start_date))
+    if date_column and end_date:
+        query += f" AND date({date_column}) <= date(?)"
+        params.append(str(end_date))
+
+    return query, params, spec["order_by"]
+
+def _declared_types(cursor, tables):
+    """테이블 선언 타입 조회 {컬럼: 타입} (같은 이름은 앞 테이블 우선)"""
+    declared = {}
+    for table in tables:
+        cursor.execute(f"PRAGMA table_info({table})")
+        for row in cursor.fetchall():
+            declared.setdefault(row[1], (row[2] or "").upper())
+    return declared
+
+def _select_columns(description, columns=None):
+    """커서 컬럼 중 내보낼 컬럼 이름과 위치 (요청 순서 유지, 없는 컬럼은 무시)"""
+    names = [item[0] for item in description]
+    if not columns:
+        return names, list(range(len(names)))
+
+    # 조인으로 같은 이름이 두 번 나오면 먼저 나온 컬럼을 사용
+    positions = {}
+    for index, name in enumerate(names):
+        positions.setdefault(name, index)
+
+    selected = [name for name in columns if name in positions]
+    missing = [name for name in columns if name not in positions]
+    if missing:
+        logger.warning(f"내보내기 대상에 없는 컬럼 제외: {', '.join(missing)}")
+    return selected, [positions[name] for name in selected]
+
+def _unique_names(names):
+    """조인으로 중복된 컬럼 이름에 번호를 붙여 구분 (JSON/Parquet 키 충돌 방지)"""
+    seen = {}
+    unique = []
+    for name in names:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        unique.append(name if count == 0 else f"{name}_{count + 1}")
+    return unique
+
+class _CsvWriter:
+    """CSV 청크 기록기"""
+    def __init__(self, path, names):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(names)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class _JsonLinesWriter:
+    """JSON Lines 청크 기록기 (한 행당 JSON 객체 한 줄)"""
+    def __init__(self, path, names):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.names = names
+
+    def write(self, rows):
+        self.file.writelines(
+            json.dumps(dict(zip(self.names, row)), ensure_ascii=False, default=str) + "\n"
+            for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+class _ParquetWriter:
+    """
+    Parquet 청크 기록기 (청크마다 행 그룹 하나)
+
+    SQLite는 컬럼 타입이 고정되어 있지 않으므로 첫 청크 값으로 스키마를 정하고,
+    이후 청크 값은 그 타입으로 변환합니다. 첫 청크에서 값이 모두 NULL인 컬럼은
+    테이블 선언 타입(REAL, INTEGER)을 따르고, 그 외에는 문자열로 둡니다.
+    """
+    _converters = {
+        "int64": int,
+        "float64": float,
+        "binary": bytes,
+        "string": str
+    }
+
+    def __init__(self, path, names, declared=None):
+        self.path = path
+        self.names = names
+        self.declared = declared or {}
+        self.writer = None
+        self.types = None
+
+    def _infer_types(self, rows):
+        types = []
+        for index, name in enumerate(self.names):
+            values = [row[index] for row in rows if row[index] is not None]
+            if not values:
+                declared = self.declared.get(name, "")
+                types.append("float64" if "REAL" in declared else "int64" if "INT" in declared else "string")
+            elif all(isinstance(value, int) for value in values):
+                types.append("int64")
+            elif all(isinstance(value, (int, float)) for value in values):
+                types.append("float64")
+            elif all(isinstance(value, bytes) for value in values):
+                types.append("binary")
+            else:
+                types.append("string")
+        return types
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.writer is None:
+            self.types = self._infer_types(rows)
+            schema = pa.schema([(name, getattr(pa, dtype)()) for name, dtype in zip(self.names, self.types)])
+            self.writer = pq.ParquetWriter(self.path, schema)
+
+        arrays = []
+        for index, dtype in enumerate(self.types):
+            convert = self._converters[dtype]
+            values = [None if row[index] is None else convert(row[index]) for row in rows]
+            arrays.append(pa.array(values, type=getattr(pa, dtype)()))
+        self.writer.write_table(pa.Table.from_arrays(arrays, names=self.names))
+
+    def close(self):
+        if self.writer is None:
+            # 행이 없으면 컬럼만 있는 빈 파일 생성
+            schema = pa.schema([(name, pa.string()) for name in self.names])
+            self.writer = pq.ParquetWriter(self.path, schema)
+        self.writer.close()
+
+_WRITERS = {
+    "csv": _CsvWriter,
+    "jsonl": _JsonLinesWriter,
+    "parquet": _ParquetWriter
+}
+
+def export_dataset(user_id, dataset, fmt="csv", path=None, start_date=None, end_date=None,
+                   columns=None, chunk_size=None, progress=None):
+    """
+    데이터셋 하나를 청크 단위로 파일에 내보내기
+
+    Args:
+        user_id (int): 사용자 ID
+        dataset (str): 'portfolio', 'transactions', 'dividends', 'history'
+        fmt (str, optional): 'csv', 'jsonl', 'parquet'
+        path (str, optional): 저장 경로 (없으면 내보내기 디렉토리에 자동 생성)
+        start_date (str, optional): 시작일 (YYYY-MM-DD, 날짜 컬럼이 있는 데이터셋만)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+        columns (list, optional): 내보낼 컬럼 이름 목록 (없으면 전체)
+        chunk_size (int, optional): 한 번에 읽는 행 수
+        progress (callable, optional): 진행률 콜백 progress(비율, desc=메시지)
+
+    Returns:
+        dict: 결과 (path, rows, format, dataset) 또는 error
+    """
+    fmt = (fmt or "csv").lower()
+    result = {"dataset": dataset, "format": fmt, "path": None, "rows": 0}
+
+    if dataset not in EXPORT_DATASETS:
+        result["error"] = f"지원하지 않는 데이터셋입니다: {dataset}"
+        return result
+    if fmt not in EXPORT_SETTINGS["formats"]:
+        result["error"] = f"지원하지 않는 형식입니다: {fmt}"
+        return result
+    if fmt == "parquet" and not PYARROW_AVAILABLE:
+        result["error"] = "Parquet 내보내기에는 pyarrow 패키지가 필요합니다."
+        return result
+
+    chunk_size = chunk_size or EXPORT_SETTINGS["chunk_size"]
+    if path is None:
+        os.makedirs(EXPORT_SETTINGS["export_dir"], exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(EXPORT_SETTINGS["export_dir"], f"{dataset}_{user_id}_{timestamp}.{fmt}")
+
+    # 중간에 실패해도 불완전한 파일이 남지 않도록 임시 파일에 쓴 뒤 이름 변경
+    temp_path = path + ".part"
+    conn = None
+    writer = None
+
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        query, params, order_by = _build_query(dataset, user_id, start_date, end_date)
+
+        total = 0
+        if progress:
+            cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+            total = cursor.fetchone()[0]
+            progress(0, desc=f"{dataset} 내보내기 (0/{total:,})")
+
+        cursor.execute(f"{query} ORDER BY {order_by}", params)
+        names, positions = _select_columns(cursor.description, columns)
+        if fmt == "parquet":
+            writer = _ParquetWriter(temp_path, _unique_names(names),
+                                    _declared_types(conn.cursor(), EXPORT_DATASETS[dataset]["tables"]))
+        else:
+            writer = _WRITERS[fmt](temp_path, _unique_names(names))
+        project_all = positions == list(range(len(cursor.description)))
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if project_all:
+                rows = [tuple(row) for row in rows]
+            else:
+                rows = [tuple(row[index] for index in positions) for row in rows]
+            writer.write(rows)
+            result["rows"] += len(rows)
+
+            if progress:
+                progress(result["rows"] / total if total else 1,
+                         desc=f"{dataset} 내보내기 ({result['rows']:,}/{total:,})")
+
+        writer.close()
+        writer = None
+        os.replace(temp_path, path)
+        result["path"] = path
+
+        logger.info(f"{dataset} 내보내기 완료: {result['rows']:,}행 -> {path}")
+        return result
+    except Exception as e:
+        log_exception(logger, e, {"context": "데이터 스트리밍 내보내기", "user_id": user_id, "dataset": dataset})
+        result["error"] = str(e)
+        return result
+    finally:
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        if conn is not None:
+            conn.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def export_user_data(user_id, datasets=("portfolio",), fmt="csv", start_date=None, end_date=None,
+                     columns=None, chunk_size=None, progress=None):
+    """
+    여러 데이터셋을 같은 형식으로 차례로 내보내기
+
+    Args:
+        user_id (int): 사용자 ID
+        datasets (tuple, optional): 내보낼 데이터셋 목록
+        fmt (str, optional): 'csv', 'jsonl', 'parquet'
+        start_date (str, optional): 시작일 (YYYY-MM-DD)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+        columns (dict, optional): 데이터셋별 내보낼 컬럼 목록 {데이터셋: [컬럼, ...]}
+        chunk_size (int, optional): 한 번에 읽는 행 수
+        progress (callable, optional): 진행률 콜백 progress(비율, desc=메시지)
+
+    Returns:
+        list: 데이터셋별 결과 목록
+    """
+    fmt = (fmt or "csv").lower()
+    columns = columns or {}
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results = []
+
+    for position, dataset in enumerate(datasets):
+        dataset_progress = None
+        if progress:
+            # 전체 진행률을 데이터셋 수로 나누어 표시
+            def dataset_progress(fraction, desc=None, _position=position):
+                progress((_position + fraction) / len(datasets), desc=desc)
+
+        path = None
+        if dataset in EXPORT_DATASETS:
+            os.makedirs(EXPORT_SETTINGS["export_dir"], exist_ok=True)
+            path = os.path.join(EXPORT_SETTINGS["export_dir"], f"{dataset}_{user_id}_{timestamp}.{fmt}")
+
+        results.append(export_dataset(
+            user_id, dataset, fmt=fmt, path=path, start_date=start_date, end_date=end_date,
+            columns=columns.get(dataset), chunk_size=chunk_size, progress=dataset_progress
+        ))
+
+    return results
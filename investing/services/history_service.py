@@ -0,0 +1,417 @@
+"""
+포트폴리오 과거 평가액 재구성 서비스
+
+거래내역을 일별 보유 수량 행렬(날짜 x 종목)로 펼치고, 저장된 일별 종가/환율로 만든 가격 행렬(날짜 x 종목)과 곱해
+사용자별 일별 평가액, 투자원금, 손익을 계산합니다. 야간 작업이 실행되기 이전 기간의 portfolio_history를
+전체 사용자에 대해 한 번에 채울 수 있습니다.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 재구성 설정
+HISTORY_SETTINGS = {
+    "default_lookback_days": 365,      # 시작일을 지정하지 않았을 때 조회 기간
+    "max_cells_per_batch": 5_000_000   # 날짜 x 종목 행렬 최대 크기 (사용자 묶음 단위로 나누어 계산)
+}
+
+def _to_date(value, default):
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+def _guess_country(ticker):
+    # 전량 매도로 포트폴리오 행이 없는 종목은 종목코드 형식으로 국가 추정 (6자리 숫자: 국내)
+    return '한국' if ticker and len(ticker) == 6 and ticker.isdigit() else '미국'
+
+def _load_transactions(cursor, user_ids):
+    """
+    사용자들의 매수/매도 거래와 종목 정보 조회 (거래일 순)
+
+    Returns:
+        pandas.DataFrame: portfolio_id, user_id, type, quantity, price, costs, date, ticker, country
+    """
+    placeholders = ", ".join("?" * len(user_ids))
+
+    # 전량 매도된 종목은 로트 장부(ledger_positions)에 남아 있는 종목코드 사용
+    cursor.execute(f"""
+        SELECT t.portfolio_id, t.user_id, t.type, COALESCE(t.quantity, 0), COALESCE(t.price, 0),
+               COALESCE(t.수수료, 0) + COALESCE(t.세금, 0), t.transaction_date,
+               COALESCE(p.종목코드, l.종목코드), p.국가
+        FROM transactions t
+        LEFT JOIN portfolio p ON p.id = t.portfolio_id
+        LEFT JOIN ledger_positions l ON l.portfolio_id = t.portfolio_id
+        WHERE t.user_id IN ({placeholders}) AND t.portfolio_id IS NOT NULL AND t.type IN ('매수', '매도')
+        ORDER BY t.transaction_date, t.id
+    """, list(user_ids))
+
+    transactions = pd.DataFrame(
+        [tuple(row) for row in cursor.fetchall()],
+        columns=['portfolio_id', 'user_id', 'type', 'quantity', 'price', 'costs', 'date', 'ticker', 'country']
+    )
+    transactions = transactions.dropna(subset=['ticker'])
+    transactions['date'] = pd.to_datetime(transactions['date'], format='mixed').dt.normalize()
+    transactions['country'] = [
+        country if country else _guess_country(ticker)
+        for ticker, country in zip(transactions['ticker'], transactions['country'])
+    ]
+
+    return transactions
+
+def _cost_flows(transactions):
+    """
+    거래별 투자원금 변화와 실현손익 계산 (종목별 평균원가 기준)
+
+    Returns:
+        tuple: (투자원금 변화 배열, 실현손익 배열, 수량 변화 배열)
+    """
+    invested_delta = np.zeros(len(transactions))
+    realized = np.zeros(len(transactions))
+    quantity_delta = np.zeros(len(transactions))
+
+    holdings = {}  # portfolio_id -> [수량, 원가]
+    for i, (portfolio_id, transaction_type, quantity, price, costs) in enumerate(zip(
+        transactions['portfolio_id'], transactions['type'], transactions['quantity'],
+        transactions['price'], transactions['costs']
+    )):
+        held = holdings.setdefault(portfolio_id, [0.0, 0.0])
+
+        if transaction_type == '매수':
+            amount = quantity * price + costs
+            held[0] += quantity
+            held[1] += amount
+            quantity_delta[i] = quantity
+            invested_delta[i] = amount
+        else:
+            sold = min(quantity, held[0])
+            cost = held[1] * sold / held[0] if held[0] > 0 else 0.0
+            held[0] -= sold
+            held[1] -= cost
+            quantity_delta[i] = -sold
+            invested_delta[i] = -cost
+            realized[i] = sold * price - costs * (sold / quantity if quantity else 0) - cost
+
+    return invested_delta, realized, quantity_delta
+
+def _price_matrix(symbols, dates, transactions, fetch_missing=True):
+    """
+    날짜 x 종목 원화 가격 행렬 생성
+
+    저장된 종가를 날짜축으로 채우고(휴장일은 직전 종가), 해외 종목은 같은 날의 USD/KRW 환율을 곱합니다.
+    종가 이력이 없는 종목은 거래 가격으로 대신합니다.
+
+    Args:
+        symbols (list): (종목코드, 국가) 목록
+        dates (pandas.DatetimeIndex): 일별 날짜
+        transactions (pandas.DataFrame): 거래내역 (대체 가격용)
+        fetch_missing (bool): 저장되지 않은 기간을 프로바이더에서 조회할지 여부
+
+    Returns:
+        numpy.ndarray: (날짜 수, 종목 수) 원화 가격
+    """
+    from services.market_service import get_price_history, get_fx_history
+
+    start_date, end_date = dates[0].date(), dates[-1].date()
+
+    # 시작일 이전 종가도 앞으로 채울 수 있도록 여유 기간 포함
+    lookup_start = start_date - timedelta(days=10)
+
+    if fetch_missing:
+        load_prices = lambda ticker, country: get_price_history(ticker, country, lookup_start, end_date)
+        load_fx = lambda: get_fx_history('USD', 'KRW', lookup_start, end_date)
+    else:
+        load_prices = lambda ticker, country: _stored_prices(ticker, country, lookup_start, end_date)
+        load_fx = lambda: _stored_fx('USD', 'KRW', lookup_start, end_date)
+
+    full_index = pd.date_range(lookup_start, end_date, freq='D')
+    fx = None
+    if any(country != '한국' for _, country in symbols):
+        fx_history = load_fx()
+        if fx_history:
+            fx_series = pd.Series(fx_history, dtype=float)
+            fx_series.index = pd.to_datetime(fx_series.index)
+            fx = fx_series.reindex(full_index).ffill().bfill().reindex(dates).to_numpy()
+
+    matrix = np.full((len(dates), len(symbols)), np.nan)
+    trade_prices = transactions.groupby(['ticker', 'country', 'date'])['price'].last()
+
+    for column, (ticker, country) in enumerate(symbols):
+        history = load_prices(ticker, country)
+
+        if history:
+            series = pd.Series(history, dtype=float)
+            series.index = pd.to_datetime(series.index)
+            values = series.reindex(full_index).ffill().bfill().reindex(dates).to_numpy()
+
+            if country != '한국':
+                if fx is None:
+                    # 환율 이력이 없으면 해외 종목은 거래 가격(원화)으로 대체
+                    values = np.full(len(dates), np.nan)
+                else:
+                    values = values * fx
+            matrix[:, column] = values
+
+        if np.isnan(matrix[:, column]).all():
+            # 종가 이력이 없으면 거래 가격(원화)을 다음 거래 전까지 유지
+            try:
+                trades = trade_prices.loc[(ticker, country)]
+            except KeyError:
+                continue
+            matrix[:, column] = trades.reindex(dates.union(trades.index)).ffill().bfill().reindex(dates).to_numpy()
+
+    return matrix
+
+def _stored_prices(ticker, country, start_date, end_date):
+    conn = get_db_connection('market')
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT date, close FROM daily_prices WHERE symbol = ? AND market = ? AND date BETWEEN ? AND ?",
+        (ticker, 'KRX' if country == '한국' else f"YF_{country}", str(start_date), str(end_date))
+    )
+    history = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    return history
+
+def _stored_fx(from_currency, to_currency, start_date, end_date):
+    conn = get_db_connection('market')
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT date, rate FROM fx_history WHERE from_currency = ? AND to_currency = ? AND date BETWEEN ? AND ?",
+        (from_currency, to_currency, str(start_date), str(end_date))
+    )
+    history = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    return history
+
+def _reconstruct(transactions, user_ids, dates, fetch_missing=True):
+    """
+    사용자 묶음의 일별 평가액/투자원금/실현손익 계산
+
+    Returns:
+        pandas.DataFrame: user_id, date, total_value, total_invested, total_gain_loss, realized_profit
+    """
+    columns = ['user_id', 'date', 'total_value', 'total_invested', 'total_gain_loss', 'realized_profit']
+    if transactions.empty:
+        return pd.DataFrame(columns=columns)
+
+    day_count = len(dates)
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    invested_delta, realized, quantity_delta = _cost_flows(transactions)
+
+    # 거래일 위치 (시작일 이전 거래는 첫날에 반영, 종료일 이후 거래는 제외)
+    day_positions = np.clip(dates.searchsorted(transactions['date'].to_numpy()), 0, day_count)
+    in_range = day_positions < day_count
+    users = transactions['user_id'].map(user_index).to_numpy()
+
+    # 사용자별 투자원금/실현손익: 날짜 x 사용자 변화량의 누적합
+    flat = day_positions[in_range] * len(user_ids) + users[in_range]
+    invested = np.bincount(flat, invested_delta[in_range], minlength=day_count * len(user_ids))
+    invested = invested.reshape(day_count, len(user_ids)).cumsum(axis=0)
+    realized_total = np.bincount(flat, realized[in_range], minlength=day_count * len(user_ids))
+    realized_total = realized_total.reshape(day_count, len(user_ids)).cumsum(axis=0)
+
+    # 보유 수량 행렬 (날짜 x 포지션), 포지션은 사용자 순으로 정렬
+    positions = (
+        transactions[['portfolio_id', 'user_id', 'ticker', 'country']]
+        .drop_duplicates('portfolio_id')
+        .assign(user_order=lambda df: df['user_id'].map(user_index))
+        .sort_values(['user_order', 'portfolio_id'])
+        .reset_index(drop=True)
+    )
+    position_index = pd.Series(positions.index, index=positions['portfolio_id'])
+
+    holdings = np.zeros((day_count, len(positions)))
+    np.add.at(
+        holdings,
+        (day_positions[in_range], position_index.loc[transactions['portfolio_id'][in_range]].to_numpy()),
+        quantity_delta[in_range]
+    )
+    holdings = holdings.cumsum(axis=0)
+
+    # 가격 행렬 (날짜 x 종목) → 포지션 순서로 펼침
+    symbols = list(dict.fromkeys(zip(positions['ticker'], positions['country'])))
+    symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+    prices = _price_matrix(symbols, dates, transactions, fetch_missing)
+    position_prices = prices[:, [symbol_index[symbol] for symbol in zip(positions['ticker'], positions['country'])]]
+
+    position_values = np.nan_to_num(holdings * position_prices)
+
+    # 사용자별 합계 (포지션이 사용자 순으로 정렬되어 있으므로 구간 합)
+    values = np.zeros((day_count, len(user_ids)))
+    user_orders = positions['user_order'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, user_orders[1:] != user_orders[:-1]])
+    values[:, user_orders[starts]] = np.add.reduceat(position_values, starts, axis=1)
+
+    result = pd.DataFrame({
+        'user_id': np.tile(np.asarray(user_ids), day_count),
+        'date': np.repeat(dates.to_numpy(), len(user_ids)),
+        'total_value': values.ravel(),
+        'total_invested': invested.ravel(),
+        'realized_profit': realized_total.ravel()
+    })
+    result['total_gain_loss'] = result['total_value'] - result['total_invested']
+
+    # 사용자별 첫 거래일 이전 날짜는 제외
+    first_day = np.full(len(user_ids), day_count)
+    np.minimum.at(first_day, users[in_range], day_positions[in_range])
+    result = result[np.repeat(np.arange(day_count), len(user_ids)) >= np.tile(first_day, day_count)]
+
+    return result[columns].reset_index(drop=True)
+
+def _user_batches(cursor, user_ids, day_count):
+    """
+    날짜 x 포지션 행렬이 설정 크기를 넘지 않도록 사용자를 묶음으로 나눔
+    """
+    placeholders = ", ".join("?" * len(user_ids))
+    cursor.execute(f"""
+        SELECT user_id, COUNT(DISTINCT portfolio_id) FROM transactions
+        WHERE user_id IN ({placeholders}) AND portfolio_id IS NOT NULL
+        GROUP BY user_id
+    """, list(user_ids))
+    position_counts = dict(cursor.fetchall())
+
+    max_positions = max(HISTORY_SETTINGS["max_cells_per_batch"] // max(day_count, 1), 1)
+    batch, batch_positions = [], 0
+    for user_id in user_ids:
+        count = position_counts.get(user_id, 0)
+        if batch and batch_positions + count > max_positions:
+            yield batch
+            batch, batch_positions = [], 0
+        batch.append(user_id)
+        batch_positions += count
+    if batch:
+        yield batch
+
+def reconstruct_portfolio_values(user_id, start_date=None, end_date=None, fetch_missing=True):
+    """
+    거래내역과 종가/환율 이력으로 사용자의 일별 포트폴리오 가치 재구성
+
+    Args:
+        user_id (int): 사용자 ID
+        start_date (date or str, optional): 시작일 (없으면 1년 전)
+        end_date (date or str, optional): 종료일 (없으면 오늘)
+        fetch_missing (bool, optional): 저장되지 않은 종가/환율을 프로바이더에서 조회할지 여부
+
+    Returns:
+        pandas.DataFrame: date, total_value, total_invested, total_gain_loss, realized_profit
+    """
+    try:
+        today = datetime.now().date()
+        end_date = _to_date(end_date, today)
+        start_date = _to_date(start_date, end_date - timedelta(days=HISTORY_SETTINGS["default_lookback_days"]))
+        dates = pd.date_range(start_date, end_date, freq='D')
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        transactions = _load_transactions(cursor, [user_id])
+        conn.close()
+
+        result = _reconstruct(transactions, [user_id], dates, fetch_missing)
+        return result.drop(columns=['user_id'])
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 가치 재구성", "user_id": user_id})
+        return pd.DataFrame(columns=['date', 'total_value', 'total_invested', 'total_gain_loss', 'realized_profit'])
+
+def backfill_portfolio_history(user_id=None, start_date=None, end_date=None, overwrite=False, fetch_missing=True):
+    """
+    재구성한 일별 가치로 portfolio_history 일괄 채우기
+
+    기본적으로 이력이 없는 날짜만 추가하며, overwrite가 True이면 기간 내 기존 이력을 재구성 값으로 교체합니다.
+    완료 후 시간가중수익률/XIRR을 다시 계산합니다.
+
+    Args:
+        user_id (int, optional): 사용자 ID (없으면 거래내역이 있는 모든 사용자)
+        start_date (date or str, optional): 시작일 (없으면 1년 전)
+        end_date (date or str, optional): 종료일 (없으면 어제, 오늘 이력은 야간 작업이 기록)
+        overwrite (bool, optional): 기존 이력 교체 여부
+        fetch_missing (bool, optional): 저장되지 않은 종가/환율을 프로바이더에서 조회할지 여부
+
+    Returns:
+        int: 추가된 이력 행 수
+    """
+    try:
+        today = datetime.now().date()
+        end_date = _to_date(end_date, today - timedelta(days=1))
+        start_date = _to_date(start_date, end_date - timedelta(days=HISTORY_SETTINGS["default_lookback_days"]))
+        dates = pd.date_range(start_date, end_date, freq='D')
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        if user_id is None:
+            cursor.execute("SELECT DISTINCT user_id FROM transactions WHERE user_id IS NOT NULL AND portfolio_id IS NOT NULL")
+            user_ids = sorted(row[0] for row in cursor.fetchall())
+        else:
+            user_ids = [user_id]
+
+        inserted = 0
+        for batch in _user_batches(cursor, user_ids, len(dates)) if user_ids else []:
+            result = _reconstruct(_load_transactions(cursor, batch), batch, dates, fetch_missing)
+            if result.empty:
+                continue
+
+            placeholders = ", ".join("?" * len(batch))
+            range_params = list(batch) + [str(start_date), str(end_date)]
+
+            if overwrite:
+                cursor.execute(f"""
+                    DELETE FROM portfolio_history
+                    WHERE user_id IN ({placeholders}) AND date(date) BETWEEN ? AND ?
+                """, range_params)
+            else:
+                # 이미 기록된 날짜는 유지
+                cursor.execute(f"""
+                    SELECT user_id, date(date) FROM portfolio_history
+                    WHERE user_id IN ({placeholders}) AND date(date) BETWEEN ? AND ?
+                """, range_params)
+                existing = {(row[0], row[1]) for row in cursor.fetchall()}
+                if existing:
+                    keys = list(zip(result['user_id'], result['date'].dt.strftime('%Y-%m-%d')))
+                    result = result[[key not in existing for key in keys]]
+
+            invested = result['total_invested'].to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return_percent = np.where(invested > 0, result['total_gain_loss'].to_numpy() / invested * 100, 0.0)
+
+            cursor.executemany(
+                """
+                INSERT INTO portfolio_history (
+                    user_id, date, total_value, total_invested, total_gain_loss,
+                    total_return_percent, cash_balance, realized_profit, unrealized_profit
+                )
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+                """,
+                zip(
+                    result['user_id'].astype(int).tolist(), result['date'].dt.strftime('%Y-%m-%d').tolist(),
+                    result['total_value'].tolist(), result['total_invested'].tolist(),
+                    result['total_gain_loss'].tolist(), return_percent.tolist(),
+                    result['realized_profit'].tolist(), result['total_gain_loss'].tolist()
+                )
+            )
+            inserted += len(result)
+
+        conn.commit()
+        conn.close()
+
+        logger.info(f"포트폴리오 이력 재구성 완료: {len(user_ids)}명의 사용자, {inserted}개 이력 추가")
+
+        # 채워진 이력 기준으로 수익률 다시 계산
+        if inserted:
+            from services.returns_service import update_returns
+            update_returns(user_id)
+
+        return inserted
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 이력 재구성", "user_id": user_id})
+        return 0
@@ -0,0 +1,648 @@
+"""
+증권사 거래내역/잔고 일괄 가져오기 서비스
+
+증권사별 컬럼 매퍼로 CSV/XLSX 파일을 청크 단위로 읽어 표준 컬럼으로 바꾸고, pandas 벡터 연산으로
+검증한 뒤 포트폴리오와 거래내역을 하나의 트랜잭션 안에서 executemany로 저장합니다.
+로트 장부 반영과 보유 종목 유니버스 갱신도 같은 트랜잭션에서 처리하고, 시세 재평가는 마지막에 한 번만 실행합니다.
+"""
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import openpyxl  # noqa: F401 (pandas XLSX 읽기 엔진)
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+from models.database import get_db_connection
+from models.portfolio import get_user_symbols, sync_held_symbols
+from services.enrichment_service import enqueue_enrichment, request_enrichment
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 가져오기 설정
+IMPORT_SETTINGS = {
+    "chunk_size": 10000,                   # 한 번에 읽어 검증하는 행 수
+    "encodings": ("utf-8-sig", "cp949"),   # CSV 인코딩 후보 (국내 증권사 파일은 대부분 cp949)
+    "default_account": "기본",             # 파일과 인자 모두에 계좌가 없을 때 사용
+    "max_errors": 100,                     # 결과에 담는 행 오류 최대 개수
+    "quantity_epsilon": 1e-9
+}
+
+# 표준 컬럼
+STATEMENT_COLUMNS = ("거래일자", "종목코드", "종목명", "구분", "수량", "단가", "금액", "수수료", "세금",
+                     "국가", "통화", "증권사", "계좌")
+
+# 파일 종류별 필수 표준 컬럼 (단가 대신 금액만 있어도 됨)
+REQUIRED_COLUMNS = {
+    "trades": ("거래일자", "종목코드", "구분", "수량"),
+    "holdings": ("종목코드", "수량")
+}
+
+# 거래 구분 값 판별 패턴 (입출금, 배당 등 다른 구분은 건너뜀)
+TRADE_TYPE_PATTERNS = {
+    "매수": r"매수|buy",
+    "매도": r"매도|sell"
+}
+
+# 취소/정정 거래(예: 매수취소, 매도정정)는 원거래를 되돌리거나 고치는 행이므로 매수/매도로 보지 않고 건너뜀
+TRADE_TYPE_EXCLUDED_PATTERN = r"취소|정정|cancel|correct"
+
+# 증권사별 컬럼 매퍼 {매퍼 이름: {"kind": 파일 종류, "columns": {원본 컬럼: 표준 컬럼}, ...}}
+# 통화 컬럼이 없으면 "currency"(없으면 국내 종목 KRW, 해외 종목 USD)를 단가 통화로 봄
+BROKER_MAPPERS = {
+    "기본": {
+        # 포트폴리오 내보내기/이전 CSV 가져오기 형식 (보유 잔고, 원화 평단가)
+        "kind": "holdings",
+        "currency": "KRW",
+        "columns": {
+            "종목코드": "종목코드", "종목명": "종목명", "수량": "수량", "평단가_원화": "단가",
+            "국가": "국가", "증권사": "증권사", "계좌": "계좌"
+        }
+    },
+    "키움증권": {
+        "kind": "trades",
+        "columns": {
+            "거래일자": "거래일자", "종목번호": "종목코드", "종목명": "종목명", "거래종류": "구분",
+            "거래수량": "수량", "거래단가": "단가", "거래금액": "금액", "수수료": "수수료", "제세금": "세금",
+            "통화": "통화", "계좌번호": "계좌"
+        }
+    },
+    "미래에셋증권": {
+        "kind": "trades",
+        "columns": {
+            "거래일자": "거래일자", "종목코드": "종목코드", "종목명": "종목명", "거래구분": "구분",
+            "수량": "수량", "단가": "단가", "거래금액": "금액", "수수료": "수수료", "제세금": "세금",
+            "통화코드": "통화", "계좌번호": "계좌"
+        }
+    },
+    "삼성증권": {
+        "kind": "trades",
+        "columns": {
+            "거래일": "거래일자", "종목코드": "종목코드", "종목명": "종목명", "매매구분": "구분",
+            "체결수량": "수량", "체결단가": "단가", "체결금액": "금액", "수수료": "수수료", "세금": "세금",
+            "통화": "통화", "계좌번호": "계좌"
+        }
+    },
+    "한국투자증권": {
+        "kind": "trades",
+        "columns": {
+            "매매일자": "거래일자", "종목코드": "종목코드", "종목명": "종목명", "매매구분": "구분",
+            "체결수량": "수량", "체결단가": "단가", "체결금액": "금액", "수수료": "수수료", "제세금": "세금",
+            "통화": "통화", "계좌번호": "계좌"
+        }
+    },
+    "NH투자증권": {
+        "kind": "trades",
+        "columns": {
+            "거래일자": "거래일자", "종목코드": "종목코드", "종목명": "종목명", "적요": "구분",
+            "수량": "수량", "단가": "단가", "거래금액": "금액", "수수료": "수수료", "세금": "세금",
+            "통화": "통화", "계좌번호": "계좌"
+        }
+    }
+}
+
+def register_broker_mapper(name, columns, kind="trades", skiprows=0, currency=None):
+    """
+    증권사 컬럼 매퍼 등록 (같은 이름이 있으면 교체)
+
+    Args:
+        name (str): 매퍼 이름 (증권사 컬럼이 없는 파일은 이 이름을 증권사로 사용)
+        columns (dict): {원본 컬럼: 표준 컬럼} (표준 컬럼은 STATEMENT_COLUMNS 중 하나)
+        kind (str, optional): 'trades'(거래내역) 또는 'holdings'(보유 잔고)
+        skiprows (int, optional): 머리글 앞에 있는 안내 문구 줄 수
+        currency (str, optional): 통화 컬럼이 없을 때 단가 통화 (없으면 종목 국가로 판단)
+    """
+    unknown = set(columns.values()) - set(STATEMENT_COLUMNS)
+    if unknown:
+        raise ValueError(f"알 수 없는 표준 컬럼: {', '.join(sorted(unknown))}")
+    if kind not in REQUIRED_COLUMNS:
+        raise ValueError(f"지원하지 않는 파일 종류입니다: {kind}")
+
+    BROKER_MAPPERS[name] = {"kind": kind, "columns": dict(columns), "skiprows": skiprows, "currency": currency}
+
+def detect_broker_mapper(columns):
+    """
+    파일 머리글로 매퍼 찾기 (필수 컬럼이 모두 있는 매퍼 중 일치하는 컬럼이 가장 많은 매퍼)
+
+    Args:
+        columns (list): 파일 컬럼 이름 목록
+
+    Returns:
+        str: 매퍼 이름 (없으면 None)
+    """
+    header = {str(column).strip() for column in columns}
+    best_name, best_score = None, 0
+
+    for name, mapper in BROKER_MAPPERS.items():
+        mapped = {target for source, target in mapper["columns"].items() if source in header}
+        if not set(REQUIRED_COLUMNS[mapper["kind"]]) <= mapped or not mapped & {"단가", "금액"}:
+            continue
+        if len(mapped) > best_score:
+            best_name, best_score = name, len(mapped)
+
+    return best_name
+
+def _detect_encoding(file_path):
+    """CSV 인코딩 판별 (후보 인코딩으로 파일 전체를 디코딩해 봄)"""
+    for encoding in IMPORT_SETTINGS["encodings"]:
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                while f.read(1 << 20):
+                    pass
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("파일 인코딩을 확인할 수 없습니다 (UTF-8, CP949만 지원).")
+
+def _read_chunks(file_path, chunk_size, skiprows=0):
+    """
+    파일을 문자열 DataFrame 청크로 읽기
+
+    CSV는 청크 단위로 스트리밍하고, XLSX는 시트를 한 번에 읽은 뒤 청크로 나눕니다 (openpyxl 필요).
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension in (".xlsx", ".xls"):
+        frame = pd.read_excel(file_path, dtype=str, skiprows=skiprows)
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+        return
+
+    encoding = _detect_encoding(file_path)
+    reader = pd.read_csv(file_path, dtype=str, encoding=encoding, skiprows=skiprows,
+                         chunksize=chunk_size, skipinitialspace=True)
+    for chunk in reader:
+        yield chunk
+
+def _to_number(series):
+    """쉼표, 통화기호 등을 제거하고 숫자로 변환 (변환할 수 없으면 NaN)"""
+    cleaned = series.astype("string").str.replace(r"[^\d.\-]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").astype(float)
+
+def _to_datetime_text(series):
+    """'2024.01.05', '20240105', '2024/01/05 09:30' 등을 'YYYY-MM-DD HH:MM:SS'로 변환 (실패 시 NA)"""
+    text = series.astype("string").str.strip()
+    text = text.str.replace(r"[./]", "-", regex=True).str.replace(r"^(\d{4})(\d{2})(\d{2})", r"\1-\2-\3", regex=True)
+    parsed = pd.to_datetime(text, errors="coerce", format="ISO8601")
+    return parsed.dt.strftime("%Y-%m-%d %H:%M:%S").astype("string")
+
+def _normalize_chunk(chunk, mapper, defaults, line_offset):
+    """
+    청크를 표준 컬럼으로 변환하고 검증
+
+    Args:
+        chunk (DataFrame): 원본 청크 (문자열)
+        mapper (dict): 컬럼 매퍼
+        defaults (dict): 파일에 없는 컬럼의 기본값 (증권사, 계좌, 국가)
+        line_offset (int): 청크 첫 행의 파일 줄 번호
+
+    Returns:
+        tuple: (유효한 행 DataFrame, 오류 목록 [(줄 번호, 사유)], 건너뛴 행 수)
+    """
+    chunk = chunk.rename(columns=lambda column: str(column).strip())
+    columns = {source: target for source, target in mapper["columns"].items() if source in chunk.columns}
+    frame = chunk[list(columns)].rename(columns=columns)
+    frame.index = np.arange(line_offset, line_offset + len(frame))
+
+    text_columns = ("종목코드", "종목명", "구분", "국가", "통화", "증권사", "계좌")
+    for column in text_columns:
+        if column in frame:
+            frame[column] = frame[column].astype("string").str.strip().replace("", pd.NA)
+        else:
+            frame[column] = pd.Series(pd.NA, index=frame.index, dtype="string")
+        if defaults.get(column):
+            frame[column] = frame[column].fillna(defaults[column])
+
+    # 종목코드: 'A005930' 형식과 엑셀에서 앞자리 0이 빠진 국내 코드 보정
+    ticker = frame["종목코드"].str.upper().str.replace(r"^A(?=\d{6}$)", "", regex=True)
+    frame["종목코드"] = ticker.where(~ticker.str.fullmatch(r"\d{1,5}").fillna(False), ticker.str.zfill(6))
+    frame["종목명"] = frame["종목명"].fillna(frame["종목코드"])
+
+    # 국가: 6자리 국내 코드(숫자로 시작)는 한국, 그 외는 미국
+    inferred_country = frame["종목코드"].str.fullmatch(r"\d[0-9A-Z]{5}").fillna(False).map({True: "한국", False: "미국"})
+    frame["국가"] = frame["국가"].fillna(inferred_country.astype("string"))
+    default_currency = frame["국가"].map(lambda country: "KRW" if country == "한국" else "USD").astype("string")
+    frame["통화"] = frame["통화"].str.upper().fillna(mapper.get("currency") or default_currency)
+
+    for column in ("수량", "단가", "금액", "수수료", "세금"):
+        frame[column] = _to_number(frame[column]) if column in frame else np.nan
+    frame["수량"] = frame["수량"].abs()
+    frame["단가"] = frame["단가"].fillna(frame["금액"].abs() / frame["수량"].replace(0, np.nan))
+    frame[["수수료", "세금"]] = frame[["수수료", "세금"]].fillna(0).abs()
+
+    skipped = pd.Series(False, index=frame.index)
+    if mapper["kind"] == "trades":
+        frame["거래일자"] = _to_datetime_text(frame["거래일자"])
+        trade_type = pd.Series(pd.NA, index=frame.index, dtype="string")
+        for value, pattern in TRADE_TYPE_PATTERNS.items():
+            matched = frame["구분"].str.contains(pattern, case=False, regex=True).fillna(False)
+            trade_type = trade_type.mask(matched & trade_type.isna(), value)
+        excluded = frame["구분"].str.contains(TRADE_TYPE_EXCLUDED_PATTERN, case=False, regex=True).fillna(False)
+        frame["구분"] = trade_type.mask(excluded)
+        # 매수/매도가 아닌 행(입출금, 배당, 이자, 취소/정정 등)은 오류가 아니라 건너뜀
+        skipped = frame["구분"].isna()
+    else:
+        frame["거래일자"] = pd.Series(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), index=frame.index, dtype="string")
+        frame["구분"] = pd.Series("매수", index=frame.index, dtype="string")
+
+    checks = [
+        (frame["종목코드"].isna(), "종목코드 없음"),
+        (frame["거래일자"].isna(), "거래일자 형식 오류"),
+        (frame["수량"].isna() | (frame["수량"] <= 0) if mapper["kind"] == "trades" else frame["수량"].isna() | (frame["수량"] < 0),
+         "수량 오류"),
+        (frame["단가"].isna() | (frame["단가"] < 0), "단가 오류"),
+        (frame["계좌"].isna(), "계좌 없음")
+    ]
+
+    invalid = pd.Series(False, index=frame.index)
+    errors = []
+    for mask, reason in checks:
+        mask = mask.fillna(True) & ~skipped & ~invalid
+        errors.extend((int(line), reason) for line in frame.index[mask])
+        invalid |= mask
+
+    valid = frame.loc[~invalid & ~skipped, list(STATEMENT_COLUMNS)]
+    return valid, errors, int(skipped.sum())
+
+def _drop_existing_trades(cursor, user_id, trades):
+    """
+    이미 저장된 거래 제외 (같은 파일을 다시 가져와도 중복되지 않도록)
+
+    종목코드, 계좌, 구분, 수량, 단가, 거래일시가 같은 거래를 같은 건수만큼 제외하므로
+    같은 날 같은 가격의 체결이 여러 건 있어도 새로 추가된 건은 유지됩니다.
+    전량 매도로 삭제된 종목의 거래는 종목코드를 알 수 없어 비교 대상에서 빠집니다.
+    """
+    if trades.empty:
+        return trades, 0
+
+    cursor.execute(
+        """
+        SELECT p.종목코드, p.계좌, t.type, t.quantity, t.price, t.transaction_date
+        FROM transactions t
+        JOIN portfolio p ON p.id = t.portfolio_id
+        WHERE t.user_id = ? AND t.transaction_date BETWEEN ? AND ?
+        """,
+        (user_id, trades["거래일자"].min(), trades["거래일자"].max())
+    )
+    rows = [tuple(row) for row in cursor.fetchall()]
+    if not rows:
+        return trades, 0
+
+    key_columns = ["종목코드", "계좌", "구분", "수량", "단가", "거래일자"]
+    existing = pd.DataFrame(rows, columns=key_columns)
+    existing["거래일자"] = existing["거래일자"].astype(str).str.slice(0, 19)
+
+    def keys(frame):
+        key = frame[key_columns].copy()
+        key["수량"] = key["수량"].astype(float).round(6)
+        key["단가"] = key["단가"].astype(float).round(4)
+        key[["종목코드", "계좌", "구분", "거래일자"]] = key[["종목코드", "계좌", "구분", "거래일자"]].astype(str)
+        return key
+
+    stored = keys(existing).value_counts().rename("stored").reset_index()
+    incoming = keys(trades)
+    incoming["occurrence"] = incoming.groupby(key_columns).cumcount()
+    merged = incoming.reset_index().merge(stored, on=key_columns, how="left").set_index("index")
+    duplicate = (merged["occurrence"] < merged["stored"].fillna(0)).reindex(trades.index)
+
+    return trades[~duplicate], int(duplicate.sum())
+
+def _holdings_to_trades(cursor, user_id, holdings):
+    """
+    보유 잔고를 기존 포지션과의 수량 차이만큼의 조정 거래로 변환
+
+    신규 종목은 전체 수량을 매수로, 기존 종목은 늘어난 수량을 파일 평단가로 매수, 줄어든 수량을
+    기존 평단가로 매도(실현손익 0)한 것으로 기록합니다. 평단가는 파일 값으로 맞춥니다.
+
+    Returns:
+        tuple: (조정 거래 DataFrame, {(종목코드, 계좌): 파일 평단가})
+    """
+    # 같은 종목/계좌가 여러 줄이면 수량 합계와 가중 평단가로 합침
+    holdings = holdings.assign(원가=holdings["수량"] * holdings["단가"])
+    grouped = holdings.groupby(["종목코드", "계좌"], sort=False).agg(
+        종목명=("종목명", "first"), 국가=("국가", "first"), 통화=("통화", "first"), 증권사=("증권사", "first"),
+        거래일자=("거래일자", "first"), 수량=("수량", "sum"), 원가=("원가", "sum")
+    ).reset_index()
+    grouped["단가"] = np.where(grouped["수량"] > 0, grouped["원가"] / grouped["수량"].replace(0, np.nan), 0.0)
+
+    cursor.execute("SELECT 종목코드, 계좌, 수량, 평단가_원화 FROM portfolio WHERE user_id = ?", (user_id,))
+    existing = pd.DataFrame([tuple(row) for row in cursor.fetchall()],
+                            columns=["종목코드", "계좌", "기존수량", "기존평단가"])
+    merged = grouped.merge(existing, on=["종목코드", "계좌"], how="left")
+    merged[["기존수량", "기존평단가"]] = merged[["기존수량", "기존평단가"]].astype(float).fillna(0)
+
+    difference = merged["수량"] - merged["기존수량"]
+    epsilon = IMPORT_SETTINGS["quantity_epsilon"]
+    trades = merged[difference.abs() > epsilon].copy()
+    difference = difference[difference.abs() > epsilon]
+
+    trades["구분"] = np.where(difference > 0, "매수", "매도")
+    trades["단가"] = np.where(difference > 0, trades["단가"], trades["기존평단가"])
+    trades["수량"] = difference.abs()
+    trades["금액"] = trades["수량"] * trades["단가"]
+    trades["수수료"] = 0.0
+    trades["세금"] = 0.0
+
+    average_prices = {(row.종목코드, row.계좌): row.단가 for row in merged.itertuples() if row.수량 > epsilon}
+    return trades[list(STATEMENT_COLUMNS)], average_prices
+
+def _replay_positions(trades, existing, average_prices=None):
+    """
+    거래일 순으로 종목/계좌별 보유 수량과 평단가(매수가 가중 평균) 계산
+
+    Args:
+        trades (DataFrame): 표준 컬럼 거래 (거래일 순 정렬)
+        existing (dict): {(종목코드, 계좌): (id, 수량, 평단가)} 기존 포지션
+        average_prices (dict, optional): 잔고 가져오기의 최종 평단가
+
+    Returns:
+        tuple: (종목별 최종 상태 dict, 실현손익 배열, 보유 수량 초과 매도 여부 배열)
+    """
+    epsilon = IMPORT_SETTINGS["quantity_epsilon"]
+    positions = {}
+    realized = np.full(len(trades), np.nan)
+    oversold = np.zeros(len(trades), dtype=bool)
+
+    tickers = trades["종목코드"].tolist()
+    accounts = trades["계좌"].tolist()
+    is_buy = (trades["구분"] == "매수").to_numpy()
+    quantities = trades["수량"].to_numpy(dtype=float)
+    prices = trades["단가"].to_numpy(dtype=float)
+    dates = trades["거래일자"].tolist()
+
+    for index in range(len(trades)):
+        key = (tickers[index], accounts[index])
+        position = positions.get(key)
+        if position is None:
+            _, quantity, avg_price = existing.get(key, (None, 0, 0))
+            position = positions[key] = {"quantity": quantity or 0, "avg_price": avg_price or 0, "first_buy": None}
+
+        quantity = quantities[index]
+        if is_buy[index]:
+            total = position["quantity"] + quantity
+            position["avg_price"] = (position["avg_price"] * position["quantity"] + prices[index] * quantity) / total
+            position["quantity"] = total
+            position["first_buy"] = position["first_buy"] or dates[index]
+        elif quantity > position["quantity"] + epsilon:
+            oversold[index] = True
+        else:
+            realized[index] = (prices[index] - position["avg_price"]) * quantity
+            position["quantity"] = max(position["quantity"] - quantity, 0)
+
+    # 잔고 가져오기는 수량이 그대로인 종목도 평단가를 파일 값으로 맞춤
+    for key, price in (average_prices or {}).items():
+        if key not in positions and key in existing:
+            positions[key] = {"quantity": existing[key][1] or 0, "avg_price": price, "first_buy": None}
+        elif key in positions:
+            positions[key]["avg_price"] = price
+
+    return positions, realized, oversold
+
+def _write_trades(cursor, user_id, trades, average_prices=None, memo=None):
+    """
+    거래와 포지션을 executemany로 저장 (커밋은 호출하는 쪽에서 처리)
+
+    Returns:
+        dict: 추가/수정/청산 포지션 수, 추가 거래 수, 보유 수량 초과로 제외한 매도 줄 번호
+    """
+    epsilon = IMPORT_SETTINGS["quantity_epsilon"]
+    current_time = datetime.now()
+
+    cursor.execute("SELECT id, 종목코드, 계좌, 수량, 평단가_원화 FROM portfolio WHERE user_id = ?", (user_id,))
+    existing = {(row[1], row[2]): (row[0], row[3], row[4]) for row in cursor.fetchall()}
+
+    trades = trades.sort_values("거래일자", kind="mergesort")
+    positions, realized, oversold = _replay_positions(trades, existing, average_prices)
+    oversold_lines = [int(line) for line in trades.index[oversold]]
+    trades = trades.assign(실현손익=realized)[~oversold]
+
+    # 해외 종목 달러 평단가용 환율은 한 번만 조회
+    exchange_rate = None
+    if (trades["국가"] != "한국").any():
+        from services.market_service import get_exchange_rate
+        exchange_rate = get_exchange_rate('USD', 'KRW')
+
+    # 신규 포지션 추가
+    first_rows = trades.drop_duplicates(["종목코드", "계좌"]).set_index(["종목코드", "계좌"])
+    # 비어 있는 텍스트(pd.NA)는 SQLite에 바인딩되지 않으므로 None으로
+    first_rows = first_rows[["증권사", "국가", "종목명"]].astype(object).where(first_rows[["증권사", "국가", "종목명"]].notna(), None)
+    new_keys = [key for key in first_rows.index if key not in existing and key in positions]
+    cursor.executemany(
+        """
+        INSERT INTO portfolio (
+            user_id, 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가_원화, 평단가_달러,
+            현재가_원화, 현재가_달러, 평가액, 투자비중, 손익금액, 손익수익, 총수익률,
+            배당금, 매수날짜, last_update
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, 0, 0, 0, 0, 0, 0, ?, ?)
+        """,
+        [
+            (user_id, first_rows.at[key, "증권사"], key[1], first_rows.at[key, "국가"], key[0], first_rows.at[key, "종목명"],
+             positions[key]["quantity"], positions[key]["avg_price"],
+             positions[key]["avg_price"] / exchange_rate if exchange_rate and first_rows.at[key, "국가"] != "한국" else None,
+             (positions[key]["first_buy"] or current_time.strftime("%Y-%m-%d"))[:10], current_time)
+            for key in new_keys
+        ]
+    )
+
+    # 기존 포지션 수량/평단가 갱신 (값이 바뀐 포지션만)
+    updated_keys = [
+        key for key in positions
+        if key in existing and (abs(positions[key]["quantity"] - (existing[key][1] or 0)) > epsilon
+                                or abs(positions[key]["avg_price"] - (existing[key][2] or 0)) > epsilon)
+    ]
+    cursor.executemany(
+        "UPDATE portfolio SET 수량 = ?, 평단가_원화 = ?, last_update = ? WHERE id = ?",
+        [(positions[key]["quantity"], positions[key]["avg_price"], current_time, existing[key][0]) for key in updated_keys]
+    )
+
+    # 거래내역 추가
+    cursor.execute("SELECT id, 종목코드, 계좌 FROM portfolio WHERE user_id = ?", (user_id,))
+    portfolio_ids = {(row[1], row[2]): row[0] for row in cursor.fetchall()}
+    trades = trades.assign(portfolio_id=[portfolio_ids[key] for key in zip(trades["종목코드"], trades["계좌"])])
+    cursor.executemany(
+        """
+        INSERT INTO transactions (
+            portfolio_id, user_id, type, quantity, price, 수수료, 세금, transaction_date, 실현손익, 거래메모
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        zip(
+            trades["portfolio_id"].tolist(), [user_id] * len(trades), trades["구분"].tolist(),
+            trades["수량"].tolist(), trades["단가"].tolist(), trades["수수료"].tolist(), trades["세금"].tolist(),
+            trades["거래일자"].tolist(), [None if np.isnan(value) else value for value in trades["실현손익"].tolist()],
+            [memo] * len(trades)
+        )
+    )
+
+    return {
+        "positions_added": len(new_keys),
+        "new_positions": [(portfolio_ids[key], user_id, key[0], first_rows.at[key, "국가"]) for key in new_keys],
+        "positions_updated": len(updated_keys),
+        "closed_ids": [portfolio_ids[key] for key, position in positions.items()
+                       if position["quantity"] <= epsilon and key in portfolio_ids],
+        "transactions_added": len(trades),
+        "oversold_lines": oversold_lines
+    }
+
+def import_statement(user_id, file_path, broker=None, account=None, revalue=True, chunk_size=None):
+    """
+    증권사 거래내역/잔고 파일 일괄 가져오기
+
+    파일을 청크 단위로 읽어 표준 컬럼으로 바꾸고 검증한 뒤, 포트폴리오/거래내역 저장, 로트 장부 반영,
+    보유 종목 유니버스 갱신을 하나의 트랜잭션으로 처리합니다. 시세 재평가는 커밋 후 한 번만 실행합니다.
+    이미 저장된 거래와 같은 거래는 건너뛰므로 같은 파일을 다시 가져와도 중복되지 않습니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        file_path (str): CSV 또는 XLSX 파일 경로
+        broker (str, optional): 매퍼 이름 (없으면 머리글로 판별)
+        account (str, optional): 파일에 계좌 컬럼이 없을 때 사용할 계좌
+        revalue (bool, optional): 가져온 뒤 시세 재평가 실행 여부
+        chunk_size (int, optional): 한 번에 읽는 행 수
+
+    Returns:
+        dict: 결과 (success, message, 매퍼, 읽은/가져온/건너뛴/중복 행 수, 포지션/거래 수, 오류 목록)
+    """
+    started = time.perf_counter()
+    result = {
+        "success": False, "message": "", "broker": broker, "rows_read": 0, "rows_imported": 0,
+        "skipped": 0, "duplicates": 0, "positions_added": 0, "positions_updated": 0,
+        "positions_closed": 0, "transactions_added": 0, "error_count": 0, "errors": []
+    }
+    max_errors = IMPORT_SETTINGS["max_errors"]
+
+    try:
+        if not os.path.exists(file_path):
+            result["message"] = f"파일을 찾을 수 없습니다: {file_path}"
+            return result
+        if os.path.splitext(file_path)[1].lower() == ".xlsx" and not OPENPYXL_AVAILABLE:
+            result["message"] = "XLSX 파일을 가져오려면 openpyxl 패키지가 필요합니다."
+            return result
+
+        chunk_size = chunk_size or IMPORT_SETTINGS["chunk_size"]
+        mapper = BROKER_MAPPERS.get(broker) if broker else None
+        if broker and mapper is None:
+            result["message"] = f"등록되지 않은 증권사 형식입니다: {broker}"
+            return result
+
+        skiprows = mapper.get("skiprows", 0) if mapper else 0
+        valid_chunks = []
+        line = 2 + skiprows  # 머리글 다음 줄부터
+
+        for chunk in _read_chunks(file_path, chunk_size, skiprows):
+            if mapper is None:
+                broker = detect_broker_mapper(chunk.columns)
+                if broker is None:
+                    result["message"] = "파일 형식을 인식할 수 없습니다. 증권사 형식을 지정하거나 매퍼를 등록하세요."
+                    return result
+                mapper = BROKER_MAPPERS[broker]
+                result["broker"] = broker
+
+            defaults = {"계좌": account or IMPORT_SETTINGS["default_account"],
+                        "증권사": broker if broker != "기본" else None}
+            valid, errors, skipped = _normalize_chunk(chunk, mapper, defaults, line)
+
+            result["rows_read"] += len(chunk)
+            result["skipped"] += skipped
+            result["error_count"] += len(errors)
+            result["errors"].extend(errors[:max(max_errors - len(result["errors"]), 0)])
+            valid_chunks.append(valid)
+            line += len(chunk)
+
+        statement = pd.concat(valid_chunks) if valid_chunks else pd.DataFrame(columns=list(STATEMENT_COLUMNS))
+        if statement.empty:
+            result["message"] = "가져올 데이터가 없거나 형식이 올바르지 않습니다."
+            return result
+
+        # 해외 통화 단가는 통화별 환율로 원화 변환 (가져오기 시점 환율, 조회 실패 시 중단)
+        currencies = statement.loc[statement["통화"] != "KRW", "통화"].unique().tolist()
+        if currencies:
+            from services.market_service import get_exchange_rate
+            exchange_rates = {"KRW": 1.0}
+            for currency in currencies:
+                exchange_rate = get_exchange_rate(currency, 'KRW')
+                if not exchange_rate:
+                    result["message"] = f"{currency}/KRW 환율을 조회할 수 없어 가져오기를 중단했습니다."
+                    return result
+                exchange_rates[currency] = float(exchange_rate)
+            amount_columns = ["단가", "금액", "수수료", "세금"]
+            statement[amount_columns] = statement[amount_columns].mul(
+                statement["통화"].map(exchange_rates).astype(float), axis=0
+            )
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        try:
+            previous_symbols = get_user_symbols(cursor, user_id)
+
+            average_prices = None
+            if mapper["kind"] == "holdings":
+                trades, average_prices = _holdings_to_trades(cursor, user_id, statement)
+                memo = "잔고 가져오기"
+            else:
+                trades, result["duplicates"] = _drop_existing_trades(cursor, user_id, statement)
+                memo = f"{broker} 거래내역 가져오기"
+
+            written = _write_trades(cursor, user_id, trades, average_prices, memo)
+            result["error_count"] += len(written["oversold_lines"])
+            result["errors"].extend(
+                (line, "보유 수량 초과 매도")
+                for line in written["oversold_lines"][:max(max_errors - len(result["errors"]), 0)]
+            )
+
+            # 로트 장부 반영 (과거 날짜 거래가 있으면 해당 종목만 다시 처리) 후 보유 수량에 맞춤
+            from services.ledger_service import sync_ledger
+            sync_ledger(cursor, user_id, reconcile=True)
+
+            # 전량 매도된 포지션 삭제 (매도 처리와 같은 방식)
+            if written["closed_ids"]:
+                cursor.executemany("DELETE FROM portfolio WHERE id = ?", [(pid,) for pid in written["closed_ids"]])
+
+            # 새로 생긴 포지션의 섹터/산업군/베타는 부가정보 작업 큐에서 채움
+            closed = set(written["closed_ids"])
+            enqueue_enrichment(cursor, [position for position in written["new_positions"] if position[0] not in closed])
+
+            sync_held_symbols(cursor, previous_symbols | get_user_symbols(cursor, user_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if written["new_positions"]:
+            request_enrichment()
+
+        result.update({
+            "success": True,
+            "rows_imported": written["transactions_added"],
+            "positions_added": written["positions_added"],
+            "positions_updated": written["positions_updated"],
+            "positions_closed": len(written["closed_ids"]),
+            "transactions_added": written["transactions_added"]
+        })
+
+        # 시세 재평가는 한 번만
+        if revalue:
+            from services.portfolio_service import update_all_prices
+            update_all_prices(user_id)
+
+        result["elapsed"] = round(time.perf_counter() - started, 3)
+        result["message"] = (
+            f"가져오기 완료 ({result['broker']}): 거래 {result['transactions_added']:,}건, "
+            f"종목 {result['positions_added']}개 추가, {result['positions_updated']}개 업데이트"
+            + (f", 중복 {result['duplicates']:,}건 제외" if result["duplicates"] else "")
+            + (f", 오류 {result['error_count']:,}건" if result["error_count"] else "")
+        )
+        logger.info(f"{result['message']} - 사용자 {user_id}, {result['elapsed']}초")
+        return result
+    except Exception as e:
+        log_exception(logger, e, {"context": "거래내역 일괄 가져오기", "user_id": user_id, "file": file_path})
+        result["message"] = f"데이터 가져오기 중 오류가 발생했습니다: {str(e)}"
+        return result
@@ -0,0 +1,750 @@
+"""
+매수 로트(세금 로트) 원가 장부 서비스
+
+거래내역(transactions)으로부터 매수 로트(tax_lots)와 매도-로트 매칭(lot_matches)을 만들고,
+사용자별 처리 위치(ledger_state)를 기준으로 새 거래만 증분 반영합니다.
+원가 계산 방식은 사용자별로 선입선출(FIFO), 후입선출(LIFO), 평균원가(AVG) 중 선택합니다.
+보유 로트와 종목별 누적 실현손익(ledger_positions)을 저장하므로 손익 조회는 보유 로트 수에 비례합니다.
+"""
+from datetime import datetime, date
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 장부 설정
+LEDGER_SETTINGS = {
+    "default_method": "AVG",       # 기존 평단가 기준 실현손익과 같은 결과
+    "quantity_epsilon": 1e-9       # 수량 비교 허용 오차
+}
+
+# 원가 계산 방식
+COST_BASIS_METHODS = ("FIFO", "LIFO", "AVG")
+
+# 거래 유형
+BUY_TYPES = ("매수",)
+SELL_TYPES = ("매도",)
+
+def _parse_datetime(value):
+    """
+    거래일/매수일 값을 datetime으로 변환 (변환 실패 시 None)
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+def _holding_days(acquired_at, disposed_at):
+    acquired = _parse_datetime(acquired_at)
+    disposed = _parse_datetime(disposed_at)
+    if acquired is None or disposed is None:
+        return None
+    return max((disposed.date() - acquired.date()).days, 0)
+
+def _get_state(cursor, user_id):
+    cursor.execute(
+        "SELECT method, last_transaction_id, transaction_count FROM ledger_state WHERE user_id = ?",
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+def _save_state(cursor, user_id, method, last_transaction_id, transaction_count):
+    cursor.execute(
+        """
+        INSERT INTO ledger_state (user_id, method, last_transaction_id, transaction_count, last_update)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            method = excluded.method,
+            last_transaction_id = excluded.last_transaction_id,
+            transaction_count = excluded.transaction_count,
+            last_update = excluded.last_update
+        """,
+        (user_id, method, last_transaction_id, transaction_count, datetime.now())
+    )
+
+def _select_transactions(cursor, where, params):
+    cursor.execute(
+        f"""
+        SELECT id, portfolio_id, type, quantity, price, 수수료, 세금, transaction_date
+        FROM transactions
+        WHERE {where}
+        ORDER BY transaction_date, id
+        """,
+        params
+    )
+    return [tuple(row) for row in cursor.fetchall()]
+
+def _load_open_lots(cursor, portfolio_ids):
+    """
+    종목별 보유 로트 조회 (매수일 순)
+    """
+    lots = {portfolio_id: [] for portfolio_id in portfolio_ids}
+    if not lots:
+        return lots
+
+    placeholders = ", ".join("?" * len(lots))
+    cursor.execute(
+        f"""
+        SELECT id, portfolio_id, acquired_at, remaining_quantity, cost_per_share
+        FROM tax_lots
+        WHERE portfolio_id IN ({placeholders}) AND remaining_quantity > 0
+        ORDER BY acquired_at, id
+        """,
+        list(lots)
+    )
+    for row in cursor.fetchall():
+        lots[row[1]].append({
+            "id": row[0],
+            "acquired_at": row[2],
+            "remaining_quantity": row[3],
+            "cost_per_share": row[4]
+        })
+    return lots
+
+def _load_positions(cursor, portfolio_ids):
+    """
+    종목 정보(종목코드, 평단가)와 누적 실현손익 조회
+    """
+    positions = {
+        portfolio_id: {
+            "ticker": None, "avg_price": None, "realized_quantity": 0, "realized_cost": 0,
+            "realized_proceeds": 0, "realized_gain": 0, "last_transaction_date": None
+        }
+        for portfolio_id in portfolio_ids
+    }
+    if not positions:
+        return positions
+
+    placeholders = ", ".join("?" * len(positions))
+    cursor.execute(
+        f"SELECT id, 종목코드, 평단가_원화 FROM portfolio WHERE id IN ({placeholders})",
+        list(positions)
+    )
+    for portfolio_id, ticker, avg_price in cursor.fetchall():
+        positions[portfolio_id]["ticker"] = ticker
+        positions[portfolio_id]["avg_price"] = avg_price
+
+    cursor.execute(
+        f"""
+        SELECT portfolio_id, 종목코드, realized_quantity, realized_cost, realized_proceeds, realized_gain,
+               last_transaction_date
+        FROM ledger_positions
+        WHERE portfolio_id IN ({placeholders})
+        """,
+        list(positions)
+    )
+    for row in cursor.fetchall():
+        position = positions[row[0]]
+        position["ticker"] = position["ticker"] or row[1]
+        position["realized_quantity"] = row[2]
+        position["realized_cost"] = row[3]
+        position["realized_proceeds"] = row[4]
+        position["realized_gain"] = row[5]
+        position["last_transaction_date"] = row[6]
+    return positions
+
+def _insert_lot(cursor, user_id, portfolio_id, ticker, buy_transaction_id, acquired_at, quantity, cost_per_share):
+    cursor.execute(
+        """
+        INSERT INTO tax_lots (
+            user_id, portfolio_id, 종목코드, buy_transaction_id, acquired_at,
+            quantity, remaining_quantity, cost_per_share
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, portfolio_id, ticker, buy_transaction_id, acquired_at, quantity, quantity, cost_per_share)
+    )
+    return {
+        "id": cursor.lastrowid,
+        "acquired_at": acquired_at,
+        "remaining_quantity": quantity,
+        "cost_per_share": cost_per_share
+    }
+
+def _match_lots(lots, method, quantity):
+    """
+    매도 수량에 대응하는 로트와 수량 목록 계산
+
+    Returns:
+        tuple: ([(로트, 수량)], 부족 수량)
+    """
+    epsilon = LEDGER_SETTINGS["quantity_epsilon"]
+    open_lots = [lot for lot in lots if lot["remaining_quantity"] > epsilon]
+    available = sum(lot["remaining_quantity"] for lot in open_lots)
+
+    if method == "AVG":
+        # 평균원가: 모든 로트에서 같은 비율로 차감하여 남은 로트의 평균 단가 유지
+        matched_quantity = min(quantity, available)
+        ratio = matched_quantity / available if available > 0 else 0
+        matches = [(lot, lot["remaining_quantity"] * ratio) for lot in open_lots]
+    else:
+        if method == "LIFO":
+            open_lots = list(reversed(open_lots))
+        matches = []
+        left = quantity
+        for lot in open_lots:
+            if left <= epsilon:
+                break
+            take = min(lot["remaining_quantity"], left)
+            matches.append((lot, take))
+            left -= take
+        matched_quantity = quantity - max(left, 0)
+
+    return [(lot, take) for lot, take in matches if take > epsilon], max(quantity - matched_quantity, 0)
+
+def _process_transactions(cursor, user_id, method, portfolio_id, transactions, lots, position):
+    """
+    한 종목의 거래를 순서대로 장부에 반영
+
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+        method (str): 원가 계산 방식
+        portfolio_id (int): 포트폴리오 종목 ID
+        transactions (list): (id, portfolio_id, type, quantity, price, 수수료, 세금, transaction_date) 목록
+        lots (list): 보유 로트 (매수일 순, 함수 안에서 갱신)
+        position (dict): 종목 정보 및 누적 실현손익 (함수 안에서 갱신)
+    """
+    epsilon = LEDGER_SETTINGS["quantity_epsilon"]
+    changed_lots = {}
+    match_rows = []
+    realized_updates = []
+
+    for transaction_id, _, transaction_type, quantity, price, fee, tax, transaction_date in transactions:
+        quantity = quantity or 0
+        price = price or 0
+        costs = (fee or 0) + (tax or 0)
+        position["last_transaction_date"] = transaction_date
+
+        if quantity <= epsilon:
+            continue
+
+        if transaction_type in BUY_TYPES:
+            # 수수료/세금은 매수 원가에 포함
+            lots.append(_insert_lot(
+                cursor, user_id, portfolio_id, position["ticker"], transaction_id, transaction_date,
+                quantity, price + costs / quantity
+            ))
+        elif transaction_type in SELL_TYPES:
+            matches, shortfall = _match_lots(lots, method, quantity)
+
+            if shortfall > epsilon:
+                # 매수 기록이 없는 수량은 현재 평단가(없으면 매도가)로 기초 로트를 만들어 대응
+                logger.warning(f"매수 로트 부족: 포트폴리오 {portfolio_id}, 거래 {transaction_id}, 부족 수량 {shortfall}")
+                opening_lot = _insert_lot(
+                    cursor, user_id, portfolio_id, position["ticker"], None, transaction_date,
+                    shortfall, position["avg_price"] if position["avg_price"] is not None else price
+                )
+                lots.append(opening_lot)
+                matches.append((opening_lot, shortfall))
+
+            # 매도 비용은 매도 금액에서 차감
+            proceeds_per_share = price - costs / quantity
+            realized_gain = 0
+
+            for lot, take in matches:
+                cost_basis = take * lot["cost_per_share"]
+                proceeds = take * proceeds_per_share
+                gain = proceeds - cost_basis
+                realized_gain += gain
+
+                lot["remaining_quantity"] -= take
+                changed_lots[lot["id"]] = lot
+
+                match_rows.append((
+                    user_id, portfolio_id, lot["id"], transaction_id, take, cost_basis, proceeds, gain,
+                    lot["acquired_at"], transaction_date, _holding_days(lot["acquired_at"], transaction_date), method
+                ))
+
+                position["realized_quantity"] += take
+                position["realized_cost"] += cost_basis
+                position["realized_proceeds"] += proceeds
+
+            position["realized_gain"] += realized_gain
+            realized_updates.append((realized_gain, transaction_id))
+
+            lots[:] = [lot for lot in lots if lot["remaining_quantity"] > epsilon]
+
+    if match_rows:
+        cursor.executemany(
+            """
+            INSERT INTO lot_matches (
+                user_id, portfolio_id, lot_id, sell_transaction_id, quantity, cost_basis, proceeds,
+                realized_gain, acquired_at, disposed_at, holding_days, method
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            match_rows
+        )
+
+    if changed_lots:
+        cursor.executemany(
+            "UPDATE tax_lots SET remaining_quantity = ?, closed_at = ? WHERE id = ?",
+            [
+                (
+                    lot["remaining_quantity"] if lot["remaining_quantity"] > epsilon else 0,
+                    None if lot["remaining_quantity"] > epsilon else position["last_transaction_date"],
+                    lot["id"]
+                )
+                for lot in changed_lots.values()
+            ]
+        )
+
+    # 매도 거래의 실현손익을 선택한 원가 계산 방식 기준으로 기록
+    if realized_updates:
+        cursor.executemany("UPDATE transactions SET 실현손익 = ? WHERE id = ?", realized_updates)
+
+    cursor.execute(
+        """
+        INSERT INTO ledger_positions (
+            portfolio_id, user_id, 종목코드, realized_quantity, realized_cost, realized_proceeds,
+            realized_gain, last_transaction_date, last_update
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (portfolio_id) DO UPDATE SET
+            종목코드 = excluded.종목코드,
+            realized_quantity = excluded.realized_quantity,
+            realized_cost = excluded.realized_cost,
+            realized_proceeds = excluded.realized_proceeds,
+            realized_gain = excluded.realized_gain,
+            last_transaction_date = excluded.last_transaction_date,
+            last_update = excluded.last_update
+        """,
+        (portfolio_id, user_id, position["ticker"], position["realized_quantity"], position["realized_cost"],
+         position["realized_proceeds"], position["realized_gain"], position["last_transaction_date"], datetime.now())
+    )
+
+def _reset_portfolios(cursor, portfolio_ids):
+    """
+    종목의 로트, 매칭, 누적 실현손익 삭제 (전체 거래 재처리 전)
+    """
+    placeholders = ", ".join("?" * len(portfolio_ids))
+    for table in ("lot_matches", "tax_lots", "ledger_positions"):
+        cursor.execute(f"DELETE FROM {table} WHERE portfolio_id IN ({placeholders})", list(portfolio_ids))
+
+def _apply(cursor, user_id, method, transactions):
+    """
+    거래 목록을 종목별로 나누어 장부에 반영
+
+    Args:
+        transactions (list): 새 거래 목록 (거래일 순)
+
+    Returns:
+        int: 처리한 거래 수
+    """
+    by_portfolio = {}
+    for transaction in transactions:
+        if transaction[1] is not None:
+            by_portfolio.setdefault(transaction[1], []).append(transaction)
+
+    positions = _load_positions(cursor, by_portfolio)
+
+    # 이미 처리한 거래보다 이전 날짜의 거래가 들어온 종목은 전체 거래를 다시 처리
+    rebuild_ids = {
+        portfolio_id for portfolio_id, items in by_portfolio.items()
+        if positions[portfolio_id]["last_transaction_date"] is not None
+        and str(items[0][7]) < str(positions[portfolio_id]["last_transaction_date"])
+    }
+
+    if rebuild_ids:
+        _reset_portfolios(cursor, rebuild_ids)
+        placeholders = ", ".join("?" * len(rebuild_ids))
+        for portfolio_id in rebuild_ids:
+            by_portfolio[portfolio_id] = []
+        for transaction in _select_transactions(cursor, f"portfolio_id IN ({placeholders})", list(rebuild_ids)):
+            by_portfolio[transaction[1]].append(transaction)
+        positions.update(_load_positions(cursor, rebuild_ids))
+
+    lots = _load_open_lots(cursor, by_portfolio)
+
+    for portfolio_id, items in by_portfolio.items():
+        if items:
+            _process_transactions(cursor, user_id, method, portfolio_id, items, lots[portfolio_id], positions[portfolio_id])
+
+    return sum(len(items) for items in by_portfolio.values())
+
+def reconcile_positions(cursor, user_id):
+    """
+    보유 로트 수량을 포트폴리오 보유 수량에 맞춤
+
+    거래 기록 없이 수량이 바뀐 종목(직접 수정, CSV 가져오기 등)은 차이만큼 현재 평단가로 조정 로트를
+    추가하거나, 최근 로트부터 수량을 줄입니다.
+
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+
+    Returns:
+        int: 조정한 종목 수
+    """
+    epsilon = LEDGER_SETTINGS["quantity_epsilon"]
+
+    cursor.execute(
+        """
+        SELECT p.id, p.종목코드, p.수량, p.평단가_원화, p.매수날짜, COALESCE(SUM(l.remaining_quantity), 0)
+        FROM portfolio p
+        LEFT JOIN tax_lots l ON l.portfolio_id = p.id AND l.remaining_quantity > 0
+        WHERE p.user_id = ?
+        GROUP BY p.id
+        """,
+        (user_id,)
+    )
+    differences = [tuple(row) for row in cursor.fetchall() if abs((row[2] or 0) - row[5]) > epsilon]
+
+    for portfolio_id, ticker, quantity, avg_price, purchase_date, lot_quantity in differences:
+        difference = (quantity or 0) - lot_quantity
+
+        if difference > 0:
+            _insert_lot(cursor, user_id, portfolio_id, ticker, None, purchase_date or datetime.now(),
+                        difference, avg_price or 0)
+            continue
+
+        # 초과 수량은 최근 로트부터 차감 (실현손익 없음)
+        excess = -difference
+        for lot in reversed(_load_open_lots(cursor, [portfolio_id])[portfolio_id]):
+            if excess <= epsilon:
+                break
+            take = min(lot["remaining_quantity"], excess)
+            remaining = lot["remaining_quantity"] - take
+            cursor.execute(
+                "UPDATE tax_lots SET remaining_quantity = ?, closed_at = ? WHERE id = ?",
+                (remaining if remaining > epsilon else 0, None if remaining > epsilon else datetime.now(), lot["id"])
+            )
+            excess -= take
+
+    if differences:
+        logger.info(f"로트 수량 조정: 사용자 {user_id}, {len(differences)}개 종목")
+
+    return len(differences)
+
+def rebuild_ledger(cursor, user_id, method=None):
+    """
+    사용자의 로트 장부를 전체 거래내역에서 다시 생성
+
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+        method (str, optional): 원가 계산 방식 (없으면 저장된 방식)
+
+    Returns:
+        int: 처리한 거래 수
+    """
+    state = _get_state(cursor, user_id)
+    method = method or (state[0] if state else LEDGER_SETTINGS["default_method"])
+
+    for table in ("lot_matches", "tax_lots", "ledger_positions"):
+        cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+    transactions = _select_transactions(cursor, "user_id = ?", (user_id,))
+    processed = _apply(cursor, user_id, method, transactions)
+
+    _save_state(cursor, user_id, method, max((t[0] for t in transactions), default=0), len(transactions))
+    reconcile_positions(cursor, user_id)
+
+    return processed
+
+def sync_ledger(cursor, user_id, reconcile=False):
+    """
+    마지막 처리 위치 이후의 거래만 장부에 반영 (매수/매도와 같은 트랜잭션 안에서 호출 가능)
+
+    처리한 거래가 삭제된 경우에는 전체를 다시 생성합니다.
+
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+        reconcile (bool, optional): 포트폴리오 보유 수량과 로트 수량 맞춤 여부
+
+    Returns:
+        int: 처리한 거래 수
+    """
+    state = _get_state(cursor, user_id)
+
+    if state is None:
+        return rebuild_ledger(cursor, user_id)
+
+    method, last_transaction_id, transaction_count = state
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM transactions WHERE user_id = ? AND id <= ?",
+        (user_id, last_transaction_id)
+    )
+    if cursor.fetchone()[0] != transaction_count:
+        logger.info(f"처리한 거래내역이 변경되어 로트 장부를 다시 생성합니다: 사용자 {user_id}")
+        return rebuild_ledger(cursor, user_id, method)
+
+    transactions = _select_transactions(cursor, "user_id = ? AND id > ?", (user_id, last_transaction_id))
+    processed = 0
+
+    if transactions:
+        processed = _apply(cursor, user_id, method, transactions)
+        _save_state(cursor, user_id, method, max(t[0] for t in transactions), transaction_count + len(transactions))
+
+    if reconcile:
+        reconcile_positions(cursor, user_id)
+
+    return processed
+
+def update_ledger(user_id=None):
+    """
+    로트 장부 갱신 (사용자 지정이 없으면 거래내역이 있는 모든 사용자)
+
+    Args:
+        user_id (int, optional): 사용자 ID
+
+    Returns:
+        int: 처리한 거래 수
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        if user_id is None:
+            cursor.execute("SELECT DISTINCT user_id FROM transactions WHERE user_id IS NOT NULL")
+            user_ids = [row[0] for row in cursor.fetchall()]
+        else:
+            user_ids = [user_id]
+
+        processed = sum(sync_ledger(cursor, uid, reconcile=True) for uid in user_ids)
+
+        conn.commit()
+        conn.close()
+
+        return processed
+    except Exception as e:
+        log_exception(logger, e, {"context": "로트 장부 갱신", "user_id": user_id})
+        return 0
+
+def get_cost_basis_method(user_id):
+    """
+    사용자의 원가 계산 방식 조회
+
+    Args:
+        user_id (int): 사용자 ID
+
+    Returns:
+        str: FIFO, LIFO, AVG 중 하나
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        state = _get_state(cursor, user_id)
+        conn.close()
+
+        return state[0] if state else LEDGER_SETTINGS["default_method"]
+    except Exception as e:
+        log_exception(logger, e, {"context": "원가 계산 방식 조회", "user_id": user_id})
+        return LEDGER_SETTINGS["default_method"]
+
+def set_cost_basis_method(user_id, method):
+    """
+    사용자의 원가 계산 방식 변경 (장부를 새 방식으로 다시 생성)
+
+    Args:
+        user_id (int): 사용자 ID
+        method (str): FIFO, LIFO, AVG 중 하나
+
+    Returns:
+        tuple: (성공 여부, 메시지)
+    """
+    method = (method or "").upper()
+    if method not in COST_BASIS_METHODS:
+        return False, f"지원하지 않는 원가 계산 방식입니다: {method}"
+
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        processed = rebuild_ledger(cursor, user_id, method)
+
+        conn.commit()
+        conn.close()
+
+        logger.info(f"원가 계산 방식 변경: 사용자 {user_id}, {method}, 거래 {processed}건 재처리")
+        return True, f"원가 계산 방식이 {method}(으)로 변경되었습니다."
+    except Exception as e:
+        log_exception(logger, e, {"context": "원가 계산 방식 변경", "user_id": user_id, "method": method})
+        return False, f"원가 계산 방식 변경 중 오류가 발생했습니다: {e}"
+
+def get_open_lots(user_id, portfolio_id=None):
+    """
+    보유 로트별 원가와 미실현 손익 조회
+
+    Args:
+        user_id (int): 사용자 ID
+        portfolio_id (int, optional): 포트폴리오 종목 ID (없으면 전체 종목)
+
+    Returns:
+        list: 로트 딕셔너리 목록
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        sync_ledger(cursor, user_id, reconcile=True)
+        conn.commit()
+
+        query = """
+            SELECT l.id, l.portfolio_id, p.종목코드, p.종목명, l.acquired_at, l.quantity, l.remaining_quantity,
+                   l.cost_per_share, p.현재가_원화
+            FROM tax_lots l
+            JOIN portfolio p ON p.id = l.portfolio_id
+            WHERE l.user_id = ? AND l.remaining_quantity > 0
+        """
+        params = [user_id]
+        if portfolio_id is not None:
+            query += " AND l.portfolio_id = ?"
+            params.append(portfolio_id)
+        query += " ORDER BY l.portfolio_id, l.acquired_at, l.id"
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+
+        now = datetime.now()
+        lots = []
+        for row in rows:
+            cost_basis = row['remaining_quantity'] * row['cost_per_share']
+            market_value = row['remaining_quantity'] * (row['현재가_원화'] or 0)
+            lots.append({
+                "lot_id": row['id'],
+                "portfolio_id": row['portfolio_id'],
+                "ticker": row['종목코드'],
+                "name": row['종목명'],
+                "acquired_at": row['acquired_at'],
+                "quantity": row['quantity'],
+                "remaining_quantity": row['remaining_quantity'],
+                "cost_per_share": row['cost_per_share'],
+                "cost_basis": cost_basis,
+                "market_value": market_value,
+                "unrealized_gain": market_value - cost_basis,
+                "unrealized_percent": (market_value / cost_basis - 1) * 100 if cost_basis > 0 else 0,
+                "holding_days": _holding_days(row['acquired_at'], now)
+            })
+
+        return lots
+    except Exception as e:
+        log_exception(logger, e, {"context": "보유 로트 조회", "user_id": user_id})
+        return []
+
+def get_position_pnl(user_id):
+    """
+    종목별 원가, 미실현/실현 손익 조회 (보유 로트와 누적 실현손익 기준)
+
+    Args:
+        user_id (int): 사용자 ID
+
+    Returns:
+        list: 종목별 손익 딕셔너리 목록
+    """
+    try:
+        lots = get_open_lots(user_id)
+
+        positions = {}
+        for lot in lots:
+            position = positions.setdefault(lot["portfolio_id"], {
+                "portfolio_id": lot["portfolio_id"],
+                "ticker": lot["ticker"],
+                "name": lot["name"],
+                "quantity": 0,
+                "cost_basis": 0,
+                "market_value": 0,
+                "lot_count": 0,
+                "_weighted_days": 0
+            })
+            position["quantity"] += lot["remaining_quantity"]
+            position["cost_basis"] += lot["cost_basis"]
+            position["market_value"] += lot["market_value"]
+            position["lot_count"] += 1
+            position["_weighted_days"] += (lot["holding_days"] or 0) * lot["remaining_quantity"]
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT portfolio_id, realized_gain FROM ledger_positions WHERE user_id = ?",
+            (user_id,)
+        )
+        realized = {row[0]: row[1] for row in cursor.fetchall()}
+        conn.close()
+
+        result = []
+        for portfolio_id, position in positions.items():
+            weighted_days = position.pop("_weighted_days")
+            cost_basis = position["cost_basis"]
+            quantity = position["quantity"]
+
+            position["average_cost"] = cost_basis / quantity if quantity > 0 else 0
+            position["unrealized_gain"] = position["market_value"] - cost_basis
+            position["unrealized_percent"] = (position["market_value"] / cost_basis - 1) * 100 if cost_basis > 0 else 0
+            position["realized_gain"] = realized.get(portfolio_id, 0)
+            position["average_holding_days"] = weighted_days / quantity if quantity > 0 else 0
+            result.append(position)
+
+        return result
+    except Exception as e:
+        log_exception(logger, e, {"context": "종목별 손익 조회", "user_id": user_id})
+        return []
+
+def get_realized_gains(user_id, start_date=None, end_date=None):
+    """
+    로트별 실현손익 내역 조회
+
+    Args:
+        user_id (int): 사용자 ID
+        start_date (str, optional): 매도일 시작 (YYYY-MM-DD)
+        end_date (str, optional): 매도일 종료 (YYYY-MM-DD)
+
+    Returns:
+        list: 매칭 딕셔너리 목록 (매도일 순)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        sync_ledger(cursor, user_id)
+        conn.commit()
+
+        query = """
+            SELECT m.sell_transaction_id, m.lot_id, l.종목코드, m.quantity, m.cost_basis, m.proceeds, m.realized_gain,
+                   m.acquired_at, m.disposed_at, m.holding_days, m.method
+            FROM lot_matches m
+            JOIN tax_lots l ON l.id = m.lot_id
+            WHERE m.user_id = ?
+        """
+        params = [user_id]
+        if start_date:
+            query += " AND m.disposed_at >= ?"
+            params.append(start_date)
+        if end_date:
+            # 종료일 당일 거래 포함
+            query += " AND date(m.disposed_at) <= date(?)"
+            params.append(end_date)
+        query += " ORDER BY m.disposed_at, m.id"
+
+        cursor.execute(query, params)
+        gains = [
+            {
+                "transaction_id": row[0],
+                "lot_id": row[1],
+                "ticker": row[2],
+                "quantity": row[3],
+                "cost_basis": row[4],
+                "proceeds": row[5],
+                "realized_gain": row[6],
+                "acquired_at": row[7],
+                "disposed_at": row[8],
+                "holding_days": row[9],
+                "method": row[10]
+            }
+            for row in cursor.fetchall()
+        ]
+        conn.close()
+
+        return gains
+    except Exception as e:
+        log_exception(logger, e, {"context": "실현손익 내역 조회", "user_id": user_id})
+        return []
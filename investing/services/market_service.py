@@ -3,7 +3,6 @@
 """
 import threading
 import time
-import schedule
 import json
 from datetime import datetime, timedelta
 import requests
@@ -31,6 +30,7 @@ except ImportError:
 
 from utils.logging import get_logger, log_exception
 from models.database import get_db_connection
+from services import provider_replay
 
 logger = get_logger(__name__)
 
@@ -50,6 +50,223 @@ CACHE_EXPIRY = {
     'financial_data': 60 * 60 * 24 * 7  # 1주일
 }
 
+# 프로바이더 응답 시간 히스토그램 구간 (밀리초)
+# 종가 이력을 저장하는 벤치마크 지수 (pykrx 지수 코드 또는 Yahoo Finance 심볼)
+INDEX_SYMBOLS = {
+    'KS11': {'name': '코스피', 'krx': '1001', 'currency': 'KRW'},
+    'KQ11': {'name': '코스닥', 'krx': '2001', 'currency': 'KRW'},
+    'SPX': {'name': 'S&P 500', 'yahoo': '^GSPC', 'currency': 'USD'},
+    'IXIC': {'name': '나스닥', 'yahoo': '^IXIC', 'currency': 'USD'},
+    'DJI': {'name': '다우존스', 'yahoo': '^DJI', 'currency': 'USD'}
+}
+
+# 지수 종가 이력의 daily_prices 시장 코드
+INDEX_MARKET = 'INDEX'
+
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# 캐시 및 프로바이더 호출 통계 (프로세스 단위, 메모리 저장)
+_stats_lock = threading.Lock()
+_cache_stats = {}     # data_type -> {'hit', 'miss', 'stale'}
+_key_hits = {}        # (data_type, symbol, market) -> 조회 횟수
+_provider_stats = {}  # provider -> {'calls', 'errors', 'total_ms', 'max_ms', 'buckets'}
+_stats_started_at = datetime.now()
+
+def _record_cache_access(data_type, key, outcome):
+    """
+    캐시 조회 결과 기록
+
+    Args:
+        data_type (str): 데이터 유형
+        key (tuple): 캐시 키 (data_type, symbol, market)
+        outcome (str): 'hit', 'miss', 'stale' 중 하나
+    """
+    with _stats_lock:
+        counters = _cache_stats.setdefault(data_type, {'hit': 0, 'miss': 0, 'stale': 0})
+        counters[outcome] += 1
+        _key_hits[key] = _key_hits.get(key, 0) + 1
+
+def _record_provider_call(provider, elapsed_ms, success):
+    """
+    프로바이더 호출 결과 기록
+
+    Args:
+        provider (str): 프로바이더 이름 ('pykrx', 'yfinance' 등)
+        elapsed_ms (float): 호출 소요 시간 (밀리초)
+        success (bool): 성공 여부
+    """
+    with _stats_lock:
+        stats = _provider_stats.setdefault(provider, {
+            'calls': 0,
+            'errors': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        })
+        stats['calls'] += 1
+        if not success:
+            stats['errors'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+        # 해당 구간 카운트 증가 (마지막 구간은 최대값 초과)
+        bucket_index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                bucket_index = i
+                break
+        stats['buckets'][bucket_index] += 1
+
+def _call_provider(provider, func, *args, **kwargs):
+    """
+    외부 프로바이더 호출 (응답 시간 및 오류 기록, 기록/재생 모드 지원)
+
+    Args:
+        provider (str): 프로바이더 이름
+        func (callable): 호출할 함수
+        *args, **kwargs: 함수 인자
+
+    Returns:
+        호출 결과 (예외는 그대로 전달)
+    """
+    start = time.perf_counter()
+    success = False
+    try:
+        result = provider_replay.call(provider, func, *args, **kwargs)
+        # HTTP 응답은 상태 코드로 성공 여부 판단
+        status_code = getattr(result, 'status_code', None)
+        success = status_code is None or status_code < 400
+        return result
+    finally:
+        _record_provider_call(provider, (time.perf_counter() - start) * 1000, success)
+
+def _estimate_percentile(buckets, total, percentile):
+    """히스토그램 구간에서 백분위 응답 시간 추정 (구간 상한값)"""
+    if total == 0:
+        return 0
+
+    threshold = total * percentile
+    cumulative = 0
+    for i, count in enumerate(buckets):
+        cumulative += count
+        if cumulative >= threshold:
+            return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else float('inf')
+    return float('inf')
+
+def get_cache_statistics():
+    """
+    캐시 적중률 및 프로바이더 호출 통계 조회
+
+    Returns:
+        dict: 데이터 유형별 캐시 통계, 프로바이더별 응답 시간/오류율
+    """
+    with _stats_lock:
+        cache_snapshot = {k: dict(v) for k, v in _cache_stats.items()}
+        provider_snapshot = {
+            k: dict(v, buckets=list(v['buckets'])) for k, v in _provider_stats.items()
+        }
+
+    cache_result = {}
+    for data_type, counters in cache_snapshot.items():
+        total = counters['hit'] + counters['miss'] + counters['stale']
+        cache_result[data_type] = {
+            **counters,
+            'total': total,
+            'hit_ratio': counters['hit'] / total if total > 0 else 0,
+            'ttl_seconds': CACHE_EXPIRY.get(data_type, 3600)
+        }
+
+    provider_result = {}
+    for provider, stats in provider_snapshot.items():
+        calls = stats['calls']
+        bucket_labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        provider_result[provider] = {
+            'calls': calls,
+            'errors': stats['errors'],
+            'error_rate': stats['errors'] / calls if calls > 0 else 0,
+            'avg_ms': stats['total_ms'] / calls if calls > 0 else 0,
+            'max_ms': stats['max_ms'],
+            'p50_ms': _estimate_percentile(stats['buckets'], calls, 0.5),
+            'p95_ms': _estimate_percentile(stats['buckets'], calls, 0.95),
+            'histogram': dict(zip(bucket_labels, stats['buckets']))
+        }
+
+    return {
+        'since': _stats_started_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'cache': cache_result,
+        'providers': provider_result
+    }
+
+def reset_cache_statistics():
+    """캐시 및 프로바이더 호출 통계 초기화"""
+    global _stats_started_at
+
+    with _stats_lock:
+        _cache_stats.clear()
+        _key_hits.clear()
+        _provider_stats.clear()
+        _stats_started_at = datetime.now()
+
+    logger.info("캐시 통계 초기화 완료")
+
+def get_cache_inspector(limit=10):
+    """
+    캐시 내용 점검 (관리자 화면용)
+
+    Args:
+        limit (int): 목록별 최대 항목 수
+
+    Returns:
+        dict: 조회가 많은 키, 가장 오래된 항목, 테이블별 크기
+    """
+    with _stats_lock:
+        hot_keys = sorted(_key_hits.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+    result = {
+        'hot_keys': [
+            {'data_type': key[0], 'symbol': key[1], 'market': key[2], 'hits': count}
+            for key, count in hot_keys
+        ],
+        'oldest_entries': [],
+        'table_sizes': {}
+    }
+
+    try:
+        conn = get_db_connection('market')
+        cursor = conn.cursor()
+
+        current_time = datetime.now()
+
+        cursor.execute(
+            """
+            SELECT data_type, symbol, market, timestamp, expiry, LENGTH(data) as size
+            FROM market_data_cache
+            ORDER BY timestamp ASC
+            LIMIT ?
+            """,
+            (limit,)
+        )
+        result['oldest_entries'] = [dict(row) for row in cursor.fetchall()]
+
+        # 테이블별 전체/만료 행 수
+        for table in ['market_data_cache', 'exchange_rate_cache']:
+            cursor.execute(
+                f"SELECT COUNT(*), SUM(CASE WHEN expiry < ? THEN 1 ELSE 0 END) FROM {table}",
+                (current_time,)
+            )
+            row = cursor.fetchone()
+            result['table_sizes'][table] = {'rows': row[0] or 0, 'expired': row[1] or 0}
+
+        for table in ['stock_info', 'financial_metrics', 'dividend_calendar']:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            result['table_sizes'][table] = {'rows': cursor.fetchone()[0] or 0, 'expired': 0}
+
+        conn.close()
+    except Exception as e:
+        log_exception(logger, e, {"context": "캐시 점검"})
+
+    return result
+
 def load_api_keys_from_settings():
     """설정 데이터베이스에서 API 키 로드"""
     try:
@@ -93,41 +310,51 @@ def get_cached_data(data_type, symbol=None, market=None, from_currency=None, to_
         cursor = conn.cursor()
         
         current_time = datetime.now()
-        
+
+        # 만료된 항목도 조회하여 미스/만료(stale)를 구분
         if data_type == 'exchange_rate':
+            cache_key = (data_type, f"{from_currency}/{to_currency}", None)
             cursor.execute(
                 """
-                SELECT rate, timestamp, source
+                SELECT rate, timestamp, source, expiry > ? AS fresh
                 FROM exchange_rate_cache
-                WHERE from_currency = ? AND to_currency = ? AND expiry > ?
+                WHERE from_currency = ? AND to_currency = ?
                 """,
-                (from_currency, to_currency, current_time)
+                (current_time, from_currency, to_currency)
             )
         else:
+            cache_key = (data_type, symbol, market or 'default')
             cursor.execute(
                 """
-                SELECT data, timestamp
+                SELECT data, timestamp, expiry > ? AS fresh
                 FROM market_data_cache
-                WHERE symbol = ? AND market = ? AND data_type = ? AND expiry > ?
+                WHERE symbol = ? AND market = ? AND data_type = ?
                 """,
-                (symbol, market or 'default', data_type, current_time)
+                (current_time, symbol, market or 'default', data_type)
             )
-        
+
         result = cursor.fetchone()
         conn.close()
-        
-        if result:
-            if data_type == 'exchange_rate':
-                return {
-                    'rate': result['rate'],
-                    'timestamp': result['timestamp'],
-                    'source': result['source']
-                }
-            else:
-                # JSON으로 저장된 데이터를 파싱하여 반환
-                return json.loads(result['data'])
-                
-        return None
+
+        if result is None:
+            _record_cache_access(data_type, cache_key, 'miss')
+            return None
+
+        if not result['fresh']:
+            _record_cache_access(data_type, cache_key, 'stale')
+            return None
+
+        _record_cache_access(data_type, cache_key, 'hit')
+
+        if data_type == 'exchange_rate':
+            return {
+                'rate': result['rate'],
+                'timestamp': result['timestamp'],
+                'source': result['source']
+            }
+        else:
+            # JSON으로 저장된 데이터를 파싱하여 반환
+            return json.loads(result['data'])
     except Exception as e:
         log_exception(logger, e, {"context": "캐시 데이터 조회", "data_type": data_type, "symbol": symbol})
         return None
@@ -228,7 +455,7 @@ def get_krx_stock_price(ticker, use_cache=True):
         fromdate = (datetime.now() - timedelta(days=30)).strftime("%Y%m%d")
         
         # 최근 30일간의 OHLCV 데이터 가져오기
-        df = stock.get_market_ohlcv_by_date(fromdate=fromdate, todate=today, ticker=ticker)
+        df = _call_provider('pykrx', stock.get_market_ohlcv_by_date, fromdate=fromdate, todate=today, ticker=ticker)
         
         if not df.empty:
             # 가장 최근 데이터 반환
@@ -270,14 +497,14 @@ def get_krx_stock_info(ticker):
         today = datetime.now().strftime("%Y%m%d")
         
         # 종목 정보 조회
-        df_info = stock.get_market_cap_by_ticker(today)
+        df_info = _call_provider('pykrx', stock.get_market_cap_by_ticker, today)
         if ticker in df_info.index:
             info_row = df_info.loc[ticker]
             
             # 업종 정보 조회
             sector = "정보없음"
             try:
-                df_sector = stock.get_market_fundamental_by_ticker(today, ticker)
+                df_sector = _call_provider('pykrx', stock.get_market_fundamental_by_ticker, today, ticker)
                 if not df_sector.empty:
                     sector_info = df_sector.loc[ticker].get('업종')
                     if sector_info:
@@ -288,7 +515,7 @@ def get_krx_stock_info(ticker):
             # 종목 정보 딕셔너리 생성
             stock_info = {
                 'ticker': ticker,
-                'name': stock.get_market_ticker_name(ticker),
+                'name': _call_provider('pykrx', stock.get_market_ticker_name, ticker),
                 'market_cap': int(info_row.get('시가총액', 0)),
                 'shares': int(info_row.get('상장주식수', 0)),
                 'sector': sector
@@ -296,7 +523,7 @@ def get_krx_stock_info(ticker):
             
             # PER, PBR, 배당수익률 정보 추가
             try:
-                df_per = stock.get_market_fundamental_by_ticker(today)
+                df_per = _call_provider('pykrx', stock.get_market_fundamental_by_ticker, today)
                 if ticker in df_per.index:
                     per_row = df_per.loc[ticker]
                     stock_info['per'] = float(per_row.get('PER', 0))
@@ -310,7 +537,7 @@ def get_krx_stock_info(ticker):
             # 52주 최고/최저 정보 추가
             try:
                 year_ago = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
-                df_year = stock.get_market_ohlcv_by_date(year_ago, today, ticker)
+                df_year = _call_provider('pykrx', stock.get_market_ohlcv_by_date, year_ago, today, ticker)
                 stock_info['high_52w'] = df_year['고가'].max()
                 stock_info['low_52w'] = df_year['저가'].min()
             except:
@@ -328,6 +555,20 @@ def get_krx_stock_info(ticker):
         log_exception(logger, e, {"context": "KRX 종목 정보 조회", "ticker": ticker})
         return None
 
+def _yahoo_ticker(ticker, country=None):
+    """
+    Yahoo Finance 티커 포맷 조정 (국가별 거래소 접미사)
+    """
+    if country == '중국':
+        # 중국 주식은 보통 Shanghai (ss) 또는 Shenzhen (sz) 거래소
+        if ticker.endswith('.SS') or ticker.endswith('.SZ'):
+            return ticker
+        # 기본적으로 Shanghai 거래소 가정
+        return f"{ticker}.SS"
+    
+    # 미국 및 기타 국가는 그대로 사용
+    return ticker
+
 def get_international_stock_price(ticker, country=None, use_cache=True):
     """
     Yahoo Finance에서 해외 주식 현재가 조회
@@ -344,20 +585,7 @@ def get_international_stock_price(ticker, country=None, use_cache=True):
         logger.warning("yfinance 모듈이 설치되어 있지 않습니다.")
         return None
     
-    # 티커 포맷 조정 (Apple -> AAPL 등)
-    if country == '미국' and '.' not in ticker:
-        # 심볼에 .이 포함되어 있지 않으면 그대로 사용
-        yf_ticker = ticker
-    elif country == '중국':
-        # 중국 주식은 보통 Shanghai (ss) 또는 Shenzhen (sz) 거래소
-        if ticker.endswith('.SS') or ticker.endswith('.SZ'):
-            yf_ticker = ticker
-        else:
-            # 기본적으로 Shanghai 거래소 가정
-            yf_ticker = f"{ticker}.SS"
-    else:
-        # 기타 국가 및 기본값
-        yf_ticker = ticker
+    yf_ticker = _yahoo_ticker(ticker, country)
     
     try:
         # 캐시 확인
@@ -371,7 +599,7 @@ def get_international_stock_price(ticker, country=None, use_cache=True):
         stock_data = yf.Ticker(yf_ticker)
         
         # 최근 2일간의 데이터를 가져옴 (오늘 거래가 없을 수 있음)
-        history = stock_data.history(period="2d")
+        history = _call_provider('yfinance', stock_data.history, period="2d")
         
         if not history.empty:
             # 가장 최근 종가 반환
@@ -387,7 +615,7 @@ def get_international_stock_price(ticker, country=None, use_cache=True):
             # 조회 실패 시 Yahoo Finance API 직접 호출 시도
             try:
                 url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yf_ticker}"
-                response = requests.get(url, timeout=10)
+                response = _call_provider('yahoo_chart', requests.get, url, timeout=10)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -445,7 +673,7 @@ def get_international_stock_info(ticker, country=None):
         stock_data = yf.Ticker(yf_ticker)
         
         # 기본 정보 가져오기
-        info = stock_data.info
+        info = _call_provider('yfinance', getattr, stock_data, 'info')
         
         # 종목 정보 딕셔너리 생성
         stock_info = {
@@ -494,7 +722,7 @@ def get_exchange_rate(from_currency, to_currency, use_cache=True):
         # 소스 1: ExchangeRate-API
         try:
             url = f"https://api.exchangerate-api.com/v4/latest/{from_currency}"
-            response = requests.get(url, timeout=10)
+            response = _call_provider('exchangerate_api', requests.get, url, timeout=10)
             data = response.json()
             
             if 'rates' in data and to_currency in data['rates']:
@@ -511,7 +739,7 @@ def get_exchange_rate(from_currency, to_currency, use_cache=True):
         try:
             if API_KEYS.get('exchange_rate'):
                 url = f"https://openexchangerates.org/api/latest.json?app_id={API_KEYS['exchange_rate']}&base={from_currency}"
-                response = requests.get(url, timeout=10)
+                response = _call_provider('openexchangerates', requests.get, url, timeout=10)
                 data = response.json()
                 
                 if 'rates' in data and to_currency in data['rates']:
@@ -528,7 +756,7 @@ def get_exchange_rate(from_currency, to_currency, use_cache=True):
         try:
             symbol = f"{from_currency}{to_currency}=X"
             url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-            response = requests.get(url, timeout=10)
+            response = _call_provider('yahoo_chart', requests.get, url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -584,7 +812,7 @@ def get_stock_financial_data(ticker, market='KRX'):
             # 한국 종목 재무 데이터 (pykrx)
             try:
                 today = datetime.now().strftime("%Y%m%d")
-                df = stock.get_market_fundamental_by_ticker(today, ticker)
+                df = _call_provider('pykrx', stock.get_market_fundamental_by_ticker, today, ticker)
                 
                 if not df.empty:
                     financial_data = {
@@ -600,7 +828,7 @@ def get_stock_financial_data(ticker, market='KRX'):
             if yf:
                 try:
                     stock_data = yf.Ticker(ticker)
-                    info = stock_data.info
+                    info = _call_provider('yfinance', getattr, stock_data, 'info')
                     
                     financial_data = {
                         'ticker': ticker,
@@ -619,7 +847,7 @@ def get_stock_financial_data(ticker, market='KRX'):
                     
                     # 재무제표 데이터 (수익, 비용, 자산 등)
                     try:
-                        income_stmt = stock_data.income_stmt
+                        income_stmt = _call_provider('yfinance', getattr, stock_data, 'income_stmt')
                         if not income_stmt.empty:
                             financial_data['revenue_growth'] = (
                                 (income_stmt.loc['Total Revenue'][0] / income_stmt.loc['Total Revenue'][1] - 1) * 100
@@ -666,7 +894,7 @@ def get_dividend_info(ticker, market='KRX'):
         if market != 'KRX' and yf:
             try:
                 stock_data = yf.Ticker(ticker)
-                dividends = stock_data.dividends
+                dividends = _call_provider('yfinance', getattr, stock_data, 'dividends')
                 
                 if not dividends.empty:
                     # 최근 배당금
@@ -726,7 +954,7 @@ def get_dividend_info(ticker, market='KRX'):
         elif market == 'KRX' and PYKRX_AVAILABLE:
             try:
                 today = datetime.now().strftime("%Y%m%d")
-                df = stock.get_market_fundamental_by_ticker(today)
+                df = _call_provider('pykrx', stock.get_market_fundamental_by_ticker, today)
                 
                 if ticker in df.index and 'DIV' in df.columns:
                     div_yield = df.loc[ticker]['DIV']
@@ -791,7 +1019,7 @@ def get_market_index(index_code, use_cache=True):
                     today = datetime.now().strftime("%Y%m%d")
                     fromdate = (datetime.now() - timedelta(days=7)).strftime("%Y%m%d")
                     
-                    df = stock.get_index_ohlcv_by_date(fromdate, today, "1001")  # 코스피 지수
+                    df = _call_provider('pykrx', stock.get_index_ohlcv_by_date, fromdate, today, "1001")  # 코스피 지수
                     
                     if not df.empty:
                         last_row = df.iloc[-1]
@@ -816,7 +1044,7 @@ def get_market_index(index_code, use_cache=True):
                     today = datetime.now().strftime("%Y%m%d")
                     fromdate = (datetime.now() - timedelta(days=7)).strftime("%Y%m%d")
                     
-                    df = stock.get_index_ohlcv_by_date(fromdate, today, "2001")  # 코스닥 지수
+                    df = _call_provider('pykrx', stock.get_index_ohlcv_by_date, fromdate, today, "2001")  # 코스닥 지수
                     
                     if not df.empty:
                         last_row = df.iloc[-1]
@@ -852,7 +1080,7 @@ def get_market_index(index_code, use_cache=True):
             if yf:
                 try:
                     index_data = yf.Ticker(yf_code)
-                    history = index_data.history(period="5d")
+                    history = _call_provider('yfinance', index_data.history, period="5d")
                     
                     if not history.empty:
                         last_row = history.iloc[-1]
@@ -900,7 +1128,7 @@ def get_market_index(index_code, use_cache=True):
                     yf_code = f"^{yf_code}"
                 
                 url = f"https://query1.finance.yahoo.com/v8/finance/chart/{yf_code}"
-                response = requests.get(url, timeout=10)
+                response = _call_provider('yahoo_chart', requests.get, url, timeout=10)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -963,14 +1191,66 @@ def update_portfolio_history_job():
     
     try:
         from services.portfolio_service import update_all_portfolio_history
+        from services.returns_service import update_returns
         
         # 모든 사용자의 포트폴리오 이력 업데이트
         update_all_portfolio_history()
         
+        # 새 이력 기준 시간가중수익률 및 XIRR 계산 (전체 사용자)
+        update_returns()
+        
         logger.info("포트폴리오 이력 업데이트 작업 완료")
     except Exception as e:
         log_exception(logger, e, {"context": "포트폴리오 이력 업데이트 작업"})
 
+def check_portfolio_aggregates_job():
+    """
+    포트폴리오 집계 정합성 검사 작업 (스케줄러에서 호출, 불일치 시 재구성)
+    """
+    try:
+        from services.portfolio_service import check_portfolio_aggregates
+        
+        result = check_portfolio_aggregates(repair=True)
+        
+        logger.info(f"포트폴리오 집계 정합성 검사 완료: {result['checked_groups']}개 그룹, 불일치 {len(result['mismatches'])}건")
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 집계 정합성 검사 작업"})
+
+def update_benchmark_history_job():
+    """
+    벤치마크 지수 종가 이력 갱신 작업 (스케줄러에서 호출)
+    """
+    try:
+        from services.benchmark_service import update_benchmark_history
+        
+        update_benchmark_history()
+    except Exception as e:
+        log_exception(logger, e, {"context": "벤치마크 지수 이력 갱신 작업"})
+
+def update_betas_job():
+    """
+    보유 종목 회귀 베타 갱신 작업 (스케줄러에서 호출)
+    """
+    try:
+        from services.risk_service import update_betas
+        
+        updated = update_betas()
+        
+        logger.info(f"종목 베타 갱신 작업 완료: {updated}개 종목")
+    except Exception as e:
+        log_exception(logger, e, {"context": "종목 베타 갱신 작업"})
+
+def process_enrichment_queue_job():
+    """
+    신규 포지션 부가정보 작업 처리 (스케줄러에서 호출, 매수 직후에도 즉시 실행 요청됨)
+    """
+    try:
+        from services.enrichment_service import process_enrichment_queue
+        
+        process_enrichment_queue()
+    except Exception as e:
+        log_exception(logger, e, {"context": "부가정보 작업 처리 작업"})
+
 def update_market_indices():
     """
     주요 시장 지수 업데이트
@@ -1014,57 +1294,60 @@ def update_exchange_rates():
     except Exception as e:
         log_exception(logger, e, {"context": "환율 업데이트"})
 
-def run_scheduler():
-    """
-    스케줄러 실행 (별도 스레드)
-    """
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(1)
-        except Exception as e:
-            log_exception(logger, e, {"context": "스케줄러 실행"})
-            time.sleep(10)  # 오류 발생 시 10초 대기 후 재시도
-
 def schedule_price_updates():
     """
     가격 업데이트 스케줄링
+
+    여러 번 호출해도 같은 이름의 작업은 새 설정으로 교체되므로 중복 등록 오류가 나지 않습니다.
     """
+    from services.scheduler_service import get_scheduler, clean_job_runs
+
+    scheduler = get_scheduler()
+
     # 시장 시간대별 업데이트 (한국, 미국, 유럽 시장 시간 고려)
-    schedule.every().day.at("08:45").do(update_prices_job)  # 한국 시장 시작 전
-    schedule.every().day.at("15:30").do(update_prices_job)  # 한국 시장 종료 후
-    
-    schedule.every().day.at("23:45").do(update_prices_job)  # 미국 시장 오전 시작 전 (한국시간)
-    schedule.every().day.at("05:30").do(update_prices_job)  # 미국 시장 종료 후 (한국시간)
-    
+    # 08:45 한국 시장 시작 전, 15:30 한국 시장 종료 후,
+    # 23:45 미국 시장 오전 시작 전, 05:30 미국 시장 종료 후 (한국시간)
+    scheduler.add_job("update_prices", update_prices_job, at=["08:45", "15:30", "23:45", "05:30"], replace=True)
+
     # 포트폴리오 이력 및 성과 지표 업데이트 (밤 12시)
-    schedule.every().day.at("00:00").do(update_portfolio_history_job)
-    
+    scheduler.add_job("update_portfolio_history", update_portfolio_history_job, at="00:00", replace=True)
+
+    # 포트폴리오 집계 정합성 검사 (이력 업데이트 전)
+    scheduler.add_job("check_portfolio_aggregates", check_portfolio_aggregates_job, at="23:50", replace=True)
+
+    # 벤치마크 지수 종가 이력 갱신 (수익률 차트 비교용, 베타 계산 전)
+    scheduler.add_job("update_benchmark_history", update_benchmark_history_job, at="00:15", replace=True)
+
+    # 종목 베타 갱신 (이력 업데이트 후)
+    scheduler.add_job("update_betas", update_betas_job, at="00:30", replace=True)
+
     # 환율 업데이트 (하루 4번)
-    schedule.every().day.at("09:00").do(update_exchange_rates)
-    schedule.every().day.at("13:00").do(update_exchange_rates)
-    schedule.every().day.at("17:00").do(update_exchange_rates)
-    schedule.every().day.at("21:00").do(update_exchange_rates)
-    
+    scheduler.add_job("update_exchange_rates", update_exchange_rates, at=["09:00", "13:00", "17:00", "21:00"], replace=True)
+
     # 시장 지수 업데이트 (매 시간)
-    schedule.every().hour.do(update_market_indices)
-    
-    # 데이터베이스 캐시 정리 (매주 일요일 새벽)
-    schedule.every().sunday.at("04:00").do(clean_cache_database)
-    
-    # 스케줄러 실행 (별도 스레드에서 실행)
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-    
+    scheduler.add_job("update_market_indices", update_market_indices, interval=60 * 60, replace=True)
+
+    # 신규 포지션 부가정보 작업 큐 처리 (재시도 대상 포함)
+    from services.enrichment_service import ENRICHMENT_JOB_NAME, ENRICHMENT_SETTINGS
+    scheduler.add_job(ENRICHMENT_JOB_NAME, process_enrichment_queue_job,
+                      interval=ENRICHMENT_SETTINGS["job_interval"], jitter=0, replace=True)
+
+    # 데이터베이스 캐시 및 작업 기록 정리 (매주 일요일 새벽)
+    scheduler.add_job("clean_cache_database", clean_cache_database, at="04:00", weekday="sunday", replace=True)
+    scheduler.add_job("clean_job_runs", clean_job_runs, at="04:30", weekday="sunday", replace=True)
+
+    # 스케줄러 실행 (별도 스레드에서 대기, 작업은 스레드 풀에서 실행)
+    scheduler.start()
+
     logger.info("가격 업데이트 스케줄러 시작됨")
-    
+
     # 앱 시작시 한번 업데이트
     try:
         # API 키 로드
         load_api_keys_from_settings()
-        
+
         # 초기 업데이트 실행
-        update_prices_job()
+        scheduler.run_now("update_prices", wait=True)
     except Exception as e:
         log_exception(logger, e, {"context": "초기 가격 업데이트"})
 
@@ -1173,7 +1456,7 @@ def get_stock_chart_data(ticker, market='KRX', period='1y', interval='1d'):
                 else:  # 5y 또는 max
                     start_date = (datetime.now() - timedelta(days=365 * 5)).strftime("%Y%m%d")
                 
-                df = stock.get_market_ohlcv_by_date(start_date, end_date, ticker)
+                df = _call_provider('pykrx', stock.get_market_ohlcv_by_date, start_date, end_date, ticker)
                 
                 if not df.empty:
                     # 데이터 포맷 변환
@@ -1198,7 +1481,7 @@ def get_stock_chart_data(ticker, market='KRX', period='1y', interval='1d'):
         if yf:
             try:
                 stock_data = yf.Ticker(ticker)
-                history = stock_data.history(period=yf_period, interval=yf_interval)
+                history = _call_provider('yfinance', stock_data.history, period=yf_period, interval=yf_interval)
                 
                 if not history.empty:
                     # 데이터 포맷 변환
@@ -1223,4 +1506,318 @@ def get_stock_chart_data(ticker, market='KRX', period='1y', interval='1d'):
         return None
     except Exception as e:
         log_exception(logger, e, {"context": "차트 데이터 조회", "ticker": ticker, "period": period})
-        return None
\ No newline at end of file
+        return None
+
+def _history_market(country):
+    """
+    종가 이력 저장용 시장 코드 (국내: KRX, 해외: YF_국가)
+    """
+    return 'KRX' if country == '한국' else f"YF_{country}"
+
+def _missing_ranges(cursor, symbol, market, start_date, end_date):
+    """
+    프로바이더에서 아직 받아 오지 않은 기간 계산 (저장된 기간의 앞/뒤)
+    """
+    cursor.execute(
+        "SELECT start_date, end_date FROM price_history_coverage WHERE symbol = ? AND market = ?",
+        (symbol, market)
+    )
+    row = cursor.fetchone()
+    
+    if not row:
+        return [(start_date, end_date)]
+    
+    covered_start = datetime.strptime(row[0], '%Y-%m-%d').date()
+    covered_end = datetime.strptime(row[1], '%Y-%m-%d').date()
+    
+    ranges = []
+    if start_date < covered_start:
+        ranges.append((start_date, covered_start - timedelta(days=1)))
+    if end_date > covered_end:
+        ranges.append((covered_end + timedelta(days=1), end_date))
+    return ranges
+
+def _save_coverage(cursor, symbol, market, start_date, end_date):
+    cursor.execute(
+        """
+        INSERT INTO price_history_coverage (symbol, market, start_date, end_date, last_update)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (symbol, market) DO UPDATE SET
+            start_date = MIN(start_date, excluded.start_date),
+            end_date = MAX(end_date, excluded.end_date),
+            last_update = excluded.last_update
+        """,
+        (symbol, market, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), datetime.now())
+    )
+
+def _fetch_close_history(ticker, country, start_date, end_date):
+    """
+    프로바이더에서 일별 종가 조회
+
+    Returns:
+        list: (날짜 문자열, 종가) 목록 (조회 실패시 None)
+    """
+    if country == '한국':
+        if not PYKRX_AVAILABLE:
+            return None
+        df = _call_provider('pykrx', stock.get_market_ohlcv_by_date,
+                            fromdate=start_date.strftime("%Y%m%d"), todate=end_date.strftime("%Y%m%d"), ticker=ticker)
+        column = '종가'
+    else:
+        if not yf:
+            return None
+        stock_data = yf.Ticker(_yahoo_ticker(ticker, country))
+        # yfinance의 end는 포함되지 않으므로 하루 뒤까지 조회
+        df = _call_provider('yfinance', stock_data.history, start=start_date.strftime('%Y-%m-%d'),
+                            end=(end_date + timedelta(days=1)).strftime('%Y-%m-%d'), interval='1d')
+        column = 'Close'
+    
+    if df is None or df.empty:
+        return []
+    return list(zip(df.index.strftime('%Y-%m-%d'), df[column].astype(float)))
+
+def _stored_history(symbol, market, start_date, end_date, fetch, currency, source):
+    """
+    저장된 종가 이력 조회 (받아 오지 않은 기간만 fetch로 조회하여 daily_prices에 저장)
+    """
+    conn = get_db_connection('market')
+    cursor = conn.cursor()
+    
+    for fetch_start, fetch_end in _missing_ranges(cursor, symbol, market, start_date, end_date):
+        try:
+            closes = fetch(fetch_start, fetch_end)
+        except Exception as e:
+            logger.warning(f"종가 이력 조회 실패 ({symbol}, {fetch_start}~{fetch_end}): {e}")
+            continue
+        
+        if closes is None:
+            continue
+        
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO daily_prices (symbol, market, date, close, currency, source)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [(symbol, market, day, close, currency, source) for day, close in closes]
+        )
+        _save_coverage(cursor, symbol, market, fetch_start, fetch_end)
+    
+    conn.commit()
+    
+    cursor.execute(
+        """
+        SELECT date, close FROM daily_prices
+        WHERE symbol = ? AND market = ? AND date BETWEEN ? AND ?
+        ORDER BY date
+        """,
+        (symbol, market, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    )
+    history = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    
+    return history
+
+def get_price_history(ticker, country, start_date, end_date=None):
+    """
+    일별 종가 이력 조회 (저장된 이력을 우선 사용하고, 받아 오지 않은 기간만 프로바이더에서 조회하여 저장)
+
+    Args:
+        ticker (str): 종목코드
+        country (str): 국가 ('한국'이면 원화, 그 외는 달러 종가)
+        start_date (date): 시작일
+        end_date (date, optional): 종료일 (없으면 오늘)
+
+    Returns:
+        dict: {날짜 문자열: 종가}
+    """
+    end_date = end_date or datetime.now().date()
+    
+    try:
+        return _stored_history(
+            ticker, _history_market(country), start_date, end_date,
+            lambda fetch_start, fetch_end: _fetch_close_history(ticker, country, fetch_start, fetch_end),
+            'KRW' if country == '한국' else 'USD',
+            'pykrx' if country == '한국' else 'yfinance'
+        )
+    except Exception as e:
+        log_exception(logger, e, {"context": "종가 이력 조회", "ticker": ticker})
+        return {}
+
+def _fetch_index_history(index_code, start_date, end_date):
+    """
+    프로바이더에서 지수 일별 종가 조회
+
+    Returns:
+        list: (날짜 문자열, 종가) 목록 (조회 실패시 None)
+    """
+    index = INDEX_SYMBOLS[index_code]
+    
+    if 'krx' in index:
+        if not PYKRX_AVAILABLE:
+            return None
+        df = _call_provider('pykrx', stock.get_index_ohlcv_by_date,
+                            start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"), index['krx'])
+        column = '종가'
+    else:
+        if not yf:
+            return None
+        index_data = yf.Ticker(index['yahoo'])
+        df = _call_provider('yfinance', index_data.history, start=start_date.strftime('%Y-%m-%d'),
+                            end=(end_date + timedelta(days=1)).strftime('%Y-%m-%d'), interval='1d')
+        column = 'Close'
+    
+    if df is None or df.empty:
+        return []
+    return list(zip(df.index.strftime('%Y-%m-%d'), df[column].astype(float)))
+
+def get_index_history(index_code, start_date, end_date=None):
+    """
+    벤치마크 지수 일별 종가 이력 조회 (daily_prices에 market='INDEX'로 저장)
+
+    Args:
+        index_code (str): INDEX_SYMBOLS의 지수 코드 ('KS11', 'KQ11', 'SPX' 등)
+        start_date (date): 시작일
+        end_date (date, optional): 종료일 (없으면 오늘)
+
+    Returns:
+        dict: {날짜 문자열: 종가}
+    """
+    end_date = end_date or datetime.now().date()
+    if index_code not in INDEX_SYMBOLS:
+        logger.warning(f"지원하지 않는 지수 코드입니다: {index_code}")
+        return {}
+    
+    try:
+        return _stored_history(
+            index_code, INDEX_MARKET, start_date, end_date,
+            lambda fetch_start, fetch_end: _fetch_index_history(index_code, fetch_start, fetch_end),
+            INDEX_SYMBOLS[index_code]['currency'],
+            'pykrx' if 'krx' in INDEX_SYMBOLS[index_code] else 'yfinance'
+        )
+    except Exception as e:
+        log_exception(logger, e, {"context": "지수 이력 조회", "index": index_code})
+        return {}
+
+def get_kosdaq_tickers(date=None):
+    """
+    코스닥 상장 종목코드 목록 조회 (국내 종목 벤치마크 구분용)
+
+    Args:
+        date (date, optional): 기준일 (없으면 오늘)
+
+    Returns:
+        set: 코스닥 종목코드 (조회 실패시 빈 집합)
+    """
+    if not PYKRX_AVAILABLE:
+        return set()
+    
+    try:
+        # 휴장일에는 빈 목록이 오므로 최근 거래일까지 거슬러 올라감
+        day = date or datetime.now().date()
+        for offset in range(7):
+            tickers = _call_provider('pykrx', stock.get_market_ticker_list,
+                                     (day - timedelta(days=offset)).strftime("%Y%m%d"), market="KOSDAQ")
+            if tickers:
+                return set(tickers)
+        return set()
+    except Exception as e:
+        log_exception(logger, e, {"context": "코스닥 종목 목록 조회"})
+        return set()
+
+def get_fx_history(from_currency, to_currency, start_date, end_date=None):
+    """
+    일별 환율 이력 조회 (저장된 이력을 우선 사용하고, 받아 오지 않은 기간만 Yahoo Finance에서 조회하여 저장)
+
+    Args:
+        from_currency (str): 기준 통화 (예: 'USD')
+        to_currency (str): 목표 통화 (예: 'KRW')
+        start_date (date): 시작일
+        end_date (date, optional): 종료일 (없으면 오늘)
+
+    Returns:
+        dict: {날짜 문자열: 환율}
+    """
+    end_date = end_date or datetime.now().date()
+    pair = f"{from_currency}{to_currency}"
+    
+    try:
+        conn = get_db_connection('market')
+        cursor = conn.cursor()
+        
+        if yf:
+            for fetch_start, fetch_end in _missing_ranges(cursor, pair, 'FX', start_date, end_date):
+                try:
+                    fx_data = yf.Ticker(f"{pair}=X")
+                    df = _call_provider('yfinance', fx_data.history, start=fetch_start.strftime('%Y-%m-%d'),
+                                        end=(fetch_end + timedelta(days=1)).strftime('%Y-%m-%d'), interval='1d')
+                except Exception as e:
+                    logger.warning(f"환율 이력 조회 실패 ({pair}, {fetch_start}~{fetch_end}): {e}")
+                    continue
+                
+                if df is not None and not df.empty:
+                    cursor.executemany(
+                        """
+                        INSERT OR REPLACE INTO fx_history (from_currency, to_currency, date, rate, source)
+                        VALUES (?, ?, ?, ?, 'yfinance')
+                        """,
+                        [(from_currency, to_currency, day, float(rate))
+                         for day, rate in zip(df.index.strftime('%Y-%m-%d'), df['Close'])]
+                    )
+                _save_coverage(cursor, pair, 'FX', fetch_start, fetch_end)
+            
+            conn.commit()
+        
+        cursor.execute(
+            """
+            SELECT date, rate FROM fx_history
+            WHERE from_currency = ? AND to_currency = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+            """,
+            (from_currency, to_currency, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        )
+        history = {row[0]: row[1] for row in cursor.fetchall()}
+        conn.close()
+        
+        return history
+    except Exception as e:
+        log_exception(logger, e, {"context": "환율 이력 조회", "from": from_currency, "to": to_currency})
+        return {}
+
+def store_daily_closes(prices, fx_rates=None, date=None):
+    """
+    가격 업데이트 시 조회한 현재가를 당일 종가 이력으로 저장 (추가 프로바이더 호출 없음)
+
+    Args:
+        prices (list): (종목코드, 국가, 현지 통화 가격) 목록
+        fx_rates (dict, optional): {(기준 통화, 목표 통화): 환율}
+        date (date, optional): 기준일 (없으면 오늘)
+    """
+    day = (date or datetime.now().date()).strftime('%Y-%m-%d')
+    
+    try:
+        conn = get_db_connection('market')
+        cursor = conn.cursor()
+        
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO daily_prices (symbol, market, date, close, currency, source)
+            VALUES (?, ?, ?, ?, ?, 'snapshot')
+            """,
+            [
+                (ticker, _history_market(country), day, float(price), 'KRW' if country == '한국' else 'USD')
+                for ticker, country, price in prices if price
+            ]
+        )
+        
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO fx_history (from_currency, to_currency, date, rate, source)
+            VALUES (?, ?, ?, ?, 'snapshot')
+            """,
+            [(from_currency, to_currency, day, float(rate)) for (from_currency, to_currency), rate in (fx_rates or {}).items() if rate]
+        )
+        
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        log_exception(logger, e, {"context": "당일 종가 저장"})
@@ -0,0 +1,560 @@
+"""
+포트폴리오 최적화 서비스 (최소 분산, 최대 샤프, 위험 균형)
+
+보유 종목(및 선택한 후보 종목)의 수익률 행렬로 수축 공분산과 기대수익률을 추정하고,
+종목/섹터/국가 비중 제약을 만족하는 목표 비중을 가속 투영 경사법으로 계산합니다.
+효율적 투자선은 여러 위험 회피 계수를 행렬의 열로 놓고 한 번에 풀어 제약을 바꿀 때마다 바로 다시 계산할 수 있습니다.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+from utils.cache import versioned_cache
+from services.risk_service import load_return_matrix, shrink_covariance, RISK_SETTINGS
+
+logger = get_logger(__name__)
+
+# 최적화 설정
+OPTIMIZER_SETTINGS = {
+    "risk_free_rate": 3.0,        # 연간 무위험 수익률 (%)
+    "trading_days": 252,
+    "return_shrinkage": 0.5,      # 종목별 평균 수익률을 전체 평균 쪽으로 줄이는 비율 (추정 오차 완화)
+    "max_weight": 0.3,            # 기본 종목당 최대 비중
+    "frontier_points": 30,        # 효율적 투자선 점 개수
+    "max_iterations": 500,        # 경사법 최대 반복 수
+    "tolerance": 1e-7,            # 반복 간 비중 변화 수렴 기준
+    "dual_iterations": 50,        # 섹터와 국가 제약을 함께 쓸 때 승수 뉴턴법 최대 반복 수
+    "group_iterations": 200       # 섹터와 국가 제약을 함께 쓸 때 교대 투영 최대 반복 수
+}
+
+# 최적화 목표
+OPTIMIZATION_OBJECTIVES = {
+    "min_variance": "최소 분산",
+    "max_sharpe": "최대 샤프 비율",
+    "risk_parity": "위험 균형"
+}
+
+def _find_shift(values, lower, upper, target):
+    """
+    sum(clip(v - tau, lower, upper)) = target 을 만족하는 tau 계산 (열마다 독립, 정렬 기반 정확해)
+
+    g(tau)는 tau에 대해 구간별 선형 감소 함수이므로 꺾이는 점(v - upper, v - lower)을 정렬하고
+    누적 기울기/절편으로 g = target 이 되는 구간을 찾습니다.
+
+    Args:
+        values (numpy.ndarray): (종목 수, 열 수) 값
+        lower (numpy.ndarray): (종목 수, 열 수) 하한
+        upper (numpy.ndarray): (종목 수, 열 수) 상한
+        target (float): 목표 합계
+
+    Returns:
+        numpy.ndarray: 열별 tau
+    """
+    count = values.shape[0]
+    breakpoints = np.concatenate([values - upper, values - lower])
+
+    # 꺾이는 점을 지날 때 기울기/절편 변화: 상한 → 선형 구간 (기울기 -1, 절편 +v - u), 선형 → 하한 (기울기 +1, 절편 -v + l)
+    slope_change = np.concatenate([-np.ones_like(values), np.ones_like(values)])
+    intercept_change = np.concatenate([values - upper, lower - values])
+
+    order = np.argsort(breakpoints, axis=0)
+    breakpoints = np.take_along_axis(breakpoints, order, axis=0)
+    slopes = np.cumsum(np.take_along_axis(slope_change, order, axis=0), axis=0)
+    intercepts = upper.sum(axis=0) + np.cumsum(np.take_along_axis(intercept_change, order, axis=0), axis=0)
+
+    # 각 꺾이는 점에서의 g 값 (연속 함수이므로 점을 지난 뒤의 식으로 계산)
+    g = intercepts + slopes * breakpoints
+    position = np.minimum((g > target).sum(axis=0), 2 * count - 1)
+
+    columns = np.arange(values.shape[1])
+    previous = np.maximum(position - 1, 0)
+    slope = slopes[previous, columns]
+    intercept = intercepts[previous, columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.where(slope != 0, (target - intercept) / slope, breakpoints[position, columns])
+    return np.where(position == 0, breakpoints[0, columns], tau)
+
+def _project_capped(values, lower, upper, membership=None, caps=None):
+    """
+    {lower <= w <= upper, sum(w) = 1, 그룹별 합 <= 상한} 위로의 정확한 투영 (그룹은 서로 겹치지 않음)
+
+    상한에 걸리는 그룹 g는 그룹 합이 상한이 되는 이동량 t_g 이상으로 이동하므로,
+    종목 상한을 clip(v - t_g, lower, upper)로 낮춘 뒤 합계 1 투영을 한 번 더 하면 됩니다.
+    """
+    lower = np.broadcast_to(lower[:, None], values.shape)
+    upper = np.array(np.broadcast_to(upper[:, None], values.shape))
+
+    if membership is not None:
+        for members, cap in zip(membership.astype(bool), caps):
+            if cap >= 1 or upper[members].sum(axis=0).max() <= cap:
+                continue
+            shift = _find_shift(values[members], lower[members], upper[members], cap)
+            upper[members] = np.clip(values[members] - shift, lower[members], upper[members])
+
+    return np.clip(values - _find_shift(values, lower, upper, 1.0), lower, upper)
+
+def _project_dual(values, lower, upper, groups):
+    """
+    여러 종류의 그룹 상한이 함께 있을 때의 투영 (승수에 대한 준평활 뉴턴법)
+
+    w = clip(v - A'y, lower, upper) 에서 합계 1 제약과 상한 그룹 제약의 승수 y (상한 그룹 수 + 1개)만 풀면 되므로
+    열마다 작은 선형계만 풉니다. 쌍대 목적함수가 증가하도록 단계를 줄이며, 수렴 여부를 함께 반환합니다.
+
+    Returns:
+        tuple: (투영된 비중, 열별 수렴 여부)
+    """
+    rows, bounds = [np.ones(values.shape[0])], [1.0]
+    for membership, caps in groups:
+        for members, cap in zip(membership, caps):
+            if cap < 1:
+                rows.append(members)
+                bounds.append(cap)
+    matrix = np.array(rows)
+    bounds = np.array(bounds)[:, None]
+    size = len(bounds)
+    low_bound, high_bound = lower[:, None], upper[:, None]
+
+    def evaluate(multipliers, columns):
+        shifted = values[:, columns] - matrix.T @ multipliers
+        weights = np.clip(shifted, low_bound, high_bound)
+        dual = 0.5 * ((weights - values[:, columns]) ** 2).sum(axis=0)
+        dual += (multipliers * (matrix @ weights - bounds)).sum(axis=0)
+        return shifted, weights, dual
+
+    def sweep(multipliers, columns):
+        # 승수 하나씩 나머지를 고정하고 정확히 최대화 (쌍대 목적함수가 선형에 가까운 먼 점에서도 항상 증가)
+        # 합계 승수를 마지막에 풀어 합계 1은 항상 정확히 유지
+        multipliers = multipliers.copy()
+        for row in list(range(1, size)) + [0]:
+            rest = values[:, columns] - matrix.T @ multipliers + matrix[row][:, None] * multipliers[row]
+            members = matrix[row].astype(bool)
+            full_lower = np.broadcast_to(low_bound[members], (members.sum(), rest.shape[1]))
+            full_upper = np.broadcast_to(high_bound[members], (members.sum(), rest.shape[1]))
+            shift = _find_shift(rest[members], full_lower, full_upper, bounds[row, 0])
+            multipliers[row] = shift if row == 0 else np.maximum(shift, 0)
+        return multipliers
+
+    def check(multipliers, weights):
+        residual = matrix @ weights - bounds
+        error = np.abs(residual)
+        error[1:] = np.where(multipliers[1:] > 0, error[1:], np.maximum(residual[1:], 0))
+        return residual, error.max(axis=0) < 1e-10
+
+    everything = np.arange(values.shape[1])
+    multipliers = np.zeros((size, values.shape[1]))
+    multipliers[0] = _find_shift(
+        values, np.broadcast_to(low_bound, values.shape), np.broadcast_to(high_bound, values.shape), 1.0
+    )
+    shifted, weights, dual = evaluate(multipliers, everything)
+    residual, converged = check(multipliers, weights)
+
+    for _ in range(OPTIMIZER_SETTINGS["dual_iterations"]):
+        columns = np.flatnonzero(~converged)
+        if len(columns) == 0:
+            break
+        current = multipliers[:, columns]
+        current_residual = residual[:, columns]
+
+        # 합계 제약은 항상, 그룹 제약은 승수가 양수이거나 상한을 넘을 때 활성
+        active = np.ones_like(current_residual, dtype=bool)
+        active[1:] = (current[1:] > 0) | (current_residual[1:] > 0)
+        free = ((shifted[:, columns] > low_bound) & (shifted[:, columns] < high_bound)).astype(float)
+        hessian = np.einsum('dn,nk,en->kde', matrix, free, matrix)
+        hessian = np.where(active.T[:, :, None] & active.T[:, None, :], hessian, 0)
+        scale = np.maximum(np.einsum('kdd->kd', hessian).max(axis=1), 1.0)
+        hessian += np.eye(size)[None] * np.where(active.T, 1e-9 * scale[:, None], 1.0)[:, :, None]
+        direction = np.linalg.solve(hessian, np.where(active, current_residual, 0).T[:, :, None])[:, :, 0].T
+
+        # 쌍대 목적함수(오목)가 줄어들지 않을 때까지 단계 축소 (승수가 값의 범위보다 크게 움직일 필요는 없음)
+        spread = np.ptp(values[:, columns], axis=0) + 1.0
+        step = np.minimum(1.0, spread / np.maximum(np.abs(direction).max(axis=0), 1e-300))
+        for _ in range(60):
+            candidate = current + step * direction
+            candidate[1:] = np.maximum(candidate[1:], 0)
+            accepted = evaluate(candidate, columns)[2] >= dual[columns] - 1e-15
+            if accepted.all():
+                break
+            step = np.where(accepted, step, step / 2)
+
+        # 단계를 줄여야 했던 열(쌍대 목적함수가 선형에 가까운 경우)은 좌표 상승을 한 번 더 적용
+        candidate = np.where(accepted, candidate, current)
+        stalled = ~accepted | (step < 1)
+        if stalled.any():
+            candidate[:, stalled] = sweep(candidate[:, stalled], columns[stalled])
+        multipliers[:, columns] = candidate
+        shifted[:, columns], weights[:, columns], dual[columns] = evaluate(candidate, columns)
+        residual, converged = check(multipliers, weights)
+
+    return weights, converged
+
+def project_weights(values, lower, upper, groups=None):
+    """
+    비중 제약 집합 위로의 투영
+
+    종목별 상하한, 합계 1, 한 종류의 그룹(섹터 또는 국가) 합 상한까지는 정확히 투영하고,
+    두 종류의 그룹 제약이 함께 있으면 승수 뉴턴법으로 투영하되 수렴하지 않은 열은
+    두 정확한 투영 사이의 Dykstra 교대 투영으로 교집합 위의 투영을 구합니다.
+
+    Args:
+        values (numpy.ndarray): (종목 수, 열 수) 비중
+        lower (numpy.ndarray): 종목별 최소 비중
+        upper (numpy.ndarray): 종목별 최대 비중
+        groups (list, optional): (소속 행렬, 그룹별 상한) 목록
+
+    Returns:
+        numpy.ndarray: 투영된 비중
+    """
+    if not groups:
+        return _project_capped(values, lower, upper)
+    if len(groups) == 1:
+        return _project_capped(values, lower, upper, *groups[0])
+
+    weights, converged = _project_dual(values, lower, upper, groups)
+    if converged.all():
+        return weights
+
+    # 뉴턴법이 수렴하지 않은 열(제약 집합에서 먼 점)은 교대 투영
+    increments = [np.zeros_like(values[:, ~converged]) for _ in groups]
+    current = values[:, ~converged]
+    for _ in range(OPTIMIZER_SETTINGS["group_iterations"]):
+        previous = current
+        for i, group in enumerate(groups):
+            shifted = current + increments[i]
+            current = _project_capped(shifted, lower, upper, *group)
+            increments[i] = shifted - current
+        if np.abs(current - previous).max() < OPTIMIZER_SETTINGS["tolerance"]:
+            break
+
+    weights[:, ~converged] = current
+    return weights
+
+def solve_mean_variance(covariance, expected_returns, risk_aversions, lower, upper, groups=None):
+    """
+    평균-분산 문제를 여러 위험 회피 계수에 대해 동시에 풀기 (적응형 재시작 FISTA 가속 투영 경사법)
+
+    각 열 k에 대해 min w'Σw - λ_k μ'w 를 제약 집합 위에서 풉니다. λ = 0이면 최소 분산 포트폴리오입니다.
+
+    Args:
+        covariance (numpy.ndarray): 연환산 공분산
+        expected_returns (numpy.ndarray): 연환산 기대수익률
+        risk_aversions (numpy.ndarray): 위험 회피 계수 목록 (λ)
+        lower (numpy.ndarray): 종목별 최소 비중
+        upper (numpy.ndarray): 종목별 최대 비중
+        groups (list, optional): (소속 행렬, 그룹별 상한) 목록
+
+    Returns:
+        numpy.ndarray: (종목 수, λ 수) 최적 비중
+    """
+    count = len(expected_returns)
+    step = 1 / (2 * max(np.linalg.eigvalsh(covariance)[-1], 1e-12))
+    linear = np.outer(expected_returns, risk_aversions)
+
+    weights = project_weights(np.full((count, len(risk_aversions)), 1 / count), lower, upper, groups)
+    momentum_point = weights
+    momentum = np.ones(len(risk_aversions))
+
+    for _ in range(OPTIMIZER_SETTINGS["max_iterations"]):
+        gradient = 2 * covariance @ momentum_point - linear
+        updated = project_weights(momentum_point - step * gradient, lower, upper, groups)
+
+        # 진행 방향이 경사와 반대가 되면 가속을 초기화 (적응형 재시작)
+        restart = np.sum((momentum_point - updated) * (updated - weights), axis=0) > 0
+        next_momentum = np.where(restart, 1.0, (1 + np.sqrt(1 + 4 * momentum ** 2)) / 2)
+        momentum_point = updated + np.where(restart, 0.0, (momentum - 1) / next_momentum) * (updated - weights)
+
+        change = np.abs(updated - weights).max()
+        weights, momentum = updated, next_momentum
+        if change < OPTIMIZER_SETTINGS["tolerance"]:
+            break
+
+    return weights
+
+def solve_risk_parity(covariance, budgets=None):
+    """
+    위험 균형 포트폴리오 (종목별 위험 기여도가 예산에 비례)
+
+    볼록 문제 min 0.5 y'Σy - b'log(y) 를 뉴턴법으로 풀고 비중 합이 1이 되도록 정규화합니다.
+
+    Args:
+        covariance (numpy.ndarray): 공분산
+        budgets (numpy.ndarray, optional): 종목별 위험 예산 (없으면 균등)
+
+    Returns:
+        numpy.ndarray: 비중
+    """
+    count = covariance.shape[0]
+    budgets = np.full(count, 1 / count) if budgets is None else budgets / budgets.sum()
+
+    y = 1 / np.sqrt(np.diag(covariance))
+    y = y / np.sqrt(y @ covariance @ y)
+    for _ in range(50):
+        gradient = covariance @ y - budgets / y
+        hessian = covariance + np.diag(budgets / y ** 2)
+        direction = np.linalg.solve(hessian, gradient)
+
+        # 양수 조건을 유지하도록 단계 축소
+        step = 1.0
+        while np.any(y - step * direction <= 0):
+            step /= 2
+        y = y - step * direction
+
+        if np.abs(gradient).max() < OPTIMIZER_SETTINGS["tolerance"]:
+            break
+
+    return y / y.sum()
+
+def _portfolio_stats(weights, covariance, expected_returns):
+    volatility = np.sqrt(np.maximum(np.einsum('ik,ij,jk->k', weights, covariance, weights), 0))
+    returns = expected_returns @ weights
+    risk_free = OPTIMIZER_SETTINGS["risk_free_rate"] / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(volatility > 0, (returns - risk_free) / volatility, 0.0)
+    return returns, volatility, sharpe
+
+def _group_constraints(labels, limits):
+    """라벨 목록과 {라벨: 최대 비중}으로 (소속 행렬, 상한) 생성 (제약이 없는 그룹은 상한 1)"""
+    names = list(dict.fromkeys(labels))
+    membership = np.array([[label == name for label in labels] for name in names], dtype=float)
+    caps = np.array([min(float(limits.get(name, 1.0)), 1.0) for name in names])
+    return membership, caps
+
+def optimize_weights(covariance, expected_returns, objective='max_sharpe', min_weight=0.0, max_weight=None,
+                     sectors=None, countries=None, sector_limits=None, country_limits=None):
+    """
+    목표에 따른 최적 비중과 효율적 투자선 계산
+
+    Args:
+        covariance (numpy.ndarray): 연환산 공분산
+        expected_returns (numpy.ndarray): 연환산 기대수익률
+        objective (str): 'min_variance', 'max_sharpe', 'risk_parity'
+        min_weight (float): 종목당 최소 비중
+        max_weight (float, optional): 종목당 최대 비중 (없으면 기본값)
+        sectors (list, optional): 종목별 섹터
+        countries (list, optional): 종목별 국가
+        sector_limits (dict, optional): {섹터: 최대 비중}
+        country_limits (dict, optional): {국가: 최대 비중}
+
+    Returns:
+        dict: weights, frontier, 목표 포트폴리오 기대수익률/변동성/샤프 비율 (제약을 만족할 수 없으면 None)
+    """
+    count = len(expected_returns)
+    max_weight = OPTIMIZER_SETTINGS["max_weight"] if max_weight is None else max_weight
+
+    # 종목 수가 적으면 상한을 균등 비중까지 완화
+    max_weight = max(min(max_weight, 1.0), 1 / count)
+    min_weight = min(max(min_weight, 0.0), 1 / count)
+    lower = np.full(count, min_weight)
+    upper = np.full(count, max_weight)
+
+    groups = []
+    for labels, limits in ((sectors, sector_limits), (countries, country_limits)):
+        if labels is not None and limits:
+            membership, caps = _group_constraints(labels, limits)
+            # 그룹 상한과 종목 상한으로 합계 1을 채울 수 없으면 실행 불가
+            if np.minimum(caps, membership @ upper).sum() < 1 - 1e-9 or np.any(membership @ lower > caps + 1e-9):
+                return None
+            groups.append((membership, caps))
+
+    # 효율적 투자선: λ = 0 (최소 분산)부터 최대 수익 쪽까지
+    spread = max(np.abs(expected_returns - expected_returns.mean()).max(), 1e-6)
+    scale = 2 * np.linalg.eigvalsh(covariance)[-1] / spread
+    points = OPTIMIZER_SETTINGS["frontier_points"]
+    risk_aversions = np.concatenate([[0.0], np.geomspace(scale * 1e-3, scale, points - 1)])
+    frontier_weights = solve_mean_variance(covariance, expected_returns, risk_aversions, lower, upper, groups)
+    returns, volatility, sharpe = _portfolio_stats(frontier_weights, covariance, expected_returns)
+
+    if objective == 'min_variance':
+        target = frontier_weights[:, 0]
+    elif objective == 'risk_parity':
+        # 제약이 있으면 위험 균형 비중과 가장 가까운 실행 가능 비중
+        target = project_weights(solve_risk_parity(covariance)[:, None], lower, upper, groups)[:, 0]
+    else:
+        # 최대 샤프: 투자선에서 가장 좋은 점 주변을 한 번 더 촘촘히 계산
+        best = int(np.argmax(sharpe))
+        low = risk_aversions[max(best - 1, 0)]
+        high = risk_aversions[min(best + 1, points - 1)]
+        refined_aversions = np.linspace(low, high, points)
+        refined = solve_mean_variance(covariance, expected_returns, refined_aversions, lower, upper, groups)
+        refined_sharpe = _portfolio_stats(refined, covariance, expected_returns)[2]
+        target = refined[:, int(np.argmax(refined_sharpe))]
+
+    target_return, target_volatility, target_sharpe = _portfolio_stats(target[:, None], covariance, expected_returns)
+
+    order = np.argsort(volatility)
+    return {
+        "weights": target,
+        "expected_return": float(target_return[0]),
+        "volatility": float(target_volatility[0]),
+        "sharpe_ratio": float(target_sharpe[0]),
+        "frontier": {
+            "volatility": (volatility[order] * 100).tolist(),
+            "return": (returns[order] * 100).tolist(),
+            "sharpe_ratio": sharpe[order].tolist()
+        }
+    }
+
+@versioned_cache(maxsize=64)
+def load_optimization_inputs(user_id, candidates=()):
+    """
+    최적화 입력 (보유 종목 + 후보 종목의 기대수익률/공분산) 조회
+
+    사용자 데이터 버전별로 캐시되어 제약 조건만 바꾸는 재계산에서는 다시 조회하지 않습니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        candidates (tuple, optional): 후보 종목 ((종목코드, 국가, 섹터), ...)
+
+    Returns:
+        dict: 종목 정보, 현재 비중, 기대수익률, 공분산 (데이터가 없으면 None)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT 종목코드, 국가, MAX(종목명), MAX(섹터), SUM(평가액)
+            FROM portfolio
+            WHERE user_id = ? AND 수량 > 0 AND 평가액 > 0
+            GROUP BY 종목코드, 국가
+        """, (user_id,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        held = {(row[0], row[1]): row for row in rows}
+        symbols = list(held)
+        names = [held[symbol][2] or symbol[0] for symbol in symbols]
+        sectors = [held[symbol][3] or '미분류' for symbol in symbols]
+        values = [held[symbol][4] for symbol in symbols]
+
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=RISK_SETTINGS["lookback_days"])
+
+        # 후보 종목은 저장된 종가가 없으면 프로바이더에서 받아 저장
+        new_candidates = [candidate for candidate in candidates if (candidate[0], candidate[1]) not in held]
+        if new_candidates:
+            from services.market_service import get_price_history
+            for ticker, country, sector in new_candidates:
+                get_price_history(ticker, country, start_date, end_date)
+                symbols.append((ticker, country))
+                names.append(ticker)
+                sectors.append(sector or '미분류')
+                values.append(0.0)
+
+        if not symbols:
+            return None
+
+        dates, returns, included = load_return_matrix(symbols, start_date, end_date)
+        if len(included) < 2 or len(returns) < RISK_SETTINGS["min_observations"]:
+            return None
+
+        trading_days = OPTIMIZER_SETTINGS["trading_days"]
+        covariance = shrink_covariance(returns)[0] * trading_days
+
+        # 기대수익률: 종목별 평균을 전체 평균 쪽으로 수축
+        means = returns.mean(axis=0) * trading_days
+        shrinkage = OPTIMIZER_SETTINGS["return_shrinkage"]
+        expected_returns = (1 - shrinkage) * means + shrinkage * means.mean()
+
+        values = np.array(values, dtype=float)
+        return {
+            "symbols": [symbols[i] for i in included],
+            "names": [names[i] for i in included],
+            "sectors": [sectors[i] for i in included],
+            "values": values[included],
+            "total_value": float(values.sum()),
+            "excluded": [symbols[i] for i in np.setdiff1d(np.arange(len(symbols)), included)],
+            "expected_returns": expected_returns,
+            "covariance": covariance
+        }
+    except Exception as e:
+        log_exception(logger, e, {"context": "최적화 입력 조회", "user_id": user_id})
+        return None
+
+def run_optimization(user_id, objective='max_sharpe', min_weight=0.0, max_weight=None,
+                     sector_limits=None, country_limits=None, candidates=()):
+    """
+    사용자 포트폴리오 최적화 실행
+
+    종가 이력이 없어 제외된 종목은 현재 비중을 유지하고, 나머지 비중을 최적화 결과대로 배분합니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        objective (str): 'min_variance', 'max_sharpe', 'risk_parity'
+        min_weight (float, optional): 종목당 최소 비중
+        max_weight (float, optional): 종목당 최대 비중
+        sector_limits (dict, optional): {섹터: 최대 비중}
+        country_limits (dict, optional): {국가: 최대 비중}
+        candidates (tuple, optional): 후보 종목 ((종목코드, 국가, 섹터), ...)
+
+    Returns:
+        dict: 최적화 결과
+    """
+    try:
+        if objective not in OPTIMIZATION_OBJECTIVES:
+            return {"status": "error", "message": f"지원하지 않는 최적화 목표입니다: {objective}"}
+
+        inputs = load_optimization_inputs(user_id, tuple(candidates))
+        if not inputs:
+            return {"status": "error", "message": "최적화에 필요한 종가 이력이 부족합니다."}
+
+        countries = [country for _, country in inputs["symbols"]]
+        result = optimize_weights(
+            inputs["covariance"], inputs["expected_returns"], objective,
+            min_weight=min_weight, max_weight=max_weight,
+            sectors=inputs["sectors"], countries=countries,
+            sector_limits=sector_limits, country_limits=country_limits
+        )
+        if result is None:
+            return {"status": "error", "message": "제약 조건을 모두 만족하는 비중이 없습니다."}
+
+        # 분석 대상 종목의 현재 비중 합만큼을 목표 비중으로 재배분
+        total_value = inputs["total_value"] or 1
+        covered = inputs["values"].sum() / total_value if inputs["values"].sum() > 0 else 1.0
+        current = inputs["values"] / total_value
+        current_returns, current_volatility, current_sharpe = (
+            _portfolio_stats((current / covered)[:, None], inputs["covariance"], inputs["expected_returns"])
+            if inputs["values"].sum() > 0 else (np.zeros(1), np.zeros(1), np.zeros(1))
+        )
+
+        weights = [
+            {
+                "ticker": ticker,
+                "country": country,
+                "name": name,
+                "sector": sector,
+                "current_weight": float(current[i] * 100),
+                "target_weight": float(result["weights"][i] * covered * 100),
+                "target_value": float(result["weights"][i] * covered * total_value)
+            }
+            for i, ((ticker, country), name, sector) in enumerate(zip(inputs["symbols"], inputs["names"], inputs["sectors"]))
+        ]
+        weights.sort(key=lambda item: item["target_weight"], reverse=True)
+
+        sector_weights = {}
+        for item in weights:
+            sector = sector_weights.setdefault(item["sector"], {"current": 0.0, "target": 0.0})
+            sector["current"] += item["current_weight"]
+            sector["target"] += item["target_weight"]
+
+        return {
+            "status": "success",
+            "objective": objective,
+            "objective_name": OPTIMIZATION_OBJECTIVES[objective],
+            "weights": weights,
+            "sector_weights": sector_weights,
+            "excluded": [ticker for ticker, _ in inputs["excluded"]],
+            "expected_return": result["expected_return"] * 100,
+            "volatility": result["volatility"] * 100,
+            "sharpe_ratio": result["sharpe_ratio"],
+            "current": {
+                "expected_return": float(current_returns[0] * 100),
+                "volatility": float(current_volatility[0] * 100),
+                "sharpe_ratio": float(current_sharpe[0])
+            },
+            "frontier": result["frontier"]
+        }
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 최적화", "user_id": user_id})
+        return {"status": "error", "message": f"포트폴리오 최적화 중 오류가 발생했습니다: {str(e)}"}
@@ -0,0 +1,269 @@
+"""
+거래내역/배당금/적금 거래내역 페이지 조회 서비스 (키셋 페이지네이션)
+
+OFFSET 대신 마지막으로 본 행의 (날짜, id)를 커서로 넘겨 그 다음 행부터 읽으므로,
+내역이 수백만 건이어도 페이지마다 (사용자, 날짜) 인덱스에서 페이지 크기만큼만 읽습니다.
+커서는 [날짜, id] 목록이라 gr.State에 그대로 저장할 수 있습니다.
+"""
+from datetime import datetime, timedelta
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 페이지 조회 설정
+PAGING_SETTINGS = {
+    "page_size": 50,
+    "max_page_size": 500
+}
+
+# 내역별 조회 쿼리와 정렬 키 (날짜 내림차순, 같은 날짜는 id 내림차순)
+PAGE_SOURCES = {
+    "transactions": {
+        "select": """
+            SELECT t.id, p.종목코드, p.종목명, t.type, t.quantity, t.price, t.transaction_date,
+                   t.수수료, t.세금, t.실현손익, t.거래메모, p.국가, p.계좌
+            FROM transactions t
+            LEFT JOIN portfolio p ON t.portfolio_id = p.id
+        """,
+        "user_column": "t.user_id",
+        "date_column": "t.transaction_date",
+        "id_column": "t.id",
+        "date_key": "transaction_date",
+        "type_column": "t.type"
+    },
+    "dividends": {
+        "select": """
+            SELECT d.id, p.종목코드, p.종목명, d.지급일, d.배당액, d.배당유형, d.통화, d.세전금액, d.세후금액, p.계좌
+            FROM dividends d
+            LEFT JOIN portfolio p ON d.portfolio_id = p.id
+        """,
+        "user_column": "d.user_id",
+        "date_column": "d.지급일",
+        "id_column": "d.id",
+        "date_key": "지급일",
+        "type_column": "d.배당유형"
+    },
+    "savings_transactions": {
+        "select": """
+            SELECT st.id, st.savings_id, s.이름 AS 적금명, st.날짜, st.금액, st.거래유형, st.메모
+            FROM savings_transactions st
+            LEFT JOIN savings s ON st.savings_id = s.id
+        """,
+        "user_column": "st.user_id",
+        "date_column": "st.날짜",
+        "id_column": "st.id",
+        "date_key": "날짜",
+        "type_column": "st.거래유형"
+    }
+}
+
+def _date_conditions(date_column, start_date=None, end_date=None):
+    """
+    날짜 구간 조건 (인덱스를 쓸 수 있도록 컬럼에 함수를 씌우지 않고 문자열로 비교)
+
+    종료일은 그날 시각이 붙은 값까지 포함하도록 다음 날 미만으로 비교합니다.
+    """
+    conditions, params = [], []
+    if start_date:
+        conditions.append(f"{date_column} >= ?")
+        params.append(str(start_date)[:10])
+    if end_date:
+        next_day = datetime.strptime(str(end_date)[:10], "%Y-%m-%d").date() + timedelta(days=1)
+        conditions.append(f"{date_column} < ?")
+        params.append(next_day.isoformat())
+    return conditions, params
+
+def _portfolio_conditions(parent_column, user_id, ticker=None, account=None):
+    """종목(코드 또는 이름)/계좌 조건 (해당 포트폴리오 종목 id 목록으로 변환)"""
+    if not ticker and not account:
+        return [], []
+
+    where, params = ["user_id = ?"], [user_id]
+    if ticker:
+        where.append("(종목코드 = ? OR 종목명 LIKE ?)")
+        params.extend([ticker.strip().upper(), f"%{ticker.strip()}%"])
+    if account:
+        where.append("계좌 = ?")
+        params.append(account)
+
+    return [f"{parent_column} IN (SELECT id FROM portfolio WHERE {' AND '.join(where)})"], params
+
+def fetch_page(source, user_id, conditions=None, params=None, after=None, before=None, page_size=None):
+    """
+    키셋 페이지 조회
+
+    after가 있으면 그 커서보다 오래된 다음 페이지, before가 있으면 그 커서보다 최근인 이전 페이지를 읽습니다.
+    이전 페이지가 한 페이지에 못 미치면(첫 페이지에 도달) 첫 페이지를 돌려줍니다.
+
+    Args:
+        source (str): 'transactions', 'dividends', 'savings_transactions'
+        user_id (int): 사용자 ID
+        conditions (list, optional): 추가 WHERE 조건 목록
+        params (list, optional): 추가 조건 파라미터
+        after (list, optional): 다음 페이지 커서 [날짜, id]
+        before (list, optional): 이전 페이지 커서 [날짜, id]
+        page_size (int, optional): 페이지 크기
+
+    Returns:
+        dict: rows(최근 순), next_cursor, prev_cursor, has_next, has_prev, page_size
+    """
+    spec = PAGE_SOURCES[source]
+    page_size = max(1, min(int(page_size or PAGING_SETTINGS["page_size"]), PAGING_SETTINGS["max_page_size"]))
+    key = f"({spec['date_column']}, {spec['id_column']})"
+
+    where = [f"{spec['user_column']} = ?"] + list(conditions or [])
+    values = [user_id] + list(params or [])
+    order = "DESC"
+    if before:
+        where.append(f"{key} > (?, ?)")
+        values.extend(before)
+        order = "ASC"
+    elif after:
+        where.append(f"{key} < (?, ?)")
+        values.extend(after)
+
+    conn = get_db_connection('portfolio')
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        {spec['select'].strip()}
+        WHERE {' AND '.join(where)}
+        ORDER BY {spec['date_column']} {order}, {spec['id_column']} {order}
+        LIMIT ?
+        """,
+        values + [page_size + 1]
+    )
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if before:
+        if not more:
+            return fetch_page(source, user_id, conditions, params, page_size=page_size)
+        rows.reverse()
+        has_next, has_prev = True, True
+    else:
+        has_next, has_prev = more, after is not None
+
+    def cursor_of(row):
+        return [row[spec["date_key"]], row["id"]]
+
+    return {
+        "rows": rows,
+        "next_cursor": cursor_of(rows[-1]) if rows and has_next else None,
+        "prev_cursor": cursor_of(rows[0]) if rows and has_prev else None,
+        "has_next": has_next,
+        "has_prev": has_prev,
+        "page_size": page_size
+    }
+
+def _empty_page(page_size=None):
+    return {
+        "rows": [], "next_cursor": None, "prev_cursor": None, "has_next": False, "has_prev": False,
+        "page_size": page_size or PAGING_SETTINGS["page_size"]
+    }
+
+def get_transactions_page(user_id, after=None, before=None, page_size=None, ticker=None,
+                          transaction_type=None, account=None, start_date=None, end_date=None):
+    """
+    거래내역 페이지 조회 (거래일시 최근 순)
+
+    Args:
+        user_id (int): 사용자 ID
+        after (list, optional): 다음 페이지 커서
+        before (list, optional): 이전 페이지 커서
+        page_size (int, optional): 페이지 크기
+        ticker (str, optional): 종목코드 또는 종목명 일부
+        transaction_type (str, optional): 거래 유형 ('매수', '매도')
+        account (str, optional): 계좌
+        start_date (str, optional): 시작일 (YYYY-MM-DD)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+
+    Returns:
+        dict: 페이지 (rows, next_cursor, prev_cursor, has_next, has_prev)
+    """
+    try:
+        spec = PAGE_SOURCES["transactions"]
+        conditions, params = _portfolio_conditions("t.portfolio_id", user_id, ticker, account)
+        if transaction_type:
+            conditions.append(f"{spec['type_column']} = ?")
+            params.append(transaction_type)
+        date_conditions, date_params = _date_conditions(spec["date_column"], start_date, end_date)
+
+        return fetch_page("transactions", user_id, conditions + date_conditions, params + date_params,
+                          after, before, page_size)
+    except Exception as e:
+        log_exception(logger, e, {"context": "거래내역 페이지 조회", "user_id": user_id})
+        return _empty_page(page_size)
+
+def get_dividends_page(user_id, after=None, before=None, page_size=None, ticker=None,
+                       dividend_type=None, account=None, start_date=None, end_date=None):
+    """
+    배당금 내역 페이지 조회 (지급일 최근 순)
+
+    Args:
+        user_id (int): 사용자 ID
+        after (list, optional): 다음 페이지 커서
+        before (list, optional): 이전 페이지 커서
+        page_size (int, optional): 페이지 크기
+        ticker (str, optional): 종목코드 또는 종목명 일부
+        dividend_type (str, optional): 배당 유형 ('현금배당', '주식배당' 등)
+        account (str, optional): 계좌
+        start_date (str, optional): 시작일 (YYYY-MM-DD)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+
+    Returns:
+        dict: 페이지 (rows, next_cursor, prev_cursor, has_next, has_prev)
+    """
+    try:
+        spec = PAGE_SOURCES["dividends"]
+        conditions, params = _portfolio_conditions("d.portfolio_id", user_id, ticker, account)
+        if dividend_type:
+            conditions.append(f"{spec['type_column']} = ?")
+            params.append(dividend_type)
+        date_conditions, date_params = _date_conditions(spec["date_column"], start_date, end_date)
+
+        return fetch_page("dividends", user_id, conditions + date_conditions, params + date_params,
+                          after, before, page_size)
+    except Exception as e:
+        log_exception(logger, e, {"context": "배당금 내역 페이지 조회", "user_id": user_id})
+        return _empty_page(page_size)
+
+def get_savings_transactions_page(user_id, savings_id=None, after=None, before=None, page_size=None,
+                                  transaction_type=None, start_date=None, end_date=None):
+    """
+    적금 거래내역 페이지 조회 (거래일 최근 순)
+
+    Args:
+        user_id (int): 사용자 ID
+        savings_id (int, optional): 적금 ID (없으면 전체 적금)
+        after (list, optional): 다음 페이지 커서
+        before (list, optional): 이전 페이지 커서
+        page_size (int, optional): 페이지 크기
+        transaction_type (str, optional): 거래 유형 ('입금', '출금', '이자지급' 등)
+        start_date (str, optional): 시작일 (YYYY-MM-DD)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+
+    Returns:
+        dict: 페이지 (rows, next_cursor, prev_cursor, has_next, has_prev)
+    """
+    try:
+        spec = PAGE_SOURCES["savings_transactions"]
+        conditions, params = [], []
+        if savings_id:
+            conditions.append("st.savings_id = ?")
+            params.append(int(savings_id))
+        if transaction_type:
+            conditions.append(f"{spec['type_column']} = ?")
+            params.append(transaction_type)
+        date_conditions, date_params = _date_conditions(spec["date_column"], start_date, end_date)
+
+        return fetch_page("savings_transactions", user_id, conditions + date_conditions, params + date_params,
+                          after, before, page_size)
+    except Exception as e:
+        log_exception(logger, e, {"context": "적금 거래내역 페이지 조회", "user_id": user_id})
+        return _empty_page(page_size)
@@ -1,3 +1,7 @@
+import threading
+
+from utils.cache import versioned_cache, get_data_version
+
 def update_all_portfolio_history():
     """
     모든 사용자의 포트폴리오 이력 업데이트
@@ -10,26 +14,17 @@ def update_all_portfolio_history():
         # 오늘 날짜
         today = datetime.now().date()
         
-        # 모든 사용자 조회
-        cursor.execute("SELECT DISTINCT user_id FROM portfolio")
-        user_ids = [row[0] for row in cursor.fetchall() if row[0] is not None]
+        # 모든 사용자의 포트폴리오 합계 (집계 테이블에서 사용자당 한 행)
+        cursor.execute("""
+            SELECT user_id, total_value, total_invested, total_gain_loss, total_dividend
+            FROM portfolio_aggregates
+            WHERE dimension = 'total'
+        """)
+        user_summaries = cursor.fetchall()
         
         update_count = 0
         
-        for user_id in user_ids:
-            # 사용자 포트폴리오 요약 데이터 계산
-            cursor.execute("""
-                SELECT 
-                    SUM(평가액) as total_value,
-                    SUM(수량 * 평단가_원화) as total_invested,
-                    SUM(손익금액) as total_gain_loss,
-                    SUM(배당금) as total_dividend
-                FROM portfolio 
-                WHERE user_id = ?
-            """, (user_id,))
-            
-            portfolio_summary = cursor.fetchone()
-            
+        for user_id, *portfolio_summary in user_summaries:
             if portfolio_summary and portfolio_summary[0]:
                 total_value = portfolio_summary[0]
                 total_invested = portfolio_summary[1]
@@ -93,144 +88,94 @@ def update_all_portfolio_history():
         conn.commit()
         conn.close()
         
+        
         logger.info(f"포트폴리오 이력 업데이트 완료: {update_count}명의 사용자")
         return update_count
     except Exception as e:
         log_exception(logger, e, {"context": "포트폴리오 이력 업데이트"})
         return 0
 
-def get_portfolio_summary(user_id):
+class PortfolioSnapshot:
     """
-    포트폴리오 요약 정보 (시각화용)
+    사용자 포트폴리오 스냅샷 (대시보드/차트 공용)
+    
+    합계와 국가/계좌/증권사/섹터별 분포는 트리거로 유지되는 portfolio_aggregates 테이블에서 그룹 수만큼만 읽고,
+    상위 종목만 포트폴리오 테이블에서 조회합니다.
+    사용자 데이터 버전이 바뀔 때까지 사용자별로 캐시되며, 한 번의 화면 갱신에서 모든 차트가 같은 스냅샷을 사용합니다.
     
     Args:
         user_id (int): 사용자 ID
-        
-    Returns:
-        dict: 포트폴리오 요약 정보
+        aggregates (list): 집계 행 딕셔너리 목록 (dimension, dim_value, position_count, total_value, ...)
+        top_positions (list): 평가액 상위 종목 딕셔너리 목록
+        history (list): 포트폴리오 이력 (오래된 날짜부터)
+        dividends (list): 최근 배당금 이력
     """
-    try:
-        # 데이터베이스 연결
-        conn = get_db_connection('portfolio')
-        cursor = conn.cursor()
-        
-        # 포트폴리오 총 가치 및 손익 계산
-        cursor.execute("""
-            SELECT 
-                SUM(평가액) as total_value,
-                SUM(수량 * 평단가_원화) as total_invested,
-                SUM(손익금액) as total_gain_loss,
-                SUM(배당금) as total_dividend
-            FROM portfolio 
-            WHERE user_id = ?
-        """, (user_id,))
-        
-        summary = cursor.fetchone()
-        total_value = summary[0] or 0
-        total_invested = summary[1] or 0
-        total_gain_loss = summary[2] or 0
-        total_dividend = summary[3] or 0
-        
-        # 수익률 계산
-        if total_invested > 0:
-            total_return_percent = (total_gain_loss / total_invested * 100)
-            dividend_yield = (total_dividend / total_invested * 100)
-            total_return_with_dividend = ((total_gain_loss + total_dividend) / total_invested * 100)
-        else:
-            total_return_percent = 0
-            dividend_yield = 0
-            total_return_with_dividend = 0
+    def __init__(self, user_id, aggregates, top_positions, history, dividends):
+        self.user_id = user_id
+        self.history = history
+        self.dividends = dividends
+        self.created_at = datetime.now()
+        self.version = None  # 생성 시점의 사용자 데이터 버전
+        
+        # 합계
+        total = next((row for row in aggregates if row['dimension'] == 'total'), None) or {}
+        self.total_value = total.get('total_value', 0)
+        self.total_invested = total.get('total_invested', 0)
+        self.total_gain_loss = total.get('total_gain_loss', 0)
+        self.total_dividend = total.get('total_dividend', 0)
+        self.stock_count = total.get('position_count', 0)
+        
+        # 분포 (평가액 큰 순서)
+        self.distributions = {"country": {}, "account": {}, "broker": {}, "sector": {}}
+        for row in sorted(aggregates, key=lambda row: row['total_value'], reverse=True):
+            if row['dimension'] in self.distributions:
+                self.distributions[row['dimension']][row['dim_value']] = row['total_value']
         
-        # 적금 총액 계산
-        try:
-            from services.savings_service import get_savings_summary
-            savings_data = get_savings_summary(user_id)
-            savings_total = savings_data.get('total_amount', 0)
-            savings_list = savings_data.get('savings', [])
-        except (ImportError, AttributeError):
-            # 적금 모듈이 없거나 함수가 없는 경우
-            savings_total = 0
-            savings_list = []
-        
-        # 전체 자산 (주식 + 적금)
-        total_assets = total_value + savings_total
-        
-        # 주식 비중
-        stock_weight = (total_value / total_assets * 100) if total_assets > 0 else 0
-        
-        # 적금 비중
-        savings_weight = (savings_total / total_assets * 100) if total_assets > 0 else 0
-        
-        # 국가별 분포
-        cursor.execute("""
-            SELECT 국가, SUM(평가액) as value
-            FROM portfolio
-            WHERE user_id = ?
-            GROUP BY 국가
-            ORDER BY value DESC
-        """, (user_id,))
-        
-        country_distribution = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # 계좌별 분포
-        cursor.execute("""
-            SELECT 계좌, SUM(평가액) as value
-            FROM portfolio
-            WHERE user_id = ?
-            GROUP BY 계좌
-            ORDER BY value DESC
-        """, (user_id,))
-        
-        account_distribution = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # 증권사별 분포
-        cursor.execute("""
-            SELECT 증권사, SUM(평가액) as value
-            FROM portfolio
-            WHERE user_id = ?
-            GROUP BY 증권사
-            ORDER BY value DESC
-        """, (user_id,))
+        # 상위 5개 종목
+        self.top_stocks = [
+            {
+                "name": p['종목명'],
+                "value": p['평가액'],
+                "weight": p['투자비중'],
+                "country": p['국가'],
+                "sector": p['섹터'] or "미분류"
+            }
+            for p in top_positions
+        ]
+    
+    @classmethod
+    def build(cls, user_id):
+        """
+        데이터베이스에서 스냅샷 생성 (집계, 상위 종목, 이력, 배당금 각각 한 번씩 조회)
         
-        broker_distribution = {row[0]: row[1] for row in cursor.fetchall()}
+        Args:
+            user_id (int): 사용자 ID
+            
+        Returns:
+            PortfolioSnapshot: 스냅샷
+        """
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
         
-        # 섹터별 분포
+        # 합계 및 분포 (그룹 수만큼의 행)
         cursor.execute("""
-            SELECT COALESCE(섹터, '미분류') as sector, SUM(평가액) as value
-            FROM portfolio
+            SELECT dimension, dim_value, position_count, total_value, total_invested, total_gain_loss, total_dividend
+            FROM portfolio_aggregates
             WHERE user_id = ?
-            GROUP BY COALESCE(섹터, '미분류')
-            ORDER BY value DESC
         """, (user_id,))
         
-        sector_distribution = {row[0]: row[1] for row in cursor.fetchall()}
+        aggregates = [dict(row) for row in cursor.fetchall()]
         
         # 상위 5개 종목
         cursor.execute("""
-            SELECT 종목명, 평가액, 투자비중, 국가, 섹터
+            SELECT 종목명, 국가, 섹터, 평가액, 투자비중
             FROM portfolio
             WHERE user_id = ?
-            ORDER BY 평가액 DESC
+            ORDER BY 평가액 IS NULL, 평가액 DESC
             LIMIT 5
         """, (user_id,))
         
-        top_stocks = [
-            {
-                "name": row[0], 
-                "value": row[1], 
-                "weight": row[2],
-                "country": row[3],
-                "sector": row[4] or "미분류"
-            } 
-            for row in cursor.fetchall()
-        ]
-        
-        # 포트폴리오 종목 수
-        cursor.execute("""
-            SELECT COUNT(*) FROM portfolio WHERE user_id = ?
-        """, (user_id,))
-        
-        stock_count = cursor.fetchone()[0] or 0
+        top_positions = [dict(row) for row in cursor.fetchall()]
         
         # 포트폴리오 이력 (최근 30일)
         cursor.execute("""
@@ -241,15 +186,16 @@ def get_portfolio_summary(user_id):
             LIMIT 30
         """, (user_id,))
         
-        history = []
-        for row in cursor.fetchall():
-            history.append({
+        history = [
+            {
                 "date": row[0],
                 "value": row[1],
                 "return_percent": row[2],
                 "realized_profit": row[3] or 0,
                 "unrealized_profit": row[4] or 0
-            })
+            }
+            for row in cursor.fetchall()
+        ]
         
         # 역순 정렬 (오래된 날짜부터)
         history.reverse()
@@ -275,6 +221,163 @@ def get_portfolio_summary(user_id):
         
         conn.close()
         
+        return cls(user_id, aggregates, top_positions, history, dividends)
+
+# 사용자별 스냅샷 캐시 (데이터 버전이 바뀌면 다시 생성)
+_snapshot_cache = {}
+_snapshot_lock = threading.Lock()
+
+def get_portfolio_snapshot(user_id, use_cache=True):
+    """
+    사용자 포트폴리오 스냅샷 조회 (데이터 버전이 같으면 캐시된 스냅샷 반환)
+    
+    Args:
+        user_id (int): 사용자 ID
+        use_cache (bool, optional): 캐시 사용 여부
+        
+    Returns:
+        PortfolioSnapshot: 스냅샷
+    """
+    # 생성 전에 버전을 읽어 두면 생성 중 변경이 있어도 다음 조회에서 다시 생성됨
+    version = get_data_version(user_id)
+    
+    if use_cache and version is not None:
+        with _snapshot_lock:
+            snapshot = _snapshot_cache.get(user_id)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+    
+    snapshot = PortfolioSnapshot.build(user_id)
+    snapshot.version = version
+    
+    with _snapshot_lock:
+        _snapshot_cache[user_id] = snapshot
+    
+    return snapshot
+
+def check_portfolio_aggregates(user_id=None, repair=False, tolerance=0.01):
+    """
+    포트폴리오 집계 테이블 정합성 검사
+    
+    포트폴리오 테이블에서 다시 계산한 값과 portfolio_aggregates를 비교하고,
+    repair가 True이면 불일치가 있는 사용자의 집계를 처음부터 다시 만듭니다.
+    
+    Args:
+        user_id (int, optional): 사용자 ID (없으면 전체 사용자)
+        repair (bool, optional): 불일치 발견 시 재구성 여부
+        tolerance (float, optional): 금액 비교 허용 오차 (원)
+        
+    Returns:
+        dict: 검사 결과 (checked_groups, mismatches, repaired_users)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        
+        columns = ['position_count', 'total_value', 'total_invested', 'total_gain_loss', 'total_dividend']
+        
+        if user_id is None:
+            where, params = "1 = 1", ()
+            stored_where, stored_params = "", ()
+        else:
+            where, params = "user_id = ?", (user_id,) * len(PORTFOLIO_AGGREGATE_DIMENSIONS)
+            stored_where, stored_params = "WHERE user_id = ?", (user_id,)
+        
+        cursor.execute(portfolio_aggregate_select(where), params)
+        expected = {(row[0], row[1], row[2]): row[3:] for row in cursor.fetchall()}
+        
+        cursor.execute(f"""
+            SELECT user_id, dimension, dim_value, {', '.join(columns)}
+            FROM portfolio_aggregates {stored_where}
+        """, stored_params)
+        stored = {(row[0], row[1], row[2]): tuple(row[3:]) for row in cursor.fetchall()}
+        
+        mismatches = []
+        for key in expected.keys() | stored.keys():
+            expected_values = expected.get(key)
+            stored_values = stored.get(key)
+            
+            if expected_values is None or stored_values is None or any(
+                abs((a or 0) - (b or 0)) > tolerance for a, b in zip(expected_values, stored_values)
+            ):
+                mismatches.append({
+                    "user_id": key[0],
+                    "dimension": key[1],
+                    "dim_value": key[2],
+                    "expected": dict(zip(columns, expected_values)) if expected_values else None,
+                    "stored": dict(zip(columns, stored_values)) if stored_values else None
+                })
+        
+        repaired_users = []
+        if repair and mismatches:
+            repaired_users = sorted({item["user_id"] for item in mismatches})
+            for mismatch_user_id in repaired_users:
+                rebuild_portfolio_aggregates(cursor, mismatch_user_id)
+            conn.commit()
+            logger.warning(f"포트폴리오 집계 불일치 {len(mismatches)}건 재구성: 사용자 {repaired_users}")
+        
+        conn.close()
+        
+        return {
+            "checked_groups": len(expected),
+            "mismatches": mismatches,
+            "repaired_users": repaired_users
+        }
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 집계 정합성 검사", "user_id": user_id})
+        return {"checked_groups": 0, "mismatches": [], "repaired_users": []}
+
+@versioned_cache()
+def get_portfolio_summary(user_id, snapshot=None):
+    """
+    포트폴리오 요약 정보 (시각화용)
+    
+    Args:
+        user_id (int): 사용자 ID
+        snapshot (PortfolioSnapshot, optional): 사용할 스냅샷 (없으면 캐시된 스냅샷 사용)
+        
+    Returns:
+        dict: 포트폴리오 요약 정보
+    """
+    try:
+        if snapshot is None:
+            snapshot = get_portfolio_snapshot(user_id)
+        
+        total_value = snapshot.total_value
+        total_invested = snapshot.total_invested
+        total_gain_loss = snapshot.total_gain_loss
+        total_dividend = snapshot.total_dividend
+        
+        # 수익률 계산
+        if total_invested > 0:
+            total_return_percent = (total_gain_loss / total_invested * 100)
+            dividend_yield = (total_dividend / total_invested * 100)
+            total_return_with_dividend = ((total_gain_loss + total_dividend) / total_invested * 100)
+        else:
+            total_return_percent = 0
+            dividend_yield = 0
+            total_return_with_dividend = 0
+        
+        # 적금 총액 계산 (적금은 포트폴리오 스냅샷과 별도로 매번 조회)
+        try:
+            from services.savings_service import get_savings_summary
+            savings_data = get_savings_summary(user_id)
+            savings_total = savings_data.get('total_amount', 0)
+            savings_list = savings_data.get('savings', [])
+        except (ImportError, AttributeError):
+            # 적금 모듈이 없거나 함수가 없는 경우
+            savings_total = 0
+            savings_list = []
+        
+        # 전체 자산 (주식 + 적금)
+        total_assets = total_value + savings_total
+        
+        # 주식 비중
+        stock_weight = (total_value / total_assets * 100) if total_assets > 0 else 0
+        
+        # 적금 비중
+        savings_weight = (savings_total / total_assets * 100) if total_assets > 0 else 0
+        
         return {
             "summary": {
                 "total_value": total_value,
@@ -288,17 +391,12 @@ def get_portfolio_summary(user_id):
                 "total_assets": total_assets,
                 "stock_weight": stock_weight,
                 "savings_weight": savings_weight,
-                "stock_count": stock_count
-            },
-            "distributions": {
-                "country": country_distribution,
-                "account": account_distribution,
-                "broker": broker_distribution,
-                "sector": sector_distribution
+                "stock_count": snapshot.stock_count
             },
-            "top_stocks": top_stocks,
-            "history": history,
-            "dividends": dividends,
+            "distributions": {name: dict(values) for name, values in snapshot.distributions.items()},
+            "top_stocks": [dict(stock) for stock in snapshot.top_stocks],
+            "history": list(snapshot.history),
+            "dividends": list(snapshot.dividends),
             "savings": savings_list
         }
     except Exception as e:
@@ -353,7 +451,7 @@ def load_transactions(user_id, limit=100):
         FROM transactions t
         LEFT JOIN portfolio p ON t.portfolio_id = p.id
         WHERE t.user_id = ?
-        ORDER BY t.transaction_date DESC
+        ORDER BY t.transaction_date DESC, t.id DESC
         LIMIT ?
         """
         
@@ -391,6 +489,93 @@ def load_transactions(user_id, limit=100):
         log_exception(logger, e, {"context": "거래내역 로드"})
         return pd.DataFrame()
 
+def load_transactions_page(user_id, after=None, before=None, transaction_type=None, search=None,
+                           start_date=None, end_date=None, page_size=None):
+    """
+    거래내역 한 페이지 로드 (키셋 페이지네이션, 거래내역 화면 표 형식)
+    
+    Args:
+        user_id (int): 사용자 ID
+        after (list, optional): 다음 페이지 커서
+        before (list, optional): 이전 페이지 커서
+        transaction_type (str, optional): 거래 유형 ('매수', '매도')
+        search (str, optional): 종목코드 또는 종목명 일부
+        start_date (str, optional): 시작일 (YYYY-MM-DD)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+        page_size (int, optional): 페이지 크기
+        
+    Returns:
+        tuple: (거래내역 DataFrame, 페이지 정보 dict (rows 제외))
+    """
+    page = get_transactions_page(
+        user_id, after=after, before=before, page_size=page_size, ticker=search or None,
+        transaction_type=transaction_type, start_date=start_date, end_date=end_date
+    )
+    rows = page.pop("rows")
+    
+    try:
+        columns = ["ID", "종목명", "거래유형", "수량", "가격", "거래일시", "수수료", "세금", "실현손익", "메모"]
+        if not rows:
+            return pd.DataFrame(columns=columns), page
+        
+        df = pd.DataFrame(rows)
+        df = pd.DataFrame({
+            "ID": df["id"],
+            "종목명": df["종목명"].fillna('매도완료 종목'),
+            "거래유형": df["type"],
+            "수량": df["quantity"].apply(lambda x: f"{float(x):,.2f}" if pd.notnull(x) else ""),
+            "가격": df["price"].apply(lambda x: f"{x:,.0f}원" if pd.notnull(x) else ""),
+            "거래일시": pd.to_datetime(df["transaction_date"], errors='coerce', format='mixed').dt.strftime('%Y-%m-%d %H:%M'),
+            "수수료": df["수수료"].apply(lambda x: f"{x:,.0f}원" if pd.notnull(x) and x != 0 else "-"),
+            "세금": df["세금"].apply(lambda x: f"{x:,.0f}원" if pd.notnull(x) and x != 0 else "-"),
+            "실현손익": df["실현손익"].apply(lambda x: f"{x:,.0f}원" if pd.notnull(x) and x != 0 else "-"),
+            "메모": df["거래메모"].fillna("-")
+        })
+        return df, page
+    except Exception as e:
+        log_exception(logger, e, {"context": "거래내역 페이지 로드"})
+        return pd.DataFrame(), page
+
+def load_dividends_page(user_id, after=None, before=None, start_date=None, end_date=None, page_size=None):
+    """
+    배당금 내역 한 페이지 로드 (키셋 페이지네이션, 배당금 화면 표 형식)
+    
+    Args:
+        user_id (int): 사용자 ID
+        after (list, optional): 다음 페이지 커서
+        before (list, optional): 이전 페이지 커서
+        start_date (str, optional): 시작일 (YYYY-MM-DD)
+        end_date (str, optional): 종료일 (YYYY-MM-DD, 포함)
+        page_size (int, optional): 페이지 크기
+        
+    Returns:
+        tuple: (배당금 내역 DataFrame, 페이지 정보 dict (rows 제외))
+    """
+    page = get_dividends_page(user_id, after=after, before=before, page_size=page_size,
+                              start_date=start_date, end_date=end_date)
+    rows = page.pop("rows")
+    
+    try:
+        columns = ["ID", "종목명", "배당일", "배당액", "통화", "세전금액", "세후금액"]
+        if not rows:
+            return pd.DataFrame(columns=columns), page
+        
+        df = pd.DataFrame(rows)
+        money = lambda x: f"{x:,.0f}" if pd.notnull(x) else ""
+        df = pd.DataFrame({
+            "ID": df["id"],
+            "종목명": df["종목명"].fillna('매도완료 종목'),
+            "배당일": df["지급일"].astype(str).str.slice(0, 10),
+            "배당액": df["배당액"].apply(money),
+            "통화": df["통화"].fillna("KRW"),
+            "세전금액": df["세전금액"].apply(money),
+            "세후금액": df["세후금액"].apply(money)
+        })
+        return df, page
+    except Exception as e:
+        log_exception(logger, e, {"context": "배당금 내역 페이지 로드"})
+        return pd.DataFrame(), page
+
 def get_owned_stocks(user_id):
     """
     사용자가 보유한 종목 목록 조회
@@ -517,6 +702,7 @@ def get_stock_details(ticker, account, user_id=None):
         log_exception(logger, e, {"context": "종목 상세 정보 조회", "ticker": ticker})
         return None
 
+@versioned_cache()
 def calculate_portfolio_risk(user_id):
     """
     포트폴리오 위험 지표 계산
@@ -561,12 +747,11 @@ def calculate_portfolio_risk(user_id):
         else:
             portfolio_beta = 1.0  # 기본값
         
-        # 섹터별 비중 계산
+        # 섹터별 비중 계산 (집계 테이블)
         cursor.execute("""
-            SELECT COALESCE(섹터, '미분류') as sector, SUM(평가액) as value
-            FROM portfolio
-            WHERE user_id = ? AND 수량 > 0
-            GROUP BY COALESCE(섹터, '미분류')
+            SELECT dim_value as sector, total_value as value
+            FROM portfolio_aggregates
+            WHERE user_id = ? AND dimension = 'sector'
         """, (user_id,))
         
         sectors = [dict(zip(['sector', 'value'], row)) for row in cursor.fetchall()]
@@ -594,12 +779,11 @@ def calculate_portfolio_risk(user_id):
             max_loss_stock = max_loss_row[0]
             max_loss_weight = max_loss_row[1]
         
-        # 국가별 비중 계산 (지역 다각화)
+        # 국가별 비중 계산 (지역 다각화, 집계 테이블)
         cursor.execute("""
-            SELECT 국가, SUM(평가액) as value
-            FROM portfolio
-            WHERE user_id = ? AND 수량 > 0
-            GROUP BY 국가
+            SELECT dim_value, total_value as value
+            FROM portfolio_aggregates
+            WHERE user_id = ? AND dimension = 'country'
         """, (user_id,))
         
         country_weights = {}
@@ -620,9 +804,16 @@ def calculate_portfolio_risk(user_id):
         
         conn.close()
         
+        # 공분산 기반 변동성/VaR (종가 이력이 부족하면 None)
+        covariance_risk = calculate_covariance_risk(user_id)
+        
         # 위험 지표 요약
         risk_metrics = {
             "portfolio_beta": portfolio_beta,
+            "volatility": covariance_risk["annualized_volatility"] if covariance_risk else None,
+            "value_at_risk": covariance_risk["var"] if covariance_risk else {},
+            "risk_contributions": covariance_risk["contributions"] if covariance_risk else [],
+            "covariance_risk": covariance_risk,
             "sector_concentration": {
                 "hhi": hhi,
                 "interpretation": get_hhi_interpretation(hhi)
@@ -641,6 +832,10 @@ def calculate_portfolio_risk(user_id):
         log_exception(logger, e, {"context": "포트폴리오 위험 계산"})
         return {
             "portfolio_beta": 1.0,
+            "volatility": None,
+            "value_at_risk": {},
+            "risk_contributions": [],
+            "covariance_risk": None,
             "sector_concentration": {"hhi": 0, "interpretation": "데이터 없음"},
             "top5_concentration": 0,
             "max_loss_stock": {"name": None, "weight": 0},
@@ -703,6 +898,7 @@ def calculate_risk_level(beta, hhi, top5_concentration):
     else:
         return "매우 높음"
 
+@versioned_cache()
 def calculate_optimal_portfolio(user_id):
     """
     포트폴리오 최적화 추천
@@ -715,7 +911,11 @@ def calculate_optimal_portfolio(user_id):
     """
     try:
         # 현재 포트폴리오 정보 조회
-        current_portfolio = load_portfolio_details(user_id)
+        current_portfolio = load_portfolio_details(
+            user_id,
+            include_transactions=False,
+            fields=['종목코드', '종목명', '손익수익']
+        )
         
         if not current_portfolio or not current_portfolio.get('items'):
             return {
@@ -736,36 +936,20 @@ def calculate_optimal_portfolio(user_id):
                     "weight": top_sector[1],
                     "recommendation": "비중 축소 고려"
                 })
-            
-            # 섹터별 권장 비중 (예시)
-            recommended_weights = {
-                'IT': 0.20,
-                '금융': 0.15,
-                '헬스케어': 0.15,
-                '소비재': 0.12,
-                '산업재': 0.10,
-                '통신': 0.08,
-                '에너지': 0.08,
-                '유틸리티': 0.05,
-                '원자재': 0.05,
-                '부동산': 0.02
-            }
-            
-            # 권장 비중과 실제 비중 비교
-            for sector, rec_weight in recommended_weights.items():
-                actual_weight = 0
-                for s, w in sector_weights.items():
-                    if sector in s:  # 부분 매칭 (예: 'IT서비스'는 'IT'로 매칭)
-                        actual_weight += w
-                
-                # 큰 차이가 있는 경우 추천
-                if actual_weight < rec_weight * 0.5:  # 권장 비중의 절반 미만
-                    sector_imbalances.append({
-                        "sector": sector,
-                        "current_weight": actual_weight,
-                        "recommended_weight": rec_weight,
-                        "recommendation": "비중 확대 고려"
-                    })
+        
+        # 섹터별 목표 비중은 최적화 결과(최대 샤프 비율)를 기준으로 비교
+        optimization = run_optimization(user_id)
+        if optimization.get("status") == "success":
+            for sector, weights in optimization["sector_weights"].items():
+                difference = weights["target"] - weights["current"]
+                if abs(difference) < SECTOR_IMBALANCE_THRESHOLD:
+                    continue
+                sector_imbalances.append({
+                    "sector": sector,
+                    "current_weight": weights["current"] / 100,
+                    "recommended_weight": weights["target"] / 100,
+                    "recommendation": "비중 확대 고려" if difference > 0 else "비중 축소 고려"
+                })
         
         # 국가별 불균형 감지
         country_weights = current_portfolio.get('countries', {})
@@ -869,7 +1053,8 @@ def calculate_optimal_portfolio(user_id):
             "country_imbalances": country_imbalances,
             "stock_concentrations": stock_concentrations,
             "low_performers": low_performers,
-            "cash_recommendation": cash_recommendation
+            "cash_recommendation": cash_recommendation,
+            "optimization": optimization
         }
     except Exception as e:
         log_exception(logger, e, {"context": "포트폴리오 최적화 추천"})
@@ -891,296 +1076,83 @@ def export_portfolio_to_csv(user_id, include_transactions=False):
     """
     try:
         import os
-        import csv
-        from datetime import datetime
         
-        # 데이터베이스에서 포트폴리오 정보 조회
-        conn = get_db_connection('portfolio')
-        cursor = conn.cursor()
+        datasets = ("portfolio", "transactions") if include_transactions else ("portfolio",)
+        results = export_user_data(user_id, datasets=datasets, fmt="csv")
         
-        cursor.execute("""
-            SELECT * FROM portfolio WHERE user_id = ? ORDER BY 투자비중 DESC
-        """, (user_id,))
+        errors = [result["error"] for result in results if result.get("error")]
+        if errors:
+            return f"데이터 내보내기 중 오류가 발생했습니다: {errors[0]}"
         
-        portfolio_data = [dict(row) for row in cursor.fetchall()]
+        # 행이 없는 데이터셋 파일은 남기지 않음
+        for result in results:
+            if result["rows"] == 0:
+                os.remove(result["path"])
         
-        if not portfolio_data:
+        portfolio_result = results[0]
+        if portfolio_result["rows"] == 0:
             return "내보낼 포트폴리오 데이터가 없습니다."
         
-        # 거래내역 조회
-        transactions_data = []
-        if include_transactions:
-            cursor.execute("""
-                SELECT t.*, p.종목명 
-                FROM transactions t
-                LEFT JOIN portfolio p ON t.portfolio_id = p.id
-                WHERE t.user_id = ?
-                ORDER BY t.transaction_date DESC
-            """, (user_id,))
-            
-            transactions_data = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        # 내보내기 디렉토리 생성
-        export_dir = os.path.join('data', 'exports')
-        os.makedirs(export_dir, exist_ok=True)
-        
-        # 파일명 생성
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        portfolio_file = os.path.join(export_dir, f"portfolio_{user_id}_{timestamp}.csv")
-        
-        # 포트폴리오 데이터 CSV 저장
-        with open(portfolio_file, 'w', newline='', encoding='utf-8') as f:
-            if portfolio_data:
-                fieldnames = list(portfolio_data[0].keys())
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(portfolio_data)
-        
-        # 거래내역 저장
-        if include_transactions and transactions_data:
-            trans_file = os.path.join(export_dir, f"transactions_{user_id}_{timestamp}.csv")
-            
-            with open(trans_file, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = list(transactions_data[0].keys())
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(transactions_data)
-            
-            return f"포트폴리오와 거래내역을 내보냈습니다.\n포트폴리오: {portfolio_file}\n거래내역: {trans_file}"
+        # 거래내역 저장 결과
+        if include_transactions and results[1]["rows"] > 0:
+            return f"포트폴리오와 거래내역을 내보냈습니다.\n포트폴리오: {portfolio_result['path']}\n거래내역: {results[1]['path']}"
         
-        return f"포트폴리오를 내보냈습니다: {portfolio_file}"
+        return f"포트폴리오를 내보냈습니다: {portfolio_result['path']}"
     except Exception as e:
         log_exception(logger, e, {"context": "포트폴리오 CSV 내보내기"})
         return f"데이터 내보내기 중 오류가 발생했습니다: {str(e)}"
 
 def import_portfolio_from_csv(user_id, file_path):
     """
-    CSV 파일에서 포트폴리오 데이터 가져오기
+    CSV/XLSX 파일에서 포트폴리오 데이터 가져오기 (보유 잔고 또는 증권사 거래내역)
     
     Args:
         user_id (int): 사용자 ID
-        file_path (str): CSV 파일 경로
+        file_path (str): CSV 또는 XLSX 파일 경로
         
     Returns:
         tuple: (성공 여부, 메시지)
     """
     try:
-        import csv
-        import os
-        
-        if not os.path.exists(file_path):
-            return False, f"파일을 찾을 수 없습니다: {file_path}"
-        
-        # CSV 파일 읽기
-        stocks = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # 필수 필드 확인
-                required_fields = ['종목코드', '종목명', '수량', '평단가_원화', '국가', '증권사', '계좌']
-                if not all(field in row for field in required_fields):
-                    continue
-                
-                # 문자열 데이터 정리 (쉼표, 통화기호 등 제거)
-                for key in ['수량', '평단가_원화']:
-                    if key in row:
-                        row[key] = float(re.sub(r'[^\d.-]', '', str(row[key])))
-                
-                stocks.append(row)
-        
-        if not stocks:
-            return False, "가져올 포트폴리오 데이터가 없거나 형식이 올바르지 않습니다."
-        
-        # 데이터베이스 연결
-        conn = get_db_connection('portfolio')
-        cursor = conn.cursor()
-        
-        # 기존 포트폴리오 유지 또는 삭제 여부 확인 (기본: 유지)
-        
-        # 데이터 추가
-        add_count = 0
-        update_count = 0
-        
-        for stock in stocks:
-            # 기존 종목 확인
-            cursor.execute(
-                "SELECT id FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
-                (stock['종목코드'], stock['계좌'], user_id)
-            )
-            existing = cursor.fetchone()
-            
-            if existing:
-                # 기존 종목 업데이트
-                update_query = """
-                    UPDATE portfolio SET
-                    수량 = ?, 평단가_원화 = ?, 국가 = ?, 증권사 = ?, 종목명 = ?, last_update = ?
-                    WHERE id = ?
-                """
-                cursor.execute(
-                    update_query,
-                    (stock['수량'], stock['평단가_원화'], stock['국가'], stock['증권사'], stock['종목명'], datetime.now(), existing[0])
-                )
-                update_count += 1
-            else:
-                # 새 종목 추가
-                insert_query = """
-                    INSERT INTO portfolio (
-                        user_id, 종목코드, 종목명, 수량, 평단가_원화, 국가, 증권사, 계좌, last_update
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                cursor.execute(
-                    insert_query,
-                    (user_id, stock['종목코드'], stock['종목명'], stock['수량'], stock['평단가_원화'], 
-                     stock['국가'], stock['증권사'], stock['계좌'], datetime.now())
-                )
-                add_count += 1
-        
-        conn.commit()
-        conn.close()
-        
-        # 실시간 가격 업데이트
-        update_all_prices(user_id)
-        
-        return True, f"포트폴리오 가져오기 완료: {add_count}개 추가, {update_count}개 업데이트"
-    except Exception as e:
-        log_exception(logger, e, {"context": "포트폴리오 CSV 가져오기"})
-        return False, f"데이터 가져오기 중 오류가 발생했습니다: {str(e)}"
-
-def get_portfolio_performance_metrics(user_id, period='1y'):
-    """
-    포트폴리오 성과 지표 계산
-    
-    Args:
-        user_id (int): 사용자 ID
-        period (str): 기간 ('1m', '3m', '6m', '1y', 'all')
+        # 증권사 형식 자동 판별, 일괄 저장 후 시세 재평가 한 번
+        result = import_statement(user_id, file_path)
+        return result["success"], result["message"]
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 CSV 가져오기"})
+        return False, f"데이터 가져오기 중 오류가 발생했습니다: {str(e)}"
+
+def get_portfolio_performance_metrics(user_id, period='1y'):
+    """
+    포트폴리오 성과 지표 계산 (시간가중수익률 기준, 매수/매도/배당 현금흐름 제외)
+    
+    모든 기간의 지표를 한 번에 계산해 캐시한 결과에서 해당 기간을 반환합니다.
+    
+    Args:
+        user_id (int): 사용자 ID
+        period (str): 기간 ('1m', '3m', '6m', '1y', 'all')
         
     Returns:
         dict: 성과 지표
     """
     try:
-        # 데이터베이스 연결
-        conn = get_db_connection('portfolio')
-        cursor = conn.cursor()
-        
-        # 기간에 따른 날짜 조건 설정
-        today = datetime.now().date()
-        
-        if period == '1m':
-            start_date = (datetime.now() - timedelta(days=30)).date()
-        elif period == '3m':
-            start_date = (datetime.now() - timedelta(days=90)).date()
-        elif period == '6m':
-            start_date = (datetime.now() - timedelta(days=180)).date()
-        elif period == '1y':
-            start_date = (datetime.now() - timedelta(days=365)).date()
-        else:  # 'all'
-            start_date = datetime(2000, 1, 1).date()  # 충분히 오래된 날짜
-        
-        # 포트폴리오 이력 조회
-        cursor.execute("""
-            SELECT date, total_value, total_invested, total_return_percent
-            FROM portfolio_history
-            WHERE user_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date ASC
-        """, (user_id, start_date, today))
-        
-        history = [dict(zip(['date', 'value', 'invested', 'return_percent'], row)) for row in cursor.fetchall()]
-        
-        # 성과 지표 계산
-        metrics = {
-            "period": period,
-            "start_date": start_date.strftime('%Y-%m-%d'),
-            "end_date": today.strftime('%Y-%m-%d'),
-            "total_return": 0,
-            "annualized_return": 0,
-            "volatility": 0,
-            "sharpe_ratio": 0,
-            "max_drawdown": 0,
-            "best_day": {"date": None, "return": 0},
-            "worst_day": {"date": None, "return": 0}
-        }
-        
-        if len(history) < 2:
-            return metrics  # 충분한 데이터가 없음
-        
-        # 총 수익률 (시작과 끝 비교)
-        start_value = history[0]['value']
-        end_value = history[-1]['value']
-        
-        if start_value > 0:
-            total_return = (end_value - start_value) / start_value * 100
-            metrics["total_return"] = total_return
-        
-        # 연환산 수익률
-        days = (datetime.strptime(metrics["end_date"], '%Y-%m-%d') - 
-                datetime.strptime(metrics["start_date"], '%Y-%m-%d')).days
-        
-        if days > 0 and start_value > 0:
-            annualized_return = ((1 + total_return / 100) ** (365 / days) - 1) * 100
-            metrics["annualized_return"] = annualized_return
-        
-        # 일일 수익률 계산 (변동성, 최대 손실 등 계산용)
-        daily_returns = []
-        prev_value = None
-        
-        for idx, day in enumerate(history):
-            if idx > 0 and prev_value:
-                daily_return = (day['value'] - prev_value) / prev_value * 100
-                daily_returns.append(daily_return)
-                
-                # 최고/최저 일일 수익률 갱신
-                if daily_return > metrics["best_day"]["return"]:
-                    metrics["best_day"] = {"date": day['date'], "return": daily_return}
-                    
-                if daily_return < metrics["worst_day"]["return"]:
-                    metrics["worst_day"] = {"date": day['date'], "return": daily_return}
-            
-            prev_value = day['value']
-        
-        # 변동성 (일일 수익률의 표준편차)
-        if daily_returns:
-            volatility = np.std(daily_returns)
-            metrics["volatility"] = volatility
-            
-            # 샤프 비율 (무위험 수익률 가정: 3%)
-            risk_free_rate = 3.0  # 연간 무위험 수익률 (%)
-            daily_risk_free = risk_free_rate / 365  # 일일 무위험 수익률
-            
-            if volatility > 0:
-                avg_daily_return = np.mean(daily_returns)
-                sharpe_ratio = (avg_daily_return - daily_risk_free) / volatility
-                metrics["sharpe_ratio"] = sharpe_ratio * np.sqrt(252)  # 연환산
-        
-        # 최대 손실(Drawdown) 계산
-        cumulative_returns = []
-        peak = -float('inf')
-        drawdowns = []
-        
-        for value in [h['value'] for h in history]:
-            if value > peak:
-                peak = value
-            
-            drawdown = (value - peak) / peak * 100 if peak > 0 else 0
-            drawdowns.append(drawdown)
-        
-        if drawdowns:
-            metrics["max_drawdown"] = min(drawdowns)
-        
-        conn.close()
-        return metrics
+        periods = get_performance_metrics(user_id)["periods"]
+        return periods.get(period, periods["all"])
     except Exception as e:
         log_exception(logger, e, {"context": "포트폴리오 성과 지표 계산"})
         return {
             "period": period,
-            "start_date": start_date.strftime('%Y-%m-%d') if 'start_date' in locals() else "",
-            "end_date": today.strftime('%Y-%m-%d') if 'today' in locals() else "",
+            "start_date": "",
+            "end_date": "",
             "total_return": 0,
             "annualized_return": 0,
+            "money_weighted_return": None,
+            "net_flow": 0,
             "volatility": 0,
+            "annualized_volatility": 0,
             "sharpe_ratio": 0,
+            "sortino_ratio": 0,
             "max_drawdown": 0,
+            "calmar_ratio": 0,
             "best_day": {"date": None, "return": 0},
             "worst_day": {"date": None, "return": 0}
         }"""
@@ -1202,6 +1174,17 @@ try:
 except ImportError:
     logger.error("models.database 모듈을 불러올 수 없습니다.")
 
+from models.database import portfolio_aggregate_select, PORTFOLIO_AGGREGATE_DIMENSIONS
+from models.portfolio import get_user_symbols, sync_held_symbols, rebuild_portfolio_aggregates
+from services.ledger_service import sync_ledger
+from services.returns_service import get_performance_metrics
+from services.risk_service import calculate_covariance_risk
+from services.optimizer_service import run_optimization
+from services.export_service import export_user_data
+from services.import_service import import_statement
+from services.paging_service import get_transactions_page, get_dividends_page
+from services.enrichment_service import enqueue_enrichment, request_enrichment
+
 try:
     from services.market_service import (
         get_krx_stock_price,
@@ -1210,7 +1193,8 @@ try:
         get_krx_stock_info,
         get_international_stock_info,
         get_dividend_info,
-        get_stock_financial_data
+        get_stock_financial_data,
+        store_daily_closes
     )
 except ImportError:
     logger.error("market_service 모듈을 불러올 수 없습니다.")
@@ -1222,6 +1206,82 @@ except ImportError:
     def get_international_stock_info(ticker, country=None): return None
     def get_dividend_info(ticker, market=None): return None
     def get_stock_financial_data(ticker, market=None): return None
+    def store_daily_closes(prices, fx_rates=None, date=None): return None
+
+# 최적화 목표 비중과 현재 비중의 차이가 이 값(%p) 이상인 섹터만 추천
+SECTOR_IMBALANCE_THRESHOLD = 5.0
+
+# load_portfolio_details()의 fields 지정 시 항상 포함되는 컬럼 (요약 및 분류 계산용)
+PORTFOLIO_DETAIL_BASE_FIELDS = ['id', '평가액', '수량', '평단가_원화', '손익금액', '투자비중', '섹터', '국가', '계좌', '증권사']
+
+def _format_portfolio_table(df):
+    """
+    포트폴리오 조회 결과를 UI 표시용 표로 변환 (컬럼 선택, 컬럼명 변경, 숫자 포맷팅)
+    
+    Args:
+        df (pandas.DataFrame): portfolio 테이블 조회 결과
+        
+    Returns:
+        pandas.DataFrame: 표시용 포트폴리오 (Data Frame)
+    """
+    try:
+        # 컬럼 선택
+        columns_to_display = [
+            '증권사', '계좌', '국가', '종목코드', '종목명', '수량', 
+            '평단가_원화', '평단가_달러', '현재가_원화', '현재가_달러',
+            '평가액', '투자비중', '손익금액', '손익수익', '총수익률', '배당금', '섹터'
+        ]
+
+        # 존재하는 컬럼만 선택
+        available_columns = [col for col in columns_to_display if col in df.columns]
+        df = df[available_columns]
+
+        # 컬럼명 매핑
+        column_mapping = {
+            '증권사': "증권사", 
+            '계좌': "계좌", 
+            '국가': "국가", 
+            '종목코드': "종목코드", 
+            '종목명': "종목명", 
+            '수량': "수량", 
+            '평단가_원화': "평단가(원화)", 
+            '평단가_달러': "평단가(달러)", 
+            '현재가_원화': "현재가(원화)", 
+            '현재가_달러': "현재가(달러)",
+            '평가액': "평가액[원화]", 
+            '투자비중': "투자비중", 
+            '손익금액': "손익금액[원화]", 
+            '손익수익': "손익수익[원화]", 
+            '총수익률': "총수익률[원가+배당]",
+            '배당금': "누적배당금",
+            '섹터': "섹터",
+            '총배당금': "총배당금"
+        }
+
+        # 사용 가능한 키와 값만으로 매핑 적용
+        available_mapping = {k: v for k, v in column_mapping.items() if k in available_columns}
+        df.rename(columns=available_mapping, inplace=True)
+
+        # 숫자 포맷팅
+        numeric_columns = [
+            "평단가(원화)", "평단가(달러)", "현재가(원화)", "현재가(달러)",
+            "평가액[원화]", "손익금액[원화]", "누적배당금"
+        ]
+
+        for col in numeric_columns:
+            if col in df.columns:
+                df[col] = df[col].apply(lambda x: f"{x:,.0f}" if pd.notnull(x) else "")
+
+        percentage_columns = ["투자비중", "손익수익[원화]", "총수익률[원가+배당]"]
+
+        for col in percentage_columns:
+            if col in df.columns:
+                df[col] = df[col].apply(lambda x: f"{x:.2f}%" if pd.notnull(x) else "")
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 데이터 변환"})
+        return pd.DataFrame()
+    
+    return df
 
 def load_portfolio(user_id):
     """
@@ -1265,74 +1325,116 @@ def load_portfolio(user_id):
             return pd.DataFrame()
         
         # UI 표시용 컬럼명 변경 및 선택
-        try:
-            # 컬럼 선택
-            columns_to_display = [
-                '증권사', '계좌', '국가', '종목코드', '종목명', '수량', 
-                '평단가_원화', '평단가_달러', '현재가_원화', '현재가_달러',
-                '평가액', '투자비중', '손익금액', '손익수익', '총수익률', '배당금', '섹터'
-            ]
-            
-            # 존재하는 컬럼만 선택
-            available_columns = [col for col in columns_to_display if col in df.columns]
-            df = df[available_columns]
-            
-            # 컬럼명 매핑
-            column_mapping = {
-                '증권사': "증권사", 
-                '계좌': "계좌", 
-                '국가': "국가", 
-                '종목코드': "종목코드", 
-                '종목명': "종목명", 
-                '수량': "수량", 
-                '평단가_원화': "평단가(원화)", 
-                '평단가_달러': "평단가(달러)", 
-                '현재가_원화': "현재가(원화)", 
-                '현재가_달러': "현재가(달러)",
-                '평가액': "평가액[원화]", 
-                '투자비중': "투자비중", 
-                '손익금액': "손익금액[원화]", 
-                '손익수익': "손익수익[원화]", 
-                '총수익률': "총수익률[원가+배당]",
-                '배당금': "누적배당금",
-                '섹터': "섹터",
-                '총배당금': "총배당금"
-            }
-            
-            # 사용 가능한 키와 값만으로 매핑 적용
-            available_mapping = {k: v for k, v in column_mapping.items() if k in available_columns}
-            df.rename(columns=available_mapping, inplace=True)
-            
-            # 숫자 포맷팅
-            numeric_columns = [
-                "평단가(원화)", "평단가(달러)", "현재가(원화)", "현재가(달러)",
-                "평가액[원화]", "손익금액[원화]", "누적배당금"
-            ]
-            
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(lambda x: f"{x:,.0f}" if pd.notnull(x) else "")
-            
-            percentage_columns = ["투자비중", "손익수익[원화]", "총수익률[원가+배당]"]
-            
-            for col in percentage_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(lambda x: f"{x:.2f}%" if pd.notnull(x) else "")
-        except Exception as e:
-            log_exception(logger, e, {"context": "포트폴리오 데이터 변환"})
-            return pd.DataFrame()
-        
-        return df
+        return _format_portfolio_table(df)
     except Exception as e:
         log_exception(logger, e, {"context": "포트폴리오 로드"})
         return pd.DataFrame()
 
-def load_portfolio_details(user_id):
+def get_portfolio_delta(user_id, ticker, account):
+    """
+    거래 직후 포트폴리오 표 변경분 조회 (거래한 종목 1행 + 사용자 총 평가액)
+
+    전체 표를 다시 읽는 대신 apply_portfolio_delta()로 화면의 표에 반영하므로, 조회량이 보유 종목
+    수와 무관합니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        ticker (str): 종목코드
+        account (str): 계좌
+
+    Returns:
+        dict: key([종목코드, 계좌]), row(표시용 행, 전량 매도로 삭제되면 None),
+            total_value(총 평가액) / 실패 시 None
+    """
+    try:
+        conn = get_db_connection('portfolio')
+
+        df = pd.read_sql_query(
+            """
+            SELECT p.*, SUM(CASE WHEN d.배당액 IS NOT NULL THEN d.배당액 ELSE 0 END) AS 총배당금
+            FROM portfolio p
+            LEFT JOIN dividends d ON p.id = d.portfolio_id
+            WHERE p.user_id = ? AND p.종목코드 = ? AND p.계좌 = ?
+            GROUP BY p.id
+            """,
+            conn,
+            params=(user_id, ticker, account)
+        )
+
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT total_value FROM portfolio_aggregates WHERE user_id = ? AND dimension = 'total' AND dim_value = ''",
+            (user_id,)
+        )
+        total = cursor.fetchone()
+        conn.close()
+
+        row = None
+        if not df.empty:
+            table = _format_portfolio_table(df)
+            row = table.iloc[0].to_dict() if not table.empty else None
+
+        return {
+            "key": [ticker, account],
+            "row": row,
+            "total_value": total[0] if total else 0
+        }
+    except Exception as e:
+        log_exception(logger, e, {"context": "포트폴리오 변경분 조회", "ticker": ticker})
+        return None
+
+def apply_portfolio_delta(table, delta):
+    """
+    화면의 포트폴리오 표에 거래 변경분 반영 (거래한 행 교체/추가/삭제, 투자비중 갱신)
+
+    투자비중은 표의 평가액과 변경분의 총 평가액으로 다시 계산합니다.
+
+    Args:
+        table (pandas.DataFrame): 현재 표시 중인 포트폴리오 표 (load_portfolio 형식)
+        delta (dict): get_portfolio_delta() 결과
+
+    Returns:
+        pandas.DataFrame: 갱신된 포트폴리오 표 (투자비중 내림차순)
+    """
+    if table is None or not isinstance(table, pd.DataFrame) or '종목코드' not in table.columns:
+        table = pd.DataFrame()
+
+    ticker, account = delta["key"]
+    row = delta["row"]
+
+    df = table.copy()
+    if not df.empty:
+        match = (df['종목코드'].astype(str) == str(ticker)) & (df['계좌'].astype(str) == str(account))
+        df = df[~match]
+
+    if row is not None:
+        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True) if not df.empty else pd.DataFrame([row])
+
+    if df.empty or '투자비중' not in df.columns:
+        return df
+
+    # 투자비중 갱신 후 load_portfolio와 같은 순서로 정렬
+    total_value = delta.get("total_value") or 0
+    if total_value > 0 and '평가액[원화]' in df.columns:
+        values = pd.to_numeric(df['평가액[원화]'].astype(str).str.replace(',', ''), errors='coerce').fillna(0)
+        weights = values / total_value * 100
+        df['투자비중'] = weights.map(lambda x: f"{x:.2f}%")
+    else:
+        weights = pd.to_numeric(df['투자비중'].astype(str).str.rstrip('%'), errors='coerce').fillna(0)
+
+    order = weights.reset_index(drop=True).sort_values(ascending=False, kind='stable').index
+    return df.reset_index(drop=True).iloc[order].reset_index(drop=True)
+
+def load_portfolio_details(user_id, include_transactions=True, fields=None):
     """
     사용자의 포트폴리오 상세 데이터 로드 (분석용)
     
+    배당금 합계는 종목별 GROUP BY 한 번, 거래 내역은 한 번의 조회로 가져와 종목별로 나눕니다.
+    
     Args:
         user_id (int): 사용자 ID
+        include_transactions (bool, optional): 종목별 거래 내역 포함 여부
+        fields (list, optional): 조회할 포트폴리오 컬럼 (요약/분류 계산에 필요한 컬럼은 항상 포함, None이면 전체)
         
     Returns:
         dict: 포트폴리오 상세 데이터
@@ -1345,37 +1447,56 @@ def load_portfolio_details(user_id):
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
+        # 조회 컬럼 구성 (존재하는 컬럼만 허용)
+        if fields:
+            cursor.execute("PRAGMA table_info(portfolio)")
+            available = {row['name'] for row in cursor.fetchall()}
+            
+            unknown = [field for field in fields if field not in available]
+            if unknown:
+                raise ValueError(f"알 수 없는 포트폴리오 컬럼: {', '.join(unknown)}")
+            
+            columns = list(dict.fromkeys(PORTFOLIO_DETAIL_BASE_FIELDS + list(fields)))
+            select_clause = ', '.join(f'"{column}"' for column in columns)
+        else:
+            select_clause = '*'
+        
         # 포트폴리오 데이터 조회
-        cursor.execute("""
-            SELECT * FROM portfolio 
+        cursor.execute(f"""
+            SELECT {select_clause} FROM portfolio 
             WHERE user_id = ? 
             ORDER BY 투자비중 DESC
         """, (user_id,))
         
         portfolio_items = [dict(row) for row in cursor.fetchall()]
         
-        # 각 종목의 배당금 정보 조회
+        # 종목별 배당금 합계 (한 번의 집계 조회)
+        cursor.execute("""
+            SELECT portfolio_id, SUM(배당액) as total_dividend 
+            FROM dividends 
+            WHERE portfolio_id IN (SELECT id FROM portfolio WHERE user_id = ?)
+            GROUP BY portfolio_id
+        """, (user_id,))
+        
+        dividend_totals = {row['portfolio_id']: row['total_dividend'] or 0 for row in cursor.fetchall()}
+        
         for item in portfolio_items:
-            cursor.execute("""
-                SELECT SUM(배당액) as total_dividend 
-                FROM dividends 
-                WHERE portfolio_id = ?
-            """, (item['id'],))
-            
-            dividend_result = cursor.fetchone()
-            if dividend_result and dividend_result['total_dividend']:
-                item['total_dividend'] = dividend_result['total_dividend']
-            else:
-                item['total_dividend'] = 0
-            
-            # 거래 내역 조회
+            item['total_dividend'] = dividend_totals.get(item['id'], 0)
+        
+        # 거래 내역 (요청한 경우에만, 한 번의 조회 후 종목별로 분리)
+        if include_transactions:
             cursor.execute("""
                 SELECT * FROM transactions 
-                WHERE portfolio_id = ? 
-                ORDER BY transaction_date DESC
-            """, (item['id'],))
+                WHERE portfolio_id IN (SELECT id FROM portfolio WHERE user_id = ?) 
+                ORDER BY portfolio_id, transaction_date DESC
+            """, (user_id,))
             
-            item['transactions'] = [dict(row) for row in cursor.fetchall()]
+            transactions_by_stock = {}
+            for row in cursor.fetchall():
+                transactions_by_stock.setdefault(row['portfolio_id'], []).append(dict(row))
+            
+            for item in portfolio_items:
+                item['transactions'] = transactions_by_stock.get(item['id'], [])
         
         # 포트폴리오 요약 정보 계산
         summary = calculate_portfolio_summary(portfolio_items)
@@ -1525,10 +1646,221 @@ def calculate_portfolio_summary(portfolio_items):
             'count': 0
         }
 
-def buy_stock(user_id, broker, account, country, ticker, stock_name, quantity, price, memo=None, date=None):
+# 일괄 주문 표(UI) 컬럼과 주문 키
+TRADE_BATCH_COLUMNS = {
+    "구분": "action",
+    "종목코드": "ticker",
+    "계좌": "account",
+    "수량": "quantity",
+    "가격/금액": "price",
+    "증권사": "broker",
+    "국가": "country",
+    "종목명": "name",
+    "날짜": "date",
+    "메모": "memo"
+}
+
+# 주문 구분 표기 (한글/영문)
+TRADE_BATCH_ACTIONS = {
+    "buy": "buy", "매수": "buy",
+    "sell": "sell", "매도": "sell",
+    "dividend": "dividend", "배당": "dividend", "배당금": "dividend"
+}
+
+# 일괄 주문 최대 건수
+TRADE_BATCH_MAX_LEGS = 500
+
+def _parse_trade_time(date):
+    """거래 일시 변환 (없거나 형식이 틀리면 현재 시각)"""
+    current_time = date if date else datetime.now()
+    if isinstance(current_time, str):
+        try:
+            current_time = datetime.strptime(current_time, '%Y-%m-%d')
+        except ValueError:
+            current_time = datetime.now()
+    return current_time
+
+def _apply_buy(cursor, user_id, broker, account, country, ticker, stock_name, quantity, price, memo, current_time):
+    """
+    매수 1건 반영 (포지션 추가/평단가 갱신, 거래내역 추가, 신규 종목 부가정보 작업 추가)
+
+    로트 장부, 보유 종목 유니버스, 재평가와 커밋은 호출하는 쪽에서 처리합니다.
+
+    Returns:
+        tuple: (포트폴리오 종목 ID, 국가, 신규 포지션 여부)
+    """
+    # 해당 종목이 이미 있는지 확인
+    cursor.execute(
+        "SELECT id, 수량, 평단가_원화, 국가 FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
+        (ticker, account, user_id)
+    )
+    existing = cursor.fetchone()
+    
+    if existing:
+        # 기존 종목 업데이트 (수량 증가, 평단가 재계산)
+        stock_id, existing_quantity, existing_avg_price, country = existing[0], existing[1], existing[2], existing[3]
+        
+        # 새로운 평단가 계산
+        new_quantity = existing_quantity + quantity
+        new_avg_price = ((existing_avg_price * existing_quantity) + (price * quantity)) / new_quantity
+        
+        cursor.execute(
+            """
+            UPDATE portfolio 
+            SET 수량 = ?, 평단가_원화 = ?, last_update = ?
+            WHERE id = ?
+            """, 
+            (new_quantity, new_avg_price, current_time, stock_id)
+        )
+        is_new = False
+    else:
+        # 매수 날짜
+        purchase_date = current_time.date() if isinstance(current_time, datetime) else current_time
+        
+        # 새 종목 추가 (섹터/산업군/베타, 평단가 달러 환산은 부가정보 작업 큐에서 채움)
+        cursor.execute(
+            """
+            INSERT INTO portfolio (
+                user_id, 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가_원화, 평단가_달러,
+                현재가_원화, 현재가_달러, 평가액, 투자비중, 손익금액, 손익수익, 총수익률, 
+                배당금, 섹터, 산업군, 베타, 매수날짜, 메모, last_update
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, 0, 0, 0, 0, 0, 0, 0, 0, NULL, NULL, NULL, ?, ?, ?)
+            """,
+            (user_id, broker, account, country, ticker, stock_name, quantity, price,
+             purchase_date, memo, current_time)
+        )
+        
+        stock_id = cursor.lastrowid
+        enqueue_enrichment(cursor, [(stock_id, user_id, ticker, country)])
+        is_new = True
+    
+    # 거래내역 추가
+    cursor.execute(
+        """
+        INSERT INTO transactions (portfolio_id, user_id, type, quantity, price, 거래메모, transaction_date) 
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (stock_id, user_id, '매수', quantity, price, memo, current_time)
+    )
+    
+    logger.info(f"종목 매수 ({'신규' if is_new else '추가'}): {stock_name} ({ticker}), 수량: {quantity}, 사용자: {user_id}")
+    return stock_id, country, is_new
+
+def _apply_sell(cursor, user_id, ticker, account, quantity, price, memo, current_time):
+    """
+    매도 1건 반영 (거래내역 추가, 수량 차감, 전량 매도 시 포지션 삭제)
+
+    로트 장부, 보유 종목 유니버스, 재평가와 커밋은 호출하는 쪽에서 처리합니다.
+
+    Returns:
+        tuple: (포트폴리오 종목 ID, 국가, 남은 수량)
+
+    Raises:
+        ValueError: 종목이 없거나 보유 수량보다 많이 매도하는 경우
+    """
+    # 해당 종목 확인
+    cursor.execute(
+        "SELECT id, 수량, 평단가_원화, 종목명, 국가 FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
+        (ticker, account, user_id)
+    )
+    existing = cursor.fetchone()
+    
+    if not existing:
+        raise ValueError("종목을 찾을 수 없습니다.")
+    
+    stock_id, existing_quantity, avg_price, stock_name, country = existing
+    
+    if quantity > existing_quantity:
+        raise ValueError("보유 수량보다 많은 수량을 매도할 수 없습니다.")
+    
+    # 실현 손익 계산 (평균원가 기준, 로트 장부 반영 시 원가 계산 방식에 맞게 갱신)
+    realized_profit = (price - avg_price) * quantity
+    
+    # 거래내역 추가
+    cursor.execute(
+        """
+        INSERT INTO transactions (portfolio_id, user_id, type, quantity, price, 거래메모, 실현손익, transaction_date) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (stock_id, user_id, '매도', quantity, price, memo, realized_profit, current_time)
+    )
+    
+    # 수량 업데이트
+    new_quantity = existing_quantity - quantity
+    
+    if new_quantity == 0:
+        # 모든 주식 매도시 종목 삭제
+        cursor.execute("DELETE FROM portfolio WHERE id = ?", (stock_id,))
+    else:
+        # 수량만 업데이트
+        cursor.execute(
+            """
+            UPDATE portfolio 
+            SET 수량 = ?, last_update = ?
+            WHERE id = ?
+            """, 
+            (new_quantity, current_time, stock_id)
+        )
+    
+    logger.info(f"종목 매도: {stock_name} ({ticker}), 수량: {quantity}, 사용자: {user_id}")
+    return stock_id, country, new_quantity
+
+def _apply_dividend(cursor, user_id, ticker, account, amount, payment_date):
+    """
+    배당금 1건 반영 (누적 배당금 갱신, 배당금 이력 추가, 커밋은 호출하는 쪽에서 처리)
+
+    Returns:
+        int: 포트폴리오 종목 ID
+
+    Raises:
+        ValueError: 종목이 없는 경우
+    """
+    # 해당 종목 확인
+    cursor.execute(
+        "SELECT id, 종목명, 배당금 FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
+        (ticker, account, user_id)
+    )
+    existing = cursor.fetchone()
+    
+    if not existing:
+        raise ValueError("종목을 찾을 수 없습니다.")
+    
+    stock_id, stock_name, current_dividend = existing
+    
+    # 누적 배당금 업데이트
+    new_dividend = (current_dividend or 0) + amount
+    
+    cursor.execute(
+        """
+        UPDATE portfolio 
+        SET 배당금 = ?, 최근배당일 = ?, last_update = ?
+        WHERE id = ?
+        """, 
+        (new_dividend, payment_date, datetime.now(), stock_id)
+    )
+    
+    # 배당금 이력 추가
+    cursor.execute(
+        """
+        INSERT INTO dividends (portfolio_id, user_id, 지급일, 배당액, 배당유형, 통화) 
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (stock_id, user_id, payment_date, amount, '현금배당', 'KRW')
+    )
+    
+    logger.info(f"배당금 추가: {stock_name} ({ticker}), 금액: {amount}, 사용자: {user_id}")
+    return stock_id
+
+def buy_stock(user_id, broker, account, country, ticker, stock_name, quantity, price, memo=None, date=None,
+              return_delta=False):
     """
     주식 매수
     
+    매수한 포지션만 캐시된 시세로 재평가하고 투자비중을 갱신하므로, 처리 시간이 보유 종목 수와
+    무관합니다. 전체 시세 갱신은 update_all_prices()(새로고침, 스케줄러)가 담당합니다.
+    신규 종목의 섹터/산업군/베타, 평단가(달러), 첫 시세는 부가정보 작업 큐(enrichment_service)에서
+    비동기로 채우므로 매수 중에는 네트워크 조회를 하지 않습니다.
+    
     Args:
         user_id (int): 사용자 ID
         broker (str): 증권사
@@ -1540,9 +1872,11 @@ def buy_stock(user_id, broker, account, country, ticker, stock_name, quantity, p
         price (float): 매수가
         memo (str, optional): 매수 메모
         date (str, optional): 매수 날짜 (없으면 현재 날짜)
+        return_delta (bool, optional): 전체 포트폴리오 대신 변경분(get_portfolio_delta) 반환 여부
         
     Returns:
         pandas.DataFrame: 업데이트된 포트폴리오 (Data Frame)
+            / return_delta=True이면 변경분 dict (실패 시 None)
     """
     try:
         # 수량과 가격 변환
@@ -1550,132 +1884,48 @@ def buy_stock(user_id, broker, account, country, ticker, stock_name, quantity, p
         price = float(price)
         
         # 날짜 처리
-        current_time = date if date else datetime.now()
-        if isinstance(current_time, str):
-            try:
-                current_time = datetime.strptime(current_time, '%Y-%m-%d')
-            except ValueError:
-                current_time = datetime.now()
+        current_time = _parse_trade_time(date)
         
         # 데이터베이스 연결
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
-        # 해당 종목이 이미 있는지 확인
-        cursor.execute(
-            "SELECT id, 수량, 평단가_원화 FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
-            (ticker, account, user_id)
+        stock_id, country, is_new = _apply_buy(
+            cursor, user_id, broker, account, country, ticker, stock_name, quantity, price, memo, current_time
         )
-        existing = cursor.fetchone()
         
-        if existing:
-            # 기존 종목 업데이트 (수량 증가, 평단가 재계산)
-            stock_id, existing_quantity, existing_avg_price = existing[0], existing[1], existing[2]
-            
-            # 새로운 평단가 계산
-            new_quantity = existing_quantity + quantity
-            new_avg_price = ((existing_avg_price * existing_quantity) + (price * quantity)) / new_quantity
-            
-            cursor.execute(
-                """
-                UPDATE portfolio 
-                SET 수량 = ?, 평단가_원화 = ?, last_update = ?
-                WHERE id = ?
-                """, 
-                (new_quantity, new_avg_price, current_time, stock_id)
-            )
-            
-            # 거래내역 추가
-            cursor.execute(
-                """
-                INSERT INTO transactions (portfolio_id, user_id, type, quantity, price, 거래메모, transaction_date) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (stock_id, user_id, '매수', quantity, price, memo, current_time)
-            )
-            
-            logger.info(f"종목 매수 (추가): {stock_name} ({ticker}), 수량: {quantity}, 사용자: {user_id}")
-        else:
-            # 평단가 달러 변환 (해외 주식)
-            avg_price_usd = None
-            if country != '한국':
-                exchange_rate = get_exchange_rate('USD', 'KRW')
-                avg_price_usd = price / exchange_rate if exchange_rate else None
-            
-            # 종목 정보 조회
-            sector = None
-            industry = None
-            
-            if country == '한국':
-                stock_info = get_krx_stock_info(ticker)
-                if stock_info:
-                    sector = stock_info.get('sector')
-            else:
-                stock_info = get_international_stock_info(ticker, country)
-                if stock_info:
-                    sector = stock_info.get('sector')
-                    industry = stock_info.get('industry')
-            
-            # 매수 날짜 처리
-            purchase_date = None
-            if date:
-                if isinstance(date, str):
-                    try:
-                        purchase_date = datetime.strptime(date, '%Y-%m-%d').date()
-                    except ValueError:
-                        purchase_date = datetime.now().date()
-                elif isinstance(date, datetime):
-                    purchase_date = date.date()
-            else:
-                purchase_date = datetime.now().date()
-            
-            # 베타값 처리
-            beta = None
-            if stock_info:
-                beta = stock_info.get('beta', None)
-            
-            # 새 종목 추가
-            cursor.execute(
-                """
-                INSERT INTO portfolio (
-                    user_id, 증권사, 계좌, 국가, 종목코드, 종목명, 수량, 평단가_원화, 평단가_달러,
-                    현재가_원화, 현재가_달러, 평가액, 투자비중, 손익금액, 손익수익, 총수익률, 
-                    배당금, 섹터, 산업군, 베타, 매수날짜, 메모, last_update
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, 0, 0, 0, 0, 0, 0, ?, ?, ?, ?, ?, ?)
-                """,
-                (user_id, broker, account, country, ticker, stock_name, quantity, price, avg_price_usd, 
-                 sector, industry, beta, purchase_date, memo, current_time)
-            )
-            
-            stock_id = cursor.lastrowid
-            
-            # 거래내역 추가
-            cursor.execute(
-                """
-                INSERT INTO transactions (portfolio_id, user_id, type, quantity, price, 거래메모, transaction_date) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (stock_id, user_id, '매수', quantity, price, memo, current_time)
-            )
-            
-            logger.info(f"종목 매수 (신규): {stock_name} ({ticker}), 수량: {quantity}, 사용자: {user_id}")
+        # 보유 종목 유니버스 갱신
+        sync_held_symbols(cursor, [(ticker, country)])
+        
+        # 매수 로트 추가
+        sync_ledger(cursor, user_id)
+        
+        # 매수한 포지션만 재평가하고 투자비중 갱신 (같은 트랜잭션, 시세가 없으면 매수가로 평가)
+        revalue_position(cursor, user_id, stock_id, fallback_price=price, fetch_missing=False)
+        update_position_weights(cursor, user_id)
         
         conn.commit()
         conn.close()
         
-        # 실시간 가격 업데이트
-        update_all_prices(user_id)
+        # 신규 종목 부가정보는 백그라운드에서 조회 (매수는 네트워크를 기다리지 않음)
+        if is_new:
+            request_enrichment()
+        
+        if return_delta:
+            return get_portfolio_delta(user_id, ticker, account)
         
         # 업데이트된 포트폴리오 반환
         return load_portfolio(user_id)
     except Exception as e:
         log_exception(logger, e, {"context": "매수 처리", "ticker": ticker, "quantity": quantity})
-        return load_portfolio(user_id)
+        return None if return_delta else load_portfolio(user_id)
 
-def sell_stock(user_id, ticker, account, quantity, price, memo=None, date=None):
+def sell_stock(user_id, ticker, account, quantity, price, memo=None, date=None, return_delta=False):
     """
     주식 매도
     
+    매도한 포지션만 캐시된 시세로 재평가하고 투자비중을 갱신합니다 (buy_stock과 같은 빠른 경로).
+    
     Args:
         user_id (int): 사용자 ID
         ticker (str): 종목코드
@@ -1684,9 +1934,10 @@ def sell_stock(user_id, ticker, account, quantity, price, memo=None, date=None):
         price (float): 매도가
         memo (str, optional): 매도 메모
         date (str, optional): 매도 날짜 (없으면 현재 날짜)
+        return_delta (bool, optional): 전체 포트폴리오 대신 변경분(get_portfolio_delta) 반환 여부
         
     Returns:
-        tuple: (결과 메시지, 업데이트된 포트폴리오)
+        tuple: (결과 메시지, 업데이트된 포트폴리오 / return_delta=True이면 변경분 dict, 실패 시 None)
     """
     try:
         # 수량과 가격 변환
@@ -1694,74 +1945,40 @@ def sell_stock(user_id, ticker, account, quantity, price, memo=None, date=None):
         price = float(price)
         
         # 날짜 처리
-        current_time = date if date else datetime.now()
-        if isinstance(current_time, str):
-            try:
-                current_time = datetime.strptime(current_time, '%Y-%m-%d')
-            except ValueError:
-                current_time = datetime.now()
+        current_time = _parse_trade_time(date)
         
         # 데이터베이스 연결
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
-        # 해당 종목 확인
-        cursor.execute(
-            "SELECT id, 수량, 평단가_원화, 종목명 FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
-            (ticker, account, user_id)
-        )
-        existing = cursor.fetchone()
-        
-        if not existing:
-            conn.close()
-            return "종목을 찾을 수 없습니다.", load_portfolio(user_id)
-        
-        stock_id, existing_quantity, avg_price, stock_name = existing
-        
-        if quantity > existing_quantity:
+        try:
+            stock_id, country, new_quantity = _apply_sell(
+                cursor, user_id, ticker, account, quantity, price, memo, current_time
+            )
+        except ValueError as e:
             conn.close()
-            return "보유 수량보다 많은 수량을 매도할 수 없습니다.", load_portfolio(user_id)
-        
-        # 실현 손익 계산
-        realized_profit = (price - avg_price) * quantity
+            return str(e), None if return_delta else load_portfolio(user_id)
         
-        # 거래내역 추가
-        cursor.execute(
-            """
-            INSERT INTO transactions (portfolio_id, user_id, type, quantity, price, 거래메모, 실현손익, transaction_date) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (stock_id, user_id, '매도', quantity, price, memo, realized_profit, current_time)
-        )
+        # 로트 매칭 (사용자의 원가 계산 방식 기준으로 실현손익 갱신)
+        sync_ledger(cursor, user_id)
         
-        # 수량 업데이트
-        new_quantity = existing_quantity - quantity
+        # 보유 종목 유니버스 갱신 (마지막 보유자가 전량 매도하면 제거)
+        sync_held_symbols(cursor, [(ticker, country)])
         
-        if new_quantity == 0:
-            # 모든 주식 매도시 종목 삭제
-            cursor.execute("DELETE FROM portfolio WHERE id = ?", (stock_id,))
-        else:
-            # 수량만 업데이트
-            cursor.execute(
-                """
-                UPDATE portfolio 
-                SET 수량 = ?, last_update = ?
-                WHERE id = ?
-                """, 
-                (new_quantity, current_time, stock_id)
-            )
+        # 남은 포지션만 재평가하고 투자비중 갱신 (같은 트랜잭션)
+        if new_quantity != 0:
+            revalue_position(cursor, user_id, stock_id, fallback_price=price, fetch_missing=False)
+        update_position_weights(cursor, user_id)
         
         conn.commit()
         conn.close()
         
-        # 실시간 가격 업데이트
-        update_all_prices(user_id)
-        
-        logger.info(f"종목 매도: {stock_name} ({ticker}), 수량: {quantity}, 사용자: {user_id}")
+        if return_delta:
+            return "매도 완료", get_portfolio_delta(user_id, ticker, account)
         return "매도 완료", load_portfolio(user_id)
     except Exception as e:
         log_exception(logger, e, {"context": "매도 처리", "ticker": ticker, "quantity": quantity})
-        return f"매도 처리 중 오류가 발생했습니다: {e}", load_portfolio(user_id)
+        return f"매도 처리 중 오류가 발생했습니다: {e}", None if return_delta else load_portfolio(user_id)
 
 def add_dividend(user_id, ticker, account, amount, payment_date, memo=None):
     """
@@ -1793,53 +2010,260 @@ def add_dividend(user_id, ticker, account, amount, payment_date, memo=None):
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
-        # 해당 종목 확인
-        cursor.execute(
-            "SELECT id, 종목명, 배당금 FROM portfolio WHERE 종목코드 = ? AND 계좌 = ? AND user_id = ?", 
-            (ticker, account, user_id)
-        )
-        existing = cursor.fetchone()
-        
-        if not existing:
+        try:
+            _apply_dividend(cursor, user_id, ticker, account, amount, payment_date)
+        except ValueError as e:
             conn.close()
-            return False, "종목을 찾을 수 없습니다."
-        
-        stock_id, stock_name, current_dividend = existing
-        
-        # 누적 배당금 업데이트
-        new_dividend = (current_dividend or 0) + amount
-        
-        cursor.execute(
-            """
-            UPDATE portfolio 
-            SET 배당금 = ?, 최근배당일 = ?, last_update = ?
-            WHERE id = ?
-            """, 
-            (new_dividend, payment_date, datetime.now(), stock_id)
-        )
-        
-        # 배당금 이력 추가
-        cursor.execute(
-            """
-            INSERT INTO dividends (portfolio_id, user_id, 지급일, 배당액, 배당유형, 통화) 
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (stock_id, user_id, payment_date, amount, '현금배당', 'KRW')
-        )
+            return False, str(e)
         
         conn.commit()
         conn.close()
         
-        logger.info(f"배당금 추가: {stock_name} ({ticker}), 금액: {amount}, 사용자: {user_id}")
         return True, "배당금이 성공적으로 추가되었습니다."
     except Exception as e:
         log_exception(logger, e, {"context": "배당금 추가", "ticker": ticker, "amount": amount})
         return False, f"배당금 추가 중 오류가 발생했습니다: {e}"
 
+def trade_legs_from_table(table):
+    """
+    일괄 주문 표(UI)를 주문 목록으로 변환 (모든 칸이 빈 행은 제외)
+
+    Args:
+        table (pandas.DataFrame): TRADE_BATCH_COLUMNS 컬럼을 가진 표
+
+    Returns:
+        list: execute_trade_batch()에 넘길 주문 dict 목록
+    """
+    if table is None or not isinstance(table, pd.DataFrame) or table.empty:
+        return []
+
+    legs = []
+    for row in table.to_dict('records'):
+        leg = {}
+        for column, key in TRADE_BATCH_COLUMNS.items():
+            value = row.get(column)
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == "" or (isinstance(value, float) and np.isnan(value)):
+                continue
+            leg[key] = value
+        if leg:
+            legs.append(leg)
+    return legs
+
+def _validate_trade_legs(cursor, user_id, legs):
+    """
+    일괄 주문 검증 (입력 순서대로 보유 수량을 따라가며 모든 주문을 함께 확인)
+
+    Returns:
+        tuple: (정규화된 주문 목록, 오류 목록 [{"leg": 주문 번호(1부터), "message": 사유}])
+    """
+    cursor.execute(
+        "SELECT 종목코드, 계좌, 수량, 국가, 증권사, 종목명 FROM portfolio WHERE user_id = ?",
+        (user_id,)
+    )
+    rows = cursor.fetchall()
+    positions = {(row[0], str(row[1])): row[2] or 0 for row in rows}
+    known_countries = {row[0]: row[3] for row in rows if row[3]}
+    known_names = {row[0]: row[5] for row in rows if row[5]}
+    account_brokers = {str(row[1]): row[4] for row in rows if row[4]}
+
+    normalized, errors = [], []
+
+    for number, leg in enumerate(legs, start=1):
+        def fail(message):
+            errors.append({"leg": number, "message": message})
+
+        action = TRADE_BATCH_ACTIONS.get(str(leg.get("action", "")).strip().lower())
+        ticker = str(leg.get("ticker") or "").strip()
+        account = str(leg.get("account") or "").strip()
+
+        if action is None:
+            fail(f"알 수 없는 거래 구분: {leg.get('action')}")
+            continue
+        if not ticker:
+            fail("종목코드가 없습니다.")
+            continue
+        if not account:
+            fail("계좌가 없습니다.")
+            continue
+
+        try:
+            quantity = float(leg.get("quantity") or 0)
+            price = float(leg.get("price") or leg.get("amount") or 0)
+        except (TypeError, ValueError):
+            fail("수량 또는 가격이 숫자가 아닙니다.")
+            continue
+
+        date = leg.get("date")
+        if date and not isinstance(date, datetime):
+            try:
+                date = datetime.strptime(str(date)[:10], '%Y-%m-%d')
+            except ValueError:
+                fail(f"날짜 형식이 올바르지 않습니다 (YYYY-MM-DD): {date}")
+                continue
+
+        key = (ticker, account)
+        held = positions.get(key)
+        entry = {"action": action, "ticker": ticker, "account": account, "quantity": quantity,
+                 "price": price, "date": date, "memo": leg.get("memo")}
+
+        if action == "buy":
+            if quantity <= 0 or price <= 0:
+                fail("매수 수량과 가격은 0보다 커야 합니다.")
+                continue
+            entry["country"] = leg.get("country") or known_countries.get(ticker)
+            entry["broker"] = leg.get("broker") or account_brokers.get(account)
+            entry["name"] = leg.get("name") or known_names.get(ticker) or ticker
+            if held is None and not entry["country"]:
+                fail("신규 종목은 국가를 입력해야 합니다.")
+                continue
+            if held is None and not entry["broker"]:
+                fail(f"새 계좌({account})는 증권사를 입력해야 합니다.")
+                continue
+            positions[key] = (held or 0) + quantity
+            known_countries.setdefault(ticker, entry["country"])
+            account_brokers.setdefault(account, entry["broker"])
+        elif action == "sell":
+            if quantity <= 0 or price <= 0:
+                fail("매도 수량과 가격은 0보다 커야 합니다.")
+                continue
+            if held is None:
+                fail(f"보유하지 않은 종목입니다: {ticker} ({account})")
+                continue
+            if quantity > held:
+                fail(f"보유 수량({held:,.4g})보다 많은 수량을 매도할 수 없습니다: {ticker} ({account})")
+                continue
+            remaining = held - quantity
+            if remaining == 0:
+                positions.pop(key)
+            else:
+                positions[key] = remaining
+        else:
+            if price <= 0:
+                fail("배당금액은 0보다 커야 합니다.")
+                continue
+            if held is None:
+                fail(f"보유하지 않은 종목입니다: {ticker} ({account})")
+                continue
+
+        normalized.append(entry)
+
+    return normalized, errors
+
+def execute_trade_batch(user_id, legs, memo=None, date=None):
+    """
+    여러 건의 매수/매도/배당 주문을 한 트랜잭션으로 일괄 실행
+
+    모든 주문을 먼저 함께 검증하고(입력 순서대로 보유 수량 추적, 계좌/종목 확인), 하나라도 오류가 있으면
+    아무 것도 반영하지 않습니다. 검증을 통과하면 하나의 연결/트랜잭션에서 순서대로 반영한 뒤 로트 장부와
+    보유 종목 유니버스를 한 번 갱신하고, 변경된 포지션만 재평가해 투자비중을 한 번 갱신한 다음 커밋합니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        legs (list): 주문 dict 목록
+            - action: 'buy'/'sell'/'dividend' (또는 '매수'/'매도'/'배당')
+            - ticker, account: 종목코드, 계좌
+            - quantity, price: 수량, 가격 (배당은 price 또는 amount에 배당금액)
+            - broker, country, name: 신규 포지션용 증권사, 국가, 종목명 (없으면 보유 정보에서 채움)
+            - date, memo (optional): 거래일 (YYYY-MM-DD), 메모
+        memo (str, optional): 메모가 없는 주문에 쓸 메모
+        date (str, optional): 날짜가 없는 주문에 쓸 거래일
+
+    Returns:
+        dict: success, message, errors([{"leg", "message"}]), buys, sells, dividends
+    """
+    result = {"success": False, "message": "", "errors": [], "buys": 0, "sells": 0, "dividends": 0}
+
+    if not legs:
+        result["message"] = "실행할 주문이 없습니다."
+        return result
+    if len(legs) > TRADE_BATCH_MAX_LEGS:
+        result["message"] = f"한 번에 최대 {TRADE_BATCH_MAX_LEGS}건까지 실행할 수 있습니다."
+        return result
+
+    conn = None
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        legs, errors = _validate_trade_legs(cursor, user_id, legs)
+        if errors:
+            conn.close()
+            result["errors"] = errors
+            result["message"] = f"주문 {len(errors)}건에 오류가 있어 실행하지 않았습니다."
+            return result
+
+        default_time = _parse_trade_time(date)
+        touched, symbols, enrichment_requested = {}, set(), False
+
+        for leg in legs:
+            current_time = leg["date"] or default_time
+            leg_memo = leg["memo"] or memo
+
+            if leg["action"] == "buy":
+                stock_id, country, is_new = _apply_buy(
+                    cursor, user_id, leg["broker"], leg["account"], leg["country"], leg["ticker"], leg["name"],
+                    leg["quantity"], leg["price"], leg_memo, current_time
+                )
+                touched[stock_id] = leg["price"]
+                enrichment_requested |= is_new
+                result["buys"] += 1
+            elif leg["action"] == "sell":
+                stock_id, country, remaining = _apply_sell(
+                    cursor, user_id, leg["ticker"], leg["account"], leg["quantity"], leg["price"], leg_memo, current_time
+                )
+                if remaining == 0:
+                    touched.pop(stock_id, None)
+                else:
+                    touched[stock_id] = leg["price"]
+                result["sells"] += 1
+            else:
+                payment_date = current_time.date() if isinstance(current_time, datetime) else current_time
+                stock_id = _apply_dividend(cursor, user_id, leg["ticker"], leg["account"], leg["price"], payment_date)
+                touched.setdefault(stock_id, None)
+                result["dividends"] += 1
+                continue
+
+            symbols.add((leg["ticker"], country))
+
+        # 로트 장부와 보유 종목 유니버스는 한 번만 갱신
+        sync_ledger(cursor, user_id)
+        if symbols:
+            sync_held_symbols(cursor, list(symbols))
+
+        # 변경된 포지션만 재평가하고 투자비중은 한 번만 갱신
+        for stock_id, fallback_price in touched.items():
+            revalue_position(cursor, user_id, stock_id, fallback_price=fallback_price, fetch_missing=False)
+        update_position_weights(cursor, user_id)
+
+        conn.commit()
+        conn.close()
+
+        if enrichment_requested:
+            request_enrichment()
+
+        result["success"] = True
+        result["message"] = (
+            f"일괄 주문 완료: 매수 {result['buys']}건, 매도 {result['sells']}건, 배당 {result['dividends']}건"
+        )
+        logger.info(f"{result['message']}, 사용자: {user_id}")
+        return result
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+            conn.close()
+        log_exception(logger, e, {"context": "일괄 주문 실행", "user_id": user_id})
+        result["message"] = f"일괄 주문 처리 중 오류가 발생해 아무 것도 반영하지 않았습니다: {e}"
+        return result
+
 def update_all_prices(user_id=None):
     """
     모든 포트폴리오 종목의 실시간 가격 업데이트
     
+    보유 종목 유니버스(held_symbols)의 종목별로 한 번씩만 시세를 조회한 뒤,
+    revalue_positions()로 모든 보유 포지션을 한 번에 재평가합니다.
+    
     Args:
         user_id (int, optional): 특정 사용자 ID (None인 경우 모든 사용자 포트폴리오 업데이트)
         
@@ -1851,106 +2275,318 @@ def update_all_prices(user_id=None):
         conn = get_db_connection('portfolio')
         cursor = conn.cursor()
         
-        # 사용자 ID로 필터링 조건 설정
-        filter_condition = "WHERE user_id = ?" if user_id else ""
-        params = (user_id,) if user_id else ()
-        
-        # 모든 종목 가져오기
-        cursor.execute(f"SELECT id, 종목코드, 국가, user_id FROM portfolio {filter_condition}", params)
-        stocks = cursor.fetchall()
-        
-        update_count = 0
-        
-        for stock in stocks:
-            try:
-                stock_id, ticker, country, stock_user_id = stock
-                
-                current_price = None
-                usd_price = None
-                
-                if country == '한국':
-                    current_price = get_krx_stock_price(ticker)
-                    if current_price:
-                        cursor.execute(
-                            "UPDATE portfolio SET 현재가_원화 = ?, last_update = ? WHERE id = ?", 
-                            (current_price, datetime.now(), stock_id)
-                        )
-                        update_count += 1
-                else:
-                    usd_price = get_international_stock_price(ticker, country)
-                    if usd_price:
-                        # 환율 적용 (USD → KRW)
-                        exchange_rate = get_exchange_rate('USD', 'KRW')
-                        krw_price = usd_price * exchange_rate if exchange_rate else usd_price
-                        
-                        cursor.execute(
-                            "UPDATE portfolio SET 현재가_달러 = ?, 현재가_원화 = ?, last_update = ? WHERE id = ?", 
-                            (usd_price, krw_price, datetime.now(), stock_id)
-                        )
-                        current_price = krw_price
-                        update_count += 1
-                
-                # 평가액, 손익 계산 업데이트
-                if current_price:
-                    cursor.execute("""
-                        SELECT 수량, 평단가_원화, 배당금 FROM portfolio WHERE id = ?
-                    """, (stock_id,))
-                    
-                    stock_data = cursor.fetchone()
-                    
-                    if stock_data:
-                        qty, avg_price, dividend = stock_data
-                        dividend = dividend or 0
-                        
-                        eval_amount = qty * current_price
-                        profit_amount = qty * (current_price - avg_price)
-                        profit_percent = (current_price - avg_price) / avg_price * 100 if avg_price > 0 else 0
-                        
-                        # 배당금을 포함한 총수익률
-                        total_profit_amount = profit_amount + dividend
-                        total_profit_percent = ((current_price - avg_price) / avg_price * 100) + (dividend / (qty * avg_price) * 100) if avg_price > 0 and qty > 0 else 0
-                        
-                        cursor.execute("""
-                            UPDATE portfolio 
-                            SET 평가액 = ?, 손익금액 = ?, 손익수익 = ?, 총수익률 = ?, last_update = ?
-                            WHERE id = ?
-                        """, (eval_amount, profit_amount, profit_percent, total_profit_percent, datetime.now(), stock_id))
-            except Exception as e:
-                log_exception(logger, e, {"context": "종목 가격 업데이트", "ticker": ticker})
-        
-        # 각 사용자별 포트폴리오 투자비중 업데이트
+        # 조회할 종목 목록 (종목별 1행)
         if user_id:
-            # 특정 사용자의 포트폴리오만 업데이트
-            cursor.execute("SELECT SUM(평가액) FROM portfolio WHERE user_id = ?", (user_id,))
-            total_value = cursor.fetchone()[0] or 0
+            cursor.execute(
+                """
+                SELECT DISTINCT 종목코드, 국가 FROM portfolio
+                WHERE user_id = ? AND 종목코드 IS NOT NULL AND 국가 IS NOT NULL
+                """,
+                (user_id,)
+            )
+            symbols = cursor.fetchall()
             
-            if total_value > 0:
-                cursor.execute("""
-                    UPDATE portfolio 
-                    SET 투자비중 = (평가액 / ?) * 100
-                    WHERE user_id = ?
-                """, (total_value, user_id))
+            # 사용자 종목이 유니버스에 빠짐없이 있도록 보정
+            sync_held_symbols(cursor, symbols)
         else:
-            # 모든 사용자의 포트폴리오 업데이트
-            cursor.execute("SELECT DISTINCT user_id FROM portfolio")
-            user_ids = [row[0] for row in cursor.fetchall()]
-            
-            for uid in user_ids:
-                cursor.execute("SELECT SUM(평가액) FROM portfolio WHERE user_id = ?", (uid,))
-                total_value = cursor.fetchone()[0] or 0
-                
-                if total_value > 0:
-                    cursor.execute("""
-                        UPDATE portfolio 
-                        SET 투자비중 = (평가액 / ?) * 100
-                        WHERE user_id = ?
-                    """, (total_value, uid))
+            cursor.execute("SELECT 종목코드, 국가 FROM held_symbols")
+            symbols = cursor.fetchall()
+        
+        # 해외 종목이 있으면 환율은 한 번만 조회
+        exchange_rate = None
+        if any(country != '한국' for _, country in symbols):
+            exchange_rate = get_exchange_rate('USD', 'KRW')
+        
+        # 종목별 시세 조회
+        update_time = datetime.now()
+        price_rows = []
+        
+        for ticker, country in symbols:
+            krw_price, usd_price = _quote_symbol(ticker, country, exchange_rate)
+            if krw_price:
+                price_rows.append((krw_price, usd_price, update_time, ticker, country))
+        
+        # 종목별 시세 저장 (사용자 단위 갱신 시에도 유니버스 시세는 최신으로 유지)
+        cursor.executemany(
+            """
+            UPDATE held_symbols
+            SET 현재가_원화 = ?, 현재가_달러 = COALESCE(?, 현재가_달러), last_price_update = ?
+            WHERE 종목코드 = ? AND 국가 = ?
+            """,
+            price_rows
+        )
+        
+        # 조회한 시세를 당일 종가 이력으로 저장 (과거 평가액 재구성용)
+        store_daily_closes(
+            [(ticker, country, usd_price if usd_price else krw_price) for krw_price, usd_price, _, ticker, country in price_rows],
+            {('USD', 'KRW'): exchange_rate} if exchange_rate else None
+        )
+        
+        # 전체 포지션 재평가 (평가액, 손익, 총수익률, 투자비중)
+        update_count = revalue_positions(cursor, user_id, refreshed_at=update_time)
         
         conn.commit()
         conn.close()
         
-        logger.info(f"가격 업데이트 완료: {update_count}개 종목")
+        
+        logger.info(f"가격 업데이트 완료: {len(price_rows)}개 종목 조회, {update_count}개 포지션 반영")
         return update_count
     except Exception as e:
         log_exception(logger, e, {"context": "가격 업데이트"})
-        return 0
\ No newline at end of file
+        return 0
+
+def _quote_symbol(ticker, country, exchange_rate=None):
+    """
+    종목 하나의 현재 시세 조회 (해외 종목은 원화로 환산)
+    
+    Args:
+        ticker (str): 종목코드
+        country (str): 국가
+        exchange_rate (float, optional): USD/KRW 환율 (없으면 필요할 때 조회)
+        
+    Returns:
+        tuple: (원화 가격, 달러 가격) / 조회 실패 시 (None, None)
+    """
+    try:
+        if country == '한국':
+            current_price = get_krx_stock_price(ticker)
+            return (current_price, None) if current_price else (None, None)
+        
+        usd_price = get_international_stock_price(ticker, country)
+        if not usd_price:
+            return None, None
+        
+        # 환율 적용 (USD → KRW)
+        if exchange_rate is None:
+            exchange_rate = get_exchange_rate('USD', 'KRW')
+        krw_price = usd_price * exchange_rate if exchange_rate else usd_price
+        return krw_price, usd_price
+    except Exception as e:
+        log_exception(logger, e, {"context": "종목 가격 업데이트", "ticker": ticker})
+        return None, None
+
+def store_held_symbol_price(cursor, ticker, country, price, usd_price=None):
+    """
+    보유 종목 유니버스(held_symbols)에 종목 하나의 시세 저장 (커밋은 호출하는 쪽에서 처리)
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        ticker (str): 종목코드
+        country (str): 국가
+        price (float): 원화 가격
+        usd_price (float, optional): 달러 가격 (없으면 기존 값 유지)
+    """
+    cursor.execute(
+        """
+        UPDATE held_symbols
+        SET 현재가_원화 = ?, 현재가_달러 = COALESCE(?, 현재가_달러), last_price_update = ?
+        WHERE 종목코드 = ? AND 국가 = ?
+        """,
+        (price, usd_price, datetime.now(), ticker, country)
+    )
+
+def revalue_position(cursor, user_id, position_id, fallback_price=None, fetch_missing=True):
+    """
+    포지션 하나만 재평가 (매수/매도 직후 빠른 경로)
+    
+    보유 종목 유니버스(held_symbols)에 캐시된 시세로 해당 포지션의 현재가, 평가액, 손익금액,
+    손익수익, 총수익률을 UPDATE 한 번으로 다시 계산합니다. 캐시된 시세가 없는 종목(처음 매수한
+    종목 등)은 fetch_missing이면 그 종목만 조회해 유니버스에 저장하고, 그래도 없으면 기존 현재가나
+    거래가로 평가합니다. 투자비중은 update_position_weights()로 갱신하며, 커밋은 호출하는 쪽에서 처리합니다.
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+        position_id (int): 포트폴리오 종목 ID
+        fallback_price (float, optional): 시세를 구하지 못했을 때 쓸 원화 가격 (보통 거래가)
+        fetch_missing (bool, optional): 캐시된 시세가 없을 때 조회 여부 (거래 중에는 False)
+        
+    Returns:
+        bool: 재평가 여부
+    """
+    cursor.execute(
+        """
+        SELECT p.종목코드, p.국가, p.현재가_원화, h.현재가_원화, h.현재가_달러
+        FROM portfolio AS p
+        LEFT JOIN held_symbols AS h ON h.종목코드 = p.종목코드 AND h.국가 = p.국가
+        WHERE p.id = ? AND p.user_id = ?
+        """,
+        (position_id, user_id)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    
+    ticker, country, old_price, price, usd_price = row
+    
+    # 캐시된 시세가 없으면 이 종목만 조회
+    if fetch_missing and (not price or price <= 0):
+        price, usd_price = _quote_symbol(ticker, country)
+        if price:
+            store_held_symbol_price(cursor, ticker, country, price, usd_price)
+    
+    if not price or price <= 0:
+        price, usd_price = (old_price if old_price and old_price > 0 else fallback_price), None
+    if not price or price <= 0:
+        return False
+    
+    if country == '한국':
+        usd_price = None
+    
+    # revalue_positions()와 같은 계산식 (평단가가 없으면 수익률 0)
+    cursor.execute(
+        """
+        UPDATE portfolio
+        SET 현재가_원화 = :price,
+            현재가_달러 = COALESCE(:usd_price, 현재가_달러),
+            평가액 = COALESCE(수량, 0) * :price,
+            손익금액 = COALESCE(수량, 0) * (:price - COALESCE(평단가_원화, 0)),
+            손익수익 = CASE WHEN 평단가_원화 > 0 THEN (:price - 평단가_원화) / 평단가_원화 * 100 ELSE 0 END,
+            총수익률 = CASE WHEN 평단가_원화 > 0 AND 수량 > 0
+                           THEN (:price - 평단가_원화) / 평단가_원화 * 100
+                                + COALESCE(배당금, 0) / (수량 * 평단가_원화) * 100
+                           ELSE 0 END
+        WHERE id = :id
+        """,
+        {"price": price, "usd_price": usd_price, "id": position_id}
+    )
+    
+    return True
+
+def update_position_weights(cursor, user_id):
+    """
+    사용자 포지션의 투자비중을 UPDATE 한 번으로 갱신
+    
+    총 평가액은 트리거로 관리되는 집계 테이블(portfolio_aggregates)에서 읽으므로 합계를 다시
+    계산하지 않습니다. 커밋은 호출하는 쪽에서 처리합니다.
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int): 사용자 ID
+        
+    Returns:
+        int: 투자비중이 바뀐 포지션 수
+    """
+    cursor.execute(
+        "SELECT total_value FROM portfolio_aggregates WHERE user_id = ? AND dimension = 'total' AND dim_value = ''",
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    total_value = row[0] if row else 0
+    
+    if not total_value or total_value <= 0:
+        return 0
+    
+    cursor.execute(
+        """
+        UPDATE portfolio
+        SET 투자비중 = COALESCE(평가액, 0) * 100.0 / :total
+        WHERE user_id = :user_id AND 투자비중 IS NOT COALESCE(평가액, 0) * 100.0 / :total
+        """,
+        {"total": total_value, "user_id": user_id}
+    )
+    
+    return cursor.rowcount
+
+def revalue_positions(cursor, user_id=None, refreshed_at=None):
+    """
+    포지션 일괄 재평가 (numpy 벡터 연산)
+    
+    대상 포지션을 한 번에 읽어 보유 종목 유니버스의 최신 시세로 평가액, 손익금액, 손익수익,
+    총수익률(배당 포함), 사용자별 투자비중을 배열 연산으로 계산하고, 값이 바뀐 행만
+    executemany 한 번으로 저장합니다. 시세가 없는 포지션은 기존 값을 유지합니다.
+    커밋은 호출하는 쪽에서 처리합니다.
+    
+    Args:
+        cursor (sqlite3.Cursor): 포트폴리오 DB 커서
+        user_id (int, optional): 특정 사용자 ID (None이면 전체 사용자)
+        refreshed_at (datetime, optional): 이번 시세 갱신 시각 (held_symbols.last_price_update와 같은 값인
+            포지션만 갱신된 것으로 보고 last_update 기록)
+        
+    Returns:
+        int: 이번 시세 갱신이 반영된 포지션 수
+    """
+    user_filter = "WHERE p.user_id = ?" if user_id else ""
+    params = (refreshed_at,) + ((user_id,) if user_id else ())
+    
+    # 대량 조회이므로 sqlite3.Row 대신 튜플로 읽고, 모든 열을 숫자로 받아 한 번에 배열로 변환
+    read_cursor = cursor.connection.cursor()
+    read_cursor.row_factory = None
+    read_cursor.execute(
+        f"""
+        SELECT p.id, p.user_id, p.국가 = '한국', p.수량, p.평단가_원화, p.배당금,
+               p.현재가_원화, p.현재가_달러, p.평가액, p.손익금액, p.손익수익, p.총수익률, p.투자비중,
+               h.현재가_원화, h.현재가_달러, COALESCE(h.last_price_update = ?, 0)
+        FROM portfolio AS p
+        LEFT JOIN held_symbols AS h ON h.종목코드 = p.종목코드 AND h.국가 = p.국가
+        {user_filter}
+        """,
+        params
+    )
+    rows = read_cursor.fetchall()
+    read_cursor.close()
+    
+    if not rows:
+        return 0
+    
+    # None은 NaN으로 변환됨
+    data = np.array(rows, dtype=float).T
+    ids = data[0].astype(np.int64)
+    user_ids = np.nan_to_num(data[1], nan=-1).astype(np.int64)
+    is_korean = data[2] == 1
+    qty, avg_price, dividend = (np.nan_to_num(data[i]) for i in (3, 4, 5))
+    old_price, old_usd, old_value, old_profit, old_profit_pct, old_total_pct, old_weight = data[6:13]
+    new_price, new_usd = data[13], data[14]
+    
+    # 최신 시세 (유니버스 시세 우선, 없으면 기존 현재가)
+    has_new_price = ~np.isnan(new_price) & (new_price > 0)
+    price = np.where(has_new_price, new_price, old_price)
+    usd_price = np.where(has_new_price & ~is_korean & ~np.isnan(new_usd), new_usd, old_usd)
+    priced = ~np.isnan(price) & (price > 0)
+    
+    # 평가액, 손익 (시세가 없는 포지션은 기존 값 유지)
+    cost = qty * avg_price
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_pct = np.where(avg_price > 0, (price - avg_price) / avg_price * 100, 0.0)
+        dividend_pct = np.where(cost > 0, dividend / cost * 100, 0.0)
+    
+    value = np.where(priced, qty * price, old_value)
+    profit = np.where(priced, qty * (price - avg_price), old_profit)
+    profit_pct = np.where(priced, profit_pct, old_profit_pct)
+    total_pct = np.where(priced, np.where((avg_price > 0) & (qty > 0), profit_pct + dividend_pct, 0.0), old_total_pct)
+    
+    # 사용자별 투자비중
+    _, user_index = np.unique(user_ids, return_inverse=True)
+    user_totals = np.bincount(user_index, weights=np.nan_to_num(value))[user_index]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(user_totals > 0, value / user_totals * 100, old_weight)
+    
+    # 이번 갱신 시세가 반영된 포지션
+    refreshed = has_new_price & (data[15] == 1) if refreshed_at is not None else has_new_price
+    
+    # 값이 바뀐 행만 저장
+    new_values = [price, usd_price, value, profit, profit_pct, total_pct, weight]
+    old_values = [old_price, old_usd, old_value, old_profit, old_profit_pct, old_total_pct, old_weight]
+    changed = refreshed.copy()
+    for new, old in zip(new_values, old_values):
+        changed |= ~((new == old) | (np.isnan(new) & np.isnan(old)))
+    
+    index = np.flatnonzero(changed)
+    if len(index) == 0:
+        return 0
+    
+    refreshed_text = (refreshed_at or datetime.now()).isoformat(' ')
+    last_update = [refreshed_text if flag else None for flag in refreshed[index].tolist()]
+    
+    # NaN은 SQLite에서 NULL로 저장됨
+    cursor.executemany(
+        """
+        UPDATE portfolio
+        SET 현재가_원화 = ?, 현재가_달러 = ?, 평가액 = ?, 손익금액 = ?, 손익수익 = ?, 총수익률 = ?,
+            투자비중 = ?, last_update = COALESCE(?, last_update)
+        WHERE id = ?
+        """,
+        zip(*(array[index].tolist() for array in new_values), last_update, ids[index].tolist())
+    )
+    
+    return int(refreshed.sum())
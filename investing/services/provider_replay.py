@@ -0,0 +1,406 @@
+"""
+외부 데이터 프로바이더 응답 기록/재생 모듈 (성능 측정 재현용)
+
+기록(record) 모드에서는 pykrx/yfinance/HTTP 응답과 실제 응답 시간을 픽스처 파일로 저장하고,
+재생(replay) 모드에서는 저장된 응답을 원래 응답 시간(배율 조정 가능)만큼 지연시켜 반환합니다.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, date
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    pd = None
+    PANDAS_AVAILABLE = False
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 기본 설정 (환경 변수로 덮어쓰기 가능)
+REPLAY_SETTINGS = {
+    'mode': os.environ.get('PROVIDER_REPLAY_MODE', 'off'),  # 'off', 'record', 'replay'
+    'fixture_dir': os.environ.get('PROVIDER_FIXTURE_DIR', 'data/fixtures'),
+    'latency_scale': float(os.environ.get('PROVIDER_LATENCY_SCALE', '1.0')),
+    'strict': True,  # 재생 모드에서 픽스처가 없으면 실제 호출 대신 오류 발생
+    'relative_dates': True  # 날짜 인자를 오늘 기준 상대 일수로 키에 반영 (다른 날에도 같은 픽스처 재생)
+}
+
+# 호출 키에서 날짜로 보는 문자열 인자 (pykrx 'YYYYMMDD', yfinance 'YYYY-MM-DD')
+_DATE_ARG_PATTERN = re.compile(r"^(\d{4})-?(\d{2})-?(\d{2})$")
+
+_lock = threading.Lock()
+_replay_cursors = {}  # 호출 키 -> 다음에 반환할 응답 순번
+_fixture_cache = {}   # 호출 키 -> 로드된 픽스처
+
+class ReplayMissError(LookupError):
+    """재생 모드에서 기록된 응답이 없을 때 발생하는 예외"""
+    pass
+
+class ReplayProviderError(RuntimeError):
+    """기록 당시 프로바이더가 오류를 반환한 호출을 재생할 때 발생하는 예외"""
+    pass
+
+class ReplayResponse:
+    """
+    기록된 HTTP 응답 (requests.Response 대체 객체)
+    """
+    def __init__(self, status_code, text, headers=None, url=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.url = url
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+def start_recording(fixture_dir=None):
+    """
+    기록 모드 시작
+
+    Args:
+        fixture_dir (str, optional): 픽스처 저장 디렉토리
+    """
+    _set_mode('record', fixture_dir)
+
+def start_replay(fixture_dir=None, latency_scale=1.0, strict=True):
+    """
+    재생 모드 시작
+
+    Args:
+        fixture_dir (str, optional): 픽스처 디렉토리
+        latency_scale (float): 기록된 응답 시간 배율 (0이면 지연 없음)
+        strict (bool): 픽스처가 없을 때 오류 발생 여부 (False면 실제 호출)
+    """
+    _set_mode('replay', fixture_dir)
+    REPLAY_SETTINGS['latency_scale'] = float(latency_scale)
+    REPLAY_SETTINGS['strict'] = strict
+
+def stop():
+    """
+    기록/재생 모드 종료 (실제 프로바이더 호출로 복귀)
+    """
+    _set_mode('off', None)
+
+def get_mode():
+    """
+    현재 모드 반환
+
+    Returns:
+        str: 'off', 'record', 'replay' 중 하나
+    """
+    return REPLAY_SETTINGS['mode']
+
+def _set_mode(mode, fixture_dir):
+    with _lock:
+        REPLAY_SETTINGS['mode'] = mode
+        if fixture_dir:
+            REPLAY_SETTINGS['fixture_dir'] = fixture_dir
+        _replay_cursors.clear()
+        _fixture_cache.clear()
+
+    if mode == 'record':
+        os.makedirs(REPLAY_SETTINGS['fixture_dir'], exist_ok=True)
+
+    logger.info(f"프로바이더 기록/재생 모드 변경: {mode} ({REPLAY_SETTINGS['fixture_dir']})")
+
+def call(provider, func, *args, **kwargs):
+    """
+    현재 모드에 따라 프로바이더 호출 (기록/재생/실제 호출)
+
+    Args:
+        provider (str): 프로바이더 이름
+        func (callable): 호출할 함수
+        *args, **kwargs: 함수 인자
+
+    Returns:
+        호출 결과 (재생 모드에서는 기록된 결과)
+    """
+    mode = REPLAY_SETTINGS['mode']
+
+    if mode == 'off':
+        return func(*args, **kwargs)
+
+    key, description = _make_call_key(provider, func, args, kwargs)
+
+    if mode == 'replay':
+        entry = _next_recorded_entry(provider, key)
+        if entry is not None:
+            return _replay_entry(entry)
+        if REPLAY_SETTINGS['strict']:
+            raise ReplayMissError(f"기록된 응답 없음: {description}")
+        return func(*args, **kwargs)
+
+    # 기록 모드
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _append_entry(provider, key, description, {
+            'elapsed_ms': elapsed_ms,
+            'kind': 'error',
+            'payload': f"{type(e).__name__}: {e}"
+        })
+        raise
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    try:
+        kind, payload = _serialize(result)
+        _append_entry(provider, key, description, {
+            'elapsed_ms': elapsed_ms,
+            'kind': kind,
+            'payload': payload
+        })
+    except Exception as e:
+        logger.warning(f"프로바이더 응답 기록 실패 ({description}): {e}")
+
+    return result
+
+def _relative_date(value):
+    """
+    날짜 인자를 오늘 기준 상대 일수 표현으로 변환
+
+    Returns:
+        str or None: '<today-30d>' 형식 (날짜 인자가 아니면 None)
+    """
+    if isinstance(value, datetime):
+        day = value.date()
+    elif isinstance(value, date):
+        day = value
+    elif isinstance(value, str):
+        match = _DATE_ARG_PATTERN.match(value)
+        if not match:
+            return None
+        try:
+            day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return None
+    else:
+        return None
+
+    return f"<today{(day - date.today()).days:+d}d>"
+
+def _describe_value(value):
+    """호출 키 생성을 위한 인자 문자열 표현"""
+    if REPLAY_SETTINGS['relative_dates']:
+        relative = _relative_date(value)
+        if relative is not None:
+            return relative
+    if PANDAS_AVAILABLE and isinstance(value, (pd.DataFrame, pd.Series)):
+        return f"<{type(value).__name__} {value.shape}>"
+    # yfinance Ticker 등은 repr에 종목코드가 포함됨
+    return repr(value)
+
+def _make_call_key(provider, func, args, kwargs):
+    """
+    호출 식별 키 생성 (프로바이더, 함수, 인자 기준)
+
+    market_service는 조회 기간을 datetime.now() 기준으로 넘기므로, 날짜 인자는 절대 날짜 대신
+    오늘과의 차이(일)로 키에 넣어 기록한 다음 날에도 같은 픽스처가 재생되도록 합니다.
+
+    Returns:
+        tuple: (해시 키, 사람이 읽을 수 있는 호출 설명)
+    """
+    name = getattr(func, '__qualname__', None) or getattr(func, '__name__', repr(func))
+    owner = getattr(func, '__self__', None)
+    if owner is not None and not isinstance(owner, type(os)):
+        name = f"{_describe_value(owner)}.{getattr(func, '__name__', name)}"
+
+    parts = [_describe_value(arg) for arg in args]
+    parts += [f"{k}={_describe_value(v)}" for k, v in sorted(kwargs.items())]
+    description = f"{provider}:{name}({', '.join(parts)})"
+    key = hashlib.sha1(description.encode('utf-8')).hexdigest()[:20]
+
+    return key, description
+
+def _fixture_path(provider, key):
+    return os.path.join(REPLAY_SETTINGS['fixture_dir'], f"{provider}_{key}.json")
+
+def _load_fixture(provider, key):
+    """픽스처 파일 로드 (없으면 None)"""
+    if key in _fixture_cache:
+        return _fixture_cache[key]
+
+    path = _fixture_path(provider, key)
+    fixture = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+
+    _fixture_cache[key] = fixture
+    return fixture
+
+def _append_entry(provider, key, description, entry):
+    """기록 모드에서 응답 추가 저장 (같은 호출은 순서대로 누적)"""
+    with _lock:
+        fixture = _load_fixture(provider, key) or {
+            'provider': provider,
+            'call': description,
+            'recorded_at': datetime.now().isoformat(),
+            'responses': []
+        }
+        fixture['responses'].append(entry)
+        _fixture_cache[key] = fixture
+
+        path = _fixture_path(provider, key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+def _next_recorded_entry(provider, key):
+    """
+    재생할 다음 응답 반환 (같은 호출이 반복되면 기록 순서대로, 마지막 응답은 계속 재사용)
+    """
+    with _lock:
+        fixture = _load_fixture(provider, key)
+        if not fixture or not fixture['responses']:
+            return None
+
+        index = _replay_cursors.get(key, 0)
+        _replay_cursors[key] = index + 1
+        return fixture['responses'][min(index, len(fixture['responses']) - 1)]
+
+def _replay_entry(entry):
+    """기록된 응답 시간만큼 대기 후 결과 복원"""
+    delay = entry['elapsed_ms'] * REPLAY_SETTINGS['latency_scale'] / 1000
+    if delay > 0:
+        time.sleep(delay)
+
+    if entry['kind'] == 'error':
+        raise ReplayProviderError(entry['payload'])
+
+    return _deserialize(entry['kind'], entry['payload'])
+
+def _json_default(value):
+    """JSON 직렬화 불가 값 변환 (날짜, numpy 타입 등)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def _serialize(result):
+    """
+    프로바이더 응답을 JSON 저장 가능한 형태로 변환
+
+    Returns:
+        tuple: (응답 유형, 저장 데이터)
+    """
+    if PANDAS_AVAILABLE and isinstance(result, pd.DataFrame):
+        return 'dataframe', _serialize_frame(result)
+
+    if PANDAS_AVAILABLE and isinstance(result, pd.Series):
+        payload = _serialize_frame(result.to_frame(name=result.name if result.name is not None else 0))
+        payload['series_name'] = result.name
+        return 'series', payload
+
+    if hasattr(result, 'status_code') and hasattr(result, 'text'):
+        return 'http', {
+            'status_code': result.status_code,
+            'text': result.text,
+            'headers': dict(getattr(result, 'headers', {}) or {}),
+            'url': getattr(result, 'url', None)
+        }
+
+    # dict, list, str, 숫자 등 (JSON 왕복 검증)
+    return 'json', json.loads(json.dumps(result, default=_json_default))
+
+def _serialize_frame(df):
+    """DataFrame을 split 형식으로 변환 (날짜 인덱스 여부 기록)"""
+    split = json.loads(df.to_json(orient='split', date_format='iso', date_unit='ns'))
+    return {
+        'columns': split['columns'],
+        'index': split['index'],
+        'data': split['data'],
+        'index_name': df.index.name,
+        'datetime_index': isinstance(df.index, pd.DatetimeIndex),
+        'index_tz': str(df.index.tz) if isinstance(df.index, pd.DatetimeIndex) and df.index.tz else None,
+        'dtypes': {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+    }
+
+def _deserialize(kind, payload):
+    """저장된 응답을 원래 형태로 복원"""
+    if kind == 'dataframe':
+        return _deserialize_frame(payload)
+
+    if kind == 'series':
+        df = _deserialize_frame(payload)
+        series = df.iloc[:, 0] if len(df.columns) else pd.Series(dtype=float)
+        series.name = payload.get('series_name')
+        return series
+
+    if kind == 'http':
+        return ReplayResponse(payload['status_code'], payload['text'], payload.get('headers'), payload.get('url'))
+
+    return payload
+
+def _deserialize_frame(payload):
+    if not PANDAS_AVAILABLE:
+        raise ReplayMissError("pandas가 설치되어 있지 않아 DataFrame 응답을 재생할 수 없습니다.")
+
+    index = payload['index']
+    if payload.get('datetime_index'):
+        index = pd.to_datetime(index)
+        if payload.get('index_tz'):
+            index = index.tz_convert(payload['index_tz'])
+
+    df = pd.DataFrame(payload['data'], columns=payload['columns'], index=index)
+    df.index.name = payload.get('index_name')
+
+    for col in df.columns:
+        dtype = payload.get('dtypes', {}).get(str(col))
+        if dtype and dtype != 'object':
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                pass
+
+    return df
+
+def benchmark(func, *args, repeat=5, **kwargs):
+    """
+    함수 실행 시간 측정 (재생 모드와 함께 사용하면 실행마다 동일한 응답으로 비교 가능)
+
+    Args:
+        func (callable): 측정할 함수 (예: update_all_prices, get_stock_chart_data)
+        *args, **kwargs: 함수 인자
+        repeat (int): 반복 횟수
+
+    Returns:
+        dict: 실행 시간 통계 (밀리초)
+    """
+    timings = []
+    for _ in range(repeat):
+        # 반복마다 같은 순서로 응답을 재생하도록 커서 초기화
+        with _lock:
+            _replay_cursors.clear()
+
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'mode': REPLAY_SETTINGS['mode'],
+        'repeat': repeat,
+        'min_ms': timings[0],
+        'median_ms': timings[len(timings) // 2],
+        'max_ms': timings[-1],
+        'timings_ms': timings
+    }
@@ -0,0 +1,387 @@
+"""
+리밸런싱 주문 생성 서비스
+
+목표 비중(최적화 결과 또는 사용자 지정)과 여러 증권사/계좌에 흩어진 보유 수량으로
+매수/매도 주문 목록을 만듭니다. 종목별 매매 금액은 회전율 예산과 현금 제약 아래에서
+목표 대비 편차 제곱합이 최소가 되도록 수위 채우기(water-filling)로 정하고,
+계좌 배분과 매매 단위 반올림은 주문 수가 적어지도록 탐욕적으로 처리한 뒤 남은 현금으로 보정합니다.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# 리밸런싱 설정
+REBALANCE_SETTINGS = {
+    "lot_sizes": {"한국": 1, "미국": 1},  # 국가별 기본 매매 단위 (주)
+    "min_order_value": 10000,            # 최소 주문 금액 (원), 미만은 주문하지 않음
+    "refine_points": 64                  # 매수/매도 총액 배분 탐색 격자 크기
+}
+
+def _load_positions(user_id):
+    """계좌별 보유 종목 조회 (종목코드, 국가, 종목명, 증권사, 계좌, 수량, 원화 현재가)"""
+    conn = get_db_connection('portfolio')
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT 종목코드, 국가, 종목명, 증권사, 계좌, 수량, 현재가_원화
+        FROM portfolio
+        WHERE user_id = ? AND 수량 > 0
+    """, (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def _fetch_price(ticker, country):
+    """보유하지 않은 목표 종목의 원화 현재가 조회"""
+    from services.market_service import get_krx_stock_price, get_international_stock_price, get_exchange_rate
+
+    if country == '한국':
+        return get_krx_stock_price(ticker)
+
+    price = get_international_stock_price(ticker, country)
+    exchange_rate = get_exchange_rate('USD', 'KRW')
+    return price * exchange_rate if price and exchange_rate else None
+
+def targets_from_optimization(result):
+    """
+    최적화 결과를 목표 비중 딕셔너리로 변환
+
+    Args:
+        result (dict): optimizer_service.run_optimization() 결과
+
+    Returns:
+        dict: {(종목코드, 국가): 목표 비중 (0~1)}
+    """
+    if not result or result.get("status") != "success":
+        return {}
+    return {(item["ticker"], item["country"]): item["target_weight"] / 100 for item in result["weights"]}
+
+def _water_level(desired, totals):
+    """
+    sum(max(desired - level, 0)) = total 을 만족하는 수위 계산 (total 여러 개를 한 번에)
+
+    Args:
+        desired (numpy.ndarray): 종목별 원하는 매매 금액 (0 이상)
+        totals (numpy.ndarray): 총 매매 금액 후보
+
+    Returns:
+        numpy.ndarray: total별 수위
+    """
+    if len(desired) == 0:
+        return np.zeros(len(totals))
+
+    ordered = np.sort(desired)[::-1]
+    cumulative = np.cumsum(ordered)
+    counts = np.arange(1, len(ordered) + 1)
+
+    # 상위 k개 종목만 매매할 때의 수위 후보, 다음 종목 금액 이상이 되는 첫 k가 정답
+    levels = (cumulative[None, :] - totals[:, None]) / counts[None, :]
+    following = np.append(ordered[1:], 0.0)
+    valid = levels >= following[None, :] - 1e-9
+    first = np.argmax(valid, axis=1)
+    return np.maximum(levels[np.arange(len(totals)), first], 0.0)
+
+def _allocate_trade_totals(buy_desired, sell_desired, cash, turnover_budget):
+    """
+    회전율 예산과 현금 제약 아래에서 종목별 매수/매도 금액 결정
+
+    편차 제곱합 sum((목표 - 매매 후)^2) 을 최소화하면 매수와 매도 각각 수위 이상인 부분만 매매하는 해가 되므로,
+    매도 총액 격자마다 가능한 최대 매수 총액을 정해 남는 편차를 한 번에 계산하고
+    가장 좋은 점 주변을 한 번 더 촘촘히 탐색합니다.
+
+    Returns:
+        tuple: (종목별 매수 금액, 종목별 매도 금액)
+    """
+    max_sell = sell_desired.sum()
+    max_buy = buy_desired.sum()
+    budget = np.inf if turnover_budget is None else turnover_budget
+
+    def evaluate(sell_totals):
+        buy_totals = np.minimum(np.minimum(max_buy, sell_totals + cash), np.maximum(budget - sell_totals, 0))
+        sell_levels = _water_level(sell_desired, sell_totals)
+        buy_levels = _water_level(buy_desired, buy_totals)
+        remaining = (np.minimum(sell_desired[None, :], sell_levels[:, None]) ** 2).sum(axis=1)
+        remaining += (np.minimum(buy_desired[None, :], buy_levels[:, None]) ** 2).sum(axis=1)
+        return buy_totals, sell_levels, buy_levels, remaining
+
+    points = REBALANCE_SETTINGS["refine_points"]
+    sell_totals = np.linspace(0, min(max_sell, budget), points)
+    remaining = evaluate(sell_totals)[3]
+    best = int(np.argmin(remaining))
+    sell_totals = np.linspace(sell_totals[max(best - 1, 0)], sell_totals[min(best + 1, points - 1)], points)
+    _, sell_levels, buy_levels, remaining = evaluate(sell_totals)
+    best = int(np.argmin(remaining))
+
+    buys = np.maximum(buy_desired - buy_levels[best], 0)
+    sells = np.maximum(sell_desired - sell_levels[best], 0)
+    return buys, sells
+
+def _round_lots(value, price, lot, nearest=False):
+    """금액을 매매 단위 수량으로 변환 (기본 내림, nearest이면 반올림)"""
+    if price <= 0:
+        return 0
+    lots = value / (price * lot)
+    lots = np.round(lots) if nearest else np.floor(lots + 1e-9)
+    return int(lots) * lot
+
+def generate_rebalance_orders(user_id, targets=None, cash=None, account_rules=None,
+                              turnover_budget=None, lot_sizes=None):
+    """
+    목표 비중으로 리밸런싱 주문 생성
+
+    목표에 없는 보유 종목은 현재 평가액을 유지합니다. 계좌 간 현금 이동은 없다고 보고
+    각 계좌의 매수는 그 계좌의 현금과 매도 대금 안에서만 이루어집니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        targets (dict, optional): {(종목코드, 국가): 목표 비중 (0~1, 현금 포함 총자산 기준)} (없으면 최대 샤프 최적화 결과)
+        cash (dict, optional): {계좌: 사용 가능 현금 (원)}
+        account_rules (dict, optional): {계좌: {"buy": bool, "sell": bool, "countries": [국가, ...]}}
+        turnover_budget (float, optional): 총자산 대비 최대 매매 금액 비율 (예: 0.1)
+        lot_sizes (dict, optional): {종목코드: 매매 단위} (없으면 국가별 기본값)
+
+    Returns:
+        dict: 주문 목록과 매매 전후 요약
+    """
+    try:
+        cash = {account: float(amount) for account, amount in (cash or {}).items()}
+        account_rules = account_rules or {}
+        lot_sizes = lot_sizes or {}
+
+        if targets is None:
+            from services.optimizer_service import run_optimization
+            targets = targets_from_optimization(run_optimization(user_id))
+        if not targets:
+            return {"status": "error", "message": "목표 비중이 없습니다."}
+
+        rows = _load_positions(user_id)
+
+        # 종목 목록 (보유 종목 + 보유하지 않은 목표 종목)
+        symbols = list(dict.fromkeys([(row[0], row[1]) for row in rows] + list(targets.keys())))
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        names = {(row[0], row[1]): row[2] for row in rows}
+        prices = np.zeros(len(symbols))
+        for row in rows:
+            prices[index[(row[0], row[1])]] = row[6] or 0
+
+        for symbol in targets:
+            if prices[index[symbol]] <= 0:
+                prices[index[symbol]] = _fetch_price(*symbol) or 0
+
+        # 계좌별 보유 (계좌, 종목 위치) -> [증권사, 수량]
+        holdings = {}
+        for ticker, country, _, broker, account, quantity, _ in rows:
+            entry = holdings.setdefault((account, index[(ticker, country)]), [broker, 0.0])
+            entry[1] += quantity or 0
+        accounts = {account: broker for (account, _), (broker, _) in holdings.items()}
+        for account in cash:
+            accounts.setdefault(account, account_rules.get(account, {}).get("broker", ""))
+
+        current = np.zeros(len(symbols))
+        for (_, position), (_, quantity) in holdings.items():
+            current[position] += quantity * prices[position]
+        total_value = current.sum() + sum(cash.values())
+        if total_value <= 0:
+            return {"status": "error", "message": "포트폴리오 평가액이 없습니다."}
+
+        target_values = current.copy()
+        for symbol, weight in targets.items():
+            target_values[index[symbol]] = max(float(weight), 0.0) * total_value
+
+        def allowed(account, position, action):
+            rule = account_rules.get(account, {})
+            if not rule.get(action, True):
+                return False
+            countries = rule.get("countries")
+            return not countries or symbols[position][1] in countries
+
+        # 계좌 제약을 반영한 종목별 최대 매도/매수 금액
+        sellable = np.zeros(len(symbols))
+        for (account, position), (_, quantity) in holdings.items():
+            if allowed(account, position, "sell"):
+                sellable[position] += quantity * prices[position]
+        buyable = np.array([
+            prices[i] > 0 and any(allowed(account, i, "buy") for account in accounts)
+            for i in range(len(symbols))
+        ], dtype=bool)
+
+        difference = target_values - current
+        sell_desired = np.minimum(np.maximum(-difference, 0), sellable)
+        buy_desired = np.where(buyable, np.maximum(difference, 0), 0)
+        budget = None if turnover_budget is None else turnover_budget * total_value
+        buys, sells = _allocate_trade_totals(buy_desired, sell_desired, sum(cash.values()), budget)
+
+        orders = []
+        funds = {account: cash.get(account, 0.0) for account in accounts}
+        traded = np.zeros(len(symbols))
+
+        def lot_of(position):
+            ticker, country = symbols[position]
+            return lot_sizes.get(ticker, REBALANCE_SETTINGS["lot_sizes"].get(country, 1))
+
+        def add_order(action, account, position, quantity):
+            value = quantity * prices[position]
+            ticker, country = symbols[position]
+            orders.append({
+                "action": action,
+                "broker": accounts.get(account, ""),
+                "account": account,
+                "country": country,
+                "ticker": ticker,
+                "name": names.get(symbols[position], ticker),
+                "quantity": quantity,
+                "price": float(prices[position]),
+                "value": float(value)
+            })
+            funds[account] += value if action == 'sell' else -value
+            traded[position] += value if action == 'buy' else -value
+
+        # 매도: 보유 금액이 큰 계좌부터 (주문 수 최소화)
+        for position in np.flatnonzero(sells > 0):
+            remaining = sells[position]
+            sources = sorted(
+                ((account, quantity) for (account, p), (_, quantity) in holdings.items()
+                 if p == position and allowed(account, p, "sell")),
+                key=lambda item: -item[1]
+            )
+            for account, quantity in sources:
+                if remaining <= 0:
+                    break
+                amount = min(remaining, quantity * prices[position])
+                # 회전율 예산이 없으면 매도는 가까운 단위로 반올림 (예산이 있으면 넘지 않도록 내림)
+                sell_quantity = min(_round_lots(amount, prices[position], lot_of(position), budget is None), quantity)
+                if sell_quantity <= 0:
+                    continue
+                add_order('sell', account, position, sell_quantity)
+                remaining -= sell_quantity * prices[position]
+
+        # 매수: 금액이 큰 종목부터, 이미 보유한 계좌 > 자금이 많은 계좌 순
+        for position in np.argsort(-buys):
+            remaining = buys[position]
+            if remaining <= 0:
+                break
+            destinations = sorted(
+                (account for account in accounts if allowed(account, position, "buy")),
+                key=lambda account: ((account, position) not in holdings, -funds[account])
+            )
+            for account in destinations:
+                if remaining <= 0:
+                    break
+                amount = min(remaining, funds[account])
+                buy_quantity = _round_lots(amount, prices[position], lot_of(position))
+                if buy_quantity <= 0:
+                    continue
+                add_order('buy', account, position, buy_quantity)
+                remaining -= buy_quantity * prices[position]
+
+        # 보정: 단위 반올림으로 남은 계좌 현금으로 목표에 가장 못 미친 종목을 한 단위씩 추가 매수
+        spent = np.abs(traded).sum()
+        for account in accounts:
+            while True:
+                shortfall = target_values - current - traded
+                lot_cost = np.array([lot_of(i) * prices[i] for i in range(len(symbols))])
+                candidates = [
+                    i for i in range(len(symbols))
+                    if buyable[i] and allowed(account, i, "buy") and shortfall[i] >= lot_cost[i] / 2
+                    and 0 < lot_cost[i] <= funds[account]
+                    and (budget is None or spent + lot_cost[i] <= budget)
+                ]
+                if not candidates:
+                    break
+                position = max(candidates, key=lambda i: shortfall[i])
+                add_order('buy', account, position, lot_of(position))
+                spent += lot_cost[position]
+
+        # 같은 계좌/종목/방향 주문 합치기, 최소 주문 금액 미만 제거
+        merged = {}
+        for order in orders:
+            key = (order["action"], order["account"], order["ticker"], order["country"])
+            if key in merged:
+                merged[key]["quantity"] += order["quantity"]
+                merged[key]["value"] += order["value"]
+            else:
+                merged[key] = dict(order)
+        orders = [order for order in merged.values() if order["value"] >= REBALANCE_SETTINGS["min_order_value"]]
+        orders.sort(key=lambda order: (order["action"] != 'sell', order["account"], -order["value"]))
+
+        traded = np.zeros(len(symbols))
+        for order in orders:
+            position = index[(order["ticker"], order["country"])]
+            traded[position] += order["value"] if order["action"] == 'buy' else -order["value"]
+        after = current + traded
+        turnover = sum(order["value"] for order in orders)
+
+        def deviation(values):
+            return float(np.abs(values - target_values).sum() / total_value * 100)
+
+        cash_after = {
+            account: cash.get(account, 0.0) + sum(
+                order["value"] if order["action"] == 'sell' else -order["value"]
+                for order in orders if order["account"] == account
+            )
+            for account in accounts
+        }
+
+        return {
+            "status": "success",
+            "orders": orders,
+            "total_value": float(total_value),
+            "turnover": float(turnover),
+            "turnover_ratio": float(turnover / total_value * 100),
+            "deviation_before": deviation(current),
+            "deviation_after": deviation(after),
+            "cash_after": cash_after,
+            "weights": [
+                {
+                    "ticker": ticker,
+                    "country": country,
+                    "name": names.get((ticker, country), ticker),
+                    "current_weight": float(current[i] / total_value * 100),
+                    "target_weight": float(target_values[i] / total_value * 100),
+                    "after_weight": float(after[i] / total_value * 100)
+                }
+                for i, (ticker, country) in enumerate(symbols)
+            ]
+        }
+    except Exception as e:
+        log_exception(logger, e, {"context": "리밸런싱 주문 생성", "user_id": user_id})
+        return {"status": "error", "message": f"리밸런싱 주문 생성 중 오류가 발생했습니다: {str(e)}"}
+
+def execute_rebalance_orders(user_id, orders, date=None):
+    """
+    리밸런싱 주문을 한 트랜잭션으로 일괄 실행 (매도 먼저 실행해 매수 자금 확보)
+
+    모든 주문을 함께 검증해 하나라도 실행할 수 없으면 아무 것도 반영하지 않습니다.
+
+    Args:
+        user_id (int): 사용자 ID
+        orders (list): generate_rebalance_orders()의 주문 목록
+        date (str, optional): 거래 날짜 (없으면 현재 날짜)
+
+    Returns:
+        dict: 실행 결과 (executed, failed, message)
+    """
+    from services.portfolio_service import execute_trade_batch
+
+    orders = sorted(orders, key=lambda order: order["action"] != 'sell')
+    memo = f"리밸런싱 {datetime.now().strftime('%Y-%m-%d')}"
+
+    result = execute_trade_batch(user_id, orders, memo=memo, date=date)
+
+    if result["success"]:
+        executed, failed = orders, []
+    else:
+        # 오류가 난 주문에는 사유를, 나머지에는 미실행 사유를 붙임
+        reasons = {error["leg"]: error["message"] for error in result["errors"]}
+        executed = []
+        failed = [
+            {**order, "message": reasons.get(number, result["message"])}
+            for number, order in enumerate(orders, start=1)
+        ]
+
+    logger.info(f"리밸런싱 주문 실행: 성공 {len(executed)}건, 실패 {len(failed)}건, 사용자: {user_id}")
+    return {"executed": executed, "failed": failed, "message": result["message"]}
@@ -0,0 +1,683 @@
+"""
+수익률 계산 서비스 (시간가중수익률 TWR, 금액가중수익률 XIRR)
+
+포트폴리오 이력(portfolio_history)의 평가액에서 매수/매도/배당 현금흐름을 제거해 일별 시간가중수익률을 계산하고,
+거래내역과 현재 평가액으로 사용자별/종목별 XIRR을 구합니다. XIRR은 모든 현금흐름 묶음을 하나의 배열로 놓고
+뉴턴법(구간을 벗어나면 이분법)으로 동시에 풀기 때문에 야간 작업에서 전체 사용자를 한 번에 처리할 수 있습니다.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+from utils.cache import versioned_cache
+
+logger = get_logger(__name__)
+
+# 수익률 계산 설정
+RETURNS_SETTINGS = {
+    "risk_free_rate": 3.0,          # 연간 무위험 수익률 (%)
+    "trading_days": 252,            # 연환산 거래일 수
+    "xirr_bounds": (-0.99, 1000.0), # XIRR 탐색 구간 (연 -99% ~ 100000%)
+    "xirr_max_iterations": 100,
+    "xirr_tolerance": 1e-9,
+    "rolling_windows": (21, 63, 252) # 롤링 지표 창 크기 (거래일 기준 1개월, 3개월, 1년)
+}
+
+# 성과 지표 기간 (기간 시작일까지의 일수, None: 전체)
+PERFORMANCE_PERIODS = {
+    "1m": 30,
+    "3m": 90,
+    "6m": 180,
+    "1y": 365,
+    "all": None
+}
+
+def solve_xirr(amounts, years, segments, segment_count):
+    """
+    여러 현금흐름 묶음의 XIRR을 동시에 계산
+
+    모든 묶음에 대해 한 번에 뉴턴 스텝을 계산하고, 스텝이 부호가 바뀌는 구간을 벗어나면 이분법으로 대체합니다.
+
+    Args:
+        amounts (numpy.ndarray): 현금흐름 (투자자 기준, 투자는 음수, 회수는 양수)
+        years (numpy.ndarray): 묶음의 첫 현금흐름 이후 경과 연수
+        segments (numpy.ndarray): 현금흐름이 속한 묶음 번호 (0 ~ segment_count-1)
+        segment_count (int): 묶음 수
+
+    Returns:
+        numpy.ndarray: 묶음별 연 수익률 (해가 없으면 NaN)
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    years = np.asarray(years, dtype=float)
+    segments = np.asarray(segments, dtype=np.int64)
+
+    if segment_count == 0:
+        return np.array([], dtype=float)
+
+    def npv(rates):
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            growth = 1.0 + rates[segments]
+            discounted = amounts * growth ** (-years)
+            value = np.bincount(segments, discounted, minlength=segment_count)
+            derivative = np.bincount(segments, -years * discounted / growth, minlength=segment_count)
+        return value, derivative
+
+    lower_bound, upper_bound = RETURNS_SETTINGS["xirr_bounds"]
+    tolerance = RETURNS_SETTINGS["xirr_tolerance"]
+
+    lo = np.full(segment_count, lower_bound)
+    hi = np.full(segment_count, upper_bound)
+    f_lo, _ = npv(lo)
+    f_hi, _ = npv(hi)
+
+    # 구간 양 끝의 부호가 다른 묶음만 해가 존재
+    solvable = np.isfinite(f_lo) & np.isfinite(f_hi) & (np.sign(f_lo) != np.sign(f_hi))
+    scale = np.maximum(np.bincount(segments, np.abs(amounts), minlength=segment_count), 1.0)
+
+    rates = np.full(segment_count, 0.1)
+    active = solvable.copy()
+
+    for _ in range(RETURNS_SETTINGS["xirr_max_iterations"]):
+        if not active.any():
+            break
+
+        value, derivative = npv(rates)
+        converged = np.abs(value) <= tolerance * scale
+        active &= ~converged
+        if not active.any():
+            break
+
+        # 현재 값으로 구간 축소
+        same_sign = np.sign(value) == np.sign(f_lo)
+        lo = np.where(active & same_sign, rates, lo)
+        f_lo = np.where(active & same_sign, value, f_lo)
+        hi = np.where(active & ~same_sign, rates, hi)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = rates - value / derivative
+        bisect = (lo + hi) / 2
+        use_newton = np.isfinite(newton) & (newton > lo) & (newton < hi)
+        rates = np.where(active, np.where(use_newton, newton, bisect), rates)
+
+        active &= (hi - lo) > tolerance
+
+    rates[~solvable] = np.nan
+    return rates
+
+def xirr(cash_flows, dates):
+    """
+    단일 현금흐름 XIRR 계산
+
+    Args:
+        cash_flows (list): 현금흐름 (투자는 음수, 회수는 양수)
+        dates (list): 현금흐름 날짜
+
+    Returns:
+        float or None: 연 수익률 (%, 해가 없으면 None)
+    """
+    if len(cash_flows) < 2:
+        return None
+
+    dates = pd.to_datetime(pd.Series(dates), format='mixed')
+    years = ((dates - dates.min()).dt.days / 365.0).to_numpy()
+    rate = solve_xirr(cash_flows, years, np.zeros(len(cash_flows), dtype=np.int64), 1)[0]
+
+    return None if np.isnan(rate) else float(rate * 100)
+
+def _load_cash_flows(cursor, user_id=None):
+    """
+    거래내역과 배당금에서 현금흐름 조회
+
+    Returns:
+        pandas.DataFrame: user_id, portfolio_id, date, flow (포트폴리오로 들어온 금액, 매수는 양수, 매도/배당은 음수)
+    """
+    where, params = ("user_id = ?", (user_id,)) if user_id is not None else ("user_id IS NOT NULL", ())
+
+    cursor.execute(f"""
+        SELECT user_id, portfolio_id, transaction_date,
+               CASE WHEN type = '매수'
+                    THEN COALESCE(quantity, 0) * COALESCE(price, 0) + COALESCE(수수료, 0) + COALESCE(세금, 0)
+                    ELSE -(COALESCE(quantity, 0) * COALESCE(price, 0) - COALESCE(수수료, 0) - COALESCE(세금, 0))
+               END
+        FROM transactions
+        WHERE {where} AND type IN ('매수', '매도')
+        UNION ALL
+        SELECT user_id, portfolio_id, 지급일, -COALESCE(배당액, 0)
+        FROM dividends
+        WHERE {where}
+    """, params * 2)
+
+    flows = pd.DataFrame([tuple(row) for row in cursor.fetchall()], columns=['user_id', 'portfolio_id', 'date', 'flow'])
+    flows['date'] = pd.to_datetime(flows['date'], format='mixed').dt.normalize()
+    flows['flow'] = flows['flow'].astype(float)
+
+    return flows.dropna(subset=['date'])
+
+def _load_history(cursor, user_id=None):
+    where, params = ("user_id = ?", (user_id,)) if user_id is not None else ("user_id IS NOT NULL", ())
+
+    cursor.execute(f"""
+        SELECT user_id, date, total_value
+        FROM portfolio_history
+        WHERE {where}
+        ORDER BY user_id, date
+    """, params)
+
+    history = pd.DataFrame([tuple(row) for row in cursor.fetchall()], columns=['user_id', 'date', 'total_value'])
+    history['date'] = pd.to_datetime(history['date'], format='mixed').dt.normalize()
+    history['total_value'] = history['total_value'].fillna(0).astype(float)
+
+    return history.drop_duplicates(['user_id', 'date'], keep='last').sort_values(['date', 'user_id'])
+
+def compute_time_weighted_returns(history, flows):
+    """
+    일별 시간가중수익률 계산 (전체 사용자 동시 계산)
+
+    포트폴리오 이력은 자정 작업으로 기록되므로 D일의 현금흐름은 D일 이후 첫 번째 이력 구간에 반영합니다.
+    구간 수익률은 (기말 평가액 - 순유입) / 기초 평가액 - 1이며, 기초 평가액이 없으면 순유입 대비 수익률을 사용합니다.
+
+    Args:
+        history (pandas.DataFrame): user_id, date, total_value
+        flows (pandas.DataFrame): user_id, date, flow
+
+    Returns:
+        pandas.DataFrame: user_id, date, total_value, net_flow, daily_return, twr_index
+    """
+    columns = ['user_id', 'date', 'total_value', 'net_flow', 'daily_return', 'twr_index']
+    if history.empty:
+        return pd.DataFrame(columns=columns)
+
+    history = history.sort_values(['date', 'user_id']).reset_index(drop=True)
+
+    if not flows.empty:
+        # 각 현금흐름을 해당 날짜 이후 첫 이력 날짜에 배정
+        assigned = pd.merge_asof(
+            flows[['user_id', 'date', 'flow']].sort_values('date'),
+            history[['user_id', 'date']].assign(period_date=history['date']),
+            on='date', by='user_id', direction='forward', allow_exact_matches=False
+        ).dropna(subset=['period_date'])
+        net_flows = assigned.groupby(['user_id', 'period_date'])['flow'].sum()
+        history = history.merge(
+            net_flows.rename('net_flow'), left_on=['user_id', 'date'], right_index=True, how='left'
+        )
+    else:
+        history['net_flow'] = 0.0
+
+    history['net_flow'] = history['net_flow'].fillna(0.0)
+    history = history.sort_values(['user_id', 'date']).reset_index(drop=True)
+
+    value = history['total_value'].to_numpy()
+    flow = history['net_flow'].to_numpy()
+    previous = history.groupby('user_id')['total_value'].shift(1).to_numpy()
+    first = np.isnan(previous)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_return = np.where(
+            previous > 0,
+            (value - flow) / previous - 1,
+            np.where(flow > 0, value / flow - 1, 0.0)
+        )
+    daily_return[first | ~np.isfinite(daily_return)] = 0.0
+
+    history['daily_return'] = daily_return
+    history['twr_index'] = (1 + history['daily_return']).groupby(history['user_id']).cumprod()
+
+    return history[columns]
+
+def compute_xirr(flows, terminal_values, key, as_of=None):
+    """
+    현금흐름 묶음별 XIRR 계산 (사용자별 또는 종목별)
+
+    Args:
+        flows (pandas.DataFrame): 현금흐름 (key 컬럼, date, flow)
+        terminal_values (dict): 묶음별 현재 평가액 (마지막 회수 현금흐름으로 사용)
+        key (str): 묶음 컬럼명 ('user_id' 또는 'portfolio_id')
+        as_of (datetime, optional): 평가 기준일 (없으면 오늘)
+
+    Returns:
+        dict: 묶음별 연 수익률 (%, 해가 없으면 None)
+    """
+    as_of = pd.Timestamp(as_of or datetime.now()).normalize()
+
+    flows = flows.dropna(subset=[key])
+    terminal = pd.DataFrame({
+        key: list(terminal_values.keys()),
+        'date': as_of,
+        'flow': [-(value or 0) for value in terminal_values.values()]
+    })
+    combined = pd.concat([flows[[key, 'date', 'flow']], terminal], ignore_index=True)
+    if combined.empty:
+        return {}
+
+    # 투자자 기준 현금흐름 (포트폴리오 유입은 투자자 지출)
+    codes, keys = pd.factorize(combined[key])
+    start = combined.groupby(codes)['date'].transform('min')
+    years = ((combined['date'] - start).dt.days / 365.0).to_numpy()
+
+    rates = solve_xirr(-combined['flow'].to_numpy(), years, codes, len(keys))
+
+    return {
+        (int(k) if isinstance(k, (int, np.integer)) else k): (None if np.isnan(rate) else float(rate * 100))
+        for k, rate in zip(keys, rates)
+    }
+
+def update_returns(user_id=None):
+    """
+    시간가중수익률 일별 시계열과 사용자별/종목별 XIRR을 계산하여 저장 (야간 작업)
+
+    Args:
+        user_id (int, optional): 사용자 ID (없으면 전체 사용자)
+
+    Returns:
+        int: 처리한 사용자 수
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        history = _load_history(cursor, user_id)
+        flows = _load_cash_flows(cursor, user_id)
+        series = compute_time_weighted_returns(history, flows)
+
+        # 현재 평가액 (사용자 합계, 종목별)
+        user_filter, params = ("AND user_id = ?", (user_id,)) if user_id is not None else ("", ())
+        cursor.execute(f"""
+            SELECT user_id, total_value FROM portfolio_aggregates
+            WHERE dimension = 'total' {user_filter}
+        """, params)
+        user_values = {row[0]: row[1] for row in cursor.fetchall()}
+
+        cursor.execute(f"SELECT id, user_id, 평가액 FROM portfolio WHERE user_id IS NOT NULL {user_filter}", params)
+        position_rows = cursor.fetchall()
+        position_values = {row[0]: row[2] for row in position_rows}
+        position_users = {row[0]: row[1] for row in position_rows}
+
+        user_ids = sorted(set(series['user_id']) | set(flows['user_id']) | set(user_values))
+        for uid in user_ids:
+            user_values.setdefault(uid, 0)
+
+        user_xirr = compute_xirr(flows, user_values, 'user_id')
+        position_xirr = compute_xirr(flows[flows['portfolio_id'].isin(list(position_values))], position_values, 'portfolio_id')
+
+        now = datetime.now()
+
+        # 일별 시계열 저장
+        if user_id is None:
+            cursor.execute("DELETE FROM portfolio_returns")
+            cursor.execute("DELETE FROM position_returns")
+        else:
+            cursor.execute("DELETE FROM portfolio_returns WHERE user_id = ?", (user_id,))
+            cursor.execute("DELETE FROM position_returns WHERE user_id = ?", (user_id,))
+
+        series_dates = series['date'].dt.strftime('%Y-%m-%d')
+        cursor.executemany(
+            """
+            INSERT INTO portfolio_returns (user_id, date, total_value, net_flow, daily_return, twr_index)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            zip(
+                series['user_id'].astype(int).tolist(), series_dates.tolist(),
+                series['total_value'].astype(float).tolist(), series['net_flow'].astype(float).tolist(),
+                series['daily_return'].astype(float).tolist(), series['twr_index'].astype(float).tolist()
+            )
+        )
+
+        # 사용자별 요약 (첫 이력 대비 마지막 누적 지수)
+        grouped = series.assign(date_text=series_dates).groupby('user_id')
+        first, last = grouped.first(), grouped.last()
+        twr_total = (last['twr_index'] / first['twr_index'] - 1) * 100
+        days = (last['date'] - first['date']).dt.days.to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            twr_annualized = np.where(
+                (days > 0) & (twr_total > -100),
+                ((1 + twr_total / 100) ** (365 / np.maximum(days, 1)) - 1) * 100,
+                0.0
+            )
+
+        summaries = [
+            (int(uid), start, end, float(total), float(annualized), user_xirr.get(uid), now)
+            for uid, start, end, total, annualized in zip(
+                first.index, first['date_text'], last['date_text'], twr_total, twr_annualized
+            )
+        ]
+        summaries += [(int(uid), None, None, 0.0, 0.0, user_xirr.get(uid), now) for uid in set(user_ids) - set(first.index)]
+
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO return_summary (user_id, start_date, end_date, twr_total, twr_annualized, xirr, last_update)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            summaries
+        )
+
+        cursor.executemany(
+            "INSERT INTO position_returns (portfolio_id, user_id, xirr, last_update) VALUES (?, ?, ?, ?)",
+            [(portfolio_id, position_users[portfolio_id], position_xirr.get(portfolio_id), now) for portfolio_id in position_values]
+        )
+
+        conn.commit()
+        conn.close()
+
+        logger.info(f"수익률 계산 완료: {len(user_ids)}명의 사용자, {len(position_values)}개 종목")
+        return len(user_ids)
+    except Exception as e:
+        log_exception(logger, e, {"context": "수익률 계산", "user_id": user_id})
+        return 0
+
+def get_daily_returns(user_id, start_date=None, end_date=None):
+    """
+    사용자의 일별 시간가중수익률 조회 (저장된 시계열이 이력보다 오래되었으면 다시 계산)
+
+    Args:
+        user_id (int): 사용자 ID
+        start_date (date, optional): 시작일
+        end_date (date, optional): 종료일
+
+    Returns:
+        list: 일별 딕셔너리 목록 (date, total_value, net_flow, daily_return, twr_index)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT MAX(date) FROM portfolio_returns WHERE user_id = ?", (user_id,))
+        stored_until = cursor.fetchone()[0]
+        cursor.execute("SELECT MAX(date) FROM portfolio_history WHERE user_id = ?", (user_id,))
+        history_until = cursor.fetchone()[0]
+        conn.close()
+
+        if history_until is not None and (stored_until is None or str(stored_until) < str(history_until)[:10]):
+            update_returns(user_id)
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        query = """
+            SELECT date, total_value, net_flow, daily_return, twr_index
+            FROM portfolio_returns
+            WHERE user_id = ?
+        """
+        params = [user_id]
+        if start_date:
+            query += " AND date >= ?"
+            params.append(str(start_date))
+        if end_date:
+            query += " AND date <= ?"
+            params.append(str(end_date))
+        query += " ORDER BY date"
+
+        cursor.execute(query, params)
+        returns = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return returns
+    except Exception as e:
+        log_exception(logger, e, {"context": "일별 수익률 조회", "user_id": user_id})
+        return []
+
+def get_return_summary(user_id):
+    """
+    사용자의 수익률 요약 조회 (시간가중수익률, XIRR, 종목별 XIRR)
+
+    Args:
+        user_id (int): 사용자 ID
+
+    Returns:
+        dict: 수익률 요약
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT start_date, end_date, twr_total, twr_annualized, xirr, last_update FROM return_summary WHERE user_id = ?",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT r.portfolio_id, p.종목코드, p.종목명, r.xirr
+            FROM position_returns r
+            JOIN portfolio p ON p.id = r.portfolio_id
+            WHERE r.user_id = ?
+            ORDER BY r.xirr DESC
+        """, (user_id,))
+        positions = [
+            {"portfolio_id": item[0], "ticker": item[1], "name": item[2], "xirr": item[3]}
+            for item in cursor.fetchall()
+        ]
+        conn.close()
+
+        summary = dict(row) if row else {
+            "start_date": None, "end_date": None, "twr_total": 0, "twr_annualized": 0, "xirr": None, "last_update": None
+        }
+        summary["positions"] = positions
+        return summary
+    except Exception as e:
+        log_exception(logger, e, {"context": "수익률 요약 조회", "user_id": user_id})
+        return {"start_date": None, "end_date": None, "twr_total": 0, "twr_annualized": 0, "xirr": None,
+                "last_update": None, "positions": []}
+
+def _empty_period_metrics(period, start_date, end_date):
+    return {
+        "period": period,
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_return": 0,
+        "annualized_return": 0,
+        "money_weighted_return": None,
+        "net_flow": 0,
+        "volatility": 0,
+        "annualized_volatility": 0,
+        "sharpe_ratio": 0,
+        "sortino_ratio": 0,
+        "max_drawdown": 0,
+        "calmar_ratio": 0,
+        "best_day": {"date": None, "return": 0},
+        "worst_day": {"date": None, "return": 0}
+    }
+
+def compute_period_metrics(dates, index, daily, flows, starts):
+    """
+    여러 기간의 성과 지표를 한 번에 계산
+
+    누적합으로 기간별 평균/분산/하방편차를 구하고, 기간 x 날짜 행렬의 누적 최대값으로 기간별 최대 낙폭을 계산합니다.
+    기간 첫날의 수익률은 기간 이전 구간에 해당하므로 제외합니다.
+
+    Args:
+        dates (numpy.ndarray): 일별 날짜 (datetime64[D])
+        index (numpy.ndarray): 시간가중 누적 지수
+        daily (numpy.ndarray): 일별 수익률 (비율)
+        flows (numpy.ndarray): 일별 순현금흐름
+        starts (numpy.ndarray): 기간별 시작 위치
+
+    Returns:
+        dict: 지표명 -> 기간별 배열
+    """
+    count = len(index)
+    trading_days = RETURNS_SETTINGS["trading_days"]
+    daily_risk_free = RETURNS_SETTINGS["risk_free_rate"] / 365  # 일일 무위험 수익률 (%)
+
+    daily = np.asarray(daily, dtype=float) * 100
+    daily[0] = 0.0
+    excess = daily - daily_risk_free
+
+    # 누적합 (위치 i까지의 합) → 기간 [s+1, 끝] 합 = 전체 합 - s까지의 합
+    sums = {
+        "return": np.cumsum(daily),
+        "square": np.cumsum(daily ** 2),
+        "downside": np.cumsum(np.minimum(excess, 0) ** 2),
+        "flow": np.cumsum(np.asarray(flows, dtype=float))
+    }
+    n = (count - 1 - starts).astype(float)
+    valid = n >= 1
+    n_safe = np.where(valid, n, 1)
+
+    def window_sum(name):
+        return sums[name][-1] - sums[name][starts]
+
+    mean = window_sum("return") / n_safe
+    variance = np.maximum(window_sum("square") / n_safe - mean ** 2, 0)
+    volatility = np.sqrt(variance)
+    downside = np.sqrt(window_sum("downside") / n_safe)
+
+    total_return = (index[-1] / index[starts] - 1) * 100
+    days = (dates[-1] - dates[starts]).astype(int)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        annualized = np.where(
+            (days > 0) & (total_return > -100),
+            ((1 + total_return / 100) ** (365 / np.maximum(days, 1)) - 1) * 100,
+            0.0
+        )
+        sharpe = np.where(volatility > 0, (mean - daily_risk_free) / volatility * np.sqrt(trading_days), 0.0)
+        sortino = np.where(downside > 0, (mean - daily_risk_free) / downside * np.sqrt(trading_days), 0.0)
+
+    # 기간 x 날짜 행렬: 기간 시작 이전은 제외(-inf/nan)하고 누적 최대값으로 낙폭 계산
+    positions = np.arange(count)
+    in_period = positions[None, :] >= starts[:, None]
+    masked_index = np.where(in_period, index[None, :], -np.inf)
+    peaks = np.maximum.accumulate(masked_index, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = np.where(in_period & (peaks > 0), (masked_index - peaks) / peaks * 100, 0.0)
+    max_drawdown = drawdowns.min(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        calmar = np.where(max_drawdown < 0, annualized / np.abs(max_drawdown), 0.0)
+
+    # 기간별 최고/최저 일일 수익률 (기간 첫날 제외)
+    in_returns = positions[None, :] > starts[:, None]
+    best = np.where(in_returns, daily[None, :], -np.inf).argmax(axis=1)
+    worst = np.where(in_returns, daily[None, :], np.inf).argmin(axis=1)
+
+    return {
+        "valid": valid,
+        "total_return": total_return,
+        "annualized_return": annualized,
+        "net_flow": window_sum("flow"),
+        "volatility": volatility,
+        "annualized_volatility": volatility * np.sqrt(trading_days),
+        "sharpe_ratio": sharpe,
+        "sortino_ratio": sortino,
+        "max_drawdown": max_drawdown,
+        "calmar_ratio": calmar,
+        "best": best,
+        "worst": worst,
+        "daily": daily
+    }
+
+def compute_rolling_metrics(dates, index, daily, windows=None):
+    """
+    롤링 수익률/변동성/샤프 비율 계산 (누적합 차분)
+
+    Args:
+        dates (list): 일별 날짜 문자열
+        index (numpy.ndarray): 시간가중 누적 지수
+        daily (numpy.ndarray): 일별 수익률 (비율)
+        windows (tuple, optional): 창 크기 목록 (거래일 수)
+
+    Returns:
+        dict: 창 크기 -> {"dates", "return", "volatility", "sharpe_ratio"}
+    """
+    windows = windows or RETURNS_SETTINGS["rolling_windows"]
+    trading_days = RETURNS_SETTINGS["trading_days"]
+    daily_risk_free = RETURNS_SETTINGS["risk_free_rate"] / 365
+
+    daily = np.asarray(daily, dtype=float) * 100
+    sums = np.concatenate([[0.0], np.cumsum(daily)])
+    squares = np.concatenate([[0.0], np.cumsum(daily ** 2)])
+
+    rolling = {}
+    for window in windows:
+        if len(index) <= window:
+            continue
+
+        # 위치 i의 창: 수익률 (i-window, i], 지수 index[i] / index[i-window]
+        end = np.arange(window, len(index))
+        mean = (sums[end + 1] - sums[end + 1 - window]) / window
+        variance = np.maximum((squares[end + 1] - squares[end + 1 - window]) / window - mean ** 2, 0)
+        volatility = np.sqrt(variance)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(volatility > 0, (mean - daily_risk_free) / volatility * np.sqrt(trading_days), 0.0)
+
+        rolling[window] = {
+            "dates": [dates[i] for i in end],
+            "return": ((index[end] / index[end - window] - 1) * 100).tolist(),
+            "volatility": (volatility * np.sqrt(trading_days)).tolist(),
+            "sharpe_ratio": sharpe.tolist()
+        }
+
+    return rolling
+
+@versioned_cache()
+def get_performance_metrics(user_id):
+    """
+    전체 기간(1m/3m/6m/1y/all)의 성과 지표와 롤링 지표를 한 번에 계산
+
+    수익률 시계열을 한 번만 조회해 numpy 배열로 만든 뒤 모든 기간을 함께 계산하며,
+    결과는 사용자 데이터 버전이 바뀔 때까지 캐시됩니다.
+
+    Args:
+        user_id (int): 사용자 ID
+
+    Returns:
+        dict: {"periods": 기간 -> 성과 지표, "rolling": 창 크기 -> 롤링 지표}
+    """
+    today = datetime.now().date()
+    period_starts = {
+        period: (today - timedelta(days=days)) if days else datetime(2000, 1, 1).date()
+        for period, days in PERFORMANCE_PERIODS.items()
+    }
+    end_date = today.strftime('%Y-%m-%d')
+
+    result = {
+        "periods": {
+            period: _empty_period_metrics(period, start.strftime('%Y-%m-%d'), end_date)
+            for period, start in period_starts.items()
+        },
+        "rolling": {}
+    }
+
+    try:
+        history = get_daily_returns(user_id, end_date=today)
+        xirr_value = get_return_summary(user_id).get("xirr")
+        for metrics in result["periods"].values():
+            metrics["money_weighted_return"] = xirr_value
+
+        if len(history) < 2:
+            return result  # 충분한 데이터가 없음
+
+        date_strings = [str(day['date'])[:10] for day in history]
+        dates = np.array(date_strings, dtype='datetime64[D]')
+        index = np.array([day['twr_index'] for day in history], dtype=float)
+        daily = np.array([day['daily_return'] or 0 for day in history], dtype=float)
+        flows = np.array([day['net_flow'] or 0 for day in history], dtype=float)
+
+        starts = dates.searchsorted(np.array([str(start) for start in period_starts.values()], dtype='datetime64[D]'))
+        starts = np.minimum(starts, len(dates) - 1)
+        computed = compute_period_metrics(dates, index, daily, flows, starts)
+
+        for i, period in enumerate(period_starts):
+            if not computed["valid"][i]:
+                continue
+
+            metrics = result["periods"][period]
+            for key in ("total_return", "annualized_return", "net_flow", "volatility", "annualized_volatility",
+                        "sharpe_ratio", "sortino_ratio", "max_drawdown", "calmar_ratio"):
+                metrics[key] = float(computed[key][i])
+
+            best, worst = computed["best"][i], computed["worst"][i]
+            if computed["daily"][best] > 0:
+                metrics["best_day"] = {"date": date_strings[best], "return": float(computed["daily"][best])}
+            if computed["daily"][worst] < 0:
+                metrics["worst_day"] = {"date": date_strings[worst], "return": float(computed["daily"][worst])}
+
+        result["rolling"] = compute_rolling_metrics(date_strings, index, daily)
+        return result
+    except Exception as e:
+        log_exception(logger, e, {"context": "기간별 성과 지표 계산", "user_id": user_id})
+        return result
@@ -0,0 +1,483 @@
+"""
+공분산 기반 포트폴리오 위험 분석 서비스
+
+저장된 일별 종가(daily_prices)와 환율(fx_history)로 보유 종목의 원화 기준 일별 수익률 행렬을 만들고,
+수축(Ledoit-Wolf) 공분산으로 포트폴리오 변동성, 종목별 한계/기여 위험, VaR/CVaR(역사적, 모수적, 몬테카를로)을 계산합니다.
+몬테카를로는 종목 수익률을 모두 만들지 않고 촐레스키 인자를 가중치에 먼저 곱해 포트폴리오 수익률만 시뮬레이션합니다.
+"""
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+from utils.cache import versioned_cache
+
+logger = get_logger(__name__)
+
+# 위험 분석 설정
+RISK_SETTINGS = {
+    "lookback_days": 365,              # 수익률 추정 기간 (달력일)
+    "min_observations": 20,            # 종목별 최소 수익률 관측 수 (미달 종목은 분석 제외)
+    "max_fill_days": 5,                # 휴장일 등 종가 누락 시 직전 종가로 채우는 최대 일수
+    "confidence_levels": (0.95, 0.99),
+    "horizons": (1, 10),               # VaR 보유 기간 (거래일)
+    "simulations": 10000,              # 몬테카를로 시뮬레이션 수
+    "random_seed": 42,
+    "beta_window": 252,                # 베타 회귀에 사용하는 최근 수익률 수 (거래일)
+    "beta_benchmarks": {"한국": "KS11", "코스닥": "KQ11", "default": "SPX"}
+}
+
+# 지수 종가 이력의 국가/시장 코드 (market_service.INDEX_MARKET)
+INDEX_COUNTRY = 'INDEX'
+
+def _history_market(country):
+    if country == INDEX_COUNTRY:
+        return INDEX_COUNTRY
+    return 'KRX' if country == '한국' else f"YF_{country}"
+
+def load_return_matrix(symbols, start_date, end_date=None, convert_fx=True):
+    """
+    종목별 원화 기준 일별 수익률 행렬 생성
+
+    모든 종목의 종가를 한 번에 조회해 날짜 x 종목 행렬로 펼치고, 해외 종목은 같은 날짜의 USD/KRW 환율을 곱합니다.
+    한쪽 시장만 휴장한 날은 직전 종가로 채우며(최대 max_fill_days), 관측 수가 부족한 종목은 제외합니다.
+
+    Args:
+        symbols (list): (종목코드, 국가) 목록 (국가가 'INDEX'이면 벤치마크 지수)
+        start_date (date): 시작일
+        end_date (date, optional): 종료일 (없으면 오늘)
+        convert_fx (bool, optional): 해외 종목 원화 환산 여부 (False면 현지 통화 수익률)
+
+    Returns:
+        tuple: (날짜 배열, 수익률 행렬 (날짜 수 - 1, 포함 종목 수), 포함 종목 위치 배열)
+    """
+    end_date = end_date or datetime.now().date()
+    empty = (np.array([], dtype='datetime64[D]'), np.empty((0, 0)), np.array([], dtype=int))
+    if not symbols:
+        return empty
+
+    conn = get_db_connection('market')
+    cursor = conn.cursor()
+
+    # 종목 수가 많아도 한 번의 쿼리로 조회 (임시 테이블 조인, 종목은 열 위치로 반환)
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS risk_symbols (position INTEGER, symbol TEXT, market TEXT)")
+    cursor.execute("DELETE FROM risk_symbols")
+    cursor.executemany(
+        "INSERT INTO risk_symbols VALUES (?, ?, ?)",
+        [(i, ticker, _history_market(country)) for i, (ticker, country) in enumerate(symbols)]
+    )
+    cursor.execute("""
+        SELECT s.position, d.date, d.close
+        FROM daily_prices d
+        JOIN risk_symbols s ON s.symbol = d.symbol AND s.market = d.market
+        WHERE d.date BETWEEN ? AND ? AND d.close > 0
+    """, (str(start_date), str(end_date)))
+    rows = cursor.fetchall()
+
+    # 해외 종목은 원화 환산 (지수는 현지 통화 그대로)
+    foreign = np.array([convert_fx and country not in ('한국', INDEX_COUNTRY) for _, country in symbols])
+
+    fx_rows = []
+    if foreign.any():
+        cursor.execute("""
+            SELECT date, rate FROM fx_history
+            WHERE from_currency = 'USD' AND to_currency = 'KRW' AND date BETWEEN ? AND ? AND rate > 0
+        """, (str(start_date), str(end_date)))
+        fx_rows = cursor.fetchall()
+
+    cursor.execute("DROP TABLE IF EXISTS risk_symbols")
+    conn.close()
+
+    if not rows:
+        return empty
+
+    columns, row_dates, closes = zip(*rows)
+    dates, date_positions = np.unique(np.array(row_dates, dtype='datetime64[D]'), return_inverse=True)
+
+    prices = np.full((len(dates), len(symbols)), np.nan)
+    prices[date_positions, np.array(columns)] = closes
+
+    # 환율이 없는 날은 직전 환율
+    if foreign.any():
+        fx = np.full(len(dates), np.nan)
+        if fx_rows:
+            fx_dates = np.array([row[0][:10] for row in fx_rows], dtype='datetime64[D]')
+            positions = dates.searchsorted(fx_dates)
+            matched = (positions < len(dates)) & (dates[np.minimum(positions, len(dates) - 1)] == fx_dates)
+            fx[positions[matched]] = np.array([row[1] for row in fx_rows])[matched]
+        fx = _forward_fill(fx[:, None], len(dates))[:, 0]
+        if np.isfinite(fx).any():
+            # 첫 환율 이전 날짜는 첫 환율로 채움
+            fx = np.where(np.isnan(fx), fx[np.isfinite(fx)][0], fx)
+        prices[:, foreign] = prices[:, foreign] * fx[:, None]
+
+    prices = _forward_fill(prices, RISK_SETTINGS["max_fill_days"])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = prices[1:] / prices[:-1] - 1
+
+    observed = np.isfinite(returns)
+    included = np.flatnonzero(observed.sum(axis=0) >= RISK_SETTINGS["min_observations"])
+    returns = returns[:, included]
+
+    # 포함 종목의 절반 이상이 관측된 날만 사용 (한 종목만 거래된 날 제거), 남은 결측은 0 수익률
+    complete = np.isfinite(returns).mean(axis=1) >= 0.5 if returns.size else np.zeros(len(returns), dtype=bool)
+    returns = np.nan_to_num(returns[complete], nan=0.0, posinf=0.0, neginf=0.0)
+
+    return dates[1:][complete], returns, included
+
+def _forward_fill(values, limit):
+    """행렬의 결측값을 열마다 직전 값으로 채움 (최대 limit 행)"""
+    rows = np.arange(len(values))[:, None]
+    last_valid = np.where(np.isfinite(values), rows, -1)
+    last_valid = np.maximum.accumulate(last_valid, axis=0)
+    filled = values[np.maximum(last_valid, 0), np.arange(values.shape[1])[None, :]]
+    stale = (last_valid < 0) | (rows - last_valid > limit)
+    return np.where(stale, np.nan, filled)
+
+def shrink_covariance(returns):
+    """
+    Ledoit-Wolf 수축 공분산 추정 (대상: 평균 분산 x 단위행렬)
+
+    종목 수가 관측 수에 비해 많을 때 표본 공분산의 추정 오차를 줄이고 항상 양정치 행렬을 반환합니다.
+
+    Args:
+        returns (numpy.ndarray): (관측 수, 종목 수) 수익률 행렬
+
+    Returns:
+        tuple: (공분산 행렬, 수축 강도 0~1)
+    """
+    observations, assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / observations
+
+    mu = np.trace(sample) / assets
+    target = mu * np.eye(assets)
+    delta = np.sum((sample - target) ** 2)
+
+    # 표본 공분산 추정 분산: sum_t ||x_t x_t' - S||^2 / T^2 = (sum_t ||x_t||^4 - T ||S||^2) / T^2
+    row_norms = np.sum(centered ** 2, axis=1)
+    beta = (np.sum(row_norms ** 2) - observations * np.sum(sample ** 2)) / observations ** 2
+    beta = min(max(beta, 0.0), delta)
+
+    shrinkage = beta / delta if delta > 0 else 1.0
+    return shrinkage * target + (1 - shrinkage) * sample, float(shrinkage)
+
+def risk_contributions(weights, covariance):
+    """
+    포트폴리오 변동성과 종목별 한계/기여 위험 계산
+
+    Args:
+        weights (numpy.ndarray): 종목 비중
+        covariance (numpy.ndarray): 일별 수익률 공분산
+
+    Returns:
+        tuple: (일별 변동성, 한계 위험 배열, 기여 위험 배열)
+    """
+    covariance_weights = covariance @ weights
+    volatility = float(np.sqrt(max(weights @ covariance_weights, 0.0)))
+    if volatility == 0:
+        zeros = np.zeros_like(weights)
+        return 0.0, zeros, zeros
+
+    marginal = covariance_weights / volatility
+    return volatility, marginal, weights * marginal
+
+def value_at_risk(portfolio_returns, mean, volatility, cholesky_weights, confidence_levels=None, horizons=None):
+    """
+    VaR/CVaR 계산 (역사적, 모수적, 몬테카를로)
+
+    손실은 양수(포트폴리오 가치 대비 비율)로 반환합니다. 역사적 방법의 다일 보유 기간은 겹치는 구간의 누적 수익률을 사용합니다.
+
+    Args:
+        portfolio_returns (numpy.ndarray): 과거 일별 포트폴리오 수익률
+        mean (float): 일별 기대 수익률
+        volatility (float): 일별 변동성
+        cholesky_weights (numpy.ndarray): 촐레스키 인자의 전치와 비중의 곱 (L' w)
+        confidence_levels (tuple, optional): 신뢰수준 목록
+        horizons (tuple, optional): 보유 기간 목록 (거래일)
+
+    Returns:
+        dict: 방법 -> {"{보유기간}d_{신뢰수준}": {"var", "cvar"}}
+    """
+    confidence_levels = confidence_levels or RISK_SETTINGS["confidence_levels"]
+    horizons = horizons or RISK_SETTINGS["horizons"]
+
+    rng = np.random.default_rng(RISK_SETTINGS["random_seed"])
+    # 포트폴리오 수익률 = w'(mu + L z) → L'w 를 먼저 곱하면 종목 수익률 행렬 없이 시뮬레이션 가능
+    draws = rng.standard_normal((RISK_SETTINGS["simulations"], len(cholesky_weights)), dtype=np.float32)
+    simulated = draws @ cholesky_weights.astype(np.float32)
+
+    cumulative = np.concatenate([[0.0], np.cumsum(np.log1p(portfolio_returns))])
+    results = {"historical": {}, "parametric": {}, "monte_carlo": {}}
+
+    for horizon in horizons:
+        historical = np.expm1(cumulative[horizon:] - cumulative[:-horizon]) if len(portfolio_returns) >= horizon else np.array([])
+        monte_carlo = mean * horizon + simulated * np.sqrt(horizon)
+
+        for confidence in confidence_levels:
+            key = f"{horizon}d_{int(round(confidence * 100))}"
+            tail = 1 - confidence
+
+            if len(historical):
+                threshold = np.quantile(historical, tail)
+                results["historical"][key] = {
+                    "var": float(-threshold),
+                    "cvar": float(-historical[historical <= threshold].mean())
+                }
+
+            # 정규분포 가정: VaR = -(mu h + z sigma sqrt(h)), CVaR = -(mu h - sigma sqrt(h) phi(z) / tail)
+            z = NormalDist().inv_cdf(tail)
+            scale = volatility * np.sqrt(horizon)
+            results["parametric"][key] = {
+                "var": float(-(mean * horizon + z * scale)),
+                "cvar": float(-(mean * horizon - scale * NormalDist().pdf(z) / tail))
+            }
+
+            threshold = np.quantile(monte_carlo, tail)
+            results["monte_carlo"][key] = {
+                "var": float(-threshold),
+                "cvar": float(-monte_carlo[monte_carlo <= threshold].mean())
+            }
+
+    return results
+
+def analyze_positions(values, symbols, start_date=None, end_date=None):
+    """
+    보유 종목 평가액으로 공분산 위험 분석 수행
+
+    Args:
+        values (numpy.ndarray): 종목별 평가액 (원화)
+        symbols (list): (종목코드, 국가) 목록
+        start_date (date, optional): 추정 시작일 (없으면 lookback_days 이전)
+        end_date (date, optional): 추정 종료일 (없으면 오늘)
+
+    Returns:
+        dict: 위험 분석 결과 (분석 가능한 데이터가 없으면 None)
+    """
+    end_date = end_date or datetime.now().date()
+    start_date = start_date or end_date - timedelta(days=RISK_SETTINGS["lookback_days"])
+
+    values = np.asarray(values, dtype=float)
+    total_value = values.sum()
+    if total_value <= 0:
+        return None
+
+    dates, returns, included = load_return_matrix(symbols, start_date, end_date)
+    if len(included) == 0 or len(returns) < RISK_SETTINGS["min_observations"]:
+        return None
+
+    # 이력이 있는 종목 비중으로 재정규화하고, 제외된 종목 비중은 coverage로 표시
+    covered_value = values[included].sum()
+    weights = values[included] / covered_value
+
+    covariance, shrinkage = shrink_covariance(returns)
+    volatility, marginal, component = risk_contributions(weights, covariance)
+
+    portfolio_returns = returns @ weights
+    mean = float(returns.mean(axis=0) @ weights)
+    cholesky = np.linalg.cholesky(covariance + 1e-12 * np.eye(len(weights)))
+
+    var = value_at_risk(portfolio_returns, mean, volatility, cholesky.T @ weights)
+
+    # 비율 → 금액 (전체 평가액 기준, 이력 없는 종목은 분석 종목과 같은 위험으로 가정)
+    for method in var.values():
+        for item in method.values():
+            item["var_amount"] = item["var"] * total_value
+            item["cvar_amount"] = item["cvar"] * total_value
+
+    trading_days = 252
+    contributions = [
+        {
+            "ticker": symbols[position][0],
+            "country": symbols[position][1],
+            "weight": float(weights[i] * 100),
+            "volatility": float(np.sqrt(covariance[i, i] * trading_days) * 100),
+            "marginal_risk": float(marginal[i] * np.sqrt(trading_days) * 100),
+            "component_risk": float(component[i] * np.sqrt(trading_days) * 100),
+            "risk_share": float(component[i] / volatility * 100) if volatility > 0 else 0.0
+        }
+        for i, position in enumerate(included)
+    ]
+    contributions.sort(key=lambda item: item["component_risk"], reverse=True)
+
+    return {
+        "start_date": str(dates[0]),
+        "end_date": str(dates[-1]),
+        "observations": int(len(returns)),
+        "coverage": float(covered_value / total_value * 100),
+        "excluded": [symbols[i][0] for i in np.setdiff1d(np.arange(len(symbols)), included)],
+        "shrinkage": shrinkage,
+        "daily_volatility": volatility * 100,
+        "annualized_volatility": float(volatility * np.sqrt(trading_days) * 100),
+        "diversification_ratio": float(
+            (weights @ np.sqrt(np.diag(covariance))) / volatility
+        ) if volatility > 0 else 1.0,
+        "var": var,
+        "contributions": contributions
+    }
+
+@versioned_cache()
+def calculate_covariance_risk(user_id):
+    """
+    사용자 포트폴리오의 공분산 기반 위험 분석
+
+    Args:
+        user_id (int): 사용자 ID
+
+    Returns:
+        dict: 위험 분석 결과 (종가 이력이 부족하면 None)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT 종목코드, 국가, SUM(평가액)
+            FROM portfolio
+            WHERE user_id = ? AND 수량 > 0 AND 평가액 > 0
+            GROUP BY 종목코드, 국가
+        """, (user_id,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        if not rows:
+            return None
+
+        symbols = [(row[0], row[1]) for row in rows]
+        values = np.array([row[2] for row in rows], dtype=float)
+        return analyze_positions(values, symbols)
+    except Exception as e:
+        log_exception(logger, e, {"context": "공분산 위험 분석", "user_id": user_id})
+        return None
+
+def estimate_betas(returns, benchmark_returns, benchmark_positions):
+    """
+    종목별 벤치마크 대비 회귀 베타와 상관계수 (전체 종목을 한 번의 행렬 곱으로 계산)
+
+    Args:
+        returns (numpy.ndarray): (수익률 수, 종목 수) 종목 수익률
+        benchmark_returns (numpy.ndarray): (수익률 수, 지수 수) 지수 수익률
+        benchmark_positions (numpy.ndarray): 종목별 벤치마크 지수 열 위치
+
+    Returns:
+        tuple: (베타 배열, 상관계수 배열)
+    """
+    stocks = returns - returns.mean(axis=0)
+    benchmarks = benchmark_returns - benchmark_returns.mean(axis=0)
+
+    # 종목 x 지수 공분산에서 각 종목의 벤치마크 열만 선택
+    covariance = (stocks.T @ benchmarks)[np.arange(stocks.shape[1]), benchmark_positions]
+    benchmark_variance = (benchmarks ** 2).sum(axis=0)[benchmark_positions]
+    stock_variance = (stocks ** 2).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = np.where(benchmark_variance > 0, covariance / benchmark_variance, np.nan)
+        correlation = np.where(
+            (benchmark_variance > 0) & (stock_variance > 0),
+            covariance / np.sqrt(benchmark_variance * stock_variance), np.nan
+        )
+    return beta, correlation
+
+def update_betas(end_date=None, fetch_missing=True):
+    """
+    보유 종목 전체의 회귀 베타를 계산해 stock_betas와 portfolio.베타에 일괄 저장 (야간 작업)
+
+    국내 종목은 코스피(코스닥 상장 종목은 코스닥), 해외 종목은 S&P 500 대비 현지 통화 일별 수익률로
+    최근 beta_window 거래일을 회귀합니다.
+
+    Args:
+        end_date (date, optional): 기준일 (없으면 오늘)
+        fetch_missing (bool, optional): 저장되지 않은 종가/지수 이력을 프로바이더에서 받아 올지 여부
+
+    Returns:
+        int: 베타를 갱신한 종목 수
+    """
+    try:
+        from services.market_service import get_price_history, get_index_history, get_kosdaq_tickers
+
+        end_date = end_date or datetime.now().date()
+        # 휴장일을 감안해 거래일 수보다 넉넉한 달력일로 조회
+        start_date = end_date - timedelta(days=int(RISK_SETTINGS["beta_window"] * 7 / 5) + 30)
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        cursor.execute("SELECT 종목코드, 국가 FROM held_symbols")
+        symbols = [(row[0], row[1]) for row in cursor.fetchall()]
+        conn.close()
+
+        if not symbols:
+            return 0
+
+        settings = RISK_SETTINGS["beta_benchmarks"]
+        kosdaq = get_kosdaq_tickers(end_date) if any(country == '한국' for _, country in symbols) else set()
+        benchmarks = [
+            settings["코스닥"] if country == '한국' and ticker in kosdaq
+            else settings["한국"] if country == '한국' else settings["default"]
+            for ticker, country in symbols
+        ]
+        indices = list(dict.fromkeys(benchmarks))
+
+        if fetch_missing:
+            for index_code in indices:
+                get_index_history(index_code, start_date, end_date)
+            for ticker, country in symbols:
+                get_price_history(ticker, country, start_date, end_date)
+
+        # 종목과 지수를 한 행렬로 읽어 같은 날짜에 맞춤 (지수는 마지막 열)
+        columns = symbols + [(index_code, INDEX_COUNTRY) for index_code in indices]
+        dates, returns, included = load_return_matrix(columns, start_date, end_date, convert_fx=False)
+        returns = returns[-RISK_SETTINGS["beta_window"]:]
+
+        stock_columns = [i for i, position in enumerate(included) if position < len(symbols)]
+        index_columns = {columns[position][0]: i for i, position in enumerate(included) if position >= len(symbols)}
+        usable = [i for i in stock_columns if benchmarks[included[i]] in index_columns]
+        if not usable or len(returns) < RISK_SETTINGS["min_observations"]:
+            logger.warning("베타 계산에 필요한 종가 또는 지수 이력이 부족합니다.")
+            return 0
+
+        index_order = list(index_columns)
+        benchmark_positions = np.array([index_order.index(benchmarks[included[i]]) for i in usable])
+        beta, correlation = estimate_betas(
+            returns[:, usable], returns[:, [index_columns[code] for code in index_order]], benchmark_positions
+        )
+
+        now = datetime.now()
+        results = [
+            (symbols[included[column]], benchmarks[included[column]], float(beta[k]), float(correlation[k]))
+            for k, column in enumerate(usable) if np.isfinite(beta[k])
+        ]
+
+        conn = get_db_connection('market')
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO stock_betas
+                (symbol, country, benchmark, beta, correlation, observations, start_date, end_date, last_update)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (ticker, country, benchmark, value, corr, len(returns), str(dates[-len(returns)]), str(dates[-1]), now)
+                for (ticker, country), benchmark, value, corr in results
+            ]
+        )
+        conn.commit()
+        conn.close()
+
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+        # 값이 바뀐 행만 갱신 (데이터 버전 트리거로 사용자 캐시가 불필요하게 무효화되지 않도록)
+        cursor.executemany(
+            "UPDATE portfolio SET 베타 = ? WHERE 종목코드 = ? AND 국가 = ? AND (베타 IS NULL OR 베타 != ?)",
+            [(round(value, 4), ticker, country, round(value, 4)) for (ticker, country), _, value, _ in results]
+        )
+        conn.commit()
+        conn.close()
+
+        logger.info(f"종목 베타 갱신 완료: {len(results)}개 종목 ({len(returns)}일)")
+        return len(results)
+    except Exception as e:
+        log_exception(logger, e, {"context": "종목 베타 갱신"})
+        return 0
@@ -0,0 +1,534 @@
+"""
+작업 스케줄러 서비스 (타이머 힙 기반, 작업별 중복 실행 방지)
+"""
+import os
+import time
+import heapq
+import uuid
+import random
+import socket
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from utils.logging import get_logger, log_exception
+from models.database import get_db_connection
+
+logger = get_logger(__name__)
+
+# 스케줄러 기본 설정
+SCHEDULER_SETTINGS = {
+    'max_workers': 4,           # 동시에 실행 가능한 작업 수
+    'default_jitter': 30,       # 기본 실행 시각 분산 (초)
+    'run_history_days': 30,     # 작업 실행 기록 보관 기간 (일)
+    'use_lease': True,          # 여러 인스턴스 실행 시 리더 임대를 가진 인스턴스만 작업 실행
+    'lease_name': 'scheduler',  # 리더 임대 이름
+    'lease_ttl': 60             # 임대 유효 시간 (초), 이 시간의 1/3마다 갱신
+}
+
+# 현재 프로세스 식별자 (호스트:PID:임의값)
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+class Job:
+    """
+    스케줄 작업 정의
+
+    Args:
+        name (str): 작업 이름 (고유)
+        func (callable): 실행할 함수
+        at (str or list, optional): 실행 시각 "HH:MM" 또는 시각 목록 (매일 또는 지정 요일)
+        weekday (str, optional): 실행 요일 ('monday' ~ 'sunday')
+        interval (int, optional): 실행 간격 (초), at 대신 사용
+        jitter (int, optional): 실행 시각에 더할 최대 임의 지연 (초)
+    """
+    def __init__(self, name, func, at=None, weekday=None, interval=None, jitter=None):
+        if not at and not interval:
+            raise ValueError("at 또는 interval 중 하나는 지정해야 합니다.")
+        if weekday and weekday not in WEEKDAYS:
+            raise ValueError(f"알 수 없는 요일: {weekday}")
+
+        self.name = name
+        self.func = func
+        self.at = [at] if isinstance(at, str) else list(at or [])
+        self.weekday = weekday
+        self.interval = interval
+        self.jitter = SCHEDULER_SETTINGS['default_jitter'] if jitter is None else jitter
+
+        self.lock = threading.Lock()  # 작업별 상호 배제
+        self.next_run = None
+        self.last_run = None
+
+    def compute_next_run(self, after):
+        """
+        다음 실행 시각 계산 (after 이후 가장 가까운 예정 시각 + 지터)
+
+        Args:
+            after (datetime): 기준 시각
+
+        Returns:
+            datetime: 다음 실행 시각
+        """
+        if self.interval:
+            base = after + timedelta(seconds=self.interval)
+        else:
+            candidates = []
+            for at in self.at:
+                hour, minute = map(int, at.split(':'))
+                candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+                if self.weekday:
+                    days_ahead = (WEEKDAYS.index(self.weekday) - candidate.weekday()) % 7
+                    candidate += timedelta(days=days_ahead)
+                    if candidate <= after:
+                        candidate += timedelta(days=7)
+                elif candidate <= after:
+                    candidate += timedelta(days=1)
+
+                candidates.append(candidate)
+            base = min(candidates)
+
+        if self.jitter:
+            base += timedelta(seconds=random.uniform(0, self.jitter))
+
+        return base
+
+class JobScheduler:
+    """
+    타이머 힙 기반 작업 스케줄러
+
+    - 예정 시각 순으로 정렬된 힙에서 다음 작업까지 대기 (1초 폴링 없음)
+    - 작업은 스레드 풀에서 실행되어 오래 걸리는 작업이 다른 작업을 지연시키지 않음
+    - 같은 작업이 실행 중이면 새 실행은 건너뜀 (중복 실행 방지)
+    - 여러 번 놓친 실행은 한 번으로 합쳐서 처리
+    - 여러 인스턴스가 떠 있으면 리더 임대를 가진 인스턴스만 작업 실행
+    """
+    def __init__(self, max_workers=None):
+        self._jobs = {}
+        self._heap = []
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or SCHEDULER_SETTINGS['max_workers'],
+            thread_name_prefix='scheduler'
+        )
+        self._thread = None
+        self._heartbeat_thread = None
+        self._running = False
+        self._is_leader = not SCHEDULER_SETTINGS['use_lease']
+
+    def add_job(self, name, func, at=None, weekday=None, interval=None, jitter=None, replace=False):
+        """
+        작업 등록
+
+        Args:
+            replace (bool): 같은 이름의 작업이 있으면 새 설정으로 교체 (False면 ValueError)
+
+        Returns:
+            Job: 등록된 작업
+        """
+        job = Job(name, func, at=at, weekday=weekday, interval=interval, jitter=jitter)
+
+        with self._condition:
+            existing = self._jobs.get(name)
+            if existing is not None:
+                if not replace:
+                    raise ValueError(f"이미 등록된 작업: {name}")
+                # 실행 중인 기존 작업과 겹치지 않도록 상호 배제 잠금과 실행 기록은 이어받음
+                # (힙에 남은 기존 예약은 next_run이 달라 _run_loop에서 건너뜀)
+                job.lock = existing.lock
+                job.last_run = existing.last_run
+            self._jobs[name] = job
+            self._push(job, job.compute_next_run(datetime.now()))
+            self._condition.notify_all()
+
+        return job
+
+    def _push(self, job, run_at):
+        job.next_run = run_at
+        self._seq += 1
+        heapq.heappush(self._heap, (run_at, self._seq, job.name))
+
+    def start(self):
+        """
+        스케줄러 스레드 시작
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        if SCHEDULER_SETTINGS['use_lease']:
+            # 시작 시 한 번 임대를 시도한 뒤 주기적으로 갱신
+            self._renew_leadership()
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='job-scheduler-lease', daemon=True)
+            self._heartbeat_thread.start()
+            atexit.register(self._release_leadership)
+
+        self._thread = threading.Thread(target=self._run_loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"작업 스케줄러 시작 (작업 {len(self._jobs)}개, 인스턴스 {INSTANCE_ID}, 리더: {self._is_leader})")
+
+    @property
+    def is_leader(self):
+        """현재 인스턴스가 스케줄 작업을 실행하는 리더인지 여부"""
+        return self._is_leader
+
+    def _renew_leadership(self):
+        """
+        리더 임대 획득 또는 갱신 (상태 변경 시 로그 기록)
+        """
+        was_leader = self._is_leader
+        self._is_leader = acquire_lease(SCHEDULER_SETTINGS['lease_name'], INSTANCE_ID, SCHEDULER_SETTINGS['lease_ttl'])
+
+        if self._is_leader and not was_leader:
+            logger.info(f"스케줄러 리더 임대 획득: {INSTANCE_ID}")
+        elif was_leader and not self._is_leader:
+            logger.warning(f"스케줄러 리더 임대 상실: {INSTANCE_ID}")
+
+    def _heartbeat_loop(self):
+        """
+        임대 유효 시간의 1/3 간격으로 임대 갱신 (리더가 종료되면 다른 인스턴스가 만료 후 인계)
+        """
+        interval = SCHEDULER_SETTINGS['lease_ttl'] / 3
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._running, timeout=interval)
+                if not self._running:
+                    return
+            self._renew_leadership()
+
+    def _release_leadership(self):
+        if self._is_leader:
+            release_lease(SCHEDULER_SETTINGS['lease_name'], INSTANCE_ID)
+            self._is_leader = False
+
+    def shutdown(self, wait=False):
+        """
+        스케줄러 종료
+
+        Args:
+            wait (bool): 실행 중인 작업 완료 대기 여부
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        self._executor.shutdown(wait=wait)
+        self._release_leadership()
+        logger.info("작업 스케줄러 종료")
+
+    def _run_loop(self):
+        """
+        다음 예정 작업 시각까지 대기 후 실행 (새 작업 등록 시 즉시 깨어남)
+        """
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                run_at, _, name = self._heap[0]
+                now = datetime.now()
+                if run_at > now:
+                    self._condition.wait(timeout=(run_at - now).total_seconds())
+                    continue
+
+                heapq.heappop(self._heap)
+                job = self._jobs.get(name)
+                if job is None or job.next_run != run_at:
+                    continue
+
+                # 다음 실행 예약 (여러 번 놓친 경우에도 한 번만 실행하고 현재 이후로 이월)
+                self._push(job, job.compute_next_run(now))
+
+            self._submit(job, run_at)
+
+    def _submit(self, job, scheduled_at):
+        """
+        작업을 스레드 풀에 제출 (실행 중이면 건너뜀)
+
+        Returns:
+            Future or None: 제출된 경우 Future
+        """
+        if not self._is_leader:
+            # 다른 인스턴스가 리더로 작업을 실행함
+            logger.debug(f"리더가 아니므로 작업 실행 안 함: {job.name}")
+            return None
+
+        if not job.lock.acquire(blocking=False):
+            logger.info(f"작업이 이미 실행 중이어서 이번 실행을 건너뜀: {job.name}")
+            _record_job_run(job.name, scheduled_at, None, None, 'skipped', '이전 실행 진행 중')
+            return None
+
+        try:
+            return self._executor.submit(self._execute, job, scheduled_at)
+        except RuntimeError:
+            # 종료된 실행기에 제출한 경우
+            job.lock.release()
+            return None
+
+    def _execute(self, job, scheduled_at):
+        """
+        작업 실행 및 결과 기록 (작업 잠금은 호출 전에 획득됨)
+        """
+        started_at = datetime.now()
+        outcome = 'success'
+        error_message = None
+
+        try:
+            job.func()
+        except Exception as e:
+            outcome = 'error'
+            error_message = str(e)
+            log_exception(logger, e, {"context": "스케줄 작업 실행", "job": job.name})
+        finally:
+            finished_at = datetime.now()
+            job.last_run = finished_at
+            job.lock.release()
+
+        _record_job_run(job.name, scheduled_at, started_at, finished_at, outcome, error_message)
+
+    def run_now(self, name, wait=False):
+        """
+        등록된 작업 즉시 실행 (실행 중이거나 리더가 아니면 건너뜀)
+
+        Args:
+            name (str): 작업 이름
+            wait (bool): 완료까지 대기 여부
+
+        Returns:
+            bool: 실행 여부
+        """
+        job = self._jobs.get(name)
+        if job is None:
+            raise KeyError(f"등록되지 않은 작업: {name}")
+
+        future = self._submit(job, datetime.now())
+        if future is None:
+            return False
+
+        if wait:
+            future.result()
+        return True
+
+    def get_jobs(self):
+        """
+        등록된 작업 목록 반환
+
+        Returns:
+            list: 작업 정보 딕셔너리 목록
+        """
+        with self._condition:
+            return [
+                {
+                    'name': job.name,
+                    'next_run': job.next_run,
+                    'last_run': job.last_run,
+                    'running': job.lock.locked(),
+                    'leader': self._is_leader
+                }
+                for job in sorted(self._jobs.values(), key=lambda j: j.next_run or datetime.max)
+            ]
+
+def _record_job_run(job_name, scheduled_at, started_at, finished_at, outcome, error_message=None):
+    """
+    작업 실행 기록 저장
+
+    Args:
+        job_name (str): 작업 이름
+        scheduled_at (datetime): 예정 시각
+        started_at (datetime): 시작 시각 (건너뛴 경우 None)
+        finished_at (datetime): 종료 시각 (건너뛴 경우 None)
+        outcome (str): 'success', 'error', 'skipped'
+        error_message (str, optional): 오류 또는 사유
+    """
+    duration_ms = None
+    if started_at and finished_at:
+        duration_ms = (finished_at - started_at).total_seconds() * 1000
+
+    try:
+        conn = get_db_connection('settings')
+        cursor = conn.cursor()
+
+        cursor.execute(
+            """
+            INSERT INTO job_runs (job_name, scheduled_at, started_at, finished_at, duration_ms, outcome, error_message, owner)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (job_name, scheduled_at, started_at, finished_at, duration_ms, outcome, error_message, INSTANCE_ID)
+        )
+
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        log_exception(logger, e, {"context": "작업 실행 기록 저장", "job": job_name})
+
+def acquire_lease(lease_name, owner, ttl):
+    """
+    임대 획득 또는 갱신 (단일 UPSERT 문으로 원자적으로 처리)
+
+    임대가 없거나, 만료되었거나, 이미 owner가 보유 중이면 owner로 설정하고 만료 시각을 연장합니다.
+
+    Args:
+        lease_name (str): 임대 이름
+        owner (str): 임대를 요청하는 인스턴스 식별자
+        ttl (float): 임대 유효 시간 (초)
+
+    Returns:
+        bool: 임대 보유 여부
+    """
+    now = time.time()
+
+    try:
+        conn = get_db_connection('settings')
+        cursor = conn.cursor()
+
+        cursor.execute(
+            """
+            INSERT INTO job_leases (lease_name, owner, acquired_at, heartbeat_at, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(lease_name) DO UPDATE SET
+                owner = excluded.owner,
+                acquired_at = CASE WHEN job_leases.owner = excluded.owner
+                                   THEN job_leases.acquired_at ELSE excluded.acquired_at END,
+                heartbeat_at = excluded.heartbeat_at,
+                expires_at = excluded.expires_at
+            WHERE job_leases.owner = excluded.owner OR job_leases.expires_at < excluded.heartbeat_at
+            """,
+            (lease_name, owner, now, now, now + ttl)
+        )
+        acquired = cursor.rowcount == 1
+
+        conn.commit()
+        conn.close()
+
+        return acquired
+    except Exception as e:
+        log_exception(logger, e, {"context": "임대 획득", "lease": lease_name})
+        return False
+
+def release_lease(lease_name, owner):
+    """
+    보유 중인 임대 반납 (다른 인스턴스가 즉시 인계 가능)
+
+    Args:
+        lease_name (str): 임대 이름
+        owner (str): 임대 보유 인스턴스 식별자
+    """
+    try:
+        conn = get_db_connection('settings')
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM job_leases WHERE lease_name = ? AND owner = ?", (lease_name, owner))
+
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        log_exception(logger, e, {"context": "임대 반납", "lease": lease_name})
+
+def get_lease(lease_name):
+    """
+    임대 상태 조회
+
+    Args:
+        lease_name (str): 임대 이름
+
+    Returns:
+        dict or None: 임대 정보 (owner, 만료까지 남은 시간 등)
+    """
+    try:
+        conn = get_db_connection('settings')
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT * FROM job_leases WHERE lease_name = ?", (lease_name,))
+        row = cursor.fetchone()
+        conn.close()
+
+        if not row:
+            return None
+
+        lease = dict(row)
+        lease['expires_in'] = lease['expires_at'] - time.time()
+        lease['is_expired'] = lease['expires_in'] <= 0
+        return lease
+    except Exception as e:
+        log_exception(logger, e, {"context": "임대 조회", "lease": lease_name})
+        return None
+
+def get_job_runs(job_name=None, limit=50):
+    """
+    작업 실행 기록 조회
+
+    Args:
+        job_name (str, optional): 작업 이름 (None이면 전체)
+        limit (int): 최대 조회 건수
+
+    Returns:
+        list: 실행 기록 딕셔너리 목록 (최신순)
+    """
+    try:
+        conn = get_db_connection('settings')
+        cursor = conn.cursor()
+
+        if job_name:
+            cursor.execute(
+                "SELECT * FROM job_runs WHERE job_name = ? ORDER BY id DESC LIMIT ?",
+                (job_name, limit)
+            )
+        else:
+            cursor.execute("SELECT * FROM job_runs ORDER BY id DESC LIMIT ?", (limit,))
+
+        runs = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return runs
+    except Exception as e:
+        log_exception(logger, e, {"context": "작업 실행 기록 조회"})
+        return []
+
+def clean_job_runs():
+    """
+    보관 기간이 지난 작업 실행 기록 삭제
+
+    Returns:
+        int: 삭제된 기록 수
+    """
+    try:
+        cutoff = datetime.now() - timedelta(days=SCHEDULER_SETTINGS['run_history_days'])
+
+        conn = get_db_connection('settings')
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM job_runs WHERE scheduled_at < ?", (cutoff,))
+        deleted = cursor.rowcount
+
+        conn.commit()
+        conn.close()
+
+        return deleted
+    except Exception as e:
+        log_exception(logger, e, {"context": "작업 실행 기록 정리"})
+        return 0
+
+# 앱 전역 스케줄러 인스턴스
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    전역 스케줄러 인스턴스 반환 (없으면 생성)
+
+    Returns:
+        JobScheduler: 스케줄러
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
@@ -0,0 +1,181 @@
+"""
+관리자 UI 컴포넌트 (시장 데이터 캐시 모니터링)
+"""
+import gradio as gr
+import pandas as pd
+
+# 관리자 화면 접근이 허용된 사용자명
+ADMIN_USERNAMES = {"admin"}
+
+def is_admin(state):
+    """
+    세션 상태가 관리자 계정인지 확인
+
+    Args:
+        state (dict): 세션 상태
+
+    Returns:
+        bool: 관리자 여부
+    """
+    return bool(state and state.get("logged_in") and state.get("username") in ADMIN_USERNAMES)
+
+def create_admin_ui():
+    """
+    관리자 UI 컴포넌트 생성
+
+    Returns:
+        tuple: (컨테이너 딕셔너리, 컴포넌트 딕셔너리)
+    """
+    # 캐시 모니터 화면
+    with gr.Group(visible=False) as cache_monitor_container:
+        gr.Markdown("## 시장 데이터 캐시 모니터", elem_classes="header-text")
+
+        with gr.Row():
+            cache_refresh_btn = gr.Button("통계 새로고침", variant="primary", elem_classes="action-button")
+            cache_reset_btn = gr.Button("통계 초기화", elem_classes="secondary-button")
+
+        cache_status = gr.Markdown("관리자 계정으로 로그인하면 캐시 통계를 확인할 수 있습니다.")
+
+        gr.Markdown("### 데이터 유형별 캐시 적중률", elem_classes="subheader-text")
+        cache_stats_table = gr.Dataframe(
+            headers=["데이터 유형", "적중", "미스", "만료", "전체", "적중률(%)", "TTL(초)"],
+            interactive=False,
+            wrap=True
+        )
+
+        gr.Markdown("### 프로바이더별 응답 시간", elem_classes="subheader-text")
+        provider_stats_table = gr.Dataframe(
+            headers=["프로바이더", "호출", "오류", "오류율(%)", "평균(ms)", "p50(ms)", "p95(ms)", "최대(ms)", "분포"],
+            interactive=False,
+            wrap=True
+        )
+
+        with gr.Row():
+            with gr.Column():
+                gr.Markdown("### 조회가 많은 키", elem_classes="subheader-text")
+                hot_keys_table = gr.Dataframe(
+                    headers=["데이터 유형", "종목/통화", "시장", "조회 수"],
+                    interactive=False,
+                    wrap=True
+                )
+
+            with gr.Column():
+                gr.Markdown("### 테이블 크기", elem_classes="subheader-text")
+                table_sizes_table = gr.Dataframe(
+                    headers=["테이블", "행 수", "만료 행 수"],
+                    interactive=False,
+                    wrap=True
+                )
+
+        gr.Markdown("### 가장 오래된 캐시 항목", elem_classes="subheader-text")
+        oldest_entries_table = gr.Dataframe(
+            headers=["데이터 유형", "종목", "시장", "저장 시간", "만료 시간", "크기(byte)"],
+            interactive=False,
+            wrap=True
+        )
+
+    containers = {
+        "cache_monitor": cache_monitor_container
+    }
+
+    components = {
+        "cache_refresh_btn": cache_refresh_btn,
+        "cache_reset_btn": cache_reset_btn,
+        "cache_status": cache_status,
+        "cache_stats_table": cache_stats_table,
+        "provider_stats_table": provider_stats_table,
+        "hot_keys_table": hot_keys_table,
+        "table_sizes_table": table_sizes_table,
+        "oldest_entries_table": oldest_entries_table
+    }
+
+    return containers, components
+
+def load_cache_monitor(state):
+    """
+    캐시 모니터 화면 데이터 조회
+
+    Args:
+        state (dict): 세션 상태
+
+    Returns:
+        tuple: (상태 메시지, 캐시 통계, 프로바이더 통계, 인기 키, 테이블 크기, 오래된 항목)
+    """
+    if not is_admin(state):
+        return "관리자 권한이 필요합니다.", None, None, None, None, None
+
+    from services.market_service import get_cache_statistics, get_cache_inspector
+
+    stats = get_cache_statistics()
+    inspector = get_cache_inspector(limit=20)
+
+    cache_df = pd.DataFrame([
+        [data_type, s["hit"], s["miss"], s["stale"], s["total"], round(s["hit_ratio"] * 100, 1), s["ttl_seconds"]]
+        for data_type, s in sorted(stats["cache"].items())
+    ], columns=["데이터 유형", "적중", "미스", "만료", "전체", "적중률(%)", "TTL(초)"])
+
+    provider_df = pd.DataFrame([
+        [
+            provider, s["calls"], s["errors"], round(s["error_rate"] * 100, 1),
+            round(s["avg_ms"], 1), s["p50_ms"], s["p95_ms"], round(s["max_ms"], 1),
+            ", ".join(f"{label}: {count}" for label, count in s["histogram"].items() if count)
+        ]
+        for provider, s in sorted(stats["providers"].items())
+    ], columns=["프로바이더", "호출", "오류", "오류율(%)", "평균(ms)", "p50(ms)", "p95(ms)", "최대(ms)", "분포"])
+
+    hot_keys_df = pd.DataFrame([
+        [item["data_type"], item["symbol"], item["market"], item["hits"]]
+        for item in inspector["hot_keys"]
+    ], columns=["데이터 유형", "종목/통화", "시장", "조회 수"])
+
+    table_sizes_df = pd.DataFrame([
+        [table, size["rows"], size["expired"]]
+        for table, size in inspector["table_sizes"].items()
+    ], columns=["테이블", "행 수", "만료 행 수"])
+
+    oldest_df = pd.DataFrame([
+        [item["data_type"], item["symbol"], item["market"], item["timestamp"], item["expiry"], item["size"]]
+        for item in inspector["oldest_entries"]
+    ], columns=["데이터 유형", "종목", "시장", "저장 시간", "만료 시간", "크기(byte)"])
+
+    status = f"통계 수집 시작: {stats['since']}"
+
+    return status, cache_df, provider_df, hot_keys_df, table_sizes_df, oldest_df
+
+def setup_admin_events(app, session_state, components, containers):
+    """
+    관리자 UI 이벤트 설정
+
+    Args:
+        app: Gradio 앱 인스턴스
+        session_state: 세션 상태 컴포넌트
+        components: UI 컴포넌트 딕셔너리
+        containers: UI 컨테이너 딕셔너리
+    """
+    outputs = [
+        components["cache_status"],
+        components["cache_stats_table"],
+        components["provider_stats_table"],
+        components["hot_keys_table"],
+        components["table_sizes_table"],
+        components["oldest_entries_table"]
+    ]
+
+    components["cache_refresh_btn"].click(
+        fn=load_cache_monitor,
+        inputs=[session_state],
+        outputs=outputs
+    )
+
+    # 통계 초기화 후 화면 갱신
+    def reset_cache_monitor(state):
+        if is_admin(state):
+            from services.market_service import reset_cache_statistics
+            reset_cache_statistics()
+        return load_cache_monitor(state)
+
+    components["cache_reset_btn"].click(
+        fn=reset_cache_monitor,
+        inputs=[session_state],
+        outputs=outputs
+    )
@@ -447,6 +447,123 @@ y=ma20,
     def show_optimization_screen():
         return show_container("optimization")
     
+    # 포트폴리오 최적화 실행 (제약을 바꿔 다시 누르면 바로 다시 계산)
+    def run_optimization_handler(state, objective_name, max_weight, sector_limit):
+        empty = """<div class="result-card">분석 결과가 없습니다.</div>"""
+        if not state or not state.get("user_id"):
+            return "로그인이 필요합니다.", None, empty, empty, empty, empty
+        
+        try:
+            from services.optimizer_service import run_optimization, OPTIMIZATION_OBJECTIVES
+            import plotly.graph_objects as go
+            
+            objective = next(key for key, name in OPTIMIZATION_OBJECTIVES.items() if name == objective_name)
+            sector_limits = None
+            if sector_limit < 100:
+                portfolio_df = load_portfolio(state["user_id"])
+                sectors = portfolio_df['섹터'].dropna().unique() if '섹터' in portfolio_df.columns else []
+                sector_limits = {sector: sector_limit / 100 for sector in sectors}
+            
+            result = run_optimization(
+                state["user_id"], objective=objective,
+                max_weight=max_weight / 100, sector_limits=sector_limits
+            )
+            recommendation = calculate_optimal_portfolio(state["user_id"])
+            if result.get("status") != "success":
+                return result.get("message", "최적화에 실패했습니다."), None, empty, empty, empty, empty
+            
+            current = result["current"]
+            summary = (
+                f"**{result['objective_name']}** 기준 목표 포트폴리오: "
+                f"기대수익률 {result['expected_return']:.2f}%, 변동성 {result['volatility']:.2f}%, "
+                f"샤프 비율 {result['sharpe_ratio']:.2f} "
+                f"(현재 {current['expected_return']:.2f}%, {current['volatility']:.2f}%, {current['sharpe_ratio']:.2f})"
+            )
+            if result["excluded"]:
+                summary += f"\n\n종가 이력이 부족해 현재 비중을 유지한 종목: {', '.join(result['excluded'])}"
+            
+            # 효율적 투자선과 현재/목표 포트폴리오
+            frontier = result["frontier"]
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                x=frontier["volatility"],
+                y=frontier["return"],
+                mode='lines', name='효율적 투자선', line=dict(color='royalblue', width=2)
+            ))
+            fig.add_trace(go.Scatter(
+                x=[current["volatility"]], y=[current["expected_return"]],
+                mode='markers', name='현재', marker=dict(color='gray', size=12)
+            ))
+            fig.add_trace(go.Scatter(
+                x=[result["volatility"]], y=[result["expected_return"]],
+                mode='markers', name='목표', marker=dict(color='red', size=14, symbol='star')
+            ))
+            fig.update_layout(
+                xaxis_title="연간 변동성 (%)", yaxis_title="연간 기대수익률 (%)",
+                template="plotly_white", height=450
+            )
+            
+            risk_html = f"""
+            <div class="result-card">
+                <p>기대수익률: {current['expected_return']:.2f}% → {result['expected_return']:.2f}%</p>
+                <p>변동성: {current['volatility']:.2f}% → {result['volatility']:.2f}%</p>
+                <p>샤프 비율: {current['sharpe_ratio']:.2f} → {result['sharpe_ratio']:.2f}</p>
+            </div>
+            """
+            
+            sector_rows = "".join(
+                f"<tr><td>{sector}</td><td>{weights['current']:.1f}%</td><td>{weights['target']:.1f}%</td></tr>"
+                for sector, weights in sorted(result["sector_weights"].items(), key=lambda x: -x[1]["target"])
+            )
+            sector_html = f"""
+            <div class="result-card">
+                <table><tr><th>섹터</th><th>현재</th><th>목표</th></tr>{sector_rows}</table>
+            </div>
+            """
+            
+            weight_rows = "".join(
+                f"<tr><td>{item['name']} ({item['ticker']})</td><td>{item['current_weight']:.1f}%</td>"
+                f"<td>{item['target_weight']:.1f}%</td><td>{item['target_value']:,.0f}원</td></tr>"
+                for item in result["weights"]
+            )
+            weight_html = f"""
+            <div class="result-card">
+                <table><tr><th>종목</th><th>현재</th><th>목표</th><th>목표 평가액</th></tr>{weight_rows}</table>
+            </div>
+            """
+            
+            improvements = []
+            if recommendation.get("status") == "success":
+                for item in recommendation.get("low_performers", []):
+                    improvements.append(f"<p>{item['name']} ({item['ticker']}): {item['loss_percent']:.1f}% - {item['recommendation']}</p>")
+                cash = recommendation.get("cash_recommendation")
+                if cash:
+                    improvements.append(f"<p>{cash['issue']} ({cash['current_weight'] * 100:.1f}%): {cash['recommendation']}</p>")
+            improvement_html = f"""<div class="result-card">{''.join(improvements) or '<p>추가 개선 사항이 없습니다.</p>'}</div>"""
+            
+            return summary, fig, risk_html, sector_html, weight_html, improvement_html
+        except Exception as e:
+            print(f"Error in run_optimization_handler: {e}")
+            return f"최적화 중 오류가 발생했습니다: {str(e)}", None, empty, empty, empty, empty
+    
+    components["start_optimization_btn"].click(
+        fn=run_optimization_handler,
+        inputs=[
+            session_state,
+            components["optimization_objective"],
+            components["optimization_max_weight"],
+            components["optimization_sector_limit"]
+        ],
+        outputs=[
+            components["optimization_summary"],
+            components["efficient_frontier_chart"],
+            components["risk_analysis_results"],
+            components["sector_analysis_results"],
+            components["concentration_analysis_results"],
+            components["performance_improvement_results"]
+        ]
+    )
+    
     # 매수 버튼 클릭 이벤트
     def buy_stock_handler(state, country, code, name, sector, broker, account, date, quantity, price, currency, exchange_rate, fee, tax, memo):
         if not state or not state.get("user_id"):
@@ -863,9 +980,27 @@ y=ma20,
                 elem_classes="info-text"
             )
         
+        with gr.Row():
+            optimization_objective = gr.Dropdown(
+                choices=["최대 샤프 비율", "최소 분산", "위험 균형"],
+                value="최대 샤프 비율",
+                label="최적화 목표"
+            )
+            optimization_max_weight = gr.Slider(
+                minimum=5, maximum=100, value=30, step=5,
+                label="종목당 최대 비중 (%)"
+            )
+            optimization_sector_limit = gr.Slider(
+                minimum=10, maximum=100, value=100, step=5,
+                label="섹터당 최대 비중 (%)"
+            )
+        
         with gr.Row():
             start_optimization_btn = gr.Button("포트폴리오 분석 시작", variant="primary", elem_classes="action-button")
         
+        with gr.Accordion("효율적 투자선", open=True):
+            efficient_frontier_chart = gr.Plot(label="효율적 투자선")
+        
         with gr.Accordion("리스크 분석", open=True):
             risk_analysis_results = gr.HTML(
                 """<div class="result-card">분석 결과를 불러오는 중...</div>""",
@@ -989,6 +1124,10 @@ y=ma20,
         "buy_btn": buy_btn,
         "cancel_buy_btn": cancel_buy_btn,
         "buy_result": buy_result,
+        "batch_table": batch_table,
+        "batch_execute_btn": batch_execute_btn,
+        "batch_clear_btn": batch_clear_btn,
+        "batch_result": batch_result,
         
         # 매도 화면
         "sell_stock_dropdown": sell_stock_dropdown,
@@ -1024,6 +1163,10 @@ y=ma20,
         "transactions_search": transactions_search,
         "transactions_period": transactions_period,
         "transaction_table": transaction_table,
+        "transactions_prev_btn": transactions_prev_btn,
+        "transactions_page_info": transactions_page_info,
+        "transactions_next_btn": transactions_next_btn,
+        "transactions_page_state": transactions_page_state,
         "export_transactions_btn": export_transactions_btn,
         
         # 배당금 화면
@@ -1031,6 +1174,10 @@ y=ma20,
         "load_dividends_btn": load_dividends_btn,
         "dividends_period": dividends_period,
         "dividends_table": dividends_table,
+        "dividends_prev_btn": dividends_prev_btn,
+        "dividends_page_info": dividends_page_info,
+        "dividends_next_btn": dividends_next_btn,
+        "dividends_page_state": dividends_page_state,
         "dividends_summary": dividends_summary,
         "dividend_stock_dropdown": dividend_stock_dropdown,
         "refresh_dividend_stocks_btn": refresh_dividend_stocks_btn,
@@ -1063,6 +1210,10 @@ y=ma20,
         # 포트폴리오 최적화 화면
         "optimization_summary": optimization_summary,
         "start_optimization_btn": start_optimization_btn,
+        "optimization_objective": optimization_objective,
+        "optimization_max_weight": optimization_max_weight,
+        "optimization_sector_limit": optimization_sector_limit,
+        "efficient_frontier_chart": efficient_frontier_chart,
         "risk_analysis_results": risk_analysis_results,
         "sector_analysis_results": sector_analysis_results,
         "concentration_analysis_results": concentration_analysis_results,
@@ -1627,6 +1778,28 @@ def create_portfolio_ui():
                         precision=0,
                         interactive=False
                     )
+            
+            with gr.Tab("일괄 주문"):
+                gr.Markdown(
+                    "매수/매도/배당을 여러 행으로 입력합니다. 모든 행을 함께 검증한 뒤 한 번에 반영하며, "
+                    "오류가 있는 행이 하나라도 있으면 아무 것도 반영하지 않습니다. "
+                    "배당은 '가격/금액'에 배당금액을 입력하고, 신규 종목 매수는 국가(새 계좌는 증권사)를 입력하세요."
+                )
+                batch_table = gr.Dataframe(
+                    headers=["구분", "종목코드", "계좌", "수량", "가격/금액", "증권사", "국가", "종목명", "날짜", "메모"],
+                    datatype=["str", "str", "str", "number", "number", "str", "str", "str", "str", "str"],
+                    row_count=(5, "dynamic"),
+                    col_count=(10, "fixed"),
+                    interactive=True,
+                    wrap=True,
+                    elem_classes="batch-order-table"
+                )
+                
+                with gr.Row():
+                    batch_execute_btn = gr.Button("일괄 실행", variant="primary", elem_classes="action-button")
+                    batch_clear_btn = gr.Button("초기화", elem_classes="secondary-button")
+                
+                batch_result = gr.Textbox(label="일괄 주문 결과", interactive=False, lines=4, elem_classes="result-message")
         
         with gr.Row():
             lookup_stock_btn = gr.Button("종목 정보 조회", elem_classes="secondary-button")
@@ -1767,6 +1940,13 @@ def create_portfolio_ui():
             elem_classes="transaction-table"
         )
         
+        # 페이지 이동 (키셋 커서는 페이지 상태에 저장)
+        with gr.Row():
+            transactions_prev_btn = gr.Button("◀ 이전", elem_classes="secondary-button")
+            transactions_page_info = gr.Markdown("")
+            transactions_next_btn = gr.Button("다음 ▶", elem_classes="secondary-button")
+        transactions_page_state = gr.State({})
+        
         with gr.Row():
             export_transactions_btn = gr.Button("거래내역 내보내기", elem_classes="secondary-button")
     
@@ -1794,6 +1974,12 @@ def create_portfolio_ui():
                     elem_classes="dividends-table"
                 )
                 
+                with gr.Row():
+                    dividends_prev_btn = gr.Button("◀ 이전", elem_classes="secondary-button")
+                    dividends_page_info = gr.Markdown("")
+                    dividends_next_btn = gr.Button("다음 ▶", elem_classes="secondary-button")
+                dividends_page_state = gr.State({})
+                
                 with gr.Row():
                     dividends_summary = gr.HTML(
                         """<div class="summary-card">배당금 요약 정보를 불러오는 중...</div>""",
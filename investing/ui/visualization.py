@@ -17,6 +17,9 @@
     
     return empty_fig, empty_fig, empty_fig
 
+from utils.cache import versioned_cache
+
+@versioned_cache()
 def create_performance_dashboard(user_id, period='1y'):
     """
     성과 대시보드 차트 생성
@@ -276,6 +279,22 @@ def create_performance_dashboard(user_id, period='1y'):
         font=dict(color="black", size=16)
     )
     
+    # 공분산 기반 변동성 및 VaR (종가 이력이 있는 경우)
+    value_at_risk = risk_metrics.get("value_at_risk", {})
+    historical_var = value_at_risk.get("historical", {}).get("1d_95")
+    if risk_metrics.get("volatility") is not None and historical_var:
+        fig_risk.add_annotation(
+            text=(
+                f"연 변동성: {risk_metrics['volatility']:.1f}%<br>"
+                f"1일 VaR(95%): ₩{historical_var['var_amount']:,.0f} / CVaR: ₩{historical_var['cvar_amount']:,.0f}"
+            ),
+            x=0.5, y=0.08,
+            xref="paper",
+            yref="paper",
+            showarrow=False,
+            font=dict(color="black", size=12)
+        )
+    
     fig_risk.update_layout(
         title={
             'text': '포트폴리오 위험 분석',
@@ -620,10 +639,13 @@ def setup_visualization_events(app, session_state, components, containers):
         }
         period = period_map.get(period_str, "1y")
         
+        # 모든 차트가 같은 포트폴리오 스냅샷 데이터를 사용하도록 한 번만 조회
+        portfolio_data = get_portfolio_summary(state["user_id"])
+        
         # 차트 생성
-        returns_fig, value_fig = create_portfolio_chart(state["user_id"])
-        country_fig, account_fig, broker_fig, sector_fig = create_distribution_charts(state["user_id"])
-        top_stocks_fig = create_top_stocks_chart(state["user_id"])
+        returns_fig, value_fig = create_portfolio_chart(state["user_id"], portfolio_data)
+        country_fig, account_fig, broker_fig, sector_fig = create_distribution_charts(state["user_id"], portfolio_data)
+        top_stocks_fig = create_top_stocks_chart(state["user_id"], portfolio_data)
         
         # 포트폴리오 요약 정보 HTML 생성
         summary_html = create_portfolio_summary_html(state["user_id"])
@@ -777,18 +799,20 @@ CHART_COLORS = {
     "wealth": ['#00877F', '#6DECB9', '#ACF6C8', '#FFD6E0', '#FF8FAB', '#5E2F50', '#FFC93C', '#57BE83']
 }
 
-def create_portfolio_chart(user_id):
+def create_portfolio_chart(user_id, portfolio_data=None):
     """
     포트폴리오 수익률 및 가치 차트 생성
     
     Args:
         user_id (int): 사용자 ID
+        portfolio_data (dict, optional): get_portfolio_summary() 결과 (여러 차트가 같은 데이터를 공유할 때 전달)
         
     Returns:
         tuple: (수익률 차트, 가치 차트)
     """
     # 포트폴리오 정보 가져오기
-    portfolio_data = get_portfolio_summary(user_id)
+    if portfolio_data is None:
+        portfolio_data = get_portfolio_summary(user_id)
     
     # 수익률 차트
     if portfolio_data["history"]:
@@ -805,19 +829,28 @@ def create_portfolio_chart(user_id):
             hovertemplate='%{x}<br>수익률: %{y:.2f}%<extra></extra>'
         ))
         
-        # 벤치마크 (KOSPI) 추가 - 더미 데이터, 실제로는 API로 가져와야 함
+        # 벤치마크 지수 (코스피, 해외 종목 보유 시 S&P 500) 누적 수익률
         if len(dates) > 1:
-            # 더미 데이터 생성 (실제로는 API에서 가져와야 함)
-            benchmark_returns = np.cumsum(np.random.normal(0, 0.5, len(dates))) + 3
+            benchmarks = [BENCHMARK_SETTINGS["default_index"]]
+            countries = portfolio_data.get("distributions", {}).get("country", {})
+            if any(country != '한국' for country in countries):
+                benchmarks.append(BENCHMARK_SETTINGS["foreign_index"])
             
-            fig_returns.add_trace(go.Scatter(
-                x=dates, 
-                y=benchmark_returns,
-                mode='lines',
-                name='KOSPI',
-                line=dict(color='gray', width=1.5, dash='dot'),
-                hovertemplate='%{x}<br>KOSPI: %{y:.2f}%<extra></extra>'
-            ))
+            for index_code, color in zip(benchmarks, ['gray', 'darkorange']):
+                benchmark_returns = get_benchmark_returns(dates, index_code)
+                if not any(value is not None for value in benchmark_returns):
+                    continue
+                
+                name = INDEX_SYMBOLS.get(index_code, {}).get('name', index_code)
+                fig_returns.add_trace(go.Scatter(
+                    x=dates, 
+                    y=benchmark_returns,
+                    mode='lines',
+                    name=name,
+                    line=dict(color=color, width=1.5, dash='dot'),
+                    connectgaps=True,
+                    hovertemplate='%{x}<br>' + name + ': %{y:.2f}%<extra></extra>'
+                ))
         
         fig_returns.update_layout(
             title={
@@ -942,18 +975,20 @@ def create_portfolio_chart(user_id):
     
     return empty_fig, empty_fig
 
-def create_distribution_charts(user_id):
+def create_distribution_charts(user_id, portfolio_data=None):
     """
     포트폴리오 분포 차트 생성
     
     Args:
         user_id (int): 사용자 ID
+        portfolio_data (dict, optional): get_portfolio_summary() 결과 (여러 차트가 같은 데이터를 공유할 때 전달)
         
     Returns:
         tuple: (국가별 차트, 계좌별 차트, 증권사별 차트, 섹터별 차트)
     """
     # 포트폴리오 정보 가져오기
-    portfolio_data = get_portfolio_summary(user_id)
+    if portfolio_data is None:
+        portfolio_data = get_portfolio_summary(user_id)
     
     # 국가별 분포
     country_data = portfolio_data["distributions"]["country"]
@@ -1107,18 +1142,20 @@ def create_distribution_charts(user_id):
     
     return empty_fig, empty_fig, empty_fig, empty_fig
 
-def create_top_stocks_chart(user_id):
+def create_top_stocks_chart(user_id, portfolio_data=None):
     """
     상위 종목 차트 생성
     
     Args:
         user_id (int): 사용자 ID
+        portfolio_data (dict, optional): get_portfolio_summary() 결과 (여러 차트가 같은 데이터를 공유할 때 전달)
         
     Returns:
         plotly.graph_objects.Figure: 상위 종목 차트
     """
     # 포트폴리오 정보 가져오기
-    portfolio_data = get_portfolio_summary(user_id)
+    if portfolio_data is None:
+        portfolio_data = get_portfolio_summary(user_id)
     
     # 상위 종목 데이터
     top_stocks = portfolio_data.get("top_stocks", [])
@@ -1193,18 +1230,20 @@ def create_top_stocks_chart(user_id):
     
     return empty_fig
 
-def create_asset_allocation_chart(user_id):
+def create_asset_allocation_chart(user_id, portfolio_data=None):
     """
     자산 배분 차트 생성
     
     Args:
         user_id (int): 사용자 ID
+        portfolio_data (dict, optional): get_portfolio_summary() 결과 (여러 차트가 같은 데이터를 공유할 때 전달)
         
     Returns:
         plotly.graph_objects.Figure: 자산 배분 차트
     """
     # 포트폴리오 정보 가져오기
-    portfolio_data = get_portfolio_summary(user_id)
+    if portfolio_data is None:
+        portfolio_data = get_portfolio_summary(user_id)
     
     # 주식과 적금 비중 계산
     stock_value = portfolio_data["summary"]["total_value"]
@@ -1486,6 +1525,9 @@ import pandas as pd
 from datetime import datetime, timedelta
 import json
 
+from services.benchmark_service import get_benchmark_returns, BENCHMARK_SETTINGS
+from services.market_service import INDEX_SYMBOLS
+
 try:
     from services.portfolio_service import (
         get_portfolio_summary, 
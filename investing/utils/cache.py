@@ -0,0 +1,105 @@
+"""
+사용자 데이터 버전 기반 캐시 유틸리티
+
+portfolio, transactions, dividends, portfolio_history, savings, savings_transactions 테이블이 변경되면
+SQLite 트리거가 사용자별 data_version을 증가시킵니다. (user_id, version)을 캐시 키로 사용하면
+데이터가 바뀐 경우에만 다시 계산하고, 오래된 결과는 반환하지 않습니다.
+"""
+import threading
+import functools
+from collections import OrderedDict
+
+from models.database import get_db_connection
+from utils.logging import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+def get_data_version(user_id):
+    """
+    사용자 데이터 버전 조회
+
+    Args:
+        user_id (int): 사용자 ID
+
+    Returns:
+        int or None: 데이터 버전 (변경 이력이 없으면 0, 조회 실패시 None)
+    """
+    try:
+        conn = get_db_connection('portfolio')
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT version FROM data_version WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+
+        return row[0] if row else 0
+    except Exception as e:
+        log_exception(logger, e, {"context": "데이터 버전 조회", "user_id": user_id})
+        return None
+
+def versioned_cache(maxsize=256):
+    """
+    사용자 데이터 버전 기반 메모이제이션 데코레이터
+
+    첫 번째 인자(또는 user_id 키워드 인자)를 사용자 ID로 보고 (함수, user_id, 데이터 버전, 나머지 인자)로
+    결과를 캐시합니다. 버전을 확인할 수 없거나 인자를 해시할 수 없으면 캐시 없이 실행합니다.
+    반환된 객체는 호출한 곳끼리 공유되므로 수정하지 않아야 합니다.
+
+    Args:
+        maxsize (int): 함수별 최대 캐시 항목 수 (초과 시 가장 오래 사용하지 않은 항목 제거)
+
+    Returns:
+        callable: 데코레이터
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        stats = {'hits': 0, 'misses': 0}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user_id = args[0] if args else kwargs.get('user_id')
+            version = get_data_version(user_id) if user_id is not None else None
+
+            if version is None:
+                return func(*args, **kwargs)
+
+            try:
+                key = (user_id, version, args[1:], tuple(sorted((k, v) for k, v in kwargs.items() if k != 'user_id')))
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    stats['hits'] += 1
+                    return cache[key]
+                stats['misses'] += 1
+
+            result = func(*args, **kwargs)
+
+            with lock:
+                # 같은 사용자의 이전 버전 결과는 더 이상 사용되지 않으므로 제거
+                for stale_key in [k for k in cache if k[0] == user_id and k[1] != version]:
+                    del cache[stale_key]
+
+                cache[key] = result
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+            return result
+
+        def cache_info():
+            with lock:
+                return {'hits': stats['hits'], 'misses': stats['misses'], 'size': len(cache), 'maxsize': maxsize}
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator